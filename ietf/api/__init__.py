@@ -8,7 +8,8 @@ import re
 from urllib.parse import urlencode
 
 from django.conf import settings
-from django.core.exceptions import ObjectDoesNotExist
+from django.core.exceptions import ObjectDoesNotExist, ValidationError
+from django.http import StreamingHttpResponse
 
 import debug                            # pyflakes:ignore
 
@@ -16,9 +17,13 @@ import tastypie
 import tastypie.resources
 from tastypie.api import Api
 from tastypie.bundle import Bundle
-from tastypie.exceptions import ApiFieldError
+from tastypie.exceptions import ApiFieldError, BadRequest
+from tastypie.paginator import Paginator
 from tastypie.serializers import Serializer # pyflakes:ignore (we're re-exporting this)
 from tastypie.fields import ApiField
+from tastypie.utils import trailing_slash
+
+from ietf.utils.urls import url
 
 _api_list = []
 
@@ -55,7 +60,96 @@ def autodiscover():
             if module_has_submodule(mod, "resources"):
                 raise
 
+class KeysetPaginator(Paginator):
+    """Paginator which, when the request has an ``after`` parameter, returns
+    the objects with a primary key greater than ``after``, in primary key
+    order, instead of slicing at an offset. The next link carries the last
+    primary key of the page, so that each page costs the same no matter how
+    deep into the table it is. An empty ``after`` starts at the beginning."""
+
+    def page(self):
+        after = self.request_data.get('after')
+        if after is None:
+            return super(KeysetPaginator, self).page()
+
+        limit = self.get_limit()
+        objects = self.objects.order_by('pk')
+        try:
+            if after != '':
+                objects = objects.filter(pk__gt=after)
+            objects = list(objects[:limit] if limit else objects)
+        except (ValueError, ValidationError):
+            raise BadRequest("Invalid 'after' value: %s" % after)
+
+        next = None
+        if limit and len(objects) == limit:
+            params = dict((k, v) for k, v in self.request_data.items() if k != 'offset')
+            params['after'] = objects[-1].pk
+            next = '%s?%s' % (self.resource_uri, urlencode(params))
+
+        return {
+            self.collection_name: objects,
+            'meta': {
+                'limit': limit,
+                'after': after,
+                'next': next,
+                'previous': None,
+            },
+        }
+
+
 class ModelResource(tastypie.resources.ModelResource):
+    def prepend_urls(self):
+        return [
+            url(r"^(?P<resource_name>%s)/export%s$" % (self._meta.resource_name, trailing_slash), self.wrap_view('export_list'), name="api_export_list"),
+        ]
+
+    def get_list(self, request, **kwargs):
+        """Like tastypie's get_list(), but with keyset pagination when the
+        request has an ``after`` parameter, see KeysetPaginator."""
+        if 'after' not in request.GET:
+            return super(ModelResource, self).get_list(request, **kwargs)
+
+        base_bundle = self.build_bundle(request=request)
+        objects = self.obj_get_list(bundle=base_bundle, **self.remove_api_resource_names(kwargs))
+
+        paginator = KeysetPaginator(request.GET, objects, resource_uri=self.get_resource_uri(), limit=self._meta.limit, max_limit=self._meta.max_limit, collection_name=self._meta.collection_name)
+        to_be_serialized = paginator.page()
+
+        bundles = [
+            self.full_dehydrate(self.build_bundle(obj=obj, request=request), for_list=True)
+            for obj in to_be_serialized[self._meta.collection_name]
+        ]
+
+        to_be_serialized[self._meta.collection_name] = bundles
+        to_be_serialized = self.alter_list_data_to_serialize(request, to_be_serialized)
+        return self.create_response(request, to_be_serialized)
+
+    def export_list(self, request, **kwargs):
+        """Stream all the objects matching the request filters as
+        newline-delimited JSON, one object per line in primary key order,
+        starting after the primary key in the ``after`` parameter if given."""
+        self.method_check(request, allowed=['get'])
+        self.is_authenticated(request)
+        self.throttle_check(request)
+
+        base_bundle = self.build_bundle(request=request)
+        objects = self.obj_get_list(bundle=base_bundle, **self.remove_api_resource_names(kwargs)).order_by('pk')
+        after = request.GET.get('after')
+        if after:
+            try:
+                objects = objects.filter(pk__gt=after)
+            except (ValueError, ValidationError):
+                raise BadRequest("Invalid 'after' value: %s" % after)
+
+        def records():
+            for obj in objects.iterator():
+                bundle = self.full_dehydrate(self.build_bundle(obj=obj, request=request), for_list=True)
+                yield self._meta.serializer.to_json(bundle) + '\n'
+
+        self.log_throttled_access(request)
+        return StreamingHttpResponse(records(), content_type='application/x-ndjson')
+
     def generate_cache_key(self, *args, **kwargs):
         """
         Creates a unique-enough cache key.
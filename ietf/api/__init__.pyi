@@ -25,6 +25,7 @@ utils           = ...       # type: Any
 
 _api_list       = ...       # type: List
 
+class KeysetPaginator(tastypie.paginator.Paginator): ...
 class ModelResource(tastypie.resources.ModelResource): ...
 class Serializer(): ...
 class ToOneField(tastypie.fields.ToOneField): ...
@@ -3,19 +3,24 @@
 
 
 import hashlib
+import itertools
 import json
+import uuid
 
 from django.core.cache import cache
 from django.core.exceptions import ObjectDoesNotExist, FieldError
-from django.core.serializers.json import Serializer
-from django.http import HttpResponse
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.serializers.python import Serializer
+from django.http import HttpResponse, StreamingHttpResponse
 from django.utils.encoding import smart_text
-from django.db.models import Field
+from django.db.models import Field, Model    # pyflakes:ignore
 from django.db.models.query import QuerySet
 from django.db.models.signals import post_save, post_delete, m2m_changed
 
 import debug                            # pyflakes:ignore
 
+from typing import Set, Type            # pyflakes:ignore
+
 
 def filter_from_queryargs(request):
     #@debug.trace
@@ -44,6 +49,10 @@ def unique_obj_name(obj):
     id = obj.pk
     return "%s.%s[%s]" % (app,model,id)
 
+def json_key(value):
+    """Return value as json.dumps() writes it as a dictionary key"""
+    return json.dumps({value: None})[1:-7]
+
 def cached_get(key, calculate_value, timeout=None):
     """Try to get value from cache using key. If no value exists calculate
     it by calling calculate_value. Timeout is defined in seconds."""
@@ -53,40 +62,65 @@ def cached_get(key, calculate_value, timeout=None):
         cache.set(key, value, timeout)
     return value
 
-def model_top_level_cache_key(model):
-    return model.__module__ + '.' + model._meta.model.__name__
+def model_json_version_key(model):
+    return 'json:version:%s' % model._meta.label_lower
+
+def object_json_version_key(obj):
+    return 'json:version:%s' % unique_obj_name(obj)
 
-def clear_top_level_cache(sender, instance, *args, **kwargs):
-    cache.delete(model_top_level_cache_key(instance))
+def json_cache_version(obj):
+    """The version of the cached serializations of obj, which changes when
+    the object, or all of the objects of its model, are invalidated"""
+    keys = (model_json_version_key(obj), object_json_version_key(obj))
+    versions = cache.get_many(keys)
+    for key in keys:
+        if versions.get(key) is None:
+            versions[key] = uuid.uuid4().hex
+            if not cache.add(key, versions[key], None):
+                versions[key] = cache.get(key) or versions[key]
+    return ':'.join(versions[key] for key in keys)
 
-def clear_top_level_cache_m2m(sender, instance, action, reverse, model, *args, **kwargs):
-    # Purge cache for both models affected and the potentially custom 'through' model
-    cache.delete_many((
-        model_top_level_cache_key(instance),
-        model_top_level_cache_key(model),
-        model_top_level_cache_key(sender),
-    ))
+# The models whose serializations are cached, see cache_json_for_model()
+json_cached_models = set()              # type: Set[Type[Model]]
 
-post_save.connect(clear_top_level_cache, dispatch_uid='clear_top_level_cache')
-post_delete.connect(clear_top_level_cache, dispatch_uid='clear_top_level_cache')
-m2m_changed.connect(clear_top_level_cache_m2m, dispatch_uid='clear_top_level_cache')
+def cache_json_for_model(model):
+    """Cache the serializations of single objects of the model, and
+    invalidate them when the objects or their m2m relations change."""
+    if model in json_cached_models:
+        return
+    json_cached_models.add(model)
+    post_save.connect(invalidate_json_cache, sender=model)
+    post_delete.connect(invalidate_json_cache, sender=model)
+    for field in model._meta.get_fields():
+        if field.many_to_many:
+            through = field.remote_field.through if field.concrete else field.through
+            m2m_changed.connect(invalidate_json_cache_m2m, sender=through)
+
+def invalidate_json_cache(sender, instance, **kwargs):
+    cache.delete(object_json_version_key(instance))
+
+def invalidate_json_cache_m2m(sender, instance, action, reverse, model, pk_set, **kwargs):
+    if not action.startswith("post_"):
+        return
+    keys = []
+    if type(instance) in json_cached_models:
+        keys.append(object_json_version_key(instance))
+    if model in json_cached_models:
+        if pk_set is None:
+            # cleared, we don't know which objects were involved
+            keys.append(model_json_version_key(model))
+        else:
+            keys.extend(object_json_version_key(model(pk=pk)) for pk in pk_set)
+    if keys:
+        cache.delete_many(keys)
 
-class AdminJsonSerializer(Serializer):
+class AdminPythonSerializer(Serializer):
     """
-    Serializes a QuerySet to Json, with selectable object expansion.
-    The representation is different from that of the builtin Json
-    serializer in that there is no separate "model", "pk" and "fields"
-    entries for each object, instead only the "fields" dictionary is
-    serialized, and the model is the key of a top-level dictionary
-    entry which encloses the table serialization:
-    {
-        "app.model": {
-            "1": {
-                "foo": "1",
-                "bar": 42,
-            }
-        }
-    }
+    Serializes a QuerySet to a list of dictionaries, with selectable
+    object expansion.  The representation is different from that of the
+    builtin Python serializer in that there is no separate "model", "pk"
+    and "fields" entries for each object, instead only the "fields"
+    dictionary is returned.
     """
 
     internal_use_only = False
@@ -94,24 +128,14 @@ class AdminJsonSerializer(Serializer):
 
     def serialize(self, queryset, **options):
         qi = options.get('query_info', '').encode('utf-8')
-        if len(list(queryset)) == 1:
+        if not isinstance(queryset, (list, QuerySet)):
+            queryset = list(queryset)
+        if len(queryset) == 1 and type(queryset[0]) in json_cached_models:
             obj = queryset[0]
-            key = 'json:%s:%s' % (hashlib.md5(qi).hexdigest(), unique_obj_name(obj))
-            is_cached = cache.get(model_top_level_cache_key(obj)) is True
-            if is_cached:
-                value = cached_get(key, lambda: super(AdminJsonSerializer, self).serialize(queryset, **options))
-            else:
-               value = super(AdminJsonSerializer, self).serialize(queryset, **options)
-               cache.set(key, value)
-               cache.set(model_top_level_cache_key(obj), True)
-            return value
+            key = 'json:%s:%s:%s' % (hashlib.md5(qi).hexdigest(), unique_obj_name(obj), json_cache_version(obj))
+            return cached_get(key, lambda: super(AdminPythonSerializer, self).serialize(queryset, **options))
         else:
-            return super(AdminJsonSerializer, self).serialize(queryset, **options)
-
-    def start_serialization(self):
-        super(AdminJsonSerializer, self).start_serialization()
-        self.json_kwargs.pop("expand", None)
-        self.json_kwargs.pop("query_info", None)
+            return super(AdminPythonSerializer, self).serialize(queryset, **options)
 
     def get_dump_object(self, obj):
         return self._current
@@ -170,8 +194,7 @@ class AdminJsonSerializer(Serializer):
     def expand_related(self, related, name):
         options = self.options.copy()
         options["expand"] = [ v[len(name)+2:] for v in options["expand"] if v.startswith(name+"__") ]
-        bytes = self.__class__().serialize([ related ], **options)
-        data = json.loads(bytes)[0]
+        data = dict(self.__class__().serialize([ related ], **options)[0])
         if 'password' in data:
             del data['password']
         return data
@@ -205,11 +228,37 @@ class AdminJsonSerializer(Serializer):
             self._current[field.name] = [m2m_value(related)
                                for related in getattr(obj, field.name).iterator()]
 
+class AdminJsonSerializer(AdminPythonSerializer):
+    """
+    Serializes a QuerySet to Json, with selectable object expansion.
+    The representation is different from that of the builtin Json
+    serializer in that there is no separate "model", "pk" and "fields"
+    entries for each object, instead only the "fields" dictionary is
+    serialized, and the model is the key of a top-level dictionary
+    entry which encloses the table serialization:
+    {
+        "app.model": {
+            "1": {
+                "foo": "1",
+                "bar": 42,
+            }
+        }
+    }
+    """
+
+    def serialize(self, queryset, **options):
+        return json.dumps(super(AdminJsonSerializer, self).serialize(queryset, **options), cls=DjangoJSONEncoder)
+
 class JsonExportMixin(object):
     """
     Adds JSON export to a DetailView
     """
 
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if getattr(cls, 'model', None) is not None:
+            cache_json_for_model(cls.model)
+
 #     def json_object(self, request, object_id, extra_context=None):
 #         "The json view for an object of this model."
 #         try:
@@ -256,14 +305,29 @@ class JsonExportMixin(object):
             qs = self.get_queryset().filter(**filter).exclude(**exclude)
         except (FieldError, ValueError) as e:
             return HttpResponse(json.dumps({"error": str(e)}, sort_keys=True, indent=3), content_type=content_type)
+        if expand:
+            qs = qs.select_related()
+        serializer = AdminPythonSerializer()
+        dumps = lambda value: json.dumps(value, sort_keys=True, indent=3, cls=DjangoJSONEncoder)
         try:
-            if expand:
-                qs = qs.select_related()
-            serializer = AdminJsonSerializer()
-            items = [(getattr(o, key), serializer.serialize([o], expand=expand, query_info=query_info) )  for o in qs ]
-            qd = dict( ( k, json.loads(v)[0] )  for k,v in items )
+            if key == "pk":
+                # The objects come in the order json.dumps(sort_keys=True)
+                # would put them in, so write them out as they are serialized.
+                objects = qs.order_by('pk').iterator()
+                # run the query before the response starts, so that errors
+                # in the query arguments can still be reported
+                first = next(objects, None)
+                def generate():
+                    yield '{\n   %s: {' % dumps(smart_text(self.model._meta))
+                    separator = ''
+                    for o in itertools.chain([] if first is None else [first], objects):
+                        value = serializer.serialize([o], expand=expand, query_info=query_info)[0]
+                        yield '%s\n      %s: %s' % (separator, json_key(o.pk), dumps(value).replace('\n', '\n      '))
+                        separator = ','
+                    yield '\n   }\n}' if separator else '}\n}'
+                return StreamingHttpResponse(generate(), content_type=content_type)
+            else:
+                qd = dict( (getattr(o, key), serializer.serialize([o], expand=expand, query_info=query_info)[0]) for o in qs.iterator() )
+                return HttpResponse(dumps({smart_text(self.model._meta): qd}), content_type=content_type)
         except (FieldError, ValueError) as e:
             return HttpResponse(json.dumps({"error": str(e)}, sort_keys=True, indent=3), content_type=content_type)
-        text = json.dumps({smart_text(self.model._meta): qd}, sort_keys=True, indent=3)
-        return HttpResponse(text, content_type=content_type)
-        
@@ -28,7 +28,7 @@ from ietf.meeting.factories import MeetingFactory, SessionFactory
 from ietf.meeting.test_data import make_meeting_test_data
 from ietf.meeting.models import Session
 from ietf.person.factories import PersonFactory, random_faker
-from ietf.person.models import User
+from ietf.person.models import Person, User
 from ietf.person.models import PersonalApiKey
 from ietf.stats.models import MeetingRegistration
 from ietf.utils.mail import outbox, get_payload_text
@@ -399,7 +399,7 @@ class CustomApiTests(TestCase):
         url = urlreverse('ietf.api.views.PersonalInformationExportView')
         login_testing_unauthorized(self, person.user.username, url)
         r = self.client.get(url)
-        jsondata = r.json()
+        jsondata = json.loads(b''.join(r.streaming_content))
         data = jsondata['person.person'][str(person.id)]
         self.assertEqual(data['name'], person.name)
         self.assertEqual(data['ascii'], person.ascii)
@@ -428,12 +428,28 @@ class CustomApiTests(TestCase):
         # working case
         r = self.client.post(url, {'apikey': apikey.hash(), 'email': robot.email().address, '_expand': 'user'})
         self.assertEqual(r.status_code, 200)
-        jsondata = r.json()
+        jsondata = json.loads(b''.join(r.streaming_content))
         data = jsondata['person.person'][str(robot.id)]
         self.assertEqual(data['name'], robot.name)
         self.assertEqual(data['ascii'], robot.ascii)
         self.assertEqual(data['user']['email'], robot.user.email)
 
+        # several objects are written out one by one, as json.dumps() would
+        other = PersonFactory(user__is_staff=True)
+        r = self.client.post(url, {'apikey': apikey.hash(), 'user__is_staff': 'True'})
+        self.assertEqual(r.status_code, 200)
+        self.assertTrue(r.streaming)
+        content = b''.join(r.streaming_content).decode()
+        jsondata = json.loads(content)
+        self.assertIn(str(robot.id), jsondata['person.person'])
+        self.assertIn(str(other.id), jsondata['person.person'])
+        expected = {'person.person': dict((int(k), v) for k, v in jsondata['person.person'].items())}
+        self.assertEqual(content, json.dumps(expected, sort_keys=True, indent=3))
+
+        # errors in the query arguments are still reported
+        r = self.client.post(url, {'apikey': apikey.hash(), 'nonexistent_field': 'x'})
+        self.assertIn("error", r.json())
+
     def test_api_new_meeting_registration(self):
         meeting = MeetingFactory(type_id='ietf')
         reg = {
@@ -571,6 +587,29 @@ class TastypieApiTestCase(ResourceTestCaseMixin, TestCase):
             self.assertIn(name, resource_list,
                         "Expected a REST API resource for %s, but didn't find one" % name)
 
+    def test_keyset_pagination_and_export(self):
+        client = Client(Accept='application/json')
+        PersonFactory.create_batch(3)
+        pks = sorted(Person.objects.values_list('pk', flat=True))
+        uri = "/api/v1/person/person/%s/"
+
+        seen = []
+        url = "/api/v1/person/person/?after=&limit=2"
+        while url:
+            r = client.get(url)
+            self.assertValidJSONResponse(r)
+            data = r.json()
+            self.assertLessEqual(len(data['objects']), 2)
+            seen.extend(o['resource_uri'] for o in data['objects'])
+            url = data['meta']['next']
+        self.assertEqual(seen, [ uri % pk for pk in pks ])
+
+        r = client.get("/api/v1/person/person/export/?after=%s" % pks[0])
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(r.streaming_content).decode().splitlines()
+        self.assertEqual([ json.loads(l)['resource_uri'] for l in lines ], [ uri % pk for pk in pks[1:] ])
+
     def test_all_model_resources_exist(self):
         client = Client(Accept='application/json')
         r = client.get("/api/v1")
@@ -0,0 +1,55 @@
+# Generated by Django 2.2.28 on 2023-03-20 12:00
+
+from django.db import migrations, models
+from django.db.models import Q
+
+
+def docs_matching_rule(Document, rule):
+    # mirrors ietf.community.utils.docs_matching_community_list_rule()
+    docs = Document.objects.all()
+    if rule.rule_type in ['group', 'area', 'group_rfc', 'area_rfc']:
+        return docs.filter(Q(group=rule.group_id) | Q(group__parent=rule.group_id), states=rule.state_id)
+    elif rule.rule_type in ['group_exp']:
+        return docs.filter(group=rule.group_id, states=rule.state_id)
+    elif rule.rule_type.startswith("state_"):
+        return docs.filter(states=rule.state_id)
+    elif rule.rule_type in ["author", "author_rfc"]:
+        return docs.filter(states=rule.state_id, documentauthor__person=rule.person_id)
+    elif rule.rule_type == "ad":
+        return docs.filter(states=rule.state_id, ad=rule.person_id)
+    elif rule.rule_type == "shepherd":
+        return docs.filter(states=rule.state_id, shepherd__person=rule.person_id)
+    elif rule.rule_type == "name_contains":
+        return docs.filter(states=rule.state_id, searchrule=rule)
+    return docs.none()
+
+
+def forward(apps, schema_editor):
+    CommunityList = apps.get_model('community', 'CommunityList')
+    Document = apps.get_model('doc', 'Document')
+    for clist in CommunityList.objects.all():
+        doc_ids = set(clist.added_docs.values_list("pk", flat=True))
+        for rule in clist.searchrule_set.all():
+            doc_ids |= set(docs_matching_rule(Document, rule).values_list("pk", flat=True))
+        clist.tracked_docs.set(doc_ids)
+
+
+def reverse(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doc', '0047_tzaware_deletedevents'),
+        ('community', '0009_add_group_exp_rule_to_groups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='communitylist',
+            name='tracked_docs',
+            field=models.ManyToManyField(related_name='tracking_community_lists', to='doc.Document'),
+        ),
+        migrations.RunPython(forward, reverse),
+    ]
@@ -3,11 +3,11 @@
 
 
 from django.contrib.auth.models import User
-from django.db import models
+from django.db import models, transaction
 from django.db.models import signals
 from django.urls import reverse as urlreverse
 
-from ietf.doc.models import Document, DocEvent, State
+from ietf.doc.models import Document, DocEvent, DocumentAuthor, State
 from ietf.group.models import Group
 from ietf.person.models import Person, Email
 from ietf.utils.models import ForeignKey
@@ -17,6 +17,11 @@ class CommunityList(models.Model):
     group = ForeignKey(Group, blank=True, null=True)
     added_docs = models.ManyToManyField(Document)
 
+    # store a materialized view/index over all the documents tracked by
+    # the list, both added directly and matched by the search rules -
+    # this is kept up to date by the signal handlers below
+    tracked_docs = models.ManyToManyField(Document, related_name="tracking_community_lists")
+
     def long_name(self):
         if self.user:
             return 'Personal ID list of %s' % self.user.username
@@ -112,3 +117,152 @@ def notify_events(sender, instance, **kwargs):
 
 
 signals.post_save.connect(notify_events)
+
+
+def update_index_on_doc_states_change(sender, instance, action, reverse, **kwargs):
+    if reverse or action not in ("post_add", "post_remove", "post_clear"):
+        return
+
+    if instance.type_id != 'draft':
+        return
+
+    from ietf.community.utils import update_community_list_index_for_doc
+    update_community_list_index_for_doc(instance)
+
+signals.m2m_changed.connect(update_index_on_doc_states_change, sender=Document.states.through)
+
+
+# the document fields the search rules look at, besides the states and
+# the authors which have handlers of their own
+COMMUNITY_RULE_DOC_FIELDS = ("name", "group_id", "ad_id", "shepherd_id")
+
+def remember_rule_fields_on_doc_save(sender, instance, raw=False, **kwargs):
+    if raw or instance.type_id != 'draft':
+        return
+
+    instance._community_rule_fields = Document.objects.filter(pk=instance.pk).values_list(*COMMUNITY_RULE_DOC_FIELDS).first() if instance.pk else None
+
+signals.pre_save.connect(remember_rule_fields_on_doc_save, sender=Document)
+
+
+def update_index_on_doc_save(sender, instance, created, raw=False, **kwargs):
+    if raw or instance.type_id != 'draft':
+        return
+
+    # only changes to what the rules look at can change the index
+    old = getattr(instance, "_community_rule_fields", None)
+    if not created and old == tuple(getattr(instance, f) for f in COMMUNITY_RULE_DOC_FIELDS):
+        return
+
+    from ietf.community.utils import update_community_list_index_for_doc
+    update_community_list_index_for_doc(instance)
+
+signals.post_save.connect(update_index_on_doc_save, sender=Document)
+
+
+def update_index_on_author_save(sender, instance, raw=False, **kwargs):
+    if raw or instance.document.type_id != 'draft':
+        return
+
+    from ietf.community.utils import update_community_list_index_for_doc
+    update_community_list_index_for_doc(instance.document)
+
+signals.post_save.connect(update_index_on_author_save, sender=DocumentAuthor)
+
+
+def update_index_on_author_delete(sender, instance, **kwargs):
+    doc_id = instance.document_id
+    def update():
+        # when the document itself is deleted, its index entries are gone already
+        from ietf.community.utils import update_community_list_index_for_doc
+        for doc in Document.objects.filter(pk=doc_id, type='draft'):
+            update_community_list_index_for_doc(doc)
+    transaction.on_commit(update)
+
+signals.post_delete.connect(update_index_on_author_delete, sender=DocumentAuthor)
+
+
+def remember_parent_on_group_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+
+    instance._community_rule_parent = Group.objects.filter(pk=instance.pk).values_list("parent_id", flat=True).first() if instance.pk else None
+
+signals.pre_save.connect(remember_parent_on_group_save, sender=Group)
+
+
+def update_index_on_group_parent_change(sender, instance, created, raw=False, **kwargs):
+    # area rules match the documents of the groups in the area
+    if raw or created or getattr(instance, "_community_rule_parent", instance.parent_id) == instance.parent_id:
+        return
+
+    from ietf.community.utils import update_community_list_index_for_doc
+    for doc in Document.objects.filter(group=instance, type='draft'):
+        update_community_list_index_for_doc(doc)
+
+signals.post_save.connect(update_index_on_group_parent_change, sender=Group)
+
+
+def update_index_on_added_docs_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+
+    from ietf.community.utils import reset_community_list_index, update_community_list_index_for_doc
+    if reverse:
+        update_community_list_index_for_doc(instance)
+    elif action == "post_add":
+        instance.tracked_docs.add(*pk_set)
+    else:
+        # removed documents may still be matched by a rule
+        reset_community_list_index(instance)
+
+signals.m2m_changed.connect(update_index_on_added_docs_change, sender=CommunityList.added_docs.through)
+
+
+def update_index_on_search_rule_save(sender, instance, **kwargs):
+    from ietf.community.utils import reset_community_list_index
+    reset_community_list_index(instance.community_list)
+
+signals.post_save.connect(update_index_on_search_rule_save, sender=SearchRule)
+
+
+def update_index_on_search_rule_delete(sender, instance, **kwargs):
+    # removing a rule can only remove documents from the index - only
+    # doing that also avoids recreating index rows when the rule is
+    # deleted together with the list
+    from ietf.community.utils import reset_community_list_index
+    try:
+        clist = instance.community_list
+    except CommunityList.DoesNotExist:
+        return
+    reset_community_list_index(clist, remove_only=True)
+
+signals.post_delete.connect(update_index_on_search_rule_delete, sender=SearchRule)
+
+
+def invalidate_name_contains_matcher_on_rule_change(sender, instance, **kwargs):
+    if instance.rule_type != "name_contains":
+        return
+
+    from ietf.community.utils import invalidate_name_contains_matcher
+    invalidate_name_contains_matcher()
+
+signals.post_save.connect(invalidate_name_contains_matcher_on_rule_change, sender=SearchRule)
+signals.post_delete.connect(invalidate_name_contains_matcher_on_rule_change, sender=SearchRule)
+
+
+def update_index_on_name_contains_index_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+
+    from ietf.community.utils import reset_community_list_index, update_community_list_index_for_doc
+    if reverse:
+        update_community_list_index_for_doc(instance)
+    elif pk_set is not None and len(pk_set) == 1:
+        # a single new document, typically from a new submission
+        for doc in Document.objects.filter(pk__in=pk_set):
+            update_community_list_index_for_doc(doc)
+    else:
+        reset_community_list_index(instance.community_list)
+
+signals.m2m_changed.connect(update_index_on_name_contains_index_change, sender=SearchRule.name_contains_index.through)
@@ -2,6 +2,8 @@
 # -*- coding: utf-8 -*-
 
 
+import mock
+
 from pyquery import PyQuery
 
 from django.urls import reverse as urlreverse
@@ -13,11 +15,13 @@ import debug                            # pyflakes:ignore
 
 from ietf.community.models import CommunityList, SearchRule, EmailSubscription
 from ietf.community.utils import docs_matching_community_list_rule, community_list_rules_matching_doc
-from ietf.community.utils import reset_name_contains_index_for_rule
+from ietf.community.utils import reset_name_contains_index_for_rule, reset_community_list_index
+from ietf.community.utils import NameContainsMatcher, reset_name_contains_indexes, update_name_contains_indexes_with_new_doc
+from ietf.community.utils import docs_tracked_by_community_list, community_lists_tracking_doc
 import ietf.community.views
 from ietf.group.models import Group
 from ietf.group.utils import setup_default_community_list_for_group
-from ietf.doc.models import State
+from ietf.doc.models import DocEvent, DocumentAuthor, State
 from ietf.doc.utils import add_state_change_event
 from ietf.person.models import Person, Email
 from ietf.utils.test_utils import login_testing_unauthorized
@@ -89,6 +93,87 @@ class CommunityListTests(WebTest):
         # rule -> docs
         self.assertTrue(draft in list(docs_matching_community_list_rule(rule_group_exp)))
 
+    def test_tracked_docs_index(self):
+        draft = WgDraftFactory(states=[('draft','active')])
+        other = WgDraftFactory()
+        clist = CommunityList.objects.create(user=PersonFactory().user)
+        self.assertEqual(list(docs_tracked_by_community_list(clist)), [])
+
+        # adding a rule or a document updates the index
+        rule = SearchRule.objects.create(rule_type="group", group=draft.group, state=State.objects.get(type="draft", slug="active"), community_list=clist)
+        self.assertEqual(list(docs_tracked_by_community_list(clist)), [draft])
+        clist.added_docs.add(other)
+        self.assertEqual(set(docs_tracked_by_community_list(clist)), set([draft, other]))
+        self.assertEqual(list(community_lists_tracking_doc(draft)), [clist])
+
+        # so does a state change
+        draft.set_state(State.objects.get(type='draft', slug='expired'))
+        self.assertEqual(list(docs_tracked_by_community_list(clist)), [other])
+        draft.set_state(State.objects.get(type='draft', slug='active'))
+        self.assertEqual(set(docs_tracked_by_community_list(clist)), set([draft, other]))
+
+        # and a move of the document to another group
+        draft.group = GroupFactory(type_id='wg')
+        draft.save()
+        self.assertEqual(list(docs_tracked_by_community_list(clist)), [other])
+        draft.group = rule.group
+        draft.save()
+        self.assertEqual(set(docs_tracked_by_community_list(clist)), set([draft, other]))
+
+        # or a new author
+        author = PersonFactory()
+        author_rule = SearchRule.objects.create(rule_type="author", person=author, state=State.objects.get(type="draft", slug="active"), community_list=clist)
+        third = WgDraftFactory(states=[('draft','active')])
+        self.assertEqual(set(docs_tracked_by_community_list(clist)), set([draft, other]))
+        DocumentAuthor.objects.create(document=third, person=author, order=1)
+        self.assertEqual(set(docs_tracked_by_community_list(clist)), set([draft, other, third]))
+        author_rule.delete()
+
+        # but events and other changes don't rebuild the index
+        with mock.patch('ietf.community.utils.update_community_list_index_for_doc') as update_mock:
+            DocEvent.objects.create(doc=draft, rev=draft.rev, type="added_comment", by=Person.objects.get(name="(System)"), desc="Comment")
+            draft.title = "Another title"
+            draft.save()
+        self.assertFalse(update_mock.called)
+
+        # and removing them again
+        clist.added_docs.remove(other)
+        rule.delete()
+        self.assertEqual(list(docs_tracked_by_community_list(clist)), [])
+
+        # rebuilding finds changes not seen by the signal handlers
+        SearchRule.objects.create(rule_type="group", group=draft.group, state=State.objects.get(type="draft", slug="active"), community_list=clist)
+        clist.tracked_docs.clear()
+        self.assertEqual(reset_community_list_index(clist), (set([draft.pk]), set()))
+        self.assertEqual(list(docs_tracked_by_community_list(clist)), [draft])
+
+    def test_name_contains_matcher(self):
+        matcher = NameContainsMatcher([(1, "^draft-[^-]+-foo-"), (2, "^draft-[^-]+-foo-"), (3, "bar"), (4, "(baz)\\1"), (5, "[")])
+        self.assertEqual(sorted(matcher.matching_rule_ids("draft-ietf-foo-bar")), [1, 2, 3])
+        self.assertEqual(matcher.matching_rule_ids("draft-ietf-bazbaz"), [4])
+        self.assertEqual(matcher.matching_rule_ids("draft-ietf-qux"), [])
+
+    def test_name_contains_indexes(self):
+        draft = WgDraftFactory(states=[('draft','active')])
+        clist = CommunityList.objects.create(user=PersonFactory().user)
+        rule = SearchRule.objects.create(rule_type="name_contains", state=State.objects.get(type="draft", slug="active"), text="^draft-[^-]+-%s-" % draft.group.acronym, community_list=clist)
+        reset_name_contains_index_for_rule(rule)
+        self.assertEqual(list(rule.name_contains_index.all()), [draft])
+
+        # a new draft is added to the index, and to the documents tracked by the list
+        new_draft = WgDraftFactory(group=draft.group, states=[('draft','active')])
+        update_name_contains_indexes_with_new_doc(new_draft)
+        self.assertEqual(set(rule.name_contains_index.all()), set([draft, new_draft]))
+        self.assertIn(new_draft, docs_tracked_by_community_list(clist))
+
+        # resetting all indexes at once
+        rule.name_contains_index.clear()
+        other_rule = SearchRule.objects.create(rule_type="name_contains", state=State.objects.get(type="draft", slug="active"), text=new_draft.name, community_list=clist)
+        counts = reset_name_contains_indexes()
+        self.assertEqual(counts, { rule.pk: (0, 2), other_rule.pk: (0, 1) })
+        self.assertEqual(set(rule.name_contains_index.all()), set([draft, new_draft]))
+        self.assertEqual(list(other_rule.name_contains_index.all()), [new_draft])
+
     def test_view_list(self):
         PersonFactory(user__username='plain')
         draft = WgDraftFactory()
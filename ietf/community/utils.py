@@ -3,14 +3,18 @@
 
 
 import re
+import uuid
+
+from collections import defaultdict
 
 from django.db.models import Q
 from django.conf import settings
+from django.core.cache import caches
 
 import debug                            # pyflakes:ignore
 
 from ietf.community.models import CommunityList, EmailSubscription, SearchRule
-from ietf.doc.models import Document, State
+from ietf.doc.models import Document, DocAlias, State
 from ietf.group.models import Role, Group
 from ietf.person.models import Person
 from ietf.ietfauth.utils import has_role
@@ -56,20 +60,142 @@ def can_manage_community_list(user, clist):
 
     return False
 
-def reset_name_contains_index_for_rule(rule):
+class NameContainsMatcher(object):
+    """The regexps of all name_contains rules, compiled once for matching
+    many names.
+
+    Rules with the same text share a compiled pattern, and a combined
+    pattern is used to skip the names that match no rule at all."""
+
+    def __init__(self, rules, version=None):
+        self.version = version
+
+        rule_ids = defaultdict(list)
+        for pk, text in rules:
+            rule_ids[text].append(pk)
+
+        self.patterns = []
+        for text, pks in rule_ids.items():
+            try:
+                self.patterns.append((re.compile(text), pks))
+            except re.error:
+                pass
+
+        # patterns with groups can't be combined without changing what
+        # backreferences refer to, so those are always tried
+        self.prefilter = None
+        combinable = [p.pattern for p, pks in self.patterns if p.groups == 0]
+        self.always_try = any(p.groups for p, pks in self.patterns)
+        if combinable:
+            try:
+                self.prefilter = re.compile("|".join("(?:%s)" % p for p in combinable))
+            except re.error:
+                self.always_try = True
+
+    def matching_rule_ids(self, name):
+        """Return the ids of the rules matching name"""
+        if not self.always_try and (self.prefilter is None or not self.prefilter.search(name)):
+            return []
+        return [pk for p, pks in self.patterns if p.search(name) for pk in pks]
+
+NAME_CONTAINS_MATCHER_VERSION_KEY = "community:name-contains-matcher-version"
+_name_contains_matcher = None
+
+def name_contains_matcher():
+    """Return a NameContainsMatcher for the current name_contains rules
+
+    The matcher is kept between calls, and rebuilt when the version stored
+    in the cache is changed by invalidate_name_contains_matcher()."""
+    global _name_contains_matcher
+
+    cache = caches["default"]
+    version = cache.get(NAME_CONTAINS_MATCHER_VERSION_KEY)
+    if version is None:
+        version = uuid.uuid4().hex
+        if not cache.add(NAME_CONTAINS_MATCHER_VERSION_KEY, version, None):
+            version = cache.get(NAME_CONTAINS_MATCHER_VERSION_KEY) or version
+
+    if _name_contains_matcher is None or _name_contains_matcher.version != version:
+        rules = SearchRule.objects.filter(rule_type="name_contains").values_list("pk", "text")
+        _name_contains_matcher = NameContainsMatcher(rules, version)
+    return _name_contains_matcher
+
+def invalidate_name_contains_matcher():
+    global _name_contains_matcher
+    _name_contains_matcher = None
+    caches["default"].delete(NAME_CONTAINS_MATCHER_VERSION_KEY)
+
+def doc_aliases():
+    """Return the names of all document aliases with the ids of their documents"""
+    aliases = defaultdict(list)
+    for name, doc_id in DocAlias.objects.filter(docs__isnull=False).values_list("name", "docs"):
+        aliases[name].append(doc_id)
+    return aliases
+
+def reset_name_contains_index_for_rule(rule, aliases=None):
     if not rule.rule_type == "name_contains":
         return
 
-    rule.name_contains_index.set(Document.objects.filter(docalias__name__regex=rule.text))
+    if aliases is None:
+        aliases = doc_aliases()
+
+    try:
+        pattern = re.compile(rule.text)
+    except re.error:
+        doc_ids = []
+    else:
+        doc_ids = set(doc_id for name in aliases if pattern.search(name) for doc_id in aliases[name])
+    rule.name_contains_index.set(doc_ids)
+
+def reset_name_contains_indexes(dry_run=False):
+    """Reset the indexes of all name_contains rules, matching the rules against
+    the list of document aliases in memory.  Returns a dict with the number of
+    documents in each index before and after, by rule."""
+    aliases = doc_aliases()
+    names = list(aliases)
+    matcher = name_contains_matcher()
+
+    indexed = defaultdict(set)
+    through = SearchRule.name_contains_index.through
+    for rule_id, doc_id in through.objects.values_list("searchrule_id", "document_id"):
+        indexed[rule_id].add(doc_id)
+
+    matching = defaultdict(set)
+    for pattern, rule_ids in matcher.patterns:
+        doc_ids = set(doc_id for name in filter(pattern.search, names) for doc_id in aliases[name])
+        for rule_id in rule_ids:
+            matching[rule_id] = doc_ids
+
+    counts = {}
+    added = []
+    for rule_id in SearchRule.objects.filter(rule_type="name_contains").values_list("pk", flat=True):
+        counts[rule_id] = (len(indexed[rule_id]), len(matching[rule_id]))
+        added.extend(through(searchrule_id=rule_id, document_id=doc_id) for doc_id in matching[rule_id] - indexed[rule_id])
+        removed = indexed[rule_id] - matching[rule_id]
+        if removed and not dry_run:
+            through.objects.filter(searchrule_id=rule_id, document_id__in=removed).delete()
+    if not dry_run:
+        through.objects.bulk_create(added, batch_size=1000)
+
+    return counts
 
 def update_name_contains_indexes_with_new_doc(doc):
-    for r in SearchRule.objects.filter(rule_type="name_contains"):
-        # in theory we could use the database to do this query, but
-        # Django doesn't support a reversed regex operator, and regexp
-        # support needs backend-specific code so custom SQL is a bit
-        # cumbersome too
-        if re.search(r.text, doc.name) and not doc in r.name_contains_index.all():
-            r.name_contains_index.add(doc)
+    # in theory we could use the database to do this query, but
+    # Django doesn't support a reversed regex operator, and regexp
+    # support needs backend-specific code so custom SQL is a bit
+    # cumbersome too
+    rule_ids = name_contains_matcher().matching_rule_ids(doc.name)
+    if not rule_ids:
+        return
+
+    through = SearchRule.name_contains_index.through
+    indexed = set(through.objects.filter(document=doc, searchrule__in=rule_ids).values_list("searchrule_id", flat=True))
+    added = [through(searchrule_id=rule_id, document_id=doc.pk) for rule_id in rule_ids if rule_id not in indexed]
+    if added:
+        through.objects.bulk_create(added)
+        # bulk_create doesn't send m2m_changed, so update the index of
+        # tracked documents here
+        update_community_list_index_for_doc(doc)
 
 def docs_matching_community_list_rule(rule):
     docs = Document.objects.all()
@@ -139,21 +265,47 @@ def community_list_rules_matching_doc(doc):
     return rules
 
 
-def docs_tracked_by_community_list(clist):
-    if clist.pk is None:
-        return Document.objects.none()
-
+def doc_ids_matching_community_list(clist):
+    """Return the ids of the documents added to clist or matched by its rules"""
     # in theory, we could use an OR query, but databases seem to have
     # trouble with OR queries and complicated joins so do the OR'ing
     # manually
     doc_ids = set(clist.added_docs.values_list("pk", flat=True))
     for rule in clist.searchrule_set.all():
         doc_ids = doc_ids | set(docs_matching_community_list_rule(rule).values_list("pk", flat=True))
+    return doc_ids
+
+def community_lists_matching_doc(doc):
+    """Return the community lists doc is added to or matched by a rule of"""
+    return CommunityList.objects.filter(Q(added_docs=doc) | Q(searchrule__in=community_list_rules_matching_doc(doc))).distinct()
+
+def reset_community_list_index(clist, remove_only=False, dry_run=False):
+    """Bring the index of documents tracked by clist up to date, and return
+    the ids of the documents added to and removed from it"""
+    doc_ids = doc_ids_matching_community_list(clist)
+    indexed_ids = set(clist.tracked_docs.values_list("pk", flat=True))
+
+    added = set() if remove_only else doc_ids - indexed_ids
+    removed = indexed_ids - doc_ids
+    if not dry_run:
+        if added:
+            clist.tracked_docs.add(*added)
+        if removed:
+            clist.tracked_docs.remove(*removed)
+    return added, removed
+
+def update_community_list_index_for_doc(doc):
+    """Bring the index entries for the community lists tracking doc up to date"""
+    doc.tracking_community_lists.set(community_lists_matching_doc(doc))
+
+def docs_tracked_by_community_list(clist):
+    if clist.pk is None:
+        return Document.objects.none()
 
-    return Document.objects.filter(pk__in=doc_ids)
+    return Document.objects.filter(tracking_community_lists=clist)
 
 def community_lists_tracking_doc(doc):
-    return CommunityList.objects.filter(Q(added_docs=doc) | Q(searchrule__in=community_list_rules_matching_doc(doc)))
+    return CommunityList.objects.filter(tracked_docs=doc)
 
 
 def notify_event_to_subscribers(event):
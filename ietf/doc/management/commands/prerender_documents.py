@@ -0,0 +1,76 @@
+# Copyright The IETF Trust 2023, All Rights Reserved
+# -*- coding: utf-8 -*-
+
+
+import multiprocessing
+
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+import debug                            # pyflakes:ignore
+
+from ietf.doc.models import Document
+from ietf.doc.utils import prerender_document
+
+DEFAULT_JOBS = 4
+
+
+def _prerender(name):
+    """Pre-render one document, for use in a worker process"""
+    try:
+        return name, prerender_document(Document.objects.get(name=name)), None
+    except Exception as e:
+        return name, False, e
+
+
+class Command(BaseCommand):
+    help = ('Fill the htmlized and pdfized caches for active drafts, so that the first '
+            'reader of a document does not have to wait for it to be rendered.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--jobs', '-j', type=int, default=DEFAULT_JOBS,
+                            help="Number of documents to render in parallel, in worker processes unless 1 (default %s)" % DEFAULT_JOBS)
+        parser.add_argument('--rfcs', action='store_true', default=False,
+                            help="Also render RFCs")
+        parser.add_argument('names', nargs='*', help="Render only these documents")
+
+    def handle(self, *args, **options):
+        verbosity = options.get("verbosity", 1)
+        jobs = options["jobs"]
+        if jobs < 1:
+            raise CommandError('The number of jobs must be at least 1')
+
+        if options["names"]:
+            docs = Document.objects.filter(name__in=options["names"])
+        else:
+            states = ['active', 'rfc'] if options["rfcs"] else ['active']
+            docs = Document.objects.filter(type_id='draft', states__type='draft', states__slug__in=states)
+        names = list(docs.order_by('name').values_list('name', flat=True))
+
+        rendered = missing = failed = 0
+        with ExitStack() as stack:
+            if jobs > 1:
+                # Each worker process needs its own database connection
+                connections.close_all()
+                executor = stack.enter_context(ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context('fork')))
+                results = executor.map(_prerender, names, chunksize=10)
+            else:
+                results = map(_prerender, names)
+            for count, (name, found, error) in enumerate(results, start=1):
+                if error is not None:
+                    failed += 1
+                    self.stderr.write('%s: %s' % (name, error))
+                elif found:
+                    rendered += 1
+                else:
+                    missing += 1
+                    if verbosity > 1:
+                        self.stdout.write('%s: no document file' % name)
+                if verbosity > 1 and count % 100 == 0:
+                    self.stdout.write('%s of %s documents processed' % (count, len(names)))
+        if verbosity > 0:
+            self.stdout.write('Rendered %s documents, %s without document file, %s failed'
+                              % (rendered, missing, failed))
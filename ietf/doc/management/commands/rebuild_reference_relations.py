@@ -0,0 +1,106 @@
+# Copyright The IETF Trust 2023, All Rights Reserved
+# -*- coding: utf-8 -*-
+
+
+import multiprocessing
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from tqdm import tqdm
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+import debug                            # pyflakes:ignore
+
+from ietf.doc.models import Document
+from ietf.doc.utils import rebuild_reference_relations
+from ietf.doc.utils_references import collect_reference_graph_changes, announce_reference_graph_changes
+
+DEFAULT_JOBS = 4
+
+
+def reference_source_filenames(doc):
+    """Find the files to extract the references of doc from, as a dict
+    mapping file extension to full path, like find_submission_filenames()"""
+    if doc.get_state_slug() == 'rfc':
+        base = os.path.join(settings.RFC_PATH, doc.canonical_name())
+    else:
+        base = os.path.join(settings.INTERNET_ALL_DRAFTS_ARCHIVE_DIR, '%s-%s' % (doc.name, doc.rev))
+    return {ext: '%s.%s' % (base, ext) for ext in ('xml', 'txt') if os.path.exists('%s.%s' % (base, ext))}
+
+
+def _rebuild(name):
+    """Rebuild the reference relations of one document, for use in a worker
+    process.  The changes to the reference graph are returned rather than
+    announced, so that the command can announce them all at once."""
+    with collect_reference_graph_changes() as graph_changes:
+        try:
+            doc = Document.objects.get(name=name)
+            filenames = reference_source_filenames(doc)
+            if not filenames:
+                return name, None, None, graph_changes
+            return name, rebuild_reference_relations(doc, filenames), None, graph_changes
+        except Exception as e:
+            return name, None, e, graph_changes
+
+
+class Command(BaseCommand):
+    help = ('Rebuild the reference relations of drafts and RFCs from their XML or text files, '
+            'e.g. after fixes to the reference parsers.  The documents are processed in '
+            'parallel worker processes.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--jobs', '-j', type=int, default=DEFAULT_JOBS,
+                            help="Number of documents to process in parallel, in worker processes unless 1 (default %s)" % DEFAULT_JOBS)
+        parser.add_argument('--active', action='store_true', default=False,
+                            help="Only process active drafts and RFCs")
+        parser.add_argument('names', nargs='*', help="Process only these documents")
+
+    def handle(self, *args, **options):
+        verbosity = options.get("verbosity", 1)
+        jobs = options["jobs"]
+        if jobs < 1:
+            raise CommandError('The number of jobs must be at least 1')
+
+        docs = Document.objects.filter(type_id='draft')
+        if options["names"]:
+            docs = docs.filter(name__in=options["names"])
+        elif options["active"]:
+            docs = docs.filter(states__type='draft', states__slug__in=['active', 'rfc'])
+        names = list(docs.order_by('name').values_list('name', flat=True))
+
+        rebuilt = missing = failed = 0
+        graph_changes = set()
+        with ExitStack() as stack:
+            if jobs > 1:
+                # Each worker process needs its own database connection
+                connections.close_all()
+                executor = stack.enter_context(ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context('fork')))
+                results = executor.map(_rebuild, names, chunksize=20)
+            else:
+                results = map(_rebuild, names)
+            for name, result, error, changes in tqdm(results, total=len(names), disable=(verbosity!=1)):
+                graph_changes |= changes
+                if error is not None:
+                    failed += 1
+                    self.stderr.write('%s: %s' % (name, error))
+                elif result is None:
+                    missing += 1
+                    if verbosity > 1:
+                        self.stdout.write('%s: no document file' % name)
+                elif 'errors' in result:
+                    failed += 1
+                    self.stderr.write('%s: %s' % (name, '; '.join(result['errors'])))
+                else:
+                    rebuilt += 1
+                    if verbosity > 1 and 'unfound' in result:
+                        self.stdout.write('%s: no document found for %s' % (name, ', '.join(sorted(result['unfound']))))
+        # one announcement lets the web processes catch up with all the
+        # changed documents in one step, instead of rebuilding the graph
+        announce_reference_graph_changes(graph_changes)
+        if verbosity > 0:
+            self.stdout.write('Rebuilt the references of %s documents, %s without document file, %s failed'
+                              % (rebuilt, missing, failed))
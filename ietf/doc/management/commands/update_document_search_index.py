@@ -0,0 +1,40 @@
+# Copyright The IETF Trust 2023, All Rights Reserved
+# -*- coding: utf-8 -*-
+
+
+from tqdm import tqdm
+
+from django.core.management.base import BaseCommand
+
+import debug                            # pyflakes:ignore
+
+from ietf.doc.models import Document, DocAlias
+from ietf.doc.utils_search import update_document_search_index, update_docalias_search_tokens
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = ('Rebuild the document search index and the autocompletion tokens of the document '
+            'names, either for the given documents or for all '
+            'documents.  The index is kept up to date as documents change, so this is only '
+            'needed to fill it in initially, or to catch changes made with bulk updates.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help="Rebuild the index only for these documents")
+
+    def handle(self, *args, **options):
+        verbosity = options.get("verbosity", 1)
+
+        docs = Document.objects.all()
+        if options["names"]:
+            docs = docs.filter(name__in=options["names"])
+        doc_ids = list(docs.order_by("pk").values_list("pk", flat=True))
+
+        for i in tqdm(range(0, len(doc_ids), BATCH_SIZE), disable=(verbosity!=1)):
+            batch = doc_ids[i:i+BATCH_SIZE]
+            update_document_search_index(batch, batch_size=BATCH_SIZE)
+            update_docalias_search_tokens(DocAlias.objects.filter(docs__in=batch).values_list("pk", flat=True), batch_size=BATCH_SIZE)
+
+        if verbosity > 1:
+            self.stdout.write("Updated the search index for %d documents" % len(doc_ids))
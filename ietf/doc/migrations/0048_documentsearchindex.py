@@ -0,0 +1,92 @@
+# Generated by Django 2.2.28 on 2023-03-21 10:12
+
+from collections import defaultdict
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import ietf.utils.models
+
+
+def index_text(values):
+    # mirrors ietf.doc.utils_search.search_index_text()
+    return "\n" + "\n".join(v.lower() for v in values if v) + "\n"
+
+
+def forward(apps, schema_editor):
+    # mirrors ietf.doc.utils_search.update_document_search_index()
+    Document = apps.get_model('doc', 'Document')
+    DocAlias = apps.get_model('doc', 'DocAlias')
+    DocumentAuthor = apps.get_model('doc', 'DocumentAuthor')
+    DocumentSearchIndex = apps.get_model('doc', 'DocumentSearchIndex')
+    Alias = apps.get_model('person', 'Alias')
+    Email = apps.get_model('person', 'Email')
+
+    now = django.utils.timezone.now()
+    doc_ids = list(Document.objects.order_by("pk").values_list("pk", flat=True))
+    batch_size = 1000
+    for i in range(0, len(doc_ids), batch_size):
+        batch = doc_ids[i:i+batch_size]
+
+        names = defaultdict(list)
+        for doc_id, name in DocAlias.objects.filter(docs__in=batch).values_list("docs", "name"):
+            names[doc_id].append(name)
+
+        author_person_ids = defaultdict(list)
+        for doc_id, person_id in DocumentAuthor.objects.filter(document__in=batch).order_by("order").values_list("document_id", "person_id"):
+            author_person_ids[doc_id].append(person_id)
+        person_text = defaultdict(list)
+        person_ids = set(p for l in author_person_ids.values() for p in l)
+        for person_id, name in Alias.objects.filter(person__in=person_ids).values_list("person_id", "name"):
+            person_text[person_id].append(name)
+        for person_id, address in Email.objects.filter(person__in=person_ids).values_list("person_id", "address"):
+            person_text[person_id].append(address)
+
+        states = defaultdict(list)
+        for doc_id, slug, name in Document.states.through.objects.filter(document__in=batch).values_list("document_id", "state__slug", "state__name"):
+            states[doc_id].extend([slug, name])
+
+        DocumentSearchIndex.objects.bulk_create([
+            DocumentSearchIndex(
+                document_id=doc_id,
+                names=index_text([name] + sorted(set(names[doc_id]) - set([name]))),
+                title=(title or "").lower(),
+                abstract=(abstract or "").lower(),
+                authors=index_text(t for p in author_person_ids[doc_id] for t in person_text[p]),
+                states=index_text(states[doc_id]),
+                time=now,
+            )
+            for doc_id, name, title, abstract in Document.objects.filter(pk__in=batch).values_list("pk", "name", "title", "abstract")
+        ])
+
+
+def reverse(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doc', '0047_tzaware_deletedevents'),
+        ('person', '0029_use_timezone_now_for_person_models'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentSearchIndex',
+            fields=[
+                ('document', ietf.utils.models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_index', serialize=False, to='doc.Document')),
+                ('names', models.TextField(help_text='Document name and aliases, one per line')),
+                ('title', models.TextField(blank=True)),
+                ('abstract', models.TextField(blank=True)),
+                ('authors', models.TextField(blank=True, help_text='Author names, name aliases and email addresses, one per line')),
+                ('states', models.TextField(blank=True, help_text='Slugs and names of the document states, one per line')),
+                ('time', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'document search index',
+                'verbose_name_plural': 'document search index entries',
+            },
+        ),
+        migrations.RunPython(forward, reverse),
+    ]
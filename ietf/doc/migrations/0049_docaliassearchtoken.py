@@ -0,0 +1,44 @@
+# Generated by Django 2.2.28 on 2023-04-17 09:26
+
+from django.db import migrations, models
+import django.db.models.deletion
+import ietf.utils.models
+
+from ietf.utils.text import prefix_search_tokens
+
+
+def forward(apps, schema_editor):
+    # mirrors ietf.doc.utils_search.update_docalias_search_tokens()
+    DocAlias = apps.get_model('doc', 'DocAlias')
+    DocAliasSearchToken = apps.get_model('doc', 'DocAliasSearchToken')
+
+    tokens = []
+    for alias_id, name in DocAlias.objects.values_list("pk", "name").iterator():
+        tokens.extend(DocAliasSearchToken(alias_id=alias_id, token=t) for t in prefix_search_tokens(name))
+        if len(tokens) >= 5000:
+            DocAliasSearchToken.objects.bulk_create(tokens)
+            tokens = []
+    DocAliasSearchToken.objects.bulk_create(tokens)
+
+
+def reverse(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doc', '0048_documentsearchindex'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocAliasSearchToken',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(db_index=True, max_length=255)),
+                ('alias', ietf.utils.models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='doc.DocAlias')),
+            ],
+        ),
+        migrations.RunPython(forward, reverse),
+    ]
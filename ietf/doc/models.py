@@ -7,6 +7,7 @@ import logging
 import io
 import os
 import rfc2html
+import time
 
 from pathlib import Path
 from lxml import etree
@@ -14,6 +15,7 @@ from typing import Optional, TYPE_CHECKING
 from weasyprint import HTML as wpHTML
 
 from django.db import models
+from django.db.models import signals
 from django.core import checks
 from django.core.cache import caches
 from django.core.validators import URLValidator, RegexValidator
@@ -31,14 +33,14 @@ from ietf.group.models import Group
 from ietf.name.models import ( DocTypeName, DocTagName, StreamName, IntendedStdLevelName, StdLevelName,
     DocRelationshipName, DocReminderTypeName, BallotPositionName, ReviewRequestStateName, ReviewAssignmentStateName, FormalLanguageName,
     DocUrlTagName, ExtResourceName)
-from ietf.person.models import Email, Person
+from ietf.person.models import Alias, Email, Person
 from ietf.person.utils import get_active_balloters
 from ietf.utils import log
 from ietf.utils.admin import admin_link
 from ietf.utils.decorators import memoize
 from ietf.utils.validators import validate_no_control_chars
 from ietf.utils.mail import formataddr
-from ietf.utils.models import ForeignKey
+from ietf.utils.models import ForeignKey, OneToOneField
 from ietf.utils.timezone import date_today, RPC_TZINFO, DEADLINE_TZINFO
 if TYPE_CHECKING:
     # importing other than for type checking causes errors due to cyclic imports
@@ -608,7 +610,49 @@ class DocumentInfo(models.Model):
         return html
 
     def pdfized(self):
-        name = self.get_base_name()
+        """Return the PDF version of this document, from the cache if possible
+
+        Rendering only happens on a cache miss. Concurrent requests for the same
+        document wait for one process to do the rendering, instead of each running
+        WeasyPrint themselves.
+        """
+        cache = caches["pdfized"]
+        cache_key = self.get_base_name().split(".")[0]
+        pdf = self._cached_pdf(cache, cache_key)
+        if pdf:
+            return pdf
+
+        lock_cache = caches["default"]
+        lock_key = "pdfized-lock:%s:%s" % (cache_key, settings.PDFIZER_VERSION)
+        lock_time = settings.PDFIZER_RENDER_LOCK_TIME
+        deadline = time.monotonic() + lock_time
+        locked = lock_cache.add(lock_key, True, lock_time)
+        while not locked and time.monotonic() < deadline:
+            time.sleep(0.5)
+            pdf = self._cached_pdf(cache, cache_key)
+            if pdf:
+                return pdf
+            locked = lock_cache.add(lock_key, True, lock_time)
+        # If the lock could not be had in time, go ahead and render anyway
+        try:
+            pdf = self._cached_pdf(cache, cache_key)
+            if not pdf:
+                pdf = self._render_pdf()
+                if pdf:
+                    cache.set(cache_key, pdf, settings.PDFIZER_CACHE_TIME, version=settings.PDFIZER_VERSION)
+        finally:
+            if locked:
+                lock_cache.delete(lock_key)
+        return pdf
+
+    @staticmethod
+    def _cached_pdf(cache, cache_key):
+        try:
+            return cache.get(cache_key, version=settings.PDFIZER_VERSION)
+        except EOFError:
+            return None
+
+    def _render_pdf(self):
         text = self.html_body(classes="rfchtml")
         stylesheets = [finders.find("ietf/css/document_html_referenced.css")]
         if text:
@@ -616,27 +660,16 @@ class DocumentInfo(models.Model):
         else:
             text = self.htmlized()
             stylesheets.append(io.BytesIO(b"body { font-size: 9.2pt; }"))
-
-        cache = caches["pdfized"]
-        cache_key = name.split(".")[0]
         try:
-            pdf = cache.get(cache_key)
-        except EOFError:
-            pdf = None
-        if not pdf:
-            try:
-                pdf = wpHTML(
-                    string=text, base_url=settings.IDTRACKER_BASE_URL
-                ).write_pdf(
-                    stylesheets=stylesheets,
-                    presentational_hints=True,
-                    optimize_size=("fonts", "images"),
-                )
-            except AssertionError:
-                pdf = None
-            if pdf:
-                cache.set(cache_key, pdf, settings.PDFIZER_CACHE_TIME)
-        return pdf
+            return wpHTML(
+                string=text, base_url=settings.IDTRACKER_BASE_URL
+            ).write_pdf(
+                stylesheets=stylesheets,
+                presentational_hints=True,
+                optimize_size=("fonts", "images"),
+            )
+        except AssertionError:
+            return None
 
     def references(self):
         return self.relations_that_doc(('refnorm','refinfo','refunk','refold'))
@@ -780,6 +813,11 @@ validate_docname = RegexValidator(
     'invalid'
 )
 
+def latest_event_cache_key(model, filter_args):
+    """Key under which the result of latest_event(model, **filter_args)
+    is kept by ietf.doc.utils.prefetch_latest_events()"""
+    return (model, tuple(sorted((k, tuple(v) if isinstance(v, list) else v) for k, v in filter_args.items())))
+
 class Document(DocumentInfo):
     name = models.CharField(max_length=255, validators=[validate_docname,], unique=True)           # immutable
     
@@ -832,6 +870,11 @@ class Document(DocumentInfo):
         while d.latest_event(WriteupDocEvent, type="xyz") returns a
         WriteupDocEvent event."""
         model = args[0] if args else DocEvent
+        cache = getattr(self, '_latest_event_cache', None)
+        if cache is not None:
+            key = latest_event_cache_key(model, filter_args)
+            if key in cache:
+                return cache[key]
         e = model.objects.filter(doc=self).filter(**filter_args).order_by('-time', '-id').first()
         return e
 
@@ -1188,6 +1231,36 @@ class DocAlias(models.Model):
         verbose_name = "document alias"
         verbose_name_plural = "document aliases"
 
+class DocumentSearchIndex(models.Model):
+    """Lower-cased text of a document to search in, so that searching
+    doesn't need to join the alias, author and state tables.  This is kept
+    up to date by the signal handlers in ietf.doc.utils_search."""
+    document = OneToOneField(Document, primary_key=True, related_name='search_index')
+    names = models.TextField(help_text="Document name and aliases, one per line")
+    title = models.TextField(blank=True)
+    abstract = models.TextField(blank=True)
+    authors = models.TextField(blank=True, help_text="Author names, name aliases and email addresses, one per line")
+    states = models.TextField(blank=True, help_text="Slugs and names of the document states, one per line")
+    time = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return u"Search index for %s" % self.document_id
+
+    class Meta:
+        verbose_name = "document search index"
+        verbose_name_plural = "document search index entries"
+
+class DocAliasSearchToken(models.Model):
+    """Lower-cased tails of a document alias name from the start of each of
+    its words, so that autocompletion can find words anywhere in the name
+    with an indexed prefix match.  This is kept up to date by the signal
+    handlers in ietf.doc.models."""
+    alias = ForeignKey(DocAlias, related_name='search_tokens')
+    token = models.CharField(max_length=255, db_index=True)
+
+    def __str__(self):
+        return u"%s: %s" % (self.alias_id, self.token)
+
 class DocReminder(models.Model):
     event = ForeignKey('DocEvent')
     type = ForeignKey(DocReminderTypeName)
@@ -1480,3 +1553,157 @@ class BofreqEditorDocEvent(DocEvent):
 class BofreqResponsibleDocEvent(DocEvent):
     """ Capture the responsible leadership (IAB and IESG members) for a BOF Request """
     responsible = models.ManyToManyField('person.Person', blank=True)
+
+
+def update_search_index_on_document_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    from ietf.doc.utils_search import update_document_search_index
+    update_document_search_index([instance.pk])
+
+signals.post_save.connect(update_search_index_on_document_save, sender=Document)
+
+
+def update_search_index_on_author_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    from ietf.doc.utils_search import update_document_search_index
+    update_document_search_index([instance.document_id])
+
+signals.post_save.connect(update_search_index_on_author_save, sender=DocumentAuthor)
+
+
+def update_search_index_on_author_delete(sender, instance, **kwargs):
+    # only update an existing entry, the document itself may be in the
+    # process of being deleted
+    from ietf.doc.utils_search import update_document_search_index
+    update_document_search_index([instance.document_id], create=False)
+
+signals.post_delete.connect(update_search_index_on_author_delete, sender=DocumentAuthor)
+
+
+def update_search_index_on_person_alias_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    # the author names are stored in the entries of the documents
+    from ietf.doc.utils_search import update_document_search_index
+    update_document_search_index(DocumentAuthor.objects.filter(person=instance.person_id).values_list("document_id", flat=True), create=False)
+
+signals.post_save.connect(update_search_index_on_person_alias_change, sender=Alias)
+signals.post_delete.connect(update_search_index_on_person_alias_change, sender=Alias)
+
+
+def remember_person_on_email_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    instance._search_index_person = Email.objects.filter(pk=instance.pk).values_list("person_id", flat=True).first()
+
+signals.pre_save.connect(remember_person_on_email_save, sender=Email)
+
+
+def update_search_index_on_email_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    # the address may have moved from another person
+    person_ids = set([instance.person_id, getattr(instance, "_search_index_person", None)]) - set([None])
+    from ietf.doc.utils_search import update_document_search_index
+    update_document_search_index(DocumentAuthor.objects.filter(person__in=person_ids).values_list("document_id", flat=True), create=False)
+
+signals.post_save.connect(update_search_index_on_email_change, sender=Email)
+signals.post_delete.connect(update_search_index_on_email_change, sender=Email)
+
+
+def update_search_index_on_m2m_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+
+    from ietf.doc.utils_search import update_document_search_index
+    if isinstance(instance, Document):
+        update_document_search_index([instance.pk])
+    elif pk_set:
+        update_document_search_index(pk_set)
+    elif action == "post_clear" and isinstance(instance, DocAlias):
+        # the documents are already gone from the relation by now
+        update_document_search_index(DocumentSearchIndex.objects.filter(names__contains="\n%s\n" % instance.name.lower()).values_list("document_id", flat=True))
+
+signals.m2m_changed.connect(update_search_index_on_m2m_change, sender=Document.states.through)
+signals.m2m_changed.connect(update_search_index_on_m2m_change, sender=DocAlias.docs.through)
+
+
+def document_changed_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    from ietf.doc.utils import document_changed
+    if isinstance(instance, Document):
+        document_changed([instance.pk])
+    elif isinstance(instance, (DocEvent, DocHistory)):
+        document_changed([instance.doc_id])
+    elif isinstance(instance, DocumentAuthor):
+        document_changed([instance.document_id])
+    elif isinstance(instance, RelatedDocument):
+        # both the source and the referenced document pages show the relation
+        document_changed([instance.source_id] + list(Document.objects.filter(docalias=instance.target_id).values_list("pk", flat=True)))
+
+def document_changed_on_delete(sender, instance, **kwargs):
+    document_changed_on_save(sender, instance)
+
+# DocEvent subclasses send their signals with their own class as sender
+signals.post_save.connect(document_changed_on_save)
+for model in (DocHistory, DocumentAuthor, RelatedDocument):
+    signals.post_delete.connect(document_changed_on_delete, sender=model)
+
+
+def document_changed_on_m2m_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+
+    from ietf.doc.utils import document_changed
+    if isinstance(instance, Document):
+        document_changed([instance.pk])
+    elif action == "pre_clear" and isinstance(instance, DocAlias):
+        # look the documents up before they are gone from the relation
+        document_changed(instance.docs.values_list("pk", flat=True))
+    elif pk_set:
+        document_changed(pk_set)
+
+signals.m2m_changed.connect(document_changed_on_m2m_change, sender=Document.states.through)
+signals.m2m_changed.connect(document_changed_on_m2m_change, sender=Document.tags.through)
+signals.m2m_changed.connect(document_changed_on_m2m_change, sender=DocAlias.docs.through)
+
+
+def reference_graph_changed_on_relation_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    from ietf.doc.utils_references import GRAPH_RELATIONSHIPS, reference_graph_changed
+    if instance.relationship_id in GRAPH_RELATIONSHIPS:
+        reference_graph_changed([instance.source_id])
+
+def reference_graph_changed_on_relation_delete(sender, instance, **kwargs):
+    reference_graph_changed_on_relation_change(sender, instance)
+
+signals.post_save.connect(reference_graph_changed_on_relation_change, sender=RelatedDocument)
+signals.post_delete.connect(reference_graph_changed_on_relation_delete, sender=RelatedDocument)
+
+
+def reference_graph_changed_on_alias_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+
+    from ietf.doc.utils_references import reference_targets_changed
+    if isinstance(instance, DocAlias):
+        reference_targets_changed([instance.pk])
+    elif action == "pre_clear":
+        reference_targets_changed(instance.docalias.values_list("pk", flat=True))
+    elif pk_set:
+        reference_targets_changed(pk_set)
+
+signals.m2m_changed.connect(reference_graph_changed_on_alias_change, sender=DocAlias.docs.through)
+
+
+def update_search_tokens_on_docalias_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    from ietf.doc.utils_search import update_docalias_search_tokens
+    update_docalias_search_tokens([instance.pk])
+
+signals.post_save.connect(update_search_tokens_on_docalias_save, sender=DocAlias)
@@ -859,3 +859,41 @@ class BofreqResponsibleDocEventResource(ModelResource):
             "responsible": ALL_WITH_RELATIONS,
         }
 api.doc.register(BofreqResponsibleDocEventResource())
+
+
+from ietf.doc.models import DocumentSearchIndex
+class DocumentSearchIndexResource(ModelResource):
+    document         = ToOneField(DocumentResource, 'document')
+    class Meta:
+        cache = SimpleCache()
+        queryset = DocumentSearchIndex.objects.all()
+        serializer = api.Serializer()
+        #resource_name = 'documentsearchindex'
+        ordering = ['document', ]
+        filtering = { 
+            "names": ALL,
+            "title": ALL,
+            "abstract": ALL,
+            "authors": ALL,
+            "states": ALL,
+            "time": ALL,
+            "document": ALL_WITH_RELATIONS,
+        }
+api.doc.register(DocumentSearchIndexResource())
+
+
+from ietf.doc.models import DocAliasSearchToken
+class DocAliasSearchTokenResource(ModelResource):
+    alias            = ToOneField(DocAliasResource, 'alias')
+    class Meta:
+        cache = SimpleCache()
+        queryset = DocAliasSearchToken.objects.all()
+        serializer = api.Serializer()
+        #resource_name = 'docaliassearchtoken'
+        ordering = ['id', ]
+        filtering = { 
+            "id": ALL,
+            "token": ALL,
+            "alias": ALL_WITH_RELATIONS,
+        }
+api.doc.register(DocAliasSearchTokenResource())
@@ -0,0 +1,26 @@
+# Copyright The IETF Trust 2023, All Rights Reserved
+#
+# Celery task definitions
+#
+from celery import shared_task
+
+from ietf.doc.models import Document
+from ietf.doc.utils import prerender_document
+from ietf.utils import log
+
+# Document files, e.g. newly published RFCs, may show up some time after the
+# event that triggers pre-rendering. Retry for up to 2 hours.
+PRERENDER_RETRY_DELAY = 20 * 60  # seconds
+PRERENDER_MAX_RETRIES = 6
+
+
+@shared_task(bind=True, max_retries=PRERENDER_MAX_RETRIES)
+def prerender_document_task(self, document_name):
+    """Fill the htmlized and pdfized caches for a document"""
+    try:
+        doc = Document.objects.get(name=document_name)
+    except Document.DoesNotExist:
+        log.log(f'prerender_document_task called for missing document {document_name}')
+        return
+    if not prerender_document(doc):
+        raise self.retry(countdown=PRERENDER_RETRY_DELAY)
@@ -20,6 +20,7 @@ from tempfile import NamedTemporaryFile
 from collections import defaultdict
 from zoneinfo import ZoneInfo
 
+from django.core.cache import cache
 from django.core.management import call_command
 from django.urls import reverse as urlreverse
 from django.conf import settings
@@ -35,14 +36,18 @@ import debug                            # pyflakes:ignore
 
 from ietf.doc.models import ( Document, DocAlias, DocRelationshipName, RelatedDocument, State,
     DocEvent, BallotPositionDocEvent, LastCallDocEvent, WriteupDocEvent, NewRevisionDocEvent, BallotType,
-    EditedAuthorsDocEvent )
+    EditedAuthorsDocEvent, DocumentSearchIndex )
 from ietf.doc.factories import ( DocumentFactory, DocEventFactory, CharterFactory, 
     ConflictReviewFactory, WgDraftFactory, IndividualDraftFactory, WgRfcFactory, 
     IndividualRfcFactory, StateDocEventFactory, BallotPositionDocEventFactory, 
     BallotDocEventFactory, DocumentAuthorFactory, NewRevisionDocEventFactory,
     StatusChangeFactory, BofreqFactory)
 from ietf.doc.fields import SearchableDocumentsField
-from ietf.doc.utils import create_ballot_if_not_open, uppercase_std_abbreviated_name
+from ietf.doc.tasks import prerender_document_task
+from ietf.doc.utils import create_ballot_if_not_open, prerender_document, uppercase_std_abbreviated_name, prefetch_latest_events
+from ietf.doc import utils_references
+from ietf.doc.utils_references import get_reference_graph, ReferenceGraph
+from ietf.doc.views_search import SearchForm, retrieve_search_results
 from ietf.doc.views_search import ad_dashboard_group, ad_dashboard_group_type, shorten_group_name # TODO: red flag that we're importing from views in tests. Move these to utils.
 from ietf.group.models import Group, Role
 from ietf.group.factories import GroupFactory, RoleFactory
@@ -52,8 +57,9 @@ from ietf.meeting.factories import ( MeetingFactory, SessionFactory, SessionPres
      ProceedingsMaterialFactory )
 
 from ietf.name.models import SessionStatusName, BallotPositionName, DocTypeName
-from ietf.person.models import Person
+from ietf.person.models import Alias, Email, Person
 from ietf.person.factories import PersonFactory, EmailFactory
+from ietf.review.factories import ReviewRequestFactory
 from ietf.utils.mail import outbox, empty_outbox
 from ietf.utils.test_utils import login_testing_unauthorized, unicontent, reload_db_objects
 from ietf.utils.test_utils import TestCase
@@ -145,6 +151,80 @@ class SearchTests(TestCase):
         self.assertEqual(r.status_code, 200)
         self.assertContains(r, draft.title)
 
+    def test_search_pages(self):
+        group = GroupFactory(acronym='paging')
+        drafts = [ WgDraftFactory(name='draft-ietf-paging-%s' % n, group=group) for n in ('a', 'b', 'c') ]
+        url = urlreverse('ietf.doc.views_search.search') + "?activedrafts=on&by=group&group=paging"
+
+        with mock.patch('ietf.doc.views_search.SEARCH_RESULTS_PER_PAGE', 2):
+            r = self.client.get(url)
+            self.assertEqual(r.status_code, 200)
+            q = PyQuery(r.content)
+            first = [ d.name for d in drafts if d.name in unicontent(r) ]
+            self.assertEqual(len(first), 2)
+            self.assertNotContains(r, "Too many documents match")
+            self.assertEqual(len(q('.pagination .page-item.disabled a[aria-label="<"]')), 1)
+            next_url = q('.pagination a[aria-label=">"]').attr('href')
+            self.assertIn("page=2", next_url)
+
+            r = self.client.get(urlreverse('ietf.doc.views_search.search') + next_url)
+            self.assertEqual(r.status_code, 200)
+            q = PyQuery(r.content)
+            second = [ d.name for d in drafts if d.name in unicontent(r) ]
+            self.assertEqual(len(second), 1)
+            self.assertCountEqual(first + second, [ d.name for d in drafts ])
+            self.assertEqual(len(q('.pagination .page-item.disabled a[aria-label=">"]')), 1)
+            self.assertIn("page=1", q('.pagination a[aria-label="<"]').attr('href'))
+
+            r = self.client.get(url + "&page=x")
+            self.assertEqual(r.status_code, 400)
+
+    def test_search_index(self):
+        author = PersonFactory()
+        draft = WgDraftFactory(name='draft-ietf-mars-test', authors=[author], title="Martian Networks")
+        other = WgDraftFactory(name='draft-ietf-mars-test-extended', title="Extended test for draft-ietf-mars-test")
+
+        entry = DocumentSearchIndex.objects.get(document=draft)
+        self.assertIn("\ndraft-ietf-mars-test\n", entry.names)
+        self.assertEqual(entry.title, "martian networks")
+        self.assertIn("\n%s\n" % author.email_address().lower(), entry.authors)
+        self.assertIn("\nactive\n", entry.states)
+
+        # changes are picked up
+        draft.title = "Venusian Networks"
+        draft.save()
+        DocAlias.objects.create(name="rfc9999").docs.add(draft)
+        draft.set_state(State.objects.get(type="draft", slug="expired"))
+        entry = DocumentSearchIndex.objects.get(document=draft)
+        self.assertEqual(entry.title, "venusian networks")
+        self.assertIn("\nrfc9999\n", entry.names)
+        self.assertIn("\nexpired\n", entry.states)
+        self.assertNotIn("\nactive\n", entry.states)
+
+        # so are new author names and addresses
+        Alias.objects.create(person=author, name="Marvin Martian")
+        EmailFactory(person=author, address="marvin@mars.example")
+        entry = DocumentSearchIndex.objects.get(document=draft)
+        self.assertIn("\nmarvin martian\n", entry.authors)
+        self.assertIn("\nmarvin@mars.example\n", entry.authors)
+        email = Email.objects.get(address="marvin@mars.example")
+        email.person = PersonFactory()
+        email.save()
+        entry = DocumentSearchIndex.objects.get(document=draft)
+        self.assertNotIn("\nmarvin@mars.example\n", entry.authors)
+
+        # exact name matches are ranked first
+        draft.set_state(State.objects.get(type="draft", slug="active"))
+        form = SearchForm({"name": "draft-ietf-mars-test", "activedrafts": "on", "by": ""})
+        self.assertEqual(list(retrieve_search_results(form)), [draft, other])
+        form = SearchForm({"name": "RFC9999", "activedrafts": "on", "by": ""})
+        self.assertEqual(list(retrieve_search_results(form)), [draft])
+
+        # rebuilding
+        DocumentSearchIndex.objects.all().delete()
+        call_command("update_document_search_index", verbosity=0)
+        self.assertEqual(DocumentSearchIndex.objects.count(), Document.objects.count())
+
     def test_search_for_name(self):
         draft = WgDraftFactory(name='draft-ietf-mars-test',group=GroupFactory(acronym='mars',parent=Group.objects.get(acronym='farfut')),authors=[PersonFactory()],ad=PersonFactory())
         draft.set_state(State.objects.get(used=True, type="draft-iesg", slug="pub-req"))
@@ -385,6 +465,32 @@ class SearchTests(TestCase):
         data = r.json()
         self.assertEqual(data[0]["id"], doc_alias.pk)
 
+    def test_ajax_search_docs_word_prefixes(self):
+        draft = IndividualDraftFactory(name="draft-somebody-quic-extensions")
+        other = IndividualDraftFactory(name="draft-somebody-quic")
+        url = urlreverse('ietf.doc.views_search.ajax_select2_search_docs', kwargs={
+            "model_name": "document",
+            "doc_type": "draft",
+        })
+
+        # terms match the start of any part of the name, exact names first
+        r = self.client.get(url, dict(q="draft-somebody-quic"))
+        self.assertEqual([ d["id"] for d in r.json() ], [other.pk, draft.pk])
+        r = self.client.get(url, dict(q="quic ext"))
+        self.assertEqual([ d["id"] for d in r.json() ], [draft.pk])
+        r = self.client.get(url, dict(q="uic"))
+        self.assertEqual(r.json(), [])
+
+        # a new alias is found right away
+        alias = DocAlias.objects.create(name="rfc9999")
+        alias.docs.add(draft)
+        url = urlreverse('ietf.doc.views_search.ajax_select2_search_docs', kwargs={
+            "model_name": "docalias",
+            "doc_type": "draft",
+        })
+        r = self.client.get(url, dict(q="9999"))
+        self.assertEqual([ d["id"] for d in r.json() ], [alias.pk])
+
     def test_recent_drafts(self):
         # Three drafts to show with various warnings
         drafts = WgDraftFactory.create_batch(3,states=[('draft','active'),('draft-iesg','ad-eval')])
@@ -1753,6 +1859,67 @@ class DocTestCase(TestCase):
         self.assertEqual(doc.name, data['name'])
         self.assertEqual(doc.pages,data['pages'])
 
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_document_etag(self):
+        doc = IndividualDraftFactory()
+
+        for url in [
+            urlreverse("ietf.doc.views_doc.document_main", kwargs=dict(name=doc.name)),
+            urlreverse("ietf.doc.views_doc.document_history", kwargs=dict(name=doc.name)),
+            urlreverse("ietf.doc.views_doc.document_json", kwargs=dict(name=doc.name)),
+        ]:
+            r = self.client.get(url)
+            self.assertEqual(r.status_code, 200)
+            etag = r['ETag']
+            self.assertTrue(etag)
+            r = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(r.status_code, 304)
+
+            # a new event changes the ETag
+            DocEventFactory(doc=doc, desc='Comment for %s' % url)
+            r = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(r.status_code, 200)
+            self.assertNotEqual(r['ETag'], etag)
+
+        # so does a state change, and the cached fragments follow
+        url = urlreverse("ietf.doc.views_doc.document_json", kwargs=dict(name=doc.name))
+        self.assertTrue(self.client.get(url)['Last-Modified'])
+        doc.set_state(State.objects.get(type="draft-iesg", slug="pub-req"))
+        r = self.client.get(url)
+        self.assertEqual(r.json()['iesg_state'], 'Publication Requested')
+
+        # the page varies with the user
+        url = urlreverse("ietf.doc.views_doc.document_main", kwargs=dict(name=doc.name))
+        etag = self.client.get(url)['ETag']
+        self.client.login(username="secretary", password="secretary+password")
+        r = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code, 200)
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_document_sections_cached(self):
+        doc = WgDraftFactory()
+        main_url = urlreverse("ietf.doc.views_doc.document_main", kwargs=dict(name=doc.name))
+        history_url = urlreverse("ietf.doc.views_doc.document_history", kwargs=dict(name=doc.name))
+        self.assertEqual(self.client.get(main_url).status_code, 200)
+        self.assertEqual(self.client.get(history_url).status_code, 200)
+
+        # another user gets their own page, but the sections that don't
+        # depend on the user come from the cache
+        self.client.login(username="secretary", password="secretary+password")
+        with mock.patch('ietf.doc.views_doc.review_assignments_to_list_for_docs', return_value={}) as mock_reviews, \
+             mock.patch('ietf.doc.views_doc.add_events_message_info') as mock_message_info:
+            self.assertEqual(self.client.get(main_url).status_code, 200)
+            self.assertEqual(self.client.get(history_url).status_code, 200)
+            self.assertFalse(mock_reviews.called)
+            self.assertFalse(mock_message_info.called)
+
+            # until the document changes
+            ReviewRequestFactory(doc=doc)
+            self.assertEqual(self.client.get(main_url).status_code, 200)
+            self.assertEqual(self.client.get(history_url).status_code, 200)
+            self.assertTrue(mock_reviews.called)
+            self.assertTrue(mock_message_info.called)
+
     def test_writeup(self):
         doc = IndividualDraftFactory(states = [('draft','active'),('draft-iesg','iesg-eva')],)
 
@@ -1860,6 +2027,28 @@ class DocTestCase(TestCase):
         self.assertEqual(r.status_code, 200)
         self.assertContains(r, doc.name)
 
+    def test_prefetch_latest_events(self):
+        docs = IndividualDraftFactory.create_batch(3)
+        by = Person.objects.get(name="(System)")
+        for doc in docs[:2]:
+            for days in (14, 7):
+                LastCallDocEvent.objects.create(doc=doc, rev=doc.rev, desc="Last call", type="sent_last_call", by=by,
+                    expires=datetime_today(DEADLINE_TZINFO) + datetime.timedelta(days=days))
+        DocEventFactory(doc=docs[0], type="started_iesg_process")
+
+        expected = [ (d.latest_event(LastCallDocEvent, type="sent_last_call"), d.latest_event(type="started_iesg_process")) for d in docs ]
+        docs = list(Document.objects.filter(pk__in=[ d.pk for d in docs ]).order_by("pk"))
+        with self.assertNumQueries(2):
+            prefetch_latest_events(docs, (LastCallDocEvent, dict(type="sent_last_call")), (DocEvent, dict(type="started_iesg_process")))
+        with self.assertNumQueries(0):
+            found = [ (d.latest_event(LastCallDocEvent, type="sent_last_call"), d.latest_event(type="started_iesg_process")) for d in docs ]
+        self.assertEqual(found, expected)
+        self.assertEqual(found[0][0].expires, expected[0][0].expires)
+        self.assertIsNone(found[2][0])
+        # other arguments still go to the database
+        with self.assertNumQueries(1):
+            docs[0].latest_event(type="added_comment")
+
     def test_rfc_feed(self):
         WgRfcFactory()
         r = self.client.get("/feed/rfc/")
@@ -2036,6 +2225,12 @@ class TemplateTagTest(TestCase):
 
 class ReferencesTest(TestCase):
 
+    def setUp(self):
+        super().setUp()
+        # the rows of earlier tests are gone without any signals
+        utils_references._graph = None
+        self.addCleanup(setattr, utils_references, '_graph', None)
+
     def test_references(self):
         doc1 = WgDraftFactory(name='draft-ietf-mars-test')
         doc2 = IndividualDraftFactory(name='draft-imaginary-independent-submission').docalias.first()
@@ -2049,6 +2244,113 @@ class ReferencesTest(TestCase):
         self.assertEqual(r.status_code, 200)
         self.assertContains(r, doc1.name)
 
+    def test_reference_graph(self):
+        rfc = WgRfcFactory()
+        rfc_alias = rfc.docalias.get(name__startswith='rfc')
+        draft1 = WgDraftFactory()
+        draft2 = IndividualDraftFactory()
+        refnorm = DocRelationshipName.objects.get(slug='refnorm')
+        RelatedDocument.objects.create(source=draft1, target=rfc_alias, relationship=refnorm)
+        RelatedDocument.objects.create(source=draft2, target=draft1.docalias.first(), relationship=refnorm)
+        RelatedDocument.objects.create(source=draft2, target=rfc_alias, relationship_id='refinfo')
+
+        graph = get_reference_graph()
+        self.assertCountEqual(graph.referenced_by(rfc.pk), [(draft1.pk, 'refnorm'), (draft2.pk, 'refinfo')])
+        self.assertEqual(graph.references(draft1.pk), [(rfc.pk, 'refnorm')])
+        self.assertEqual(graph.transitive_referenced_by(rfc.pk), {draft1.pk: 1, draft2.pk: 2})
+        self.assertEqual(graph.transitive_referenced_by(rfc.pk, max_depth=1), {draft1.pk: 1})
+        self.assertEqual(graph.transitive_references(draft2.pk), {draft1.pk: 1, rfc.pk: 2})
+
+        # incremental update
+        draft1.relateddocument_set.all().delete()
+        graph.update([draft1.pk])
+        self.assertEqual(graph.referenced_by(rfc.pk), [(draft2.pk, 'refinfo')])
+        self.assertEqual(graph.transitive_referenced_by(rfc.pk), {})
+        rebuilt = ReferenceGraph(ReferenceGraph.relations())
+        for edges, rebuilt_edges in [(graph.outgoing, rebuilt.outgoing), (graph.incoming, rebuilt.incoming)]:
+            self.assertEqual(dict((k, sorted(v)) for k, v in edges.items()), dict((k, sorted(v)) for k, v in rebuilt_edges.items()))
+
+        RelatedDocument.objects.create(source=draft1, target=rfc_alias, relationship=refnorm)
+        url = urlreverse('ietf.doc.views_doc.document_referenced_by', kwargs=dict(name=rfc_alias.name))
+        r = self.client.get(url)
+        self.assertEqual(r.status_code, 200)
+        self.assertContains(r, draft1.name)
+        self.assertContains(r, draft2.name)
+        self.assertContains(r, '2 documents depend normatively')
+
+        # expired drafts are left out of the list and the count
+        expired = WgDraftFactory(states=[('draft','expired')])
+        RelatedDocument.objects.create(source=expired, target=rfc_alias, relationship=refnorm)
+        r = self.client.get(url)
+        self.assertEqual(r.status_code, 200)
+        self.assertNotContains(r, expired.name)
+        self.assertContains(r, '2 documents depend normatively')
+
+    @override_settings(CACHES=dict(settings.CACHES, default={'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}))
+    def test_reference_graph_without_cache(self):
+        rfc = WgRfcFactory()
+        rfc_alias = rfc.docalias.get(name__startswith='rfc')
+        draft = WgDraftFactory()
+
+        # the graph is kept, rather than rebuilt for every call
+        graph = get_reference_graph()
+        with self.assertNumQueries(0):
+            self.assertIs(get_reference_graph(), graph)
+
+        # and follows the changes of this process
+        RelatedDocument.objects.create(source=draft, target=rfc_alias, relationship_id='refnorm')
+        with mock.patch.object(ReferenceGraph, 'relations', wraps=ReferenceGraph.relations) as mock_relations:
+            self.assertIs(get_reference_graph(), graph)
+            mock_relations.assert_called_once_with(set([draft.pk]))
+        self.assertEqual(graph.referenced_by(rfc.pk), [(draft.pk, 'refnorm')])
+
+        # for a while
+        graph.built -= utils_references.REFERENCE_GRAPH_UNCACHED_MAX_AGE + 1
+        self.assertIsNot(get_reference_graph(), graph)
+
+    @override_settings(CACHES=dict(settings.CACHES, default={'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}))
+    @mock.patch('ietf.doc.utils_references.transaction.on_commit', side_effect=lambda func: func())
+    def test_reference_graph_catch_up(self, mock_on_commit):
+        utils_references._graph = None
+        self.addCleanup(setattr, utils_references, '_graph', None)
+        rfc = WgRfcFactory()
+        rfc_alias = rfc.docalias.get(name__startswith='rfc')
+        draft1 = WgDraftFactory()
+        draft2 = WgDraftFactory()
+        refnorm = DocRelationshipName.objects.get(slug='refnorm')
+
+        graph = get_reference_graph()
+        version = graph.version
+        self.assertEqual(graph.referenced_by(rfc.pk), [])
+
+        # a process that is behind reloads only the changed documents
+        RelatedDocument.objects.create(source=draft1, target=rfc_alias, relationship=refnorm)
+        RelatedDocument.objects.create(source=draft2, target=rfc_alias, relationship=refnorm)
+        with mock.patch.object(ReferenceGraph, 'relations', wraps=ReferenceGraph.relations) as mock_relations:
+            self.assertIs(get_reference_graph(), graph)
+            mock_relations.assert_called_once_with(set([draft1.pk, draft2.pk]))
+        self.assertEqual(graph.version, version + 2)
+        self.assertCountEqual(graph.referenced_by(rfc.pk), [(draft1.pk, 'refnorm'), (draft2.pk, 'refnorm')])
+
+        # changes collected together are one announcement
+        with utils_references.collect_reference_graph_changes() as changes:
+            RelatedDocument.objects.filter(target=rfc_alias).delete()
+        utils_references.announce_reference_graph_changes(changes)
+        self.assertIs(get_reference_graph(), graph)
+        self.assertEqual(graph.version, version + 3)
+        self.assertEqual(graph.referenced_by(rfc.pk), [])
+
+        # a process that is too far behind rebuilds the graph
+        RelatedDocument.objects.create(source=draft1, target=rfc_alias, relationship=refnorm)
+        cache.incr(utils_references.REFERENCE_GRAPH_VERSION_KEY, utils_references.REFERENCE_GRAPH_MAX_CHANGES)
+        rebuilt = get_reference_graph()
+        self.assertIsNot(rebuilt, graph)
+        self.assertEqual(rebuilt.referenced_by(rfc.pk), [(draft1.pk, 'refnorm')])
+
+        # as does one that finds the version gone
+        cache.delete(utils_references.REFERENCE_GRAPH_VERSION_KEY)
+        self.assertIsNot(get_reference_graph(), rebuilt)
+
 class GenerateDraftAliasesTests(TestCase):
    def setUp(self):
        super().setUp()
@@ -2926,3 +3228,58 @@ class PdfizedTests(TestCase):
             for ext in ('pdf','txt','html','anythingatall'):
                 self.should_succeed(dict(name=rfc.name,rev=f'{r:02d}',ext=ext))
         self.should_404(dict(name=rfc.name,rev='02'))
+
+    @override_settings(CACHES=dict(settings.CACHES,
+                                   default={'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+                                   pdfized={'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}))
+    def test_pdfized_cache_hit_does_not_render(self):
+        draft = WgDraftFactory()
+        with (Path(settings.INTERNET_DRAFT_PATH) / f'{draft.name}-{draft.rev}.txt').open('w') as f:
+            f.write('text content')
+        with mock.patch.object(Document, 'html_body', return_value=None) as html_body:
+            pdf = draft.pdfized()
+            self.assertTrue(pdf)
+            self.assertEqual(html_body.call_count, 1)
+            self.assertEqual(draft.pdfized(), pdf)
+            self.assertEqual(html_body.call_count, 1)
+        with override_settings(PDFIZER_VERSION=settings.PDFIZER_VERSION + 1):
+            with mock.patch.object(Document, 'html_body', return_value=None) as html_body:
+                draft.pdfized()
+                self.assertEqual(html_body.call_count, 1)
+
+class PrerenderTests(TestCase):
+
+    @mock.patch('ietf.doc.tasks.prerender_document')
+    def test_prerender_document_task(self, mock_prerender):
+        draft = WgDraftFactory()
+        mock_prerender.return_value = True
+        prerender_document_task(draft.name)
+        self.assertEqual(mock_prerender.call_count, 1)
+        self.assertEqual(mock_prerender.call_args.args, (draft,))
+
+        prerender_document_task('draft-does-not-exist')
+        self.assertEqual(mock_prerender.call_count, 1)
+
+    def test_prerender_document(self):
+        draft = WgDraftFactory()
+        with mock.patch.object(Document, 'pdfized') as pdfized:
+            self.assertFalse(prerender_document(draft))
+            self.assertFalse(pdfized.called)
+            with (Path(settings.INTERNET_DRAFT_PATH) / f'{draft.name}-{draft.rev}.txt').open('w') as f:
+                f.write('text content')
+            self.assertTrue(prerender_document(draft))
+            self.assertTrue(pdfized.called)
+
+    def test_prerender_documents_command(self):
+        draft = WgDraftFactory()
+        without_file = WgDraftFactory()
+        with (Path(settings.INTERNET_DRAFT_PATH) / f'{draft.name}-{draft.rev}.txt').open('w') as f:
+            f.write('text content')
+        out = io.StringIO()
+        err = io.StringIO()
+        with mock.patch.object(Document, 'pdfized') as pdfized:
+            call_command('prerender_documents', draft.name, without_file.name, jobs=1, verbosity=2, stdout=out, stderr=err)
+        self.assertEqual(pdfized.call_count, 1)
+        self.assertIn('%s: no document file' % without_file.name, out.getvalue())
+        self.assertIn('Rendered 1 documents, 1 without document file, 0 failed', out.getvalue())
+        self.assertEqual(err.getvalue(), '')
@@ -1,9 +1,13 @@
 # Copyright The IETF Trust 2020, All Rights Reserved
 import datetime
+import io
 import debug  # pyflakes:ignore
 
+from pathlib import Path
 from unittest.mock import patch
 
+from django.conf import settings
+from django.core.management import call_command
 from django.db import IntegrityError
 from django.utils import timezone
 
@@ -430,3 +434,65 @@ class RebuildReferenceRelationsTests(TestCase):
                 (self.updated.docalias.first().name, 'updates'),
             ]
         )
+
+    @patch.object(XMLDraft, 'get_refs')
+    @patch.object(XMLDraft, '__init__', return_value=None)
+    def test_unchanged_relations_kept(self, mock_init, mock_get_refs):
+        """Should only replace the relations that have changed"""
+        mock_get_refs.return_value = self._get_refs_return_value()
+        rebuild_reference_relations(self.doc, {'xml': 'file.xml'})
+        before = dict(self.doc.relateddocument_set.values_list('target__name', 'pk'))
+
+        refs = self._get_refs_return_value()
+        refs[self.informative.canonical_name()] = Draft.REF_TYPE_NORMATIVE
+        del refs[self.unknown.canonical_name()]
+        mock_get_refs.return_value = refs
+        result = rebuild_reference_relations(self.doc, {'xml': 'file.xml'})
+        self.assertEqual(result['unfound'], ['draft-not-found'])
+
+        self.assertCountEqual(
+            self.doc.relateddocument_set.values_list('target__name', 'relationship__slug'),
+            [
+                (self.normative.canonical_name(), 'refnorm'),
+                (self.informative.canonical_name(), 'refnorm'),
+                (self.updated.docalias.first().name, 'updates'),
+            ]
+        )
+        after = dict(self.doc.relateddocument_set.values_list('target__name', 'pk'))
+        self.assertEqual(after[self.normative.canonical_name()], before[self.normative.canonical_name()])
+        self.assertNotEqual(after[self.informative.canonical_name()], before[self.informative.canonical_name()])
+
+    @patch('ietf.doc.utils_references.transaction.on_commit')
+    @patch.object(XMLDraft, 'get_refs')
+    @patch.object(XMLDraft, '__init__', return_value=None)
+    def test_reference_graph_change_announced_once(self, mock_init, mock_get_refs, mock_on_commit):
+        """Should announce one reference graph change, not one per deleted relation"""
+        mock_get_refs.return_value = self._get_refs_return_value()
+        rebuild_reference_relations(self.doc, {'xml': 'file.xml'})
+        self.assertEqual(mock_on_commit.call_count, 1)
+
+    @patch.object(XMLDraft, 'get_refs')
+    @patch.object(XMLDraft, '__init__', return_value=None)
+    def test_management_command(self, mock_init, mock_get_refs):
+        """The rebuild_reference_relations command should rebuild from the archived draft files"""
+        mock_get_refs.return_value = self._get_refs_return_value()
+        without_file = WgDraftFactory()
+        (Path(settings.INTERNET_ALL_DRAFTS_ARCHIVE_DIR) / f'{self.doc.name}-{self.doc.rev}.xml').write_text('<rfc/>')
+
+        out = io.StringIO()
+        err = io.StringIO()
+        call_command('rebuild_reference_relations', self.doc.name, without_file.name, jobs=1, verbosity=2, stdout=out, stderr=err)
+
+        self.assertIn('%s: no document file' % without_file.name, out.getvalue())
+        self.assertIn('%s: no document found for draft-not-found' % self.doc.name, out.getvalue())
+        self.assertIn('Rebuilt the references of 1 documents, 1 without document file, 0 failed', out.getvalue())
+        self.assertEqual(err.getvalue(), '')
+        self.assertCountEqual(
+            self.doc.relateddocument_set.values_list('target__name', 'relationship__slug'),
+            [
+                (self.normative.canonical_name(), 'refnorm'),
+                (self.informative.canonical_name(), 'refinfo'),
+                (self.unknown.canonical_name(), 'refunk'),
+                (self.updated.docalias.first().name, 'updates'),
+            ]
+        )
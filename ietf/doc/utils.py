@@ -17,6 +17,9 @@ from zoneinfo import ZoneInfo
 
 from django.conf import settings
 from django.contrib import messages
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
 from django.forms import ValidationError
 from django.http import Http404
 from django.template.loader import render_to_string
@@ -26,6 +29,7 @@ from django.urls import reverse as urlreverse
 
 
 import debug                            # pyflakes:ignore
+import ietf
 from ietf.community.models import CommunityList
 from ietf.community.utils import docs_tracked_by_community_list
 
@@ -33,6 +37,8 @@ from ietf.doc.models import Document, DocHistory, State, DocumentAuthor, DocHist
 from ietf.doc.models import DocAlias, RelatedDocument, RelatedDocHistory, BallotType, DocReminder
 from ietf.doc.models import DocEvent, ConsensusDocEvent, BallotDocEvent, IRSGBallotDocEvent, NewRevisionDocEvent, StateDocEvent
 from ietf.doc.models import TelechatDocEvent, DocumentActionHolder, EditedAuthorsDocEvent
+from ietf.doc.models import latest_event_cache_key
+from ietf.doc.utils_references import reference_graph_changed, collect_reference_graph_changes, announce_reference_graph_changes
 from ietf.name.models import DocReminderTypeName, DocRelationshipName
 from ietf.group.models import Role, Group
 from ietf.ietfauth.utils import has_role, is_authorized_in_doc_stream, is_individual_draft_author, is_bofreq_editor
@@ -339,6 +345,32 @@ def augment_events_with_revision(doc, events):
                 cur_rev = "00"
             e.rev = cur_rev
 
+def prefetch_latest_events(docs, *specs):
+    """Fetch the latest event of each spec for all of docs, with one query
+    per spec, and attach the results so that doc.latest_event() calls with
+    the same arguments are answered without going to the database.  Each
+    spec is a (model, filter_args) tuple, e.g.
+
+        prefetch_latest_events(docs, (DocEvent, dict(type="started_iesg_process")),
+                                     (LastCallDocEvent, dict(type="sent_last_call")))
+
+    The attached results are not updated when new events are added, so
+    only use this for documents that are about to be displayed."""
+    doc_dict = dict((d.pk, d) for d in docs if d.pk is not None)
+    if not doc_dict:
+        return docs
+    for model, filter_args in specs:
+        latest = model.objects.filter(doc=OuterRef('doc'), **filter_args).order_by('-time', '-id').values('pk')[:1]
+        # filter the outer query too, so the subquery only runs for the
+        # matching events rather than for every event of the documents
+        events = dict((e.doc_id, e) for e in model.objects.filter(doc__in=list(doc_dict.keys()), pk=Subquery(latest), **filter_args))
+        key = latest_event_cache_key(model, filter_args)
+        for doc_id, d in doc_dict.items():
+            if getattr(d, '_latest_event_cache', None) is None:
+                d._latest_event_cache = {}
+            d._latest_event_cache[key] = events.get(doc_id)
+    return docs
+
 def add_links_in_new_revision_events(doc, events, diff_revisions):
     """Add direct .txt links and diff links to new_revision events."""
     prev = None
@@ -763,24 +795,44 @@ def rebuild_reference_relations(doc, filenames):
     else:
         return {'errors': ['No draft text available for rebuilding reference relations. Need XML or plaintext.']}
 
-    doc.relateddocument_set.filter(relationship__slug__in=['refnorm','refinfo','refold','refunk']).delete()
+    # resolve all the references with one query
+    aliases = {}
+    for alias_name, alias_id, doc_id in DocAlias.objects.filter(name__in=list(refs.keys())).values_list('name', 'pk', 'docs'):
+        aliases.setdefault(alias_name, (alias_id, set()))[1].add(doc_id)
 
     warnings = []
     errors = []
     unfound = set()
+    wanted = set()
     for ( ref, refType ) in refs.items():
-        # As of Dec 2021, DocAlias has a unique constraint on the name field, so count > 1 should not occur
-        refdoc = DocAlias.objects.filter( name=ref )
-        count = refdoc.count()
-        if count == 0:
+        if ref not in aliases:
             unfound.add( "%s" % ref )
             continue
-        elif count > 1:
-            errors.append("Too many DocAlias objects found for %s"%ref)
+        alias_id, doc_ids = aliases[ref]
+        # Don't add references to ourself
+        if doc.pk not in doc_ids:
+            wanted.add((alias_id, 'ref%s' % refType))
+
+    # only touch the relations that have changed
+    existing = set()
+    stale = []
+    for pk, target_id, relationship_id in doc.relateddocument_set.filter(relationship__slug__in=['refnorm','refinfo','refold','refunk']).values_list('pk', 'target_id', 'relationship_id'):
+        if (target_id, relationship_id) in wanted and (target_id, relationship_id) not in existing:
+            existing.add((target_id, relationship_id))
         else:
-            # Don't add references to ourself
-            if doc != refdoc[0].document:
-                RelatedDocument.objects.get_or_create( source=doc, target=refdoc[ 0 ], relationship=DocRelationshipName.objects.get( slug='ref%s' % refType ) )
+            stale.append(pk)
+    new = wanted - existing
+    # announce the changes to the reference graph once, rather than once
+    # for every deleted row
+    with collect_reference_graph_changes() as graph_changes:
+        if stale:
+            RelatedDocument.objects.filter(pk__in=stale).delete()
+        if new:
+            RelatedDocument.objects.bulk_create([ RelatedDocument(source=doc, target_id=target_id, relationship_id=relationship_id) for target_id, relationship_id in new ])
+            # bulk_create() sends no signals
+            document_changed([doc.pk] + list(Document.objects.filter(docalias__in=[ target_id for target_id, _ in new ]).values_list('pk', flat=True)))
+            reference_graph_changed([doc.pk])
+    announce_reference_graph_changes(graph_changes)
     if unfound:
         warnings.append('There were %d references with no matching DocAlias'%len(unfound))
 
@@ -994,7 +1046,58 @@ def get_search_cache_key(params):
     kwargs = dict([ (k,v) for (k,v) in list(params.items()) if k in fields ])
     key = "doc:document:search:" + hashlib.sha512(json.dumps(kwargs, sort_keys=True).encode('utf-8')).hexdigest()
     return key
-    
+
+DOCUMENT_VERSION_KEY = "doc:document:version:%s"
+# Changes the signal handlers don't see, e.g. to group or person names,
+# show up after at most this long
+DOCUMENT_CACHE_TIMEOUT = 24 * 60 * 60
+
+def document_version(doc_id):
+    """Return a stamp that changes whenever the events, states, aliases,
+    relations, authors or history of the document change.  The stamp is
+    the time of the change as a timestamp, so it can be used for cache
+    keys and ETags as well as Last-Modified headers."""
+    key = DOCUMENT_VERSION_KEY % doc_id
+    version = cache.get(key)
+    if version is None:
+        version = timezone.now().timestamp()
+        if not cache.add(key, version, DOCUMENT_CACHE_TIMEOUT):
+            version = cache.get(key) or version
+    return version
+
+def document_last_modified(doc_id):
+    return datetime.datetime.fromtimestamp(document_version(doc_id), datetime.timezone.utc)
+
+def document_etag(doc_id, *parts):
+    """Return an ETag for a page of the document, with parts distinguishing
+    the different pages and the variants of a page"""
+    text = ":".join(str(p) for p in (doc_id, document_version(doc_id), ietf.__version__) + parts)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+def document_changed(doc_ids):
+    """Invalidate the cached pages and fragments of the documents"""
+    keys = [ DOCUMENT_VERSION_KEY % i for i in set(doc_ids) if i is not None ]
+    if not keys:
+        return
+    def new_version():
+        version = timezone.now().timestamp()
+        cache.set_many(dict((k, version) for k in keys), DOCUMENT_CACHE_TIMEOUT)
+    new_version()
+    # and again on commit, in case a concurrent request cached a page from
+    # before the commit under the new version
+    transaction.on_commit(new_version)
+
+def prerender_document(doc):
+    """Fill the htmlized and pdfized caches for the current revision of doc
+
+    Returns False if the document file is not available (yet), True otherwise.
+    """
+    if not os.path.exists(doc.get_file_name()):
+        return False
+    doc.htmlized()
+    doc.pdfized()
+    return True
+
 def build_file_urls(doc):
     if isinstance(doc,Document) and doc.get_state_slug() == "rfc":
         name = doc.canonical_name()
@@ -0,0 +1,252 @@
+# Copyright The IETF Trust 2023, All Rights Reserved
+# -*- coding: utf-8 -*-
+"""In-memory index of the references between documents
+
+The index holds the reference, obsoletes, updates and replaces relations
+as arrays of encoded edges per document, in both directions, so that
+direct and transitive lookups don't need to join RelatedDocument and
+DocAlias.  Each process keeps its own copy.  Changes are announced
+through the cache: every change gets a sequence number, stored with the
+ids of the documents whose outgoing relations changed, and a process
+that is behind reloads only the relations of those documents.
+"""
+
+import time
+
+from array import array
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from threading import Lock, local
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+import debug                            # pyflakes:ignore
+
+from ietf.doc.models import RelatedDocument
+
+
+REFERENCE_RELATIONSHIPS = ('refnorm', 'refinfo', 'refunk', 'refold')
+GRAPH_RELATIONSHIPS = REFERENCE_RELATIONSHIPS + ('obs', 'updates', 'replaces')
+# the relationships that make a document depend on the referenced one
+NORMATIVE_RELATIONSHIPS = ('refnorm', 'refunk', 'refold')
+
+REFERENCE_GRAPH_VERSION_KEY = "doc:reference-graph:version"
+REFERENCE_GRAPH_CHANGE_KEY = "doc:reference-graph:change:%s"
+REFERENCE_GRAPH_CACHE_TIMEOUT = 24 * 60 * 60
+# a process further behind than this rebuilds the whole graph
+REFERENCE_GRAPH_MAX_CHANGES = 500
+# without a working cache, the changes made by other processes can't be
+# followed, so a graph is rebuilt after this many seconds
+REFERENCE_GRAPH_UNCACHED_MAX_AGE = 5 * 60
+
+# the relationship is kept in the low bits of each edge
+REL_BITS = 3
+REL_MASK = (1 << REL_BITS) - 1
+
+
+def relationship_codes(relationships):
+    return set(GRAPH_RELATIONSHIPS.index(r) for r in relationships)
+
+
+class ReferenceGraph(object):
+    """Relations between documents, by document id.  Each document has an
+    array of outgoing and an array of incoming edges, each edge being the
+    id of the document at the other end shifted left by REL_BITS, plus the
+    index of the relationship in GRAPH_RELATIONSHIPS."""
+
+    def __init__(self, rows=(), version=None):
+        self.version = version
+        self.built = time.monotonic()
+        self.outgoing = {}
+        self.incoming = {}
+        outgoing = defaultdict(set)
+        for source_id, target_id, relationship in rows:
+            if target_id is not None and source_id != target_id:
+                outgoing[source_id].add((target_id, GRAPH_RELATIONSHIPS.index(relationship)))
+        for source_id, edges in outgoing.items():
+            self._set_outgoing(source_id, edges)
+
+    @classmethod
+    def relations(cls, source_ids=None):
+        """Return (source id, target document id, relationship) rows of the
+        relations of the given documents, or of all documents"""
+        qs = RelatedDocument.objects.filter(relationship__in=GRAPH_RELATIONSHIPS)
+        if source_ids is not None:
+            qs = qs.filter(source__in=source_ids)
+        return qs.values_list('source_id', 'target__docs', 'relationship_id').iterator()
+
+    def _set_outgoing(self, source_id, edges):
+        """Replace the outgoing edges of source_id with the given
+        (target id, relationship code) pairs, fixing the incoming edges of
+        the old and new targets."""
+        old = set((e >> REL_BITS, e & REL_MASK) for e in self.outgoing.get(source_id, ()))
+        edges = set(edges)
+        for target_id, code in old - edges:
+            remaining = array('q', (e for e in self.incoming[target_id] if e != (source_id << REL_BITS) | code))
+            if remaining:
+                self.incoming[target_id] = remaining
+            else:
+                del self.incoming[target_id]
+        for target_id, code in edges - old:
+            self.incoming.setdefault(target_id, array('q')).append((source_id << REL_BITS) | code)
+        if edges:
+            self.outgoing[source_id] = array('q', sorted((t << REL_BITS) | c for t, c in edges))
+        else:
+            self.outgoing.pop(source_id, None)
+
+    def update(self, source_ids):
+        """Reload the outgoing relations of the given documents from the database"""
+        edges = defaultdict(set)
+        for source_id, target_id, relationship in self.relations(source_ids):
+            if target_id is not None and source_id != target_id:
+                edges[source_id].add((target_id, GRAPH_RELATIONSHIPS.index(relationship)))
+        for source_id in set(source_ids):
+            self._set_outgoing(source_id, edges[source_id])
+
+    def _edges(self, edges, relationships):
+        codes = relationship_codes(relationships)
+        return [ (e >> REL_BITS, GRAPH_RELATIONSHIPS[e & REL_MASK]) for e in edges if e & REL_MASK in codes ]
+
+    def references(self, doc_id, relationships=REFERENCE_RELATIONSHIPS):
+        """Return (document id, relationship) pairs of the documents doc_id refers to"""
+        return self._edges(self.outgoing.get(doc_id, ()), relationships)
+
+    def referenced_by(self, doc_id, relationships=REFERENCE_RELATIONSHIPS):
+        """Return (document id, relationship) pairs of the documents referring to doc_id"""
+        return self._edges(self.incoming.get(doc_id, ()), relationships)
+
+    def _walk(self, adjacency, doc_id, relationships, max_depth):
+        codes = relationship_codes(relationships)
+        depths = {}
+        queue = deque([(doc_id, 0)])
+        while queue:
+            current, depth = queue.popleft()
+            if max_depth is not None and depth >= max_depth:
+                continue
+            for e in adjacency.get(current, ()):
+                other = e >> REL_BITS
+                if e & REL_MASK in codes and other != doc_id and other not in depths:
+                    depths[other] = depth + 1
+                    queue.append((other, depth + 1))
+        return depths
+
+    def transitive_references(self, doc_id, relationships=NORMATIVE_RELATIONSHIPS, max_depth=None):
+        """Return a dict mapping the ids of the documents doc_id depends on,
+        directly or through other documents, to the number of steps"""
+        return self._walk(self.outgoing, doc_id, relationships, max_depth)
+
+    def transitive_referenced_by(self, doc_id, relationships=NORMATIVE_RELATIONSHIPS, max_depth=None):
+        """Return a dict mapping the ids of the documents depending on
+        doc_id, directly or through other documents, to the number of steps"""
+        return self._walk(self.incoming, doc_id, relationships, max_depth)
+
+
+_graph = None
+_graph_lock = Lock()
+# the changes made by this process, for a graph kept without a cache
+_local_changes = set()
+
+def get_reference_graph():
+    """Return the reference graph of this process, brought up to date with
+    the changes announced since it was built"""
+    global _graph, _local_changes
+    with _graph_lock:
+        version = cache.get(REFERENCE_GRAPH_VERSION_KEY)
+        if version is None:
+            # start from the time, so processes with a graph from before the
+            # version was lost don't take themselves to be up to date
+            cache.add(REFERENCE_GRAPH_VERSION_KEY, int(timezone.now().timestamp() * 1000), None)
+            version = cache.get(REFERENCE_GRAPH_VERSION_KEY)
+        if version is None:
+            # no working cache.  Rather than rebuilding on every call, keep
+            # the graph for a while, following the changes of this process
+            changes, _local_changes = _local_changes, set()
+            if (_graph is None or _graph.version is not None or None in changes
+                or time.monotonic() - _graph.built > REFERENCE_GRAPH_UNCACHED_MAX_AGE):
+                _graph = ReferenceGraph(ReferenceGraph.relations())
+            elif changes:
+                _graph.update(changes)
+            return _graph
+        # the cache tells about the changes of this process too
+        _local_changes = set()
+        if _graph is not None and _graph.version == version:
+            return _graph
+
+        if _graph is not None and _graph.version is not None and 0 < version - _graph.version <= REFERENCE_GRAPH_MAX_CHANGES:
+            changes = cache.get_many([ REFERENCE_GRAPH_CHANGE_KEY % v for v in range(_graph.version + 1, version + 1) ])
+            if len(changes) == version - _graph.version and all(c is not None for c in changes.values()):
+                _graph.update(set(doc_id for c in changes.values() for doc_id in c))
+                _graph.version = version
+                return _graph
+
+        _graph = ReferenceGraph(ReferenceGraph.relations(), version)
+        return _graph
+
+_collected = local()
+
+@contextmanager
+def collect_reference_graph_changes():
+    """Collect the changes announced within the block instead of announcing
+    each of them.  Yields a set that gets the ids of the changed documents,
+    and None if the whole graph has to be rebuilt; it's up to the caller to
+    announce them, once."""
+    previous = getattr(_collected, "changes", None)
+    changes = _collected.changes = set()
+    try:
+        yield changes
+    finally:
+        _collected.changes = previous
+
+def announce_reference_graph_changes(changes):
+    """Announce changes gathered by collect_reference_graph_changes()"""
+    if None in changes:
+        reference_graph_changed(None)
+    elif changes:
+        reference_graph_changed(changes)
+
+def reference_graph_changed(source_ids=None):
+    """Announce a change to the outgoing relations of the given documents
+    once the current transaction commits.  None means that the whole graph
+    has to be rebuilt, e.g. because an alias moved to another document."""
+    collected = getattr(_collected, "changes", None)
+    if collected is not None:
+        if source_ids is None:
+            collected.add(None)
+        else:
+            collected.update(source_ids)
+        return
+
+    def note_local_change():
+        with _graph_lock:
+            if source_ids is None or len(_local_changes) > REFERENCE_GRAPH_MAX_CHANGES:
+                _local_changes.clear()
+                _local_changes.add(None)
+            else:
+                _local_changes.update(source_ids)
+    # now, for this process, and on commit, in case the graph was reloaded
+    # in between
+    note_local_change()
+
+    def announce():
+        note_local_change()
+        if source_ids is not None:
+            # a process catching up before the change is stored finds it
+            # missing, and rebuilds
+            try:
+                version = cache.incr(REFERENCE_GRAPH_VERSION_KEY)
+            except ValueError:
+                return # nobody has built a graph yet
+            cache.set(REFERENCE_GRAPH_CHANGE_KEY % version, list(set(source_ids)), REFERENCE_GRAPH_CACHE_TIMEOUT)
+        else:
+            # an unknown version makes everybody rebuild
+            cache.delete(REFERENCE_GRAPH_VERSION_KEY)
+    transaction.on_commit(announce)
+
+def reference_targets_changed(alias_ids):
+    """Announce a change to the documents behind the given aliases, which
+    changes the relations pointing at the aliases"""
+    source_ids = set(RelatedDocument.objects.filter(target__in=alias_ids, relationship__in=GRAPH_RELATIONSHIPS).values_list('source_id', flat=True))
+    if source_ids:
+        reference_graph_changed(source_ids)
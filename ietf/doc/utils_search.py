@@ -5,15 +5,21 @@ import re
 import datetime
 import debug                            # pyflakes:ignore
 
+from collections import defaultdict
 from zoneinfo import ZoneInfo
 
 from django.conf import settings
+from django.db.models import Case, When, Value, IntegerField, Q
+from django.utils import timezone
 
 from ietf.doc.models import Document, DocAlias, RelatedDocument, DocEvent, TelechatDocEvent, BallotDocEvent
+from ietf.doc.models import DocumentAuthor, DocumentSearchIndex, DocAliasSearchToken
+from ietf.person.models import Alias, Email
 from ietf.doc.expire import expirable_drafts
 from ietf.doc.utils import augment_docs_and_user_with_user_info
 from ietf.meeting.models import SessionPresentation, Meeting, Session
 from ietf.review.utils import review_assignments_to_list_for_docs
+from ietf.utils.text import prefix_search_tokens
 from ietf.utils.timezone import date_today
 
 
@@ -163,22 +169,29 @@ def augment_docs_with_related_docs_info(docs):
             originalDoc = d.related_that_doc('conflrev')[0].document
             d.pages = originalDoc.pages
             
-def prepare_document_table(request, docs, query=None, max_results=200):
+def prepare_document_table(request, docs, query=None, max_results=200, page=None):
     """Take a queryset of documents and a QueryDict with sorting info
     and return list of documents with attributes filled in for
     displaying a full table of information about the documents, plus
-    dict with information about the columns."""
+    dict with information about the columns.
 
+    If page is given, the documents are split into pages of max_results,
+    and the meta dict has links to the next and previous page."""
+
+    # fetch one more document than shown, to tell whether there are more
+    start = (page - 1) * max_results if page else 0
     if not isinstance(docs, list):
         # evaluate and fill in attribute results immediately to decrease
         # the number of queries
         docs = docs.select_related("ad", "std_level", "intended_std_level", "group", "stream", "shepherd", )
         docs = docs.prefetch_related("states__type", "tags", "groupmilestone_set__group", "reviewrequest_set__team",
                                      "ad__email_set", "docalias__iprdocrel_set")
-        docs = docs[:max_results] # <- that is still a queryset, but with a LIMIT now
+        docs = docs[start:start + max_results + 1] # <- that is still a queryset, but with a LIMIT now
         docs = list(docs)
     else:
-        docs = docs[:max_results]
+        docs = docs[start:start + max_results + 1]
+    more_results = len(docs) > max_results
+    docs = docs[:max_results]
 
     fill_in_document_table_attributes(docs)
     augment_docs_and_user_with_user_info(docs, request.user)
@@ -238,7 +251,7 @@ def prepare_document_table(request, docs, query=None, max_results=200):
     docs.sort(key=generate_sort_key, reverse=sort_reversed)
 
     # fill in a meta dict with some information for rendering the table
-    if len(docs) == max_results:
+    if more_results and not page:
         meta['max'] = max_results
 
     meta['headers'] = [{'title': 'Document', 'key':'document'},
@@ -263,4 +276,117 @@ def prepare_document_table(request, docs, query=None, max_results=200):
             else:
                 d["sort"] = h["key"]
 
+        if page:
+            meta['page'] = page
+            d = query.copy()
+            if page > 1:
+                d["page"] = page - 1
+                meta['previous_url'] = "?" + d.urlencode()
+            if more_results:
+                d["page"] = page + 1
+                meta['next_url'] = "?" + d.urlencode()
+
     return (docs, meta)
+
+
+def search_index_text(values):
+    """Join values into the lower-cased, line-separated form stored in the
+    search index, where a line can be matched exactly with "\\n<value>\\n"."""
+    return "\n" + "\n".join(v.lower() for v in values if v) + "\n"
+
+def update_document_search_index(doc_ids, create=True, batch_size=1000):
+    """Rebuild the search index entries of the given documents, only updating
+    existing entries if create is False"""
+    doc_ids = list(doc_ids)
+    for i in range(0, len(doc_ids), batch_size):
+        batch = doc_ids[i:i+batch_size]
+
+        names = defaultdict(list)
+        for doc_id, name in DocAlias.objects.filter(docs__in=batch).values_list("docs", "name"):
+            names[doc_id].append(name)
+
+        author_person_ids = defaultdict(list)
+        for doc_id, person_id in DocumentAuthor.objects.filter(document__in=batch).order_by("order").values_list("document_id", "person_id"):
+            author_person_ids[doc_id].append(person_id)
+        person_text = defaultdict(list)
+        person_ids = set(p for l in author_person_ids.values() for p in l)
+        for person_id, name in Alias.objects.filter(person__in=person_ids).values_list("person_id", "name"):
+            person_text[person_id].append(name)
+        for person_id, address in Email.objects.filter(person__in=person_ids).values_list("person_id", "address"):
+            person_text[person_id].append(address)
+
+        states = defaultdict(list)
+        for doc_id, slug, name in Document.states.through.objects.filter(document__in=batch).values_list("document_id", "state__slug", "state__name"):
+            states[doc_id].extend([slug, name])
+
+        existing = set(DocumentSearchIndex.objects.filter(document__in=batch).values_list("document_id", flat=True))
+        now = timezone.now()
+        created, updated, found = [], [], set()
+        for doc_id, name, title, abstract in Document.objects.filter(pk__in=batch).values_list("pk", "name", "title", "abstract"):
+            found.add(doc_id)
+            entry = DocumentSearchIndex(
+                document_id=doc_id,
+                names=search_index_text([name] + sorted(set(names[doc_id]) - set([name]))),
+                title=(title or "").lower(),
+                abstract=(abstract or "").lower(),
+                authors=search_index_text(t for p in author_person_ids[doc_id] for t in person_text[p]),
+                states=search_index_text(states[doc_id]),
+                time=now,
+            )
+            if doc_id in existing:
+                updated.append(entry)
+            elif create:
+                created.append(entry)
+
+        DocumentSearchIndex.objects.bulk_create(created)
+        DocumentSearchIndex.objects.bulk_update(updated, ["names", "title", "abstract", "authors", "states", "time"])
+        DocumentSearchIndex.objects.filter(document__in=set(batch) - found).delete()
+
+def update_docalias_search_tokens(alias_ids, batch_size=1000):
+    """Bring the autocompletion tokens of the given document aliases up to
+    date, only writing the tokens that have changed"""
+    alias_ids = list(set(alias_ids))
+    for i in range(0, len(alias_ids), batch_size):
+        batch = alias_ids[i:i+batch_size]
+        wanted = set()
+        for alias_id, name in DocAlias.objects.filter(pk__in=batch).values_list("pk", "name"):
+            wanted.update((alias_id, t) for t in prefix_search_tokens(name))
+        existing = set()
+        stale = []
+        for pk, alias_id, token in DocAliasSearchToken.objects.filter(alias__in=batch).values_list("pk", "alias_id", "token"):
+            if (alias_id, token) in wanted and (alias_id, token) not in existing:
+                existing.add((alias_id, token))
+            else:
+                stale.append(pk)
+        DocAliasSearchToken.objects.filter(pk__in=stale).delete()
+        DocAliasSearchToken.objects.bulk_create([ DocAliasSearchToken(alias_id=alias_id, token=token) for alias_id, token in wanted - existing ])
+
+def docalias_tokens_matching(terms):
+    """Return one queryset of DocAliasSearchToken per term, each selecting
+    the tokens with a word starting with the term"""
+    # the tokens are lower-case already, but unlike startswith, istartswith
+    # can use the index on MySQL
+    return [ DocAliasSearchToken.objects.filter(token__istartswith=t.lower()) for t in terms ]
+
+def search_index_matching(text, fields):
+    """Return the ids of the documents where any of the fields in the search
+    index contains text, as a subquery"""
+    text = text.lower()
+    q = Q()
+    for f in fields:
+        q |= Q(**{f + "__contains": text})
+    return DocumentSearchIndex.objects.filter(q).values("document")
+
+def rank_search_results(docs, text):
+    """Annotate docs with a search_rank for how well they match text, and
+    order them by it: exact name or alias matches first, then partial name
+    matches, then title matches, then the rest"""
+    text = text.lower()
+    rank = Case(
+        When(search_index__names__contains="\n%s\n" % text, then=Value(3)),
+        When(search_index__names__contains=text, then=Value(2)),
+        When(search_index__title__contains=text, then=Value(1)),
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+    return docs.annotate(search_rank=rank).order_by("-search_rank", "-time", "name")
@@ -40,6 +40,7 @@ import json
 import os
 import re
 
+from collections import defaultdict
 from urllib.parse import quote
 from pathlib import Path
 
@@ -50,6 +51,8 @@ from django.urls import reverse as urlreverse
 from django.conf import settings
 from django import forms
 from django.contrib.staticfiles import finders
+from django.core.cache import cache
+from django.views.decorators.http import condition
 
 
 import debug                            # pyflakes:ignore
@@ -65,8 +68,9 @@ from ietf.doc.utils import (add_links_in_new_revision_events, augment_events_wit
     add_events_message_info, get_unicode_document_content,
     augment_docs_and_user_with_user_info, irsg_needed_ballot_positions, add_action_holder_change_event,
     build_file_urls, update_documentauthors, fuzzy_find_documents,
-    bibxml_for_draft)
+    bibxml_for_draft, document_etag, document_last_modified, DOCUMENT_CACHE_TIMEOUT)
 from ietf.doc.utils_bofreq import bofreq_editors, bofreq_responsible
+from ietf.doc.utils_references import get_reference_graph, REFERENCE_RELATIONSHIPS
 from ietf.group.models import Role, Group
 from ietf.group.utils import can_manage_all_groups_of_type, can_manage_materials, group_features_role_filter
 from ietf.ietfauth.utils import ( has_role, is_authorized_in_doc_stream, user_is_person,
@@ -89,6 +93,12 @@ from ietf.utils.timezone import date_today
 
 
 def render_document_top(request, doc, tab, name):
+    doc_id = doc.doc_id if isinstance(doc, DocHistory) else doc.pk
+    cache_key = "doc:document:top:%s" % document_etag(doc_id, type(doc).__name__, doc.rev, tab, name)
+    top = cache.get(cache_key)
+    if top is not None:
+        return top
+
     tabs = []
     tabs.append(("Status", "status", urlreverse("ietf.doc.views_doc.document_main", kwargs=dict(name=name)), True, None))
 
@@ -115,11 +125,13 @@ def render_document_top(request, doc, tab, name):
     else:
         name += "-" + doc.rev
 
-    return render_to_string("doc/document_top.html",
-                            dict(doc=doc,
-                                 tabs=tabs,
-                                 selected=tab,
-                                 name=name))
+    top = render_to_string("doc/document_top.html",
+                           dict(doc=doc,
+                                tabs=tabs,
+                                selected=tab,
+                                name=name))
+    cache.set(cache_key, top, DOCUMENT_CACHE_TIMEOUT)
+    return top
 
 def interesting_doc_relations(doc):
 
@@ -141,8 +153,41 @@ def interesting_doc_relations(doc):
 
     return interesting_relations_that, interesting_relations_that_doc
 
+def document_page_etag(request, name, rev=None, **kwargs):
+    """ETag for the document pages that vary with the user and their
+    preferences, which both come from the cookies"""
+    doc_id = DocAlias.objects.filter(name=name).values_list("docs", flat=True).first()
+    if doc_id is None:
+        return None
+    return document_etag(doc_id, request.get_full_path(), sorted(kwargs.items()),
+                         sorted(request.COOKIES.items()), date_today())
+
+def document_json_etag(request, name, rev=None):
+    doc_id = DocAlias.objects.filter(name=name).values_list("docs", flat=True).first()
+    if doc_id is None:
+        return None
+    return document_etag(doc_id, "json")
+
+def document_json_last_modified(request, name, rev=None):
+    doc_id = DocAlias.objects.filter(name=name).values_list("docs", flat=True).first()
+    if doc_id is None:
+        return None
+    return document_last_modified(doc_id)
+
+def cached_document_section(doc_id, section, compute, *parts):
+    """Return the value compute() gives for a section of a document page
+    that doesn't depend on the user, cached until the document changes"""
+    cache_key = "doc:document:section:%s" % document_etag(doc_id, section, *parts)
+    value = cache.get(cache_key)
+    if value is None:
+        value = compute()
+        cache.set(cache_key, value, DOCUMENT_CACHE_TIMEOUT)
+    return value
+
+@condition(etag_func=document_page_etag)
 def document_main(request, name, rev=None, document_html=False):
     doc = get_object_or_404(Document.objects.select_related(), docalias__name=name)
+    doc_pk = doc.pk
 
     # take care of possible redirections
     aliases = DocAlias.objects.filter(docs=doc).values_list("name", flat=True)
@@ -151,12 +196,15 @@ def document_main(request, name, rev=None, document_html=False):
             if a.startswith("rfc"):
                 return redirect("ietf.doc.views_doc.document_main", name=a)
     
-    revisions = []
-    for h in doc.history_set.order_by("time", "id"):
-        if h.rev and not h.rev in revisions:
-            revisions.append(h.rev)
-    if not doc.rev in revisions:
-        revisions.append(doc.rev)
+    def history_revisions():
+        revisions = []
+        for h in doc.history_set.order_by("time", "id"):
+            if h.rev and not h.rev in revisions:
+                revisions.append(h.rev)
+        if not doc.rev in revisions:
+            revisions.append(doc.rev)
+        return revisions
+    revisions = cached_document_section(doc_pk, "revisions", history_revisions)
     latest_rev = doc.rev
 
     snapshot = False
@@ -268,17 +316,22 @@ def document_main(request, name, rev=None, document_html=False):
             latest_revision = doc.latest_event(NewRevisionDocEvent, type="new_revision")
 
         # ballot
-        iesg_ballot_summary = None
-        irsg_ballot_summary = None
-        due_date = None
-        if (iesg_state_slug in IESG_BALLOT_ACTIVE_STATES) or irsg_state:
-            active_ballot = doc.active_ballot()
-            if active_ballot:
-                if irsg_state:
-                    irsg_ballot_summary = irsg_needed_ballot_positions(doc, list(active_ballot.active_balloter_positions().values()))
-                    due_date=active_ballot.irsgballotdocevent.duedate
-                else:
-                    iesg_ballot_summary = needed_ballot_positions(doc, list(active_ballot.active_balloter_positions().values()))
+        def ballot_summaries():
+            iesg_ballot_summary = None
+            irsg_ballot_summary = None
+            due_date = None
+            if (iesg_state_slug in IESG_BALLOT_ACTIVE_STATES) or irsg_state:
+                active_ballot = doc.active_ballot()
+                if active_ballot:
+                    if irsg_state:
+                        irsg_ballot_summary = irsg_needed_ballot_positions(doc, list(active_ballot.active_balloter_positions().values()))
+                        due_date=active_ballot.irsgballotdocevent.duedate
+                    else:
+                        iesg_ballot_summary = needed_ballot_positions(doc, list(active_ballot.active_balloter_positions().values()))
+            return iesg_ballot_summary, irsg_ballot_summary, due_date
+        iesg_ballot_summary, irsg_ballot_summary, due_date = cached_document_section(doc_pk, "ballot", ballot_summaries, doc.rev, snapshot)
+
+        related_ipr = cached_document_section(doc_pk, "ipr", lambda: list(doc.related_ipr()))
 
         # submission
         submission = ""
@@ -425,8 +478,9 @@ def document_main(request, name, rev=None, document_html=False):
         published = doc.latest_event(type="published_rfc")
         started_iesg_process = doc.latest_event(type="started_iesg_process")
 
-        review_assignments = review_assignments_to_list_for_docs([doc]).get(doc.name, [])
-        no_review_from_teams = no_review_from_teams_on_doc(doc, rev or doc.rev)
+        review_assignments, no_review_from_teams = cached_document_section(doc_pk, "reviews",
+            lambda: (review_assignments_to_list_for_docs([doc]).get(doc.name, []), list(no_review_from_teams_on_doc(doc, rev or doc.rev))),
+            rev or doc.rev)
 
         exp_comment = doc.latest_event(IanaExpertDocEvent,type="comment")
         iana_experts_comment = exp_comment and exp_comment.desc
@@ -533,6 +587,7 @@ def document_main(request, name, rev=None, document_html=False):
                                        review_assignments=review_assignments,
                                        no_review_from_teams=no_review_from_teams,
                                        due_date=due_date,
+                                       related_ipr=related_ipr,
                                        ))
 
     if doc.type_id == "charter":
@@ -901,51 +956,57 @@ def document_email(request,name):
                  )
 
 
+@condition(etag_func=document_page_etag)
 def document_history(request, name):
     doc = get_object_or_404(Document, docalias__name=name)
     top = render_document_top(request, doc, "history", name)
 
-    # pick up revisions from events
-    diff_revisions = []
-
-    diffable = [ name.startswith(prefix) for prefix in ["rfc", "draft", "charter", "conflict-review", "status-change", ]]
-    if any(diffable):
-        diff_documents = [ doc ]
-        diff_documents.extend(Document.objects.filter(docalias__relateddocument__source=doc, docalias__relateddocument__relationship="replaces"))
-
-        if doc.get_state_slug() == "rfc":
-            e = doc.latest_event(type="published_rfc")
-            aliases = doc.docalias.filter(name__startswith="rfc")
-            if aliases:
-                name = aliases[0].name
-            diff_revisions.append((name, "", e.time if e else doc.time, name))
-
-        seen = set()
-        for e in NewRevisionDocEvent.objects.filter(type="new_revision", doc__in=diff_documents).select_related('doc').order_by("-time", "-id"):
-            if (e.doc.name, e.rev) in seen:
-                continue
-
-            seen.add((e.doc.name, e.rev))
-
-            url = ""
-            if name.startswith("charter"):
-                url = request.build_absolute_uri(urlreverse('ietf.doc.views_charter.charter_with_milestones_txt', kwargs=dict(name=e.doc.name, rev=e.rev)))
-            elif name.startswith("conflict-review"):
-                url = find_history_active_at(e.doc, e.time).get_href()
-            elif name.startswith("status-change"):
-                url = find_history_active_at(e.doc, e.time).get_href()
-            elif name.startswith("draft") or name.startswith("rfc"):
-                # rfcdiff tool has special support for IDs
-                url = e.doc.name + "-" + e.rev
-
-            diff_revisions.append((e.doc.name, e.rev, e.time, url))
-
-    # grab event history
-    events = doc.docevent_set.all().order_by("-time", "-id").select_related("by")
-
-    augment_events_with_revision(doc, events)
-    add_links_in_new_revision_events(doc, events, diff_revisions)
-    add_events_message_info(events)
+    def history_events(name):
+        # pick up revisions from events
+        diff_revisions = []
+
+        diffable = [ name.startswith(prefix) for prefix in ["rfc", "draft", "charter", "conflict-review", "status-change", ]]
+        if any(diffable):
+            diff_documents = [ doc ]
+            diff_documents.extend(Document.objects.filter(docalias__relateddocument__source=doc, docalias__relateddocument__relationship="replaces"))
+
+            if doc.get_state_slug() == "rfc":
+                e = doc.latest_event(type="published_rfc")
+                aliases = doc.docalias.filter(name__startswith="rfc")
+                if aliases:
+                    name = aliases[0].name
+                diff_revisions.append((name, "", e.time if e else doc.time, name))
+
+            seen = set()
+            for e in NewRevisionDocEvent.objects.filter(type="new_revision", doc__in=diff_documents).select_related('doc').order_by("-time", "-id"):
+                if (e.doc.name, e.rev) in seen:
+                    continue
+
+                seen.add((e.doc.name, e.rev))
+
+                url = ""
+                if name.startswith("charter"):
+                    url = request.build_absolute_uri(urlreverse('ietf.doc.views_charter.charter_with_milestones_txt', kwargs=dict(name=e.doc.name, rev=e.rev)))
+                elif name.startswith("conflict-review"):
+                    url = find_history_active_at(e.doc, e.time).get_href()
+                elif name.startswith("status-change"):
+                    url = find_history_active_at(e.doc, e.time).get_href()
+                elif name.startswith("draft") or name.startswith("rfc"):
+                    # rfcdiff tool has special support for IDs
+                    url = e.doc.name + "-" + e.rev
+
+                diff_revisions.append((e.doc.name, e.rev, e.time, url))
+
+        # grab event history
+        events = doc.docevent_set.all().order_by("-time", "-id").select_related("by")
+
+        augment_events_with_revision(doc, events)
+        add_links_in_new_revision_events(doc, events, diff_revisions)
+        add_events_message_info(events)
+        return diff_revisions, list(events)
+
+    # the charter diff urls are absolute
+    diff_revisions, events = cached_document_section(doc.pk, "history", lambda: history_events(name), name, request.get_host())
 
     # figure out if the current user can add a comment to the history
     if doc.type_id == "draft" and doc.group != None:
@@ -1141,24 +1202,49 @@ def document_shepherd_writeup_template(request, type):
 
 def document_references(request, name):
     doc = get_object_or_404(Document,docalias__name=name)
-    refs = doc.references()
+    refs = doc.references().select_related('target', 'relationship')
     return render(request, "doc/document_references.html",dict(doc=doc,refs=sorted(refs,key=lambda x:x.target.name),))
 
 def document_referenced_by(request, name):
     doc = get_object_or_404(Document,docalias__name=name)
-    refs = doc.referenced_by()
+    graph = get_reference_graph()
+
+    # find, name and sort the referencing RFCs and active drafts from the
+    # reference graph, and only load the ones on the page
+    relationships = defaultdict(set)
+    for source_id, relationship in graph.referenced_by(doc.pk):
+        relationships[source_id].add(relationship)
+    source_ids = set(Document.objects.filter(pk__in=list(relationships.keys()), states__type__slug='draft', states__slug__in=['rfc','active']).values_list('pk', flat=True))
+    names = dict(Document.objects.filter(pk__in=source_ids).values_list('pk', 'name'))
+    for doc_id, alias_name in DocAlias.objects.filter(docs__in=source_ids, name__startswith='rfc').order_by('name').values_list('docs', 'name'):
+        names[doc_id] = alias_name
+    def sort_key(source_id):
+        return (min(REFERENCE_RELATIONSHIPS.index(r) for r in relationships[source_id]), names[source_id])
+    source_ids = sorted(source_ids, key=sort_key)
+
     full = ( request.GET.get('full') != None )
-    numdocs = refs.count()
+    numdocs = len(source_ids)
     if not full and numdocs>250:
-       refs=refs[:250]
+       source_ids=source_ids[:250]
     else:
        numdocs=None
-    refs=sorted(refs,key=lambda x:(['refnorm','refinfo','refunk','refold'].index(x.relationship.slug),x.source.canonical_name()))
+
+    refs = list(RelatedDocument.objects.filter(target__docs=doc, source__in=source_ids, relationship__in=REFERENCE_RELATIONSHIPS)
+                .select_related('source', 'source__type', 'source__std_level', 'source__intended_std_level', 'target', 'relationship')
+                .prefetch_related('source__states'))
+    for ref in refs:
+        ref.source._canonical_name = names[ref.source_id]
+    refs.sort(key=lambda x:(REFERENCE_RELATIONSHIPS.index(x.relationship_id), names[x.source_id]))
+    # count the dependents the same way as the list, leaving out expired
+    # and replaced drafts
+    dependent_ids = list(graph.transitive_referenced_by(doc.pk).keys())
+    normative_dependents = Document.objects.filter(pk__in=dependent_ids, states__type__slug='draft', states__slug__in=['rfc','active']).count()
     return render(request, "doc/document_referenced_by.html",
                dict(alias_name=name,
                     doc=doc,
                     numdocs=numdocs,
                     refs=refs,
+                    normative_dependents=normative_dependents,
                     ))
 
 def document_ballot_content(request, doc, ballot_id, editable=True):
@@ -1296,9 +1382,15 @@ def ballot_popup(request, name, ballot_id):
                                    ))
 
 
+@condition(etag_func=document_json_etag, last_modified_func=document_json_last_modified)
 def document_json(request, name, rev=None):
     doc = get_object_or_404(Document, docalias__name=name)
 
+    cache_key = "doc:document:json:%s" % document_etag(doc.pk, "json")
+    content = cache.get(cache_key)
+    if content is not None:
+        return HttpResponse(content, content_type='application/json')
+
     def extract_name(s):
         return s.name if s else None
 
@@ -1344,7 +1436,9 @@ def document_json(request, name, rev=None):
             data["consensus"] = e.consensus if e else None
         data["stream"] = extract_name(doc.stream)
 
-    return HttpResponse(json.dumps(data, indent=2), content_type='application/json')
+    content = json.dumps(data, indent=2)
+    cache.set(cache_key, content, DOCUMENT_CACHE_TIMEOUT)
+    return HttpResponse(content, content_type='application/json')
 
 class AddCommentForm(forms.Form):
     comment = forms.CharField(required=True, widget=forms.Textarea, strip=False)
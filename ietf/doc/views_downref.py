@@ -17,7 +17,7 @@ def downref_registry(request):
     add_button = has_role(request.user, "Area Director") or has_role(request.user, "Secretariat")
     
     downref_doc_pairs = [ ]
-    downref_relations = RelatedDocument.objects.filter(relationship_id='downref-approval')
+    downref_relations = RelatedDocument.objects.filter(relationship_id='downref-approval').select_related('source', 'target')
     for rel in downref_relations:
         downref_doc_pairs.append((rel.target.document, rel.source))
 
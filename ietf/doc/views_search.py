@@ -43,7 +43,7 @@ from django import forms
 from django.conf import settings
 from django.core.cache import cache, caches
 from django.urls import reverse as urlreverse
-from django.db.models import Q
+from django.db.models import BooleanField, Case, Q, Value, When
 from django.http import Http404, HttpResponseBadRequest, HttpResponse, HttpResponseRedirect, QueryDict
 from django.shortcuts import render
 from django.utils import timezone
@@ -53,19 +53,19 @@ from django.utils.cache import _generate_cache_key # type: ignore
 
 import debug                            # pyflakes:ignore
 
-from ietf.doc.models import ( Document, DocHistory, DocAlias, State,
+from ietf.doc.models import ( Document, DocHistory, DocAlias, State, DocEvent,
     LastCallDocEvent, NewRevisionDocEvent, IESG_SUBSTATE_TAGS,
     IESG_BALLOT_ACTIVE_STATES, IESG_STATCHG_CONFLREV_ACTIVE_STATES,
     IESG_CHARTER_ACTIVE_STATES )
 from ietf.doc.fields import select2_id_doc_name_json
-from ietf.doc.utils import get_search_cache_key, augment_events_with_revision
+from ietf.doc.utils import get_search_cache_key, augment_events_with_revision, prefetch_latest_events
 from ietf.group.models import Group
 from ietf.idindex.index import active_drafts_index_by_group
 from ietf.name.models import DocTagName, DocTypeName, StreamName
 from ietf.person.models import Person
 from ietf.person.utils import get_active_ads
 from ietf.utils.draft_search import normalize_draftname
-from ietf.doc.utils_search import prepare_document_table
+from ietf.doc.utils_search import prepare_document_table, rank_search_results, search_index_matching, docalias_tokens_matching
 
 
 class SearchForm(forms.Form):
@@ -163,10 +163,11 @@ def retrieve_search_results(form, all_types=False):
 
         docs = Document.objects.filter(type__in=types)
 
-    # name
+    # name, looked up in the search index to avoid joining the alias
+    # table, with the best matches first
     if query["name"]:
-        docs = docs.filter(Q(docalias__name__icontains=query["name"]) |
-                           Q(title__icontains=query["name"])).distinct()
+        docs = docs.filter(pk__in=search_index_matching(query["name"], ["names", "title"]))
+        docs = rank_search_results(docs, query["name"])
 
     # rfc/active/old check buttons
     allowed_draft_states = []
@@ -177,16 +178,13 @@ def retrieve_search_results(form, all_types=False):
     if query["olddrafts"]:
         allowed_draft_states.extend(['repl', 'expired', 'auth-rm', 'ietf-rm'])
 
-    docs = docs.filter(Q(states__slug__in=allowed_draft_states) |
-                       ~Q(type__slug='draft')).distinct()
+    docs = docs.filter(Q(pk__in=Document.states.through.objects.filter(state__slug__in=allowed_draft_states).values("document")) |
+                       ~Q(type__slug='draft'))
 
     # radio choices
     by = query["by"]
     if by == "author":
-        docs = docs.filter(
-            Q(documentauthor__person__alias__name__icontains=query["author"]) |
-            Q(documentauthor__person__email__address__icontains=query["author"])
-        )
+        docs = docs.filter(pk__in=search_index_matching(query["author"], ["authors"]))
     elif by == "group":
         docs = docs.filter(group__acronym=query["group"])
     elif by == "area":
@@ -204,8 +202,14 @@ def retrieve_search_results(form, all_types=False):
     elif by == "stream":
         docs = docs.filter(stream=query["stream"])
 
+    # a stable order, so the results can be split into pages
+    if not docs.ordered:
+        docs = docs.order_by("-time", "name")
+
     return docs
 
+SEARCH_RESULTS_PER_PAGE = 200
+
 def search(request):
     if request.GET:
         # backwards compatibility
@@ -221,13 +225,19 @@ def search(request):
         if not form.is_valid():
             return HttpResponseBadRequest("form not valid: %s" % form.errors)
 
+        try:
+            page = max(1, int(get_params.get('page', 1)))
+        except ValueError:
+            return HttpResponseBadRequest("page not valid: %s" % get_params.get('page'))
+
         cache_key = get_search_cache_key(get_params)
         results = cache.get(cache_key)
         if not results:
             results = retrieve_search_results(form)
             cache.set(cache_key, results)
 
-        results, meta = prepare_document_table(request, results, get_params)
+        results, meta = prepare_document_table(request, results, get_params,
+                                               max_results=SEARCH_RESULTS_PER_PAGE, page=page)
         meta['searching'] = True
     else:
         form = SearchForm()
@@ -574,7 +584,9 @@ def ad_workload(request):
         ad.doc_now = defaultdict(list)
         ad.doc_prev = defaultdict(list)
 
-        for doc in retrieve_search_results(form):
+        docs = prefetch_latest_events(list(retrieve_search_results(form)),
+            (DocEvent, dict(type__in=("started_iesg_process", "changed_state"))))
+        for doc in docs:
             group_type = ad_dashboard_group_type(doc)
             if group_type and group_type in groups:
                 # Right now, anything with group_type "Document", such as a bofreq is not handled.
@@ -593,12 +605,8 @@ def ad_workload(request):
                 ad.counts[group_type][groups[group_type][group]] += 1
                 ad.doc_now[group_type][groups[group_type][group]].add(doc)
 
-                last_state_event = (
-                    doc.docevent_set.filter(
-                        Q(type="started_iesg_process") | Q(type="changed_state")
-                    )
-                    .order_by("-time")
-                    .first()
+                last_state_event = doc.latest_event(
+                    type__in=("started_iesg_process", "changed_state")
                 )
                 if (last_state_event is not None) and (right_now - last_state_event.time) > delta:
                     ad.prev[group_type][groups[group_type][group]] += 1
@@ -677,6 +685,7 @@ def docs_for_ad(request, name):
                        'sort': 'status',
                        'doctypes': list(DocTypeName.objects.filter(used=True).exclude(slug__in=('draft','liai-att')).values_list("pk", flat=True))})
     results, meta = prepare_document_table(request, retrieve_search_results(form), form.data, max_results=500)
+    prefetch_latest_events(results, (DocEvent, dict(type="changed_document")))
     results.sort(key=ad_dashboard_sort_key)
     del meta["headers"][-1]
     #
@@ -743,10 +752,10 @@ def drafts_in_iesg_process(request):
         docs = Document.objects.filter(type="draft", states=s).distinct().order_by("time").select_related("ad", "group", "group__parent")
         if docs:
             if s.slug == "lc":
+                docs = prefetch_latest_events(list(docs), (LastCallDocEvent, dict(type="sent_last_call")))
                 for d in docs:
                     e = d.latest_event(LastCallDocEvent, type="sent_last_call")
                     d.lc_expires = e.expires if e else datetime.datetime.min
-                docs = list(docs)
                 docs.sort(key=lambda d: d.lc_expires)
 
             grouped_docs.append((s, docs))
@@ -849,9 +858,16 @@ def ajax_select2_search_docs(request, model_name, doc_type):
         elif model == DocAlias:
             qs = qs.filter(docs__type=doc_type)
 
-        for t in q:
-            qs = qs.filter(name__icontains=t)
+        # each term has to match the start of a word in a name
+        for tokens in docalias_tokens_matching(q):
+            if model == Document:
+                qs = qs.filter(name__in=tokens.values("alias__name"))
+            elif model == DocAlias:
+                qs = qs.filter(pk__in=tokens.values("alias"))
+
+        # rank a name matching the whole search first
+        qs = qs.annotate(exact=Case(When(name__iexact=" ".join(q), then=Value(True)), default=Value(False), output_field=BooleanField()))
 
-        objs = qs.distinct().order_by("name")[:20]
+        objs = qs.distinct().order_by("-exact", "name")[:20]
 
     return HttpResponse(select2_id_doc_name_json(model, objs), content_type='application/json')
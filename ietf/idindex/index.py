@@ -8,9 +8,13 @@
 import datetime
 import os
 
+from collections import defaultdict
+
 from django.conf import settings
+from django.db.models import Max
 from django.template.loader import render_to_string
 from django.utils import timezone
+from django.utils.functional import cached_property
 
 import debug    # pyflakes:ignore
 
@@ -19,77 +23,232 @@ from ietf.doc.models import LastCallDocEvent, NewRevisionDocEvent
 from ietf.doc.models import IESG_SUBSTATE_TAGS
 from ietf.doc.templatetags.ietf_filters import clean_whitespace
 from ietf.group.models import Group
+from ietf.name.models import DocTagName
 from ietf.person.models import Person, Email
 
-def all_id_txt():
-    # this returns a lot of data so try to be efficient
-
-    # precalculations
-    revision_time = dict(NewRevisionDocEvent.objects.filter(type="new_revision", doc__name__startswith="draft-").order_by('time').values_list("doc__name", "time"))
-
-    def formatted_rev_date(name):
-        t = revision_time.get(name)
-        return t.strftime("%Y-%m-%d") if t else ""
-
-    rfc_aliases = dict(DocAlias.objects.filter(name__startswith="rfc",
-                                               docs__states=State.objects.get(type="draft", slug="rfc")).values_list("docs__name", "name"))
-
-    replacements = dict(RelatedDocument.objects.filter(target__docs__states=State.objects.get(type="draft", slug="repl"),
-                                                       relationship="replaces").values_list("target__name", "source__name"))
-
-
-    # we need a distinct to prevent the queries below from multiplying the result
-    all_ids = Document.objects.filter(type="draft").order_by('name').exclude(name__startswith="rfc").distinct()
-
-    res = ["\nInternet-Drafts Status Summary\n"]
-
-    def add_line(f1, f2, f3, f4):
-        # each line must have exactly 4 tab-separated fields
-        res.append(f1 + "\t" + f2 + "\t" + f3 + "\t" + f4)
-
 
+class IndexData(object):
+    """Draft data used by the index generators, loaded with a few bulk queries
+
+    Each kind of data is loaded the first time it is used, so one instance can
+    be passed to several generators without repeating any queries.
+
+    If doc_ids is given, revision times, last call expiry and authors are only
+    loaded for those drafts.
+    """
+    def __init__(self, doc_ids=None):
+        self.doc_ids = doc_ids
+
+    # data that is only loaded for the drafts in doc_ids, if given
+    per_draft_data = ("revision_times", "event_revision_times", "last_call_expires", "authors")
+
+    def _restrict(self, qs, field="doc_id"):
+        if self.doc_ids is not None:
+            qs = qs.filter(**{field + "__in": self.doc_ids})
+        return qs
+
+    def for_drafts(self, doc_ids):
+        """Return IndexData for the given drafts, sharing any data already loaded that isn't per draft"""
+        data = IndexData(doc_ids)
+        data.__dict__.update((k, v) for k, v in self.__dict__.items() if k not in self.per_draft_data and k != "doc_ids")
+        return data
+
+    @cached_property
+    def drafts(self):
+        """(id, name, rev) of all drafts, ordered by name"""
+        return list(Document.objects.filter(type="draft").exclude(name__startswith="rfc")
+                    .order_by('name').values_list("id", "name", "rev"))
+
+    @cached_property
+    def draft_fields(self):
+        """Document fields used in all_id2.txt, by document id"""
+        return dict((f[0], list(f[1:])) for f in
+                    Document.objects.filter(type="draft").exclude(name__startswith="rfc")
+                    .values_list("id", "rev", "title", "group_id", "ad_id", "intended_std_level_id", "shepherd_id"))
+
+    @cached_property
+    def states(self):
+        """Lists of states for each draft, by document id"""
+        states = dict((s.pk, s) for s in State.objects.all())
+        doc_states = defaultdict(list)
+        for doc_id, state_id in Document.states.through.objects.filter(document__type="draft").values_list("document_id", "state_id"):
+            doc_states[doc_id].append(states[state_id])
+        for l in doc_states.values():
+            l.sort(key=lambda s: (s.type_id, s.order))
+        return doc_states
+
+    def get_state(self, doc_id, state_type="draft"):
+        """Equivalent of Document.get_state()"""
+        state = None
+        for s in self.states.get(doc_id, []):
+            if s.type_id == state_type:
+                state = s
+        return state
+
+    @cached_property
+    def iesg_substate_tags(self):
+        """Names of the IESG substate tags of each draft, by document id"""
+        tag_names = dict((t.slug, t) for t in DocTagName.objects.filter(slug__in=IESG_SUBSTATE_TAGS))
+        tags = defaultdict(list)
+        for doc_id, tag_id in Document.tags.through.objects.filter(document__type="draft", doctagname__in=IESG_SUBSTATE_TAGS).values_list("document_id", "doctagname_id"):
+            tags[doc_id].append(tag_names[tag_id])
+        return dict((doc_id, [t.name for t in sorted(l, key=lambda t: (t.order, t.name))]) for doc_id, l in tags.items())
+
+    @cached_property
+    def revision_times(self):
+        """(initial, latest) new revision time, by draft name"""
+        times = {}
+        events = self._restrict(NewRevisionDocEvent.objects.filter(type="new_revision", doc__name__startswith="draft-"))
+        for name, time in events.order_by('time').values_list("doc__name", "time"):
+            initial = times[name][0] if name in times else time
+            times[name] = (initial, time)
+        return times
+
+    @cached_property
+    def event_revision_times(self):
+        """Latest new revision time according to any DocEvent, by draft name"""
+        events = self._restrict(DocEvent.objects.filter(type="new_revision", doc__name__startswith="draft-"))
+        return dict(events.order_by('time').values_list("doc__name", "time"))
+
+    @cached_property
+    def last_call_expires(self):
+        """Expiry of the latest last call, by document id"""
+        events = self._restrict(LastCallDocEvent.objects.filter(type="sent_last_call", doc__type="draft",
+                                                                doc__states__type="draft-iesg", doc__states__slug="lc"))
+        return dict(events.order_by("time", "id").values_list("doc_id", "expires"))
+
+    @cached_property
+    def rfc_aliases(self):
+        return dict(DocAlias.objects.filter(name__startswith="rfc",
+                                            docs__states=State.objects.get(type="draft", slug="rfc")).values_list("docs__name", "name"))
+
+    @cached_property
+    def replacements(self):
+        return dict(RelatedDocument.objects.filter(target__docs__states=State.objects.get(type="draft", slug="repl"),
+                                                   relationship="replaces").values_list("target__name", "source__name"))
+
+    @cached_property
+    def authors(self):
+        """DocumentAuthors of each draft in order, by document id"""
+        authors = defaultdict(list)
+        doc_authors = self._restrict(DocumentAuthor.objects.filter(document__type="draft"), "document_id")
+        for a in doc_authors.order_by("order").select_related("email", "person").iterator():
+            authors[a.document_id].append(a)
+        return authors
+
+    @cached_property
+    def author_signatures(self):
+        """(name, plain name, address) of the authors of each draft in order, by document id"""
+        signatures = defaultdict(list)
+        for doc_id, name, plain, address in (DocumentAuthor.objects.filter(document__type="draft").order_by("order")
+                                             .values_list("document_id", "person__name", "person__plain", "email_id")):
+            signatures[doc_id].append([name, plain, address])
+        return signatures
+
+    @cached_property
+    def group_signatures(self):
+        """(acronym, type, parent acronym, parent type) of each group, by group id"""
+        return dict((g[0], list(g[1:])) for g in
+                    Group.objects.values_list("id", "acronym", "type_id", "parent__acronym", "parent__type_id"))
+
+    @cached_property
+    def file_types(self):
+        return file_types_for_drafts()
+
+    @cached_property
+    def shepherds(self):
+        """Formatted shepherd addresses, by email pk"""
+        return dict((e.pk, e.formatted_ascii_email().replace('"', ''))
+                    for e in Email.objects.filter(shepherd_document_set__type="draft").select_related("person").distinct())
+
+    @cached_property
+    def ads(self):
+        """Formatted responsible AD addresses, by person pk"""
+        return dict((p.pk, p.formatted_ascii_email().replace('"', ''))
+                    for p in Person.objects.filter(ad_document_set__type="draft").distinct())
+
+
+def all_id_txt(data=None):
+    return "".join(all_id_txt_lines(data))
+
+def all_id_txt_entries(data, doc_id, name, rev):
+    """Return the lines for one draft in all_id.txt, as (section, line) tuples
+
+    The section is None for drafts in the IESG process, and otherwise the pk of
+    the draft state the draft is listed under.
+    """
     inactive_states = ["idexists", "pub", "watching", "dead"]
 
-    excludes = list(State.objects.filter(type="draft", slug__in=["rfc","repl"]))
-    includes = list(State.objects.filter(type="draft-iesg").exclude(slug__in=inactive_states))
-    in_iesg_process = all_ids.exclude(states__in=excludes).filter(states__in=includes).only("name", "rev")
+    t = data.revision_times.get(name)
+    rev_date = t[1].strftime("%Y-%m-%d") if t else ""
 
-    # handle those actively in the IESG process
-    for d in in_iesg_process:
-        state = d.get_state("draft-iesg").name
-        tags = d.tags.filter(slug__in=IESG_SUBSTATE_TAGS).values_list("name", flat=True)
+    def line(f1, f2, f3, f4):
+        # each line must have exactly 4 tab-separated fields
+        return f1 + "\t" + f2 + "\t" + f3 + "\t" + f4 + "\n"
+
+    states = data.states.get(doc_id, [])
+    in_iesg_process = (
+        not any(s.type_id == "draft" and s.slug in ("rfc", "repl") for s in states)
+        and any(s.type_id == "draft-iesg" and s.slug not in inactive_states for s in states)
+    )
+    if in_iesg_process:
+        state = data.get_state(doc_id, "draft-iesg").name
+        tags = data.iesg_substate_tags.get(doc_id)
         if tags:
             state += "::" + "::".join(tags)
-        add_line(d.name + "-" + d.rev,
-                 formatted_rev_date(d.name),
-                 "In IESG processing - ID Tracker state <" + state + ">",
-                 "",
-                 )
-
-
-    # handle the rest
+        return [(None, line(name + "-" + rev,
+                            rev_date,
+                            "In IESG processing - ID Tracker state <" + state + ">",
+                            "",
+                            ))]
+
+    entries = []
+    for s in states:
+        if s.type_id != "draft":
+            continue
+        state = s.name
+        last_field = ""
 
-    not_in_process = all_ids.exclude(pk__in=[d.pk for d in in_iesg_process])
+        if s.slug == "rfc":
+            a = data.rfc_aliases.get(name)
+            if a:
+                last_field = a[3:]
+        elif s.slug == "repl":
+            state += " replaced by " + data.replacements.get(name, "0")
+
+        entries.append((s.pk, line(name + "-" + rev,
+                                   rev_date,
+                                   state,
+                                   last_field,
+                                   )))
+    return entries
+
+def all_id_txt_lines(data=None, entries=None):
+    """Generate the lines of all_id.txt
+
+    entries can be a dict with the all_id_txt_entries() result for each draft
+    by document id, otherwise these are generated from data.
+    """
+    if data is None:
+        data = IndexData()
+
+    yield "\nInternet-Drafts Status Summary\n\n"
+
+    # first those actively in the IESG process, then the rest sorted by state
+    not_in_process = defaultdict(list)
+    for doc_id, name, rev in data.drafts:
+        if entries is None:
+            doc_entries = all_id_txt_entries(data, doc_id, name, rev)
+        else:
+            doc_entries = entries.get(doc_id, [])
+        for section, line in doc_entries:
+            if section is None:
+                yield line
+            else:
+                not_in_process[section].append(line)
 
     for s in State.objects.filter(type="draft").order_by("order"):
-        for name, rev in not_in_process.filter(states=s).values_list("name", "rev"):
-            state = s.name
-            last_field = ""
-
-            if s.slug == "rfc":
-                a = rfc_aliases.get(name)
-                if a:
-                    last_field = a[3:]
-            elif s.slug == "repl":
-                state += " replaced by " + replacements.get(name, "0")
-
-            add_line(name + "-" + rev,
-                     formatted_rev_date(name),
-                     state,
-                     last_field,
-                    )
-
-    return "\n".join(res) + "\n"
+        yield from not_in_process[s.pk]
 
 def file_types_for_drafts():
     """Look in the draft directory and return file types found as dict (name + rev -> [t1, t2, ...])."""
@@ -105,124 +264,202 @@ def file_types_for_drafts():
 
     return file_types
 
-def all_id2_txt():
-    # this returns a lot of data so try to be efficient
+def all_id2_txt(data=None):
+    return "".join(all_id2_txt_lines(data))
 
+def all_id2_drafts():
+    """Drafts with the related objects all_id2_txt_line() needs, ordered by name"""
     drafts = Document.objects.filter(type="draft").exclude(name__startswith="rfc").order_by('name')
-    drafts = drafts.select_related('group', 'group__parent', 'ad', 'intended_std_level', 'shepherd', )
-    drafts = drafts.prefetch_related("states")
-
-    rfc_aliases = dict(DocAlias.objects.filter(name__startswith="rfc",
-                                               docs__states=State.objects.get(type="draft", slug="rfc")).values_list("docs__name", "name"))
-
-    replacements = dict(RelatedDocument.objects.filter(target__docs__states=State.objects.get(type="draft", slug="repl"),
-                                                       relationship="replaces").values_list("target__name", "source__name"))
-
-    revision_time = dict(DocEvent.objects.filter(type="new_revision", doc__name__startswith="draft-").order_by('time').values_list("doc__name", "time"))
-
-    file_types = file_types_for_drafts()
-
-    authors = {}
-    for a in DocumentAuthor.objects.filter(document__name__startswith="draft-").order_by("order").select_related("email", "person").iterator():
-        if a.document.name not in authors:
-            l = authors[a.document.name] = []
-        else:
-            l = authors[a.document.name]
+    return drafts.select_related('group', 'group__parent', 'ad', 'intended_std_level', 'shepherd', )
+
+def all_id2_txt_lines(data=None, lines=None):
+    """Generate the lines of all_id2.txt
+
+    lines can be a dict with the all_id2_txt_line() result for each draft by
+    document id, otherwise these are generated from data.
+    """
+    if data is None:
+        data = IndexData()
+
+    # The template is rendered around a marker, so that the draft lines can be
+    # generated one at a time in between
+    marker = "\x00data\x00"
+    header, footer = render_to_string("idindex/all_id2.txt", {'data': marker }).split(marker)
+    yield header
+
+    if lines is not None:
+        draft_lines = (lines[doc_id] for doc_id, name, rev in data.drafts if doc_id in lines)
+    else:
+        draft_lines = (all_id2_txt_line(data, d) for d in all_id2_drafts().iterator())
+    for i, line in enumerate(draft_lines):
+        yield ("\n" if i else "") + line
+
+    yield footer
+
+def all_id2_txt_line(data, d):
+    """Return the line for one draft in all_id2.txt"""
+    draft_state = data.get_state(d.pk)
+    state = draft_state.slug if draft_state else None
+    iesg_state = data.get_state(d.pk, "draft-iesg")
+
+    fields = []
+    # 0
+    fields.append(d.name + "-" + d.rev)
+    # 1
+    fields.append("-1") # used to be internal numeric identifier, we don't have that anymore
+    # 2
+    fields.append(draft_state.name if state else "")
+    # 3
+    if state == "active":
+        s = "I-D Exists"
+        if iesg_state:
+            s = iesg_state.name
+            tags = data.iesg_substate_tags.get(d.pk)
+            if tags:
+                s += "::" + "::".join(tags)
+        fields.append(s)
+    else:
+        fields.append("")
+    # 4
+    rfc_number = ""
+    if state == "rfc":
+        a = data.rfc_aliases.get(d.name)
+        if a:
+            rfc_number = a[3:]
+    fields.append(rfc_number)
+    # 5
+    repl = ""
+    if state == "repl":
+        repl = data.replacements.get(d.name, "")
+    fields.append(repl)
+    # 6
+    t = data.event_revision_times.get(d.name)
+    fields.append(t.strftime("%Y-%m-%d") if t else "")
+    # 7
+    group_acronym = ""
+    if d.group and d.group.type_id != "area" and d.group.acronym != "none":
+        group_acronym = d.group.acronym
+    fields.append(group_acronym)
+    # 8
+    area = ""
+    if d.group:
+        if d.group.type_id == "area":
+            area = d.group.acronym
+        elif d.group.type_id == "wg" and d.group.parent and d.group.parent.type_id == "area":
+            area = d.group.parent.acronym
+    fields.append(area)
+    # 9 responsible AD name
+    fields.append(str(d.ad) if d.ad else "")
+    # 10
+    fields.append(d.intended_std_level.name if d.intended_std_level else "")
+    # 11
+    lc_expires = ""
+    if iesg_state and iesg_state.slug == "lc":
+        expires = data.last_call_expires.get(d.pk)
+        if expires:
+            lc_expires = expires.strftime("%Y-%m-%d")
+    fields.append(lc_expires)
+    # 12
+    doc_file_types = data.file_types.get(d.name + "-" + d.rev, [])
+    doc_file_types.sort()           # make the order consistent (and the result testable)
+    fields.append(",".join(doc_file_types) if state == "active" else "")
+    # 13
+    fields.append(clean_whitespace(d.title)) # FIXME: we should make sure this is okay in the database and in submit
+    # 14
+    authors = []
+    for a in data.authors.get(d.pk, []):
         if a.email:
-            l.append('%s <%s>' % (a.person.plain_name().replace("@", ""), a.email.address.replace(",", "")))
+            authors.append('%s <%s>' % (a.person.plain_name().replace("@", ""), a.email.address.replace(",", "")))
         else:
-            l.append(a.person.plain_name())
-
-    shepherds = dict((e.pk, e.formatted_ascii_email().replace('"', ''))
-                     for e in Email.objects.filter(shepherd_document_set__type="draft").select_related("person").distinct())
-    ads = dict((p.pk, p.formatted_ascii_email().replace('"', ''))
-               for p in Person.objects.filter(ad_document_set__type="draft").distinct())
-
-    res = []
-    for d in drafts:
-        state = d.get_state_slug()
-        iesg_state = d.get_state("draft-iesg")
-
-        fields = []
-        # 0
-        fields.append(d.name + "-" + d.rev)
-        # 1
-        fields.append("-1") # used to be internal numeric identifier, we don't have that anymore
-        # 2
-        fields.append(d.get_state().name if state else "")
-        # 3
-        if state == "active":
-            s = "I-D Exists"
-            if iesg_state:
-                s = iesg_state.name
-                tags = d.tags.filter(slug__in=IESG_SUBSTATE_TAGS).values_list("name", flat=True)
-                if tags:
-                    s += "::" + "::".join(tags)
-            fields.append(s)
-        else:
-            fields.append("")
-        # 4
-        rfc_number = ""
-        if state == "rfc":
-            a = rfc_aliases.get(d.name)
-            if a:
-                rfc_number = a[3:]
-        fields.append(rfc_number)
-        # 5
-        repl = ""
-        if state == "repl":
-            repl = replacements.get(d.name, "")
-        fields.append(repl)
-        # 6
-        t = revision_time.get(d.name)
-        fields.append(t.strftime("%Y-%m-%d") if t else "")
-        # 7
-        group_acronym = ""
-        if d.group and d.group.type_id != "area" and d.group.acronym != "none":
-            group_acronym = d.group.acronym
-        fields.append(group_acronym)
-        # 8
-        area = ""
-        if d.group:
-            if d.group.type_id == "area":
-                area = d.group.acronym
-            elif d.group.type_id == "wg" and d.group.parent and d.group.parent.type_id == "area":
-                area = d.group.parent.acronym
-        fields.append(area)
-        # 9 responsible AD name
-        fields.append(str(d.ad) if d.ad else "")
-        # 10
-        fields.append(d.intended_std_level.name if d.intended_std_level else "")
-        # 11
-        lc_expires = ""
-        if iesg_state and iesg_state.slug == "lc":
-            e = d.latest_event(LastCallDocEvent, type="sent_last_call")
-            if e:
-                lc_expires = e.expires.strftime("%Y-%m-%d")
-        fields.append(lc_expires)
-        # 12
-        doc_file_types = file_types.get(d.name + "-" + d.rev, [])
-        doc_file_types.sort()           # make the order consistent (and the result testable)
-        fields.append(",".join(doc_file_types) if state == "active" else "")
-        # 13
-        fields.append(clean_whitespace(d.title)) # FIXME: we should make sure this is okay in the database and in submit
-        # 14
-        fields.append(", ".join(authors.get(d.name, [])))
-        # 15
-        fields.append(shepherds.get(d.shepherd_id, ""))
-        # 16 Responsible AD name and email
-        fields.append(ads.get(d.ad_id, ""))
-
-        #
-        res.append("\t".join(fields))
-
-    return render_to_string("idindex/all_id2.txt", {'data': "\n".join(res) })
-
-def active_drafts_index_by_group(extra_values=()):
+            authors.append(a.person.plain_name())
+    fields.append(", ".join(authors))
+    # 15
+    fields.append(data.shepherds.get(d.shepherd_id, ""))
+    # 16 Responsible AD name and email
+    fields.append(data.ads.get(d.ad_id, ""))
+
+    #
+    return "\t".join(fields)
+
+INDEX_STATE_VERSION = 2
+
+def draft_signature(data, doc_id, name, rev):
+    """Values that the index lines of a draft depend on, and that can change without a DocEvent"""
+    fields = data.draft_fields.get(doc_id, [None] * 6)
+    group_id, ad_id, shepherd_id = fields[2], fields[3], fields[5]
+    return fields + [
+        data.group_signatures.get(group_id),
+        data.author_signatures.get(doc_id, []),
+        [s.pk for s in data.states.get(doc_id, [])],
+        data.iesg_substate_tags.get(doc_id, []),
+        data.rfc_aliases.get(name),
+        data.replacements.get(name),
+        sorted(data.file_types.get(name + "-" + rev, [])),
+        data.shepherds.get(shepherd_id),
+        data.ads.get(ad_id),
+    ]
+
+def update_index_state(data, state=None):
+    """Return the all_id.txt and all_id2.txt lines of each draft, reusing those in state where possible
+
+    The state is a dict as returned by this function, and can be saved as
+    JSON between runs.  Drafts are only rendered again if they are new, have
+    DocEvents newer than those seen for the state, or if their signature has
+    changed.  The data should not have been used before, so that no DocEvents
+    are missed.
+    """
+    high_water = DocEvent.objects.aggregate(Max("id"))["id__max"] or 0
+
+    sigs = dict((doc_id, draft_signature(data, doc_id, name, rev)) for doc_id, name, rev in data.drafts)
+
+    if state is None or state.get("version") != INDEX_STATE_VERSION:
+        old = {}
+        changed_ids = None
+    else:
+        old = state["drafts"]
+        recent = set(DocEvent.objects.filter(id__gt=state["high_water"], id__lte=high_water).values_list("doc_id", flat=True))
+        changed_ids = set(doc_id for doc_id, sig in sigs.items()
+                          if doc_id in recent or str(doc_id) not in old or old[str(doc_id)]["sig"] != sig)
+
+    new = {}
+    for doc_id, sig in sigs.items():
+        key = str(doc_id)
+        if changed_ids is not None and doc_id not in changed_ids and key in old:
+            new[key] = old[key]
+
+    if changed_ids is None or changed_ids:
+        changed_data = data.for_drafts(changed_ids)
+        docs = all_id2_drafts()
+        if changed_ids is not None:
+            docs = docs.filter(pk__in=changed_ids)
+        for d in docs.iterator():
+            if d.pk in sigs:
+                new[str(d.pk)] = {
+                    "sig": sigs[d.pk],
+                    "all_id": all_id_txt_entries(changed_data, d.pk, d.name, d.rev),
+                    "all_id2": all_id2_txt_line(changed_data, d),
+                }
+
+    return {
+        "version": INDEX_STATE_VERSION,
+        "high_water": high_water,
+        "rendered": len(sigs) if changed_ids is None else len(changed_ids),
+        "drafts": new,
+    }
+
+def index_state_lines(state):
+    """Return the all_id.txt and all_id2.txt lines from state, in the form all_id_txt_lines() and all_id2_txt_lines() take them"""
+    entries = dict((int(k), v["all_id"]) for k, v in state["drafts"].items())
+    lines = dict((int(k), v["all_id2"]) for k, v in state["drafts"].items())
+    return entries, lines
+
+def active_drafts_index_by_group(extra_values=(), data=None):
     """Return active drafts grouped into their corresponding
     associated group, for spitting out draft index."""
 
     # this returns a lot of data so try to be efficient
+    if data is None:
+        data = IndexData()
 
     active_state = State.objects.get(type="draft", slug="active")
     wg_cand = State.objects.get(type="draft-stream-ietf", slug="wg-cand")
@@ -234,27 +471,22 @@ def active_drafts_index_by_group(extra_values=()):
     extracted_values = ("name", "rev", "title", "group_id") + extra_values
 
     docs_dict = dict((d["name"], d)
-                     for d in Document.objects.filter(states=active_state).values(*extracted_values))
+                     for d in Document.objects.filter(states=active_state).values("id", *extracted_values))
 
     # Special case for drafts with group set, but in state wg_cand:
     for d in Document.objects.filter(states=active_state).filter(states__in=[wg_cand, wg_adopt]):
         docs_dict[d.name]['group_id'] = individual.id
 
-    # add initial and latest revision time
-    for time, doc_name in NewRevisionDocEvent.objects.filter(type="new_revision", doc__states=active_state).order_by('-time').values_list("time", "doc__name"):
-        d = docs_dict.get(doc_name)
-        if d:
-            if "rev_time" not in d:
-                d["rev_time"] = time
-            d["initial_rev_time"] = time
-
-    # add authors
-    for a in DocumentAuthor.objects.filter(document__states=active_state).order_by("order").select_related("person"):
-        d = docs_dict.get(a.document.name)
-        if d:
-            if "authors" not in d:
-                d["authors"] = []
-            d["authors"].append(a.person.plain_ascii()) # This should probably change to .plain_name() when non-ascii names are permitted
+    for d in docs_dict.values():
+        # add initial and latest revision time
+        times = data.revision_times.get(d["name"])
+        if times:
+            d["initial_rev_time"], d["rev_time"] = times
+
+        # add authors
+        authors = data.authors.get(d.pop("id"))
+        if authors:
+            d["authors"] = [a.person.plain_ascii() for a in authors] # This should probably change to .plain_name() when non-ascii names are permitted
 
     # put docs into groups
     for d in docs_dict.values():
@@ -276,13 +508,15 @@ def active_drafts_index_by_group(extra_values=()):
 
     return groups
     
-def id_index_txt(with_abstracts=False):
+def id_index_txt(with_abstracts=False, data=None):
+    if data is None:
+        data = IndexData()
     extra_values = ()
     if with_abstracts:
         extra_values = ("abstract",)
-    groups = active_drafts_index_by_group(extra_values)
+    groups = active_drafts_index_by_group(extra_values, data)
 
-    file_types = file_types_for_drafts()
+    file_types = data.file_types
     for g in groups:
         for d in g.active_drafts:
             # we need to output a multiple extension thing
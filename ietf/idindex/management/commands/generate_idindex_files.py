@@ -0,0 +1,137 @@
+# Copyright The IETF Trust 2023, All Rights Reserved
+# -*- coding: utf-8 -*-
+
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+
+import debug                            # pyflakes:ignore
+
+from ietf.idindex.index import ( IndexData, all_id_txt_lines, all_id2_txt_lines, id_index_txt,
+    update_index_state, index_state_lines, )
+
+# Generation timestamps are ignored when checking whether a file has changed
+TIMESTAMP_RE = re.compile(r"\d{4}-\d\d-\d\d \d\d:\d\d:\d\d \w+")
+
+
+def content_hash(chunks):
+    h = hashlib.sha256()
+    for chunk in chunks:
+        h.update(TIMESTAMP_RE.sub("", chunk).encode("utf-8"))
+    return h.hexdigest()
+
+
+def file_hash(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return content_hash(f)
+    except (IOError, UnicodeDecodeError):
+        return None
+
+
+class Command(BaseCommand):
+    help = ('Generate the Internet-Draft index files all_id.txt, 1id-index.txt, 1id-abstracts.txt '
+            'and all_id2.txt in one go.  Each file can be written to several paths.  Files are '
+            'replaced atomically, and left alone if only the generation time would change.  With '
+            '--state, the per-draft lines of all_id.txt and all_id2.txt are saved between runs, and '
+            'only drafts which have changed since the last run are rendered again.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all-id', nargs='+', default=[], metavar='PATH', help="Paths to write all_id.txt to")
+        parser.add_argument('--id-index', nargs='+', default=[], metavar='PATH', help="Paths to write 1id-index.txt to")
+        parser.add_argument('--id-abstracts', nargs='+', default=[], metavar='PATH', help="Paths to write 1id-abstracts.txt to")
+        parser.add_argument('--all-id2', nargs='+', default=[], metavar='PATH', help="Paths to write all_id2.txt to")
+        parser.add_argument('--state', metavar='PATH', help="File to keep the per-draft lines in between runs")
+        parser.add_argument('--verify', action='store_true', default=False,
+            help="Check the incrementally generated files against a full rebuild, and use the latter if they differ")
+
+    def handle(self, *args, **options):
+        self.verbosity = options.get("verbosity", 1)
+        if not any(options[o] for o in ("all_id", "id_index", "id_abstracts", "all_id2")):
+            raise CommandError("No output paths given")
+
+        if options["verify"] and not options["state"]:
+            raise CommandError("--verify needs --state")
+
+        data = IndexData()
+        if options["state"]:
+            state = self.update_state(data, options["state"], options["verify"])
+            entries, lines = index_state_lines(state)
+            all_id = all_id_txt_lines(data, entries=entries)
+            all_id2 = all_id2_txt_lines(data, lines=lines)
+        else:
+            all_id = all_id_txt_lines(data)
+            all_id2 = all_id2_txt_lines(data)
+
+        if options["all_id"]:
+            self.write(all_id, options["all_id"])
+        if options["id_index"]:
+            self.write([id_index_txt(data=data)], options["id_index"])
+        if options["id_abstracts"]:
+            self.write([id_index_txt(with_abstracts=True, data=data)], options["id_abstracts"])
+        if options["all_id2"]:
+            self.write(all_id2, options["all_id2"])
+
+    def update_state(self, data, path, verify):
+        """Bring the per-draft lines saved at path up to date, and save them again"""
+        try:
+            with open(path, encoding="utf-8") as f:
+                state = json.load(f)
+        except (IOError, ValueError):
+            state = None
+
+        state = update_index_state(data, state)
+        if self.verbosity > 1:
+            self.stdout.write("Rendered %d of %d drafts" % (state["rendered"], len(state["drafts"])))
+
+        if verify:
+            entries, lines = index_state_lines(state)
+            for name, incremental, full in (
+                    ("all_id.txt", all_id_txt_lines(data, entries=entries), all_id_txt_lines(data)),
+                    ("all_id2.txt", all_id2_txt_lines(data, lines=lines), all_id2_txt_lines(data)), ):
+                if content_hash(incremental) != content_hash(full):
+                    self.stderr.write("Incrementally generated %s differs from a full rebuild, rebuilding the state" % name)
+                    high_water = state["high_water"]
+                    state = update_index_state(data, None)
+                    state["high_water"] = high_water
+                    break
+
+        fd, tmpname = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmpname, path)
+        return state
+
+    def write(self, chunks, paths):
+        """Stream chunks to a temporary file, then move it into place at the given paths"""
+        fd, tmpname = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(paths[0])), suffix=".tmp")
+        try:
+            h = hashlib.sha256()
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    h.update(TIMESTAMP_RE.sub("", chunk).encode("utf-8"))
+            new_hash = h.hexdigest()
+            os.chmod(tmpname, 0o644)
+
+            for path in paths:
+                if file_hash(path) == new_hash:
+                    if self.verbosity > 1:
+                        self.stdout.write("%s is unchanged" % path)
+                    continue
+                # Copy to the target directory first, so that the rename is atomic
+                fd, pathtmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+                os.close(fd)
+                shutil.copyfile(tmpname, pathtmp)
+                os.chmod(pathtmp, 0o644)
+                os.replace(pathtmp, path)
+                if self.verbosity > 1:
+                    self.stdout.write("Wrote %s" % path)
+        finally:
+            os.unlink(tmpname)
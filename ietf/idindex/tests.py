@@ -3,19 +3,26 @@
 
 
 import datetime
+import json
+import os
+import shutil
+import tempfile
 
+from io import StringIO
 from pathlib import Path
 
 from django.conf import settings
+from django.core.management import call_command
 from django.utils import timezone
 
 import debug    # pyflakes:ignore
 
 from ietf.doc.factories import WgDraftFactory
-from ietf.doc.models import Document, DocAlias, RelatedDocument, State, LastCallDocEvent, NewRevisionDocEvent
+from ietf.doc.models import Document, DocAlias, DocEvent, RelatedDocument, State, LastCallDocEvent, NewRevisionDocEvent
 from ietf.group.factories import GroupFactory
 from ietf.name.models import DocRelationshipName
-from ietf.idindex.index import all_id_txt, all_id2_txt, id_index_txt
+from ietf.idindex.index import IndexData, all_id_txt, all_id2_txt, id_index_txt
+from ietf.idindex.management.commands.generate_idindex_files import TIMESTAMP_RE
 from ietf.person.factories import PersonFactory, EmailFactory
 from ietf.utils.test_utils import TestCase
 
@@ -140,3 +147,104 @@ class IndexTests(TestCase):
         txt = id_index_txt(with_abstracts=True)
 
         self.assertTrue(draft.abstract[:20] in txt)
+
+    def test_generate_idindex_files(self):
+        draft = WgDraftFactory(states=[('draft','active'),('draft-iesg','lc')],abstract='a'*20,authors=[PersonFactory()])
+        outdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, outdir)
+        paths = dict((name, [os.path.join(outdir, name), os.path.join(outdir, 'copy-' + name)])
+                     for name in ('all_id.txt', '1id-index.txt', '1id-abstracts.txt', 'all_id2.txt'))
+
+        def generate():
+            call_command('generate_idindex_files',
+                         all_id=paths['all_id.txt'],
+                         id_index=paths['1id-index.txt'],
+                         id_abstracts=paths['1id-abstracts.txt'],
+                         all_id2=paths['all_id2.txt'])
+
+        generate()
+        for name, expected in (('all_id.txt', all_id_txt()), ('all_id2.txt', all_id2_txt())):
+            for path in paths[name]:
+                self.assertEqual(Path(path).read_text(), expected)
+        for path in paths['1id-abstracts.txt']:
+            self.assertIn(draft.abstract, Path(path).read_text())
+        self.assertEqual(sorted(os.listdir(outdir)), sorted(os.path.basename(p) for l in paths.values() for p in l))
+
+        # unchanged files are not rewritten, even though the generation time changes
+        for l in paths.values():
+            for path in l:
+                os.utime(path, (0, 0))
+        generate()
+        for l in paths.values():
+            for path in l:
+                self.assertEqual(os.stat(path).st_mtime, 0)
+
+        draft.title = 'A new title'
+        draft.save()
+        generate()
+        self.assertNotEqual(os.stat(paths['all_id2.txt'][0]).st_mtime, 0)
+        self.assertEqual(os.stat(paths['all_id.txt'][0]).st_mtime, 0)
+
+    def test_index_data_queries(self):
+        WgDraftFactory(states=[('draft','active'),('draft-iesg','lc')],authors=[PersonFactory()])
+        data = IndexData()
+        all_id_txt(data)
+        with self.assertNumQueries(1):
+            # only the list of draft states is queried again
+            all_id_txt(data)
+
+    def test_generate_idindex_files_incremental(self):
+        draft = WgDraftFactory(states=[('draft','active'),('draft-iesg','lc')],authors=[PersonFactory()])
+        other = WgDraftFactory(states=[('draft','active')])
+        outdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, outdir)
+        state_path = os.path.join(outdir, 'state.json')
+        all_id_path = os.path.join(outdir, 'all_id.txt')
+        all_id2_path = os.path.join(outdir, 'all_id2.txt')
+
+        def generate(**kwargs):
+            call_command('generate_idindex_files', all_id=[all_id_path], all_id2=[all_id2_path], state=state_path, **kwargs)
+            with open(state_path) as f:
+                return json.load(f)
+        def strip_timestamps(s):
+            return TIMESTAMP_RE.sub("", s)
+
+        state = generate()
+        self.assertEqual(state["rendered"], 2)
+        self.assertEqual(Path(all_id_path).read_text(), all_id_txt())
+        self.assertEqual(strip_timestamps(Path(all_id2_path).read_text()), strip_timestamps(all_id2_txt()))
+
+        # nothing changed
+        state = generate()
+        self.assertEqual(state["rendered"], 0)
+
+        # an author renaming themselves and the group moving to another area
+        author = draft.documentauthor_set.first().person
+        author.name = "Renamed Author"
+        author.plain = ""
+        author.save()
+        draft.group.parent = GroupFactory(type_id='area')
+        draft.group.save()
+        state = generate()
+        self.assertEqual(state["rendered"], 1)
+        self.assertEqual(strip_timestamps(Path(all_id2_path).read_text()), strip_timestamps(all_id2_txt()))
+        self.assertIn("Renamed Author", Path(all_id2_path).read_text())
+
+        # a new event, a state change without an event, and a new draft
+        draft.title = 'A new title'
+        draft.save_with_history([DocEvent.objects.create(doc=draft, rev=draft.rev, type="changed_document", by=PersonFactory(), desc="Changed title")])
+        other.set_state(State.objects.get(type='draft', slug='expired'))
+        WgDraftFactory(states=[('draft','active')])
+        state = generate(verify=True)
+        self.assertEqual(state["rendered"], 3)
+        self.assertEqual(Path(all_id_path).read_text(), all_id_txt())
+        self.assertEqual(strip_timestamps(Path(all_id2_path).read_text()), strip_timestamps(all_id2_txt()))
+
+        # a broken state is caught by --verify
+        state["drafts"][str(other.pk)]["all_id2"] = "garbage"
+        with open(state_path, "w") as f:
+            json.dump(state, f)
+        err = StringIO()
+        call_command('generate_idindex_files', all_id=[all_id_path], all_id2=[all_id2_path], state=state_path, verify=True, stderr=err)
+        self.assertIn("differs from a full rebuild", err.getvalue())
+        self.assertEqual(strip_timestamps(Path(all_id2_path).read_text()), strip_timestamps(all_id2_txt()))
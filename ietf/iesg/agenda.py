@@ -13,7 +13,8 @@ from django.http import Http404
 
 import debug                            # pyflakes:ignore
 
-from ietf.doc.models import Document, LastCallDocEvent, ConsensusDocEvent
+from ietf.doc.models import Document, DocEvent, LastCallDocEvent, ConsensusDocEvent, TelechatDocEvent, BallotDocEvent
+from ietf.doc.utils import prefetch_latest_events
 from ietf.doc.utils_search import fill_in_telechat_date
 from ietf.iesg.models import TelechatDate, TelechatAgendaItem
 from ietf.review.utils import review_assignments_to_list_for_docs
@@ -160,6 +161,14 @@ def fill_in_agenda_docs(date, sections, docs=None):
         docs = docs.select_related("stream", "group").distinct()
         fill_in_telechat_date(docs)
 
+    docs = prefetch_latest_events(list(docs),
+        (TelechatDocEvent, dict(type="scheduled_for_telechat")),
+        (BallotDocEvent, dict(type__in=("created_ballot", "closed_ballot"))),
+        (DocEvent, dict(type="started_iesg_process")),
+        (LastCallDocEvent, dict(type="sent_last_call")),
+        (ConsensusDocEvent, dict(type="changed_consensus")),
+    )
+
     review_assignments_for_docs = review_assignments_to_list_for_docs(docs)
 
     for doc in docs:
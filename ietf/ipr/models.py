@@ -4,6 +4,7 @@
 
 from django.conf import settings
 from django.db import models
+from django.db.models import signals
 from django.urls import reverse
 from django.utils import timezone
 
@@ -257,3 +258,22 @@ class LegacyMigrationIprEvent(IprEvent):
     """A subclass of IprEvent specifically for capturing contents of legacy_url_0,
     the text of a disclosure submitted by email"""
     pass
+
+
+def document_changed_on_ipr_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    from ietf.doc.models import Document
+    from ietf.doc.utils import document_changed
+    if isinstance(instance, IprDocRel):
+        document_changed(Document.objects.filter(docalias=instance.document_id).values_list("pk", flat=True))
+    else:
+        document_changed(Document.objects.filter(docalias__iprdocrel__disclosure=instance.disclosure_id).values_list("pk", flat=True))
+
+def document_changed_on_ipr_delete(sender, instance, **kwargs):
+    document_changed_on_ipr_change(sender, instance)
+
+signals.post_save.connect(document_changed_on_ipr_change, sender=IprDocRel)
+signals.post_delete.connect(document_changed_on_ipr_delete, sender=IprDocRel)
+# disclosure state changes are recorded with an event
+signals.post_save.connect(document_changed_on_ipr_change, sender=IprEvent)
@@ -3,15 +3,18 @@
 
 
 from django.db import models
+from django.db.models import signals
 from django.template import Template, Context
 
 from email.utils import parseaddr
 
+from ietf.doc.models import (Document, DocAlias, DocumentAuthor, RelatedDocument,
+    BofreqEditorDocEvent, BofreqResponsibleDocEvent)
 from ietf.doc.utils_bofreq import bofreq_editors, bofreq_responsible
 from ietf.utils.mail import formataddr, get_email_addresses_from_text
-from ietf.group.models import Group
-from ietf.person.models import Email, Alias
-from ietf.review.models import ReviewTeamSettings
+from ietf.group.models import Group, Role
+from ietf.person.models import Email, Alias, Person
+from ietf.review.models import ReviewTeamSettings, ReviewAssignment
 
 import debug                            # pyflakes:ignore
 
@@ -61,7 +64,10 @@ class Recipient(models.Model):
         if hasattr(self,'gather_%s'%self.slug):
             retval.extend(eval('self.gather_%s(**kwargs)'%self.slug))
         if self.template:
-            rendering = Template('{%% autoescape off %%}%s{%% endautoescape %%}'%self.template).render(Context(kwargs))
+            # the compiled template is kept, as recipients are cached by ietf.mailtrigger.utils
+            if getattr(self, '_compiled_template', (None, None))[0] != self.template:
+                self._compiled_template = (self.template, Template('{%% autoescape off %%}%s{%% endautoescape %%}'%self.template))
+            rendering = self._compiled_template[1].render(Context(kwargs))
             if rendering:
                 retval.extend( get_email_addresses_from_text(rendering) )
 
@@ -428,3 +434,30 @@ class Recipient(models.Model):
             addrs.extend(Recipient.objects.get(slug='iesg').gather(**{}))
         return addrs
 
+
+
+def invalidate_mailtrigger_definitions_on_change(sender, instance, **kwargs):
+    from ietf.mailtrigger.utils import invalidate_mailtrigger_definitions
+    invalidate_mailtrigger_definitions()
+
+signals.post_save.connect(invalidate_mailtrigger_definitions_on_change, sender=MailTrigger)
+signals.post_delete.connect(invalidate_mailtrigger_definitions_on_change, sender=MailTrigger)
+signals.post_save.connect(invalidate_mailtrigger_definitions_on_change, sender=Recipient)
+signals.post_delete.connect(invalidate_mailtrigger_definitions_on_change, sender=Recipient)
+signals.m2m_changed.connect(invalidate_mailtrigger_definitions_on_change, sender=MailTrigger.to.through)
+signals.m2m_changed.connect(invalidate_mailtrigger_definitions_on_change, sender=MailTrigger.cc.through)
+
+
+def clear_resolution_cache_on_change(sender, **kwargs):
+    from ietf.mailtrigger.utils import clear_resolution_cache
+    clear_resolution_cache()
+
+# the models the recipients are gathered from; other changes, like the
+# events saved while sending, keep what has been resolved
+for model in (Role, Email, Person, Alias, Group, Document, DocAlias, DocumentAuthor, RelatedDocument,
+              BofreqEditorDocEvent, BofreqResponsibleDocEvent, ReviewTeamSettings, ReviewAssignment):
+    signals.post_save.connect(clear_resolution_cache_on_change, sender=model)
+    signals.post_delete.connect(clear_resolution_cache_on_change, sender=model)
+for through in (DocAlias.docs.through, BofreqEditorDocEvent.editors.through,
+                BofreqResponsibleDocEvent.responsible.through):
+    signals.m2m_changed.connect(clear_resolution_cache_on_change, sender=through)
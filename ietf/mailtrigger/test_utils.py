@@ -3,8 +3,11 @@
 
 
 from ietf.doc.factories import WgDraftFactory
+from ietf.doc.models import DocEvent
 from ietf.mailtrigger.models import MailTrigger
-from .utils import gather_address_lists
+from ietf.person.models import Person
+from .utils import (gather_address_lists, gather_address_lists_for_triggers, resolution_cache,
+    mailtrigger_definitions, invalidate_mailtrigger_definitions)
 from ietf.utils.test_utils import TestCase
 
 
@@ -42,3 +45,36 @@ class GatherAddressListsTests(TestCase):
                                         'mars-chairs@ietf.org', 'iesg-secretary@ietf.org'])
         new_trigger = MailTrigger.objects.get(slug=new_slug)
         self.assertEqual(new_trigger.desc, new_desc)
+
+    def test_resolution_cache(self):
+        with resolution_cache():
+            addrs = gather_address_lists('doc_pulled_from_rfc_queue', doc=self.doc)
+            with self.assertNumQueries(0):
+                self.assertEqual(gather_address_lists('doc_pulled_from_rfc_queue', doc=self.doc), addrs)
+            # saving objects recipients aren't resolved from keeps what has been resolved
+            DocEvent.objects.create(type='added_comment', doc=self.doc, rev=self.doc.rev,
+                                    by=Person.objects.get(name="(System)"), desc='A comment')
+            with self.assertNumQueries(0):
+                self.assertEqual(gather_address_lists('doc_pulled_from_rfc_queue', doc=self.doc), addrs)
+            # saving a group forgets what has been resolved
+            self.doc.group.acronym = 'venus'
+            self.doc.group.save()
+            to, cc = gather_address_lists('doc_pulled_from_rfc_queue', doc=self.doc)
+            self.assertIn('venus-chairs@ietf.org', cc)
+            self.assertNotIn('mars-chairs@ietf.org', cc)
+
+    def test_definitions_without_cache(self):
+        # the test settings use a dummy cache, which can't hold the version
+        definitions = mailtrigger_definitions()
+        with self.assertNumQueries(0):
+            self.assertIs(mailtrigger_definitions(), definitions)
+        invalidate_mailtrigger_definitions()
+        self.assertIsNot(mailtrigger_definitions(), definitions)
+
+    def test_gather_address_lists_for_triggers(self):
+        slugs = ['doc_pulled_from_rfc_queue', 'doc_state_edited', 'ballot_deferred']
+        addrs = gather_address_lists_for_triggers(slugs, doc=self.doc)
+        self.assertEqual(set(addrs), set(slugs))
+        for slug in slugs:
+            self.assertEqual(addrs[slug], gather_address_lists(slug, doc=self.doc))
+
@@ -1,6 +1,14 @@
 # Copyright The IETF Trust 2015-2019, All Rights Reserved
 
+import threading
+import time
+import uuid
+
 from collections import namedtuple
+from contextlib import contextmanager
+
+from django.core.cache import caches
+from django.db import models
 
 import debug                            # pyflakes:ignore
 
@@ -21,27 +29,133 @@ class AddrLists(namedtuple('AddrLists',['to','cc'])):
         return namedtuple('AddrListsAsStrings',['to','cc'])(to=to_string,cc=cc_string)
 
 
+class MailTriggerDefinitions(object):
+    """All the mailtriggers, with their to and cc recipients"""
+
+    def __init__(self, version=None):
+        self.version = version
+        self.loaded = time.monotonic()
+        self.triggers = { t.slug: t for t in MailTrigger.objects.prefetch_related('to', 'cc') }
+
+    def slugs_starting_with(self, prefix):
+        return [ slug for slug in self.triggers if slug.startswith(prefix) ]
+
+MAILTRIGGER_DEFINITIONS_VERSION_KEY = "mailtrigger:definitions-version"
+# without a working cache, changes made by other processes can't be seen,
+# so the definitions are reloaded after this many seconds
+MAILTRIGGER_DEFINITIONS_UNCACHED_MAX_AGE = 5 * 60
+_mailtrigger_definitions = None
+
+def mailtrigger_definitions():
+    """Return the MailTriggerDefinitions
+
+    The definitions are kept between calls, and reloaded when the version
+    stored in the cache is changed by invalidate_mailtrigger_definitions(),
+    or after a while when the cache can't hold the version. Within a resolution_cache() block they're only looked up once."""
+    global _mailtrigger_definitions
+
+    results = _resolution.__dict__.get("results")
+    if results is not None and "definitions" in results:
+        return results["definitions"]
+
+    cache = caches["default"]
+    version = cache.get(MAILTRIGGER_DEFINITIONS_VERSION_KEY)
+    if version is None:
+        cache.add(MAILTRIGGER_DEFINITIONS_VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(MAILTRIGGER_DEFINITIONS_VERSION_KEY)
+
+    definitions = _mailtrigger_definitions
+    if version is None:
+        # no working cache.  Rather than reloading the definitions for every
+        # call, keep them for a while; changes made by this process reset
+        # them through invalidate_mailtrigger_definitions()
+        if (definitions is None or definitions.version is not None
+            or time.monotonic() - definitions.loaded > MAILTRIGGER_DEFINITIONS_UNCACHED_MAX_AGE):
+            definitions = _mailtrigger_definitions = MailTriggerDefinitions()
+    elif definitions is None or definitions.version != version:
+        definitions = _mailtrigger_definitions = MailTriggerDefinitions(version)
+    if results is not None:
+        results["definitions"] = definitions
+    return definitions
+
+def invalidate_mailtrigger_definitions():
+    global _mailtrigger_definitions
+    _mailtrigger_definitions = None
+    caches["default"].delete(MAILTRIGGER_DEFINITIONS_VERSION_KEY)
+    clear_resolution_cache()
+
+
+_resolution = threading.local()
+
+@contextmanager
+def resolution_cache():
+    """Remember the addresses each recipient resolves to for the duration
+    of the block, so that sending several mails about the same objects
+    doesn't repeat the same lookups. Saving or deleting any of the objects
+    recipients are resolved from clears what has been remembered."""
+    if _resolution.__dict__.get("results") is not None:
+        yield
+        return
+    _resolution.results = {}
+    try:
+        yield
+    finally:
+        _resolution.results = None
+
+def clear_resolution_cache():
+    if _resolution.__dict__.get("results"):
+        _resolution.results = {}
+
+def _identity(value):
+    if isinstance(value, models.Model) and value.pk is not None:
+        return (value._meta.label, value.pk)
+    if value is None or isinstance(value, (str, int, bool)):
+        return value
+    return ("id", id(value))
+
+def gather_recipient(recipient, **kwargs):
+    """Return recipient.gather(**kwargs), remembered within a resolution_cache() block"""
+    results = _resolution.__dict__.get("results")
+    if results is None:
+        return recipient.gather(**kwargs)
+
+    key = (recipient.slug, tuple(sorted((k, _identity(v)) for k, v in kwargs.items())))
+    if key not in results:
+        # keep the kwargs alive, so the ids in the key can't be reused
+        results[key] = (recipient.gather(**kwargs), kwargs)
+    return results[key][0]
+
+
 def gather_address_lists(slug, skipped_recipients=None, create_from_slug_if_not_exists=None, 
                          desc_if_not_exists=None, **kwargs):
     mailtrigger = get_mailtrigger(slug, create_from_slug_if_not_exists, desc_if_not_exists)
 
     to = set()
     for recipient in mailtrigger.to.all():
-        to.update(recipient.gather(**kwargs))
+        to.update(gather_recipient(recipient, **kwargs))
     to.discard('')
     if skipped_recipients:
         to = excludeaddrs(to, skipped_recipients)
 
     cc = set()
     for recipient in mailtrigger.cc.all():
-        cc.update(recipient.gather(**kwargs))
+        cc.update(gather_recipient(recipient, **kwargs))
     cc.discard('')
     if skipped_recipients:
         cc = excludeaddrs(cc, skipped_recipients)
 
     return AddrLists(to=sorted(list(to)),cc=sorted(list(cc)))
 
+def gather_address_lists_for_triggers(slugs, skipped_recipients=None, **kwargs):
+    """Return a dictionary from each of the mailtrigger slugs to its
+    AddrLists, resolving the recipients they share only once."""
+    with resolution_cache():
+        return { slug: gather_address_lists(slug, skipped_recipients=skipped_recipients, **kwargs) for slug in slugs }
+
 def get_mailtrigger(slug, create_from_slug_if_not_exists, desc_if_not_exists):
+    mailtrigger = mailtrigger_definitions().triggers.get(slug)
+    if mailtrigger is not None:
+        return mailtrigger
     try:
         mailtrigger = MailTrigger.objects.get(slug=slug)
     except MailTrigger.DoesNotExist:
@@ -59,8 +173,8 @@ def get_mailtrigger(slug, create_from_slug_if_not_exists, desc_if_not_exists):
 
 def gather_relevant_expansions(**kwargs):
 
-    def starts_with(prefix):
-        return MailTrigger.objects.filter(slug__startswith=prefix).values_list('slug',flat=True)
+    definitions = mailtrigger_definitions()
+    starts_with = definitions.slugs_starting_with
 
     relevant = set() 
     
@@ -111,10 +225,10 @@ def gather_relevant_expansions(**kwargs):
         relevant.update(starts_with('sub_'))
 
     rule_list = []
-    for mailtrigger in MailTrigger.objects.filter(slug__in=relevant):
-        addrs = gather_address_lists(mailtrigger.slug,**kwargs)
+    relevant = [ slug for slug in relevant if slug in definitions.triggers ]
+    for slug, addrs in gather_address_lists_for_triggers(relevant, **kwargs).items():
         if addrs.to or addrs.cc:
-            rule_list.append((mailtrigger.slug,mailtrigger.desc,addrs.to,addrs.cc))
+            rule_list.append((slug,definitions.triggers[slug].desc,addrs.to,addrs.cc))
     return sorted(rule_list)
 
 def get_base_submission_message_address():
@@ -4,6 +4,7 @@
 
 from collections import defaultdict
 import datetime
+import hashlib
 import io
 import os
 import re
@@ -18,20 +19,23 @@ from django.urls import reverse
 from django.shortcuts import get_object_or_404
 from django.template.loader import render_to_string
 from django.utils import timezone
+from django.utils.encoding import force_str
 
 import debug                            # pyflakes:ignore
 
-from ietf.doc.models import Document
+from ietf.doc.models import Document, State
 from ietf.group.utils import can_manage_some_groups, can_manage_group
 from ietf.ietfauth.utils import has_role, user_is_person
 from ietf.liaisons.utils import get_person_for_user
 from ietf.mailtrigger.utils import gather_address_lists
 from ietf.person.models  import Person
 from ietf.meeting.models import Meeting, Schedule, TimeSlot, SchedTimeSessAssignment, ImportantDate, SchedulingEvent, Session
+from ietf.meeting.models import SessionPresentation
 from ietf.meeting.utils import session_requested_by, add_event_info_to_session_qs
 from ietf.name.models import ImportantDateName, SessionPurposeName
 from ietf.utils import log, meetecho
 from ietf.utils.mail import send_mail
+from ietf.utils.pdf import pdf_pages
 from ietf.utils.pipe import pipe
 from ietf.utils.text import xslugify
 
@@ -637,9 +641,49 @@ def read_session_file(type, num, doc):
 def read_agenda_file(num, doc):
     return read_session_file('agenda', num, doc)
 
+def session_draft_list(num, acronym):
+    try:
+        agendas = Document.objects.filter(type="agenda",
+                                         session__meeting__number=num,
+                                         session__group__acronym=acronym,
+                                         states=State.objects.get(type="agenda", slug="active")).distinct()
+    except Document.DoesNotExist:
+        raise Http404
+
+    drafts = set()
+    for agenda in agendas:
+        content, _ = read_agenda_file(num, agenda)
+        if content:
+            drafts.update(re.findall(b'(draft-[-a-z0-9]*)', content))
+
+    result = []
+    for draft in drafts:
+        draft = force_str(draft)
+        try:
+            if re.search('-[0-9]{2}$', draft):
+                doc_name = draft
+            else:
+                doc = Document.objects.get(name=draft)
+                doc_name = draft + "-" + doc.rev
+
+            if doc_name not in result:
+                result.append(doc_name)
+        except Document.DoesNotExist:
+            pass
+
+    for sp in SessionPresentation.objects.filter(session__meeting__number=num, session__group__acronym=acronym, document__type='draft'):
+        doc_name = sp.document.name + "-" + sp.document.rev
+        if doc_name not in result:
+            result.append(doc_name)
+
+    return sorted(result)
+
+def draft_pdf_path(doc_name):
+    return os.path.join(settings.INTERNET_DRAFT_PDF_PATH, doc_name + ".pdf")
+
 def convert_draft_to_pdf(doc_name):
     inpath = os.path.join(settings.IDSUBMIT_REPOSITORY_PATH, doc_name + ".txt")
-    outpath = os.path.join(settings.INTERNET_DRAFT_PDF_PATH, doc_name + ".pdf")
+    outpath = draft_pdf_path(doc_name)
 
     try:
         infile = io.open(inpath, "r")
@@ -684,6 +728,60 @@ def convert_draft_to_pdf(doc_name):
     pipe("ps2pdf "+psname+" "+outpath)
     os.unlink(psname)
 
+def convert_missing_draft_pdfs(doc_names):
+    for doc_name in doc_names:
+        if not os.path.exists(draft_pdf_path(doc_name)):
+            convert_draft_to_pdf(doc_name)
+
+def session_draft_merged_pdf(num, acronym, doc_names):
+    """Return the path of the merged PDF of those of the session drafts
+    that have been converted to PDF, building it if it isn't cached on disk
+    yet.  The file name contains a hash of the draft names, so a changed
+    draft list gives a new file, and replaces the earlier one."""
+    doc_names = [ d for d in doc_names if os.path.exists(draft_pdf_path(d)) ]
+    digest = hashlib.sha1("\n".join(doc_names).encode('utf-8')).hexdigest()[:16]
+    cache_dir = settings.SESSION_DRAFT_PDF_CACHE_DIR
+    prefix = "%s-%s-drafts-" % (num, acronym)
+    path = os.path.join(cache_dir, prefix + digest + ".pdf")
+    if os.path.exists(path):
+        return path
+
+    os.makedirs(cache_dir, exist_ok=True)
+    curr_page = 1
+    pmh, pmn = mkstemp()
+    os.close(pmh)
+    pdfmarks = io.open(pmn, "w")
+    pdf_list = ""
+
+    for doc_name in doc_names:
+        pdf_path = draft_pdf_path(doc_name)
+        pages = pdf_pages(pdf_path)
+        pdfmarks.write("[/Page "+str(curr_page)+" /View [/XYZ 0 792 1.0] /Title (" + doc_name + ") /OUT pdfmark\n")
+        pdf_list = pdf_list + " " + pdf_path
+        curr_page = curr_page + pages
+
+    pdfmarks.close()
+    # write next to the final file, so the rename is atomic
+    pdfh, pdfn = mkstemp(dir=cache_dir, suffix=".tmp")
+    os.close(pdfh)
+    gs = settings.GHOSTSCRIPT_COMMAND
+    code, out, err = pipe(gs + " -dBATCH -dNOPAUSE -q -sDEVICE=pdfwrite -sOutputFile=" + pdfn + " " + pdf_list + " " + pmn)
+    os.unlink(pmn)
+    if code != 0:
+        # don't cache a partial file
+        os.unlink(pdfn)
+        raise RuntimeError('error merging the session draft PDFs: %s' % err.decode('utf-8', errors='replace'))
+    os.rename(pdfn, path)
+
+    for filename in os.listdir(cache_dir):
+        if filename.startswith(prefix) and filename.endswith(".pdf") and filename != os.path.basename(path):
+            try:
+                os.unlink(os.path.join(cache_dir, filename))
+            except FileNotFoundError:
+                pass
+
+    return path
+
 def schedule_permissions(meeting, schedule, user):
     # do this in positive logic.
     cansee = False
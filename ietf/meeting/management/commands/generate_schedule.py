@@ -5,18 +5,23 @@ from __future__ import absolute_import, print_function, unicode_literals
 
 import calendar
 import datetime
+import io
 import math
+import multiprocessing
 import random
 import string
 import sys
 import time
 
 from collections import defaultdict
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
 from functools import lru_cache
-from typing import NamedTuple, Optional
+from typing import List, NamedTuple, Optional, Tuple
 
 from django.contrib.humanize.templatetags.humanize import intcomma
 from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
 from django.db.models import Q
 
 import debug                            # pyflakes:ignore
@@ -52,6 +57,14 @@ class ScheduleId(NamedTuple):
         return '/'.join(tok for tok in reversed(self) if tok is not None)
 
 
+class SeedResult(NamedTuple):
+    """Outcome of an optimiser run with a particular random seed"""
+    seed: int
+    violations: List[str]
+    cost: float
+    assignments: List[Tuple[int, int]]  # (timeslot pk, session pk)
+
+
 class Command(BaseCommand):
     help = 'Create a meeting schedule'
 
@@ -71,18 +84,35 @@ class Command(BaseCommand):
                                 'Base schedule for generated schedule, specified as "[owner/]name"'
                                 ' (default is no base schedule; owner not required if name is unique)'
                             ))
+        parser.add_argument('-s', '--seeds', type=int, nargs='+', default=None,
+                            help=(
+                                'random seeds for independent optimiser runs; the schedule with the '
+                                'lowest cost is saved (default is a single unseeded run)'
+                            ))
+        parser.add_argument('-w', '--workers', type=int, default=1,
+                            help=(
+                                'number of worker processes for optimiser runs; if no seeds are '
+                                'given, one run per worker is made with random seeds'
+                            ))
 
-    def handle(self, meeting, name, max_cycles, verbosity, base_id, *args, **kwargs):
-        ScheduleHandler(self.stdout, meeting, name, max_cycles, verbosity, base_id).run()
+    def handle(self, meeting, name, max_cycles, verbosity, base_id, seeds, workers, *args, **kwargs):
+        if workers < 1:
+            raise CommandError('Number of workers must be at least 1')
+        if seeds is None and workers > 1:
+            seeds = [random.SystemRandom().randrange(2**32) for _ in range(workers)]
+        ScheduleHandler(self.stdout, meeting, name, max_cycles, verbosity, base_id, seeds, workers).run()
 
 
 class ScheduleHandler(object):
     def __init__(self, stdout, meeting_number, name=None, max_cycles=OPTIMISER_MAX_CYCLES,
-                 verbosity=1, base_id=None):
+                 verbosity=1, base_id=None, seeds=None, workers=1):
         self.stdout = stdout
         self.verbosity = verbosity
         self.name = name
         self.max_cycles = max_cycles
+        self.base_id = base_id
+        self.seeds = seeds
+        self.workers = workers
         if meeting_number:
             try:
                 self.meeting = models.Meeting.objects.get(type="ietf", number=meeting_number)
@@ -116,6 +146,15 @@ class ScheduleHandler(object):
 
     def run(self):
         """Schedule all sessions"""
+        if self.seeds is None:
+            violations, cost = self._optimise()
+        else:
+            violations, cost = self._optimise_seeds()
+        self._save_schedule(cost)
+        return violations, cost
+
+    def _optimise(self):
+        """Generate and optimise the schedule, returns the violations and cost"""
         beg_time = time.time()
         self.schedule.fill_initial_schedule()
         violations, cost = self.schedule.total_schedule_cost()
@@ -140,10 +179,61 @@ class ScheduleHandler(object):
                 self.stdout.write(v)
                 
         self.schedule.optimise_timeslot_capacity()
-
-        self._save_schedule(cost)
         return violations, cost
-    
+
+    def optimise_with_seed(self, seed):
+        """
+        Generate and optimise the schedule from scratch, with the random number
+        generator seeded with seed. The same seed results in the same schedule.
+        Returns a SeedResult.
+        """
+        self.schedule.reset()
+        random.seed(seed)
+        violations, cost = self._optimise()
+        return SeedResult(
+            seed,
+            violations,
+            cost,
+            [(t.timeslot_pk, s.session_pk) for t, s in self.schedule.schedule.items()],
+        )
+
+    def _optimise_seeds(self):
+        """
+        Run the optimiser once for every seed in self.seeds, in up to self.workers
+        processes, and keep the schedule with the lowest cost.
+        """
+        if self.workers > 1 and len(self.seeds) > 1:
+            # Every worker process loads the meeting once, and needs its own database connection
+            connections.close_all()
+            with ProcessPoolExecutor(
+                max_workers=min(self.workers, len(self.seeds)),
+                mp_context=multiprocessing.get_context('fork'),
+                initializer=_init_worker,
+                initargs=(self.meeting.number, self.max_cycles, self.base_id),
+            ) as executor:
+                results = list(executor.map(_optimise_with_seed, self.seeds))
+        else:
+            results = [self.optimise_with_seed(seed) for seed in self.seeds]
+
+        if self.verbosity >= 1:
+            for result in results:
+                vc = len(result.violations)
+                self.stdout.write('Seed {}: {} violation{}, cost {}'.format(
+                    result.seed, vc, '' if vc==1 else 's', intcomma(result.cost)))
+        best = min(results, key=lambda r: r.cost)
+        if self.verbosity >= 1:
+            self.stdout.write('Using schedule from seed {}'.format(best.seed))
+
+        timeslot_lut = {t.timeslot_pk: t for t in self.schedule.timeslots}
+        session_lut = {s.session_pk: s for s in self.schedule.sessions}
+        self.schedule.reset()
+        self.schedule.schedule = {
+            timeslot_lut[timeslot_pk]: session_lut[session_pk]
+            for timeslot_pk, session_pk in best.assignments
+        }
+        self.schedule.total_schedule_cost()  # updates the cost of each session
+        return best.violations, best.cost
+
     def _save_schedule(self, cost):
         if not self.name:
             count = models.Schedule.objects.filter(name__startswith='auto-%s-'%self.meeting.number).count()
@@ -247,6 +337,20 @@ class ScheduleHandler(object):
         self.schedule.adjust_for_timeslot_availability()  # calculates some fixed costs
 
 
+# ScheduleHandler used by each worker process of ScheduleHandler._optimise_seeds()
+_worker_handler = None
+
+
+def _init_worker(meeting_number, max_cycles, base_id):
+    global _worker_handler
+    _worker_handler = ScheduleHandler(io.StringIO(), meeting_number, max_cycles=max_cycles,
+                                      verbosity=0, base_id=base_id)
+
+
+def _optimise_with_seed(seed):
+    return _worker_handler.optimise_with_seed(seed)
+
+
 class Schedule(object):
     """
     The Schedule object represents the schedule, and contains code to generate/optimise it.
@@ -267,6 +371,9 @@ class Schedule(object):
         self._fixed_violations = dict()  # key = type of cost
         self.max_cycles = max_cycles
         self.base_schedule = self._load_base_schedule(base_schedule) if base_schedule else None
+        self._cost_state = None
+        self._overlapped_by = None
+        self._adjacent_to = None
 
     def __str__(self):
         return 'Schedule ({} timeslots, {} sessions, {} scheduled, {} in base schedule)'.format(
@@ -318,6 +425,13 @@ class Schedule(object):
         """Timeslots that can be filled by the schedule"""
         return (t for t in self.timeslots if not t.is_fixed)
 
+    def reset(self):
+        """Remove all scheduled sessions, so that the schedule can be generated again"""
+        self.schedule = dict()
+        self.best_cost = math.inf
+        self.best_schedule = None
+        self._cost_state = None
+
     def _load_base_schedule(self, db_base_schedule):
         session_lut = {s.session_pk: s for s in self.sessions}
         timeslot_lut = {t.timeslot_pk: t for t in self.timeslots}
@@ -454,11 +568,10 @@ class Schedule(object):
         for session in sessions:
             possible_slots = [t for t in self.free_timeslots if t not in self.schedule.keys()]
             random.shuffle(possible_slots)
-            
+            cost_state = self._current_cost_state()
+
             def timeslot_preference(t):
-                proposed_schedule = self.schedule.copy()
-                proposed_schedule[t] = session
-                return self.calculate_dynamic_cost(proposed_schedule)[1], t.duration, t.capacity
+                return cost_state.cost_for_changes({t: session}), t.duration, t.capacity
 
             possible_slots.sort(key=timeslot_preference)
             self._schedule_session(session, possible_slots[0])
@@ -506,7 +619,7 @@ class Schedule(object):
             for original_timeslot, session in items:
                 if session.is_fixed:
                     continue
-                best_cost = self.calculate_dynamic_cost()[1]
+                best_cost = self._current_cost_state().cost
                 if best_cost == 0:
                     if self.verbosity >= 1 and self.stdout.isatty():
                         sys.stderr.write('\n')
@@ -544,6 +657,7 @@ class Schedule(object):
             self.stdout.write('Optimiser did not find perfect schedule, using best schedule at dynamic cost {:,}'
                               .format(self.best_cost))
         self.schedule = self.best_schedule
+        self._cost_state = None
 
         return run_count
 
@@ -603,31 +717,45 @@ class Schedule(object):
                 
             optimised_timeslots.add(timeslot)
             optimised_timeslots.update(timeslot_overlaps)    
+        self._cost_state = None
 
     def _schedule_session(self, session, timeslot):
         self.schedule[timeslot] = session
+        self._cost_state = None
+
+    def _current_cost_state(self):
+        """
+        Return the DynamicCostState for the current schedule, calculating it if
+        the schedule has changed since it was last calculated.
+        """
+        if self._cost_state is None or self._cost_state.source is not self.schedule:
+            if self._overlapped_by is None:
+                # Reverse lookups of TimeSlot.overlaps and TimeSlot.adjacent
+                self._overlapped_by = defaultdict(set)
+                self._adjacent_to = defaultdict(set)
+                for timeslot in self.timeslots:
+                    for other in timeslot.overlaps:
+                        self._overlapped_by[other].add(timeslot)
+                    for other in timeslot.adjacent:
+                        self._adjacent_to[other].add(timeslot)
+            self._cost_state = DynamicCostState(
+                self.schedule, self.base_schedule, self._overlapped_by, self._adjacent_to,
+            )
+        return self._cost_state
 
     def _cost_for_switch(self, timeslot1, timeslot2):
         """
         Calculate the total cost of self.schedule, if the sessions in timeslot1 and timeslot2 
         would be switched. Does not perform the switch, self.schedule remains unchanged.
+        Only the sessions affected by the switch are recalculated, see DynamicCostState.
         """
-        proposed_schedule = self.schedule.copy()
-        session1 = proposed_schedule.get(timeslot1)
-        session2 = proposed_schedule.get(timeslot2)
+        session1 = self.schedule.get(timeslot1)
+        session2 = self.schedule.get(timeslot2)
         if session1 and not session1.fits_in_timeslot(timeslot2):
             return math.inf
         if session2 and not session2.fits_in_timeslot(timeslot1):
             return math.inf
-        if session1:
-            proposed_schedule[timeslot2] = session1
-        elif session2:
-            del proposed_schedule[timeslot2]
-        if session2:
-            proposed_schedule[timeslot1] = session2
-        elif session1:
-            del proposed_schedule[timeslot1]
-        return self.calculate_dynamic_cost(proposed_schedule)[1]
+        return self._current_cost_state().cost_for_changes({timeslot1: session2, timeslot2: session1})
 
     def _switch_sessions(self, timeslot1, timeslot2):
         """
@@ -650,6 +778,7 @@ class Schedule(object):
             self.schedule[timeslot1] = session2
         elif session1:
             del self.schedule[timeslot1]
+        self._cost_state = None
         return session2
     
     def _save(self, cost):
@@ -658,6 +787,153 @@ class Schedule(object):
             self.best_schedule = self.schedule.copy()
 
 
+class DynamicCostState(object):
+    """
+    The DynamicCostState holds the dynamic cost of each session in a schedule, so that
+    the cost of a small change to that schedule can be calculated without recalculating
+    the cost of every session, as Schedule.calculate_dynamic_cost() does.
+
+    The cost of a session only depends on its own timeslot, the sessions in overlapping
+    and adjacent timeslots, and the other sessions of the same group. When sessions are
+    moved, only the sessions related to the changed timeslots in one of those ways
+    are recalculated. The result is identical to calculating the full cost of the
+    changed schedule.
+
+    The state is only valid as long as the schedule it was created from is unchanged.
+    """
+    def __init__(self, schedule, base_schedule, overlapped_by, adjacent_to):
+        self.source = schedule
+        self.overlapped_by = overlapped_by
+        self.adjacent_to = adjacent_to
+        self.schedule = dict(schedule)
+        if base_schedule is not None:
+            self.schedule.update(base_schedule)
+
+        # calculate_dynamic_cost() inserts sessions into the per-group sets in schedule
+        # order, and the session order check depends on that order. Keep the positions,
+        # so that changed schedules can be built in the same order. Timeslots that are
+        # new to the schedule are added after the other generated timeslots, but before
+        # the base schedule.
+        self.positions = {timeslot: idx for idx, timeslot in enumerate(self.schedule)}
+        self.append_position = len(schedule) - 0.5
+
+        self.group_timeslots = defaultdict(set)
+        group_sessions = defaultdict(set)
+        for timeslot, session in self.schedule.items():
+            self.group_timeslots[session.group].add(timeslot)
+            group_sessions[session.group].add((timeslot, session))
+
+        # Infinite costs are counted separately, as they can not be subtracted
+        self.session_costs = dict()
+        self.finite_cost = 0
+        self.infinite_count = 0
+        for timeslot, session in self.schedule.items():
+            cost = self._session_cost(self.schedule, timeslot, session, group_sessions[session.group])
+            self.session_costs[timeslot] = cost
+            if cost == math.inf:
+                self.infinite_count += 1
+            else:
+                self.finite_cost += cost
+
+    @property
+    def cost(self):
+        """The total dynamic cost of the schedule"""
+        return math.inf if self.infinite_count else self.finite_cost
+
+    @staticmethod
+    def _session_cost(schedule, timeslot, session, group_sessions):
+        overlapping_sessions = {schedule[t] for t in timeslot.overlaps if t in schedule}
+        return session.calculate_cost(schedule, timeslot, overlapping_sessions, group_sessions)[1]
+
+    def cost_for_changes(self, changes):
+        """
+        Calculate the total dynamic cost of the schedule, if the changes would be applied.
+        changes is a dict with TimeSlot objects as keys, and the Session to place in that
+        timeslot as values, or None to leave the timeslot empty.
+        """
+        proposed = ChangedSchedule(self.schedule, changes)
+
+        affected = set()
+        groups = set()
+        for timeslot, session in changes.items():
+            affected.add(timeslot)
+            affected.update(self.overlapped_by[timeslot])
+            affected.update(self.adjacent_to[timeslot])
+            if session:
+                groups.add(session.group)
+            if timeslot in self.schedule:
+                groups.add(self.schedule[timeslot].group)
+        for group in groups:
+            affected.update(self.group_timeslots[group])
+
+        finite_cost, infinite_count = self.finite_cost, self.infinite_count
+        for timeslot in affected:
+            if timeslot in self.schedule:
+                cost = self.session_costs[timeslot]
+                if cost == math.inf:
+                    infinite_count -= 1
+                else:
+                    finite_cost -= cost
+
+        group_sessions = dict()
+        for timeslot in affected:
+            if timeslot not in proposed:
+                continue
+            session = proposed[timeslot]
+            if session.group not in group_sessions:
+                group_sessions[session.group] = self._group_sessions(proposed, session.group, changes)
+            cost = self._session_cost(proposed, timeslot, session, group_sessions[session.group])
+            if cost == math.inf:
+                infinite_count += 1
+            else:
+                finite_cost += cost
+
+        return math.inf if infinite_count else finite_cost
+
+    def _group_sessions(self, proposed, group, changes):
+        """Build the set of (TimeSlot, Session) tuples of a group, in schedule order"""
+        timeslots = [
+            t for t in self.group_timeslots[group].union(changes)
+            if t in proposed and proposed[t].group == group
+        ]
+        timeslots.sort(key=lambda t: self.positions.get(t, self.append_position))
+        return {(t, proposed[t]) for t in timeslots}
+
+
+class ChangedSchedule(Mapping):
+    """
+    Read-only view of a schedule dict, with the sessions in some timeslots changed.
+    Avoids copying the entire schedule for every proposed change.
+    """
+    def __init__(self, schedule, changes):
+        self.schedule = schedule
+        self.changes = changes
+
+    def __getitem__(self, timeslot):
+        if timeslot in self.changes:
+            session = self.changes[timeslot]
+            if session is None:
+                raise KeyError(timeslot)
+            return session
+        return self.schedule[timeslot]
+
+    def __contains__(self, timeslot):
+        if timeslot in self.changes:
+            return self.changes[timeslot] is not None
+        return timeslot in self.schedule
+
+    def __iter__(self):
+        for timeslot in self.schedule:
+            if timeslot in self:
+                yield timeslot
+        for timeslot, session in self.changes.items():
+            if session is not None and timeslot not in self.schedule:
+                yield timeslot
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
 class TimeSlot(object):
     """
     This TimeSlot class is analogous to the TimeSlot class in the models,
@@ -685,6 +961,11 @@ class TimeSlot(object):
         self.full_overlaps = set()
         self.adjacent = set()
 
+    def __hash__(self):
+        # Hash on the pk rather than the object id, so that the iteration order of
+        # sets, and with that a seeded optimiser run, does not depend on memory layout.
+        return hash(self.timeslot_pk)
+
     def store_relations(self, other_timeslots):
         """
         Store relations to all other timeslots. This should be called
@@ -794,6 +1075,10 @@ class Session(object):
             self.requested_duration.seconds * 100,
         ])
         
+    def __hash__(self):
+        # See TimeSlot.__hash__
+        return hash(self.session_pk)
+
     def update_complexity(self, other_sessions):
         """
         Update the complexity of this session, based on all other sessions.
@@ -0,0 +1,53 @@
+# Generated by Django 2.2.28 on 2023-04-11 10:02
+
+from django.db import migrations
+from django.utils import timezone
+
+
+def forward(apps, schema_editor):
+    IntervalSchedule = apps.get_model('django_celery_beat', 'IntervalSchedule')
+    PeriodicTask = apps.get_model('django_celery_beat', 'PeriodicTask')
+    PeriodicTasks = apps.get_model('django_celery_beat', 'PeriodicTasks')
+    every_fifteen_minutes, _ = IntervalSchedule.objects.get_or_create(
+        every=15,
+        period='minutes',  # in non-migration code, use IntervalSchedule.MINUTES instead
+    )
+    task, _ = PeriodicTask.objects.get_or_create(
+        interval=every_fifteen_minutes,
+        name='Prepare session draft PDFs',
+        task='ietf.meeting.tasks.prepare_session_draft_pdfs_task',
+    )
+    # this replicates the PeriodicTasks.changed() call as of django-celery-beat==2.3.0
+    PeriodicTasks.objects.update_or_create(ident=1, defaults={'last_update': timezone.now()})
+
+
+def reverse(apps, schema_editor):
+    IntervalSchedule = apps.get_model('django_celery_beat', 'IntervalSchedule')
+    PeriodicTask = apps.get_model('django_celery_beat', 'PeriodicTask')
+    PeriodicTasks = apps.get_model('django_celery_beat', 'PeriodicTasks')
+    every_fifteen_minutes = IntervalSchedule.objects.get(
+        every=15,
+        period='minutes',  # in non-migration code, use IntervalSchedule.MINUTES instead
+    )
+    task = PeriodicTask.objects.get(
+        interval=every_fifteen_minutes,
+        name='Prepare session draft PDFs',
+        task='ietf.meeting.tasks.prepare_session_draft_pdfs_task',
+    )
+    task.delete()
+    if not PeriodicTask.objects.filter(interval=every_fifteen_minutes).exists():
+        every_fifteen_minutes.delete()
+    # this replicates the PeriodicTasks.changed() call as of django-celery-beat==2.3.0
+    PeriodicTasks.objects.update_or_create(ident=1, defaults={'last_update': timezone.now()})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meeting', '0058_meeting_time_zone_not_blank'),
+        ('django_celery_beat', '0016_alter_crontabschedule_timezone'),
+    ]
+
+    operations = [
+        migrations.RunPython(forward, reverse),
+    ]
@@ -20,6 +20,7 @@ import debug                            # pyflakes:ignore
 
 from django.core.validators import MinValueValidator, RegexValidator
 from django.db import models
+from django.db.models import signals
 from django.db.models import Max, Subquery, OuterRef, TextField, Value, Q
 from django.db.models.functions import Coalesce
 from django.conf import settings
@@ -1426,3 +1427,42 @@ class Attended(models.Model):
 
     def __str__(self):
         return f'{self.person} at {self.session}'
+
+
+def invalidate_agenda_on_change(sender, instance, **kwargs):
+    from ietf.meeting.utils import agenda_changed
+    if isinstance(instance, Meeting):
+        meeting_ids = [instance.pk]
+    elif isinstance(instance, SchedTimeSessAssignment):
+        # assignments are usually created with their schedule at hand
+        if SchedTimeSessAssignment.schedule.is_cached(instance):
+            meeting_ids = [instance.schedule.meeting_id]
+        else:
+            meeting_ids = Schedule.objects.filter(pk=instance.schedule_id).values_list("meeting_id", flat=True)
+    elif isinstance(instance, (SchedulingEvent, SessionPresentation)):
+        meeting_ids = Session.objects.filter(pk=instance.session_id).values_list("meeting_id", flat=True)
+    else:
+        meeting_ids = [instance.meeting_id]
+    for meeting_id in meeting_ids:
+        if meeting_id:
+            agenda_changed(meeting_id)
+
+for model in (Meeting, Room, FloorPlan, TimeSlot, Schedule, SchedTimeSessAssignment, Session, SchedulingEvent, SessionPresentation):
+    signals.post_save.connect(invalidate_agenda_on_change, sender=model)
+    signals.post_delete.connect(invalidate_agenda_on_change, sender=model)
+
+
+def invalidate_agenda_on_materials_change(sender, instance, action, reverse, pk_set, **kwargs):
+    from ietf.meeting.utils import agenda_changed
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    if not reverse:
+        meeting_ids = [instance.meeting_id]
+    elif action == "pre_clear":
+        meeting_ids = instance.session_set.values_list("meeting_id", flat=True)
+    else:
+        meeting_ids = Session.objects.filter(pk__in=pk_set).values_list("meeting_id", flat=True)
+    for meeting_id in set(meeting_ids):
+        agenda_changed(meeting_id)
+
+signals.m2m_changed.connect(invalidate_agenda_on_materials_change, sender=Session.materials.through)
@@ -0,0 +1,45 @@
+# Copyright The IETF Trust 2023, All Rights Reserved
+#
+# Celery task definitions
+#
+from celery import shared_task
+
+from django.core.cache import cache
+
+from ietf.meeting.helpers import get_current_ietf_meeting, session_draft_list, convert_missing_draft_pdfs, session_draft_merged_pdf
+from ietf.meeting.models import Meeting, Session
+from ietf.meeting.utils import AGENDA_REBUILD_PENDING_KEY
+from ietf.utils import log
+
+
+@shared_task
+def rebuild_agenda_data_task(meeting_id):
+    """Fill the agenda data cache of a meeting after its agenda has changed"""
+    # clear this first, so changes made while rebuilding queue another rebuild
+    cache.delete(AGENDA_REBUILD_PENDING_KEY % meeting_id)
+    try:
+        meeting = Meeting.objects.get(pk=meeting_id)
+    except Meeting.DoesNotExist:
+        log.log(f'rebuild_agenda_data_task called for missing meeting_id={meeting_id}')
+        return
+    if meeting.type_id != 'ietf' or int(meeting.number) <= 64 or meeting.schedule is None:
+        return
+    from ietf.meeting.views import get_agenda_data
+    get_agenda_data(meeting, meeting.schedule)
+
+
+@shared_task
+def prepare_session_draft_pdfs_task():
+    """Convert the drafts on the session agendas of the current IETF meeting
+    to PDF, and build the merged per-session PDFs, ahead of the requests"""
+    meeting = get_current_ietf_meeting()
+    if meeting is None:
+        return
+    acronyms = Session.objects.filter(meeting=meeting, group__isnull=False).values_list('group__acronym', flat=True)
+    for acronym in sorted(set(acronyms)):
+        drafts = session_draft_list(meeting.number, acronym)
+        convert_missing_draft_pdfs(drafts)
+        try:
+            session_draft_merged_pdf(meeting.number, acronym, drafts)
+        except RuntimeError as err:
+            log.log(f'prepare_session_draft_pdfs_task could not merge the drafts of {acronym}: {err}')
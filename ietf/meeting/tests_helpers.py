@@ -1,6 +1,9 @@
 # Copyright The IETF Trust 2020-2022, All Rights Reserved
 # -*- coding: utf-8 -*-
 import datetime
+import os
+
+from importlib import import_module
 
 import debug    # pyflakes:ignore
 
@@ -15,8 +18,9 @@ from ietf.group.models import Group
 from ietf.meeting.factories import SessionFactory, MeetingFactory, TimeSlotFactory
 from ietf.meeting.helpers import (AgendaFilterOrganizer, AgendaKeywordTagger,
     delete_interim_session_conferences, sessions_post_save, sessions_post_cancel,
-    create_interim_session_conferences, get_ietf_meeting)
+    create_interim_session_conferences, get_ietf_meeting, draft_pdf_path, session_draft_merged_pdf)
 from ietf.meeting.models import SchedTimeSessAssignment, Session
+from ietf.meeting.tasks import prepare_session_draft_pdfs_task
 from ietf.meeting.test_data import make_meeting_test_data
 from ietf.utils.meetecho import Conference
 from ietf.utils.test_utils import TestCase
@@ -637,3 +641,53 @@ class HelperTests(TestCase):
         ietf.date = today
         ietf.save()
         self.assertEqual(get_ietf_meeting(), ietf, 'Return current meeting if there is one')
+
+
+class SessionDraftPdfTests(TestCase):
+    settings_temp_path_overrides = TestCase.settings_temp_path_overrides + ['INTERNET_DRAFT_PDF_PATH', 'SESSION_DRAFT_PDF_CACHE_DIR']
+
+    @patch('ietf.meeting.helpers.pdf_pages', return_value=1)
+    @patch('ietf.meeting.helpers.pipe')
+    def test_session_draft_merged_pdf_failure(self, mock_pipe, mock_pages):
+        """A failed merge should raise, and not leave a file in the cache"""
+        os.makedirs(settings.INTERNET_DRAFT_PDF_PATH, exist_ok=True)
+        with open(draft_pdf_path('draft-ietf-mars-test-00'), 'w') as f:
+            f.write('%PDF-1.4')
+        mock_pipe.return_value = (1, b'', b'broken')
+        with self.assertRaises(RuntimeError):
+            session_draft_merged_pdf('999', 'mars', ['draft-ietf-mars-test-00'])
+        self.assertEqual(os.listdir(settings.SESSION_DRAFT_PDF_CACHE_DIR), [])
+
+    @patch('ietf.meeting.tasks.session_draft_merged_pdf')
+    @patch('ietf.meeting.tasks.convert_missing_draft_pdfs')
+    @patch('ietf.meeting.tasks.session_draft_list')
+    def test_prepare_session_draft_pdfs_task(self, mock_list, mock_convert, mock_merge):
+        """The task should prepare the PDFs of each group with a session at the current meeting"""
+        # no current meeting
+        prepare_session_draft_pdfs_task()
+        self.assertFalse(mock_list.called)
+
+        meeting = MeetingFactory(type_id='ietf', date=date_today())
+        SessionFactory(meeting=meeting, group__acronym='mars')
+        SessionFactory(meeting=meeting, group__acronym='ames')
+        mock_list.return_value = ['draft-ietf-mars-test-00']
+        # a failure for one group doesn't stop the others
+        mock_merge.side_effect = [RuntimeError('broken'), '/tmp/merged.pdf']
+        prepare_session_draft_pdfs_task()
+        self.assertEqual([c.args[1] for c in mock_list.call_args_list], ['ames', 'mars'])
+        self.assertEqual(mock_convert.call_count, 2)
+        self.assertEqual([c.args[1:] for c in mock_merge.call_args_list],
+                         [('ames', ['draft-ietf-mars-test-00']), ('mars', ['draft-ietf-mars-test-00'])])
+
+    def test_prepare_session_draft_pdfs_periodic_task(self):
+        """The migration should schedule the task, and remove it again when reversed"""
+        from django.apps import apps
+        from django_celery_beat.models import PeriodicTask
+        migration = import_module('ietf.meeting.migrations.0059_create_prepare_session_draft_pdfs_task')
+        task_name = 'ietf.meeting.tasks.prepare_session_draft_pdfs_task'
+        migration.forward(apps, None)
+        self.assertEqual(PeriodicTask.objects.filter(task=task_name).count(), 1)
+        migration.reverse(apps, None)
+        self.assertFalse(PeriodicTask.objects.filter(task=task_name).exists())
+        migration.forward(apps, None)
+        self.assertEqual(PeriodicTask.objects.filter(task=task_name).get().interval.every, 15)
@@ -161,6 +161,73 @@ class ScheduleGeneratorTest(TestCase):
         self.assertIn('Optimiser starting run 1', output)
         self.assertIn('Optimiser found an optimal schedule', output)
 
+    def test_seeded_schedule(self):
+        self._create_basic_sessions()
+        generator = generate_schedule.ScheduleHandler(self.stdout, self.meeting.number, verbosity=0, seeds=[1])
+        first = generator.optimise_with_seed(1)
+        second = generator.optimise_with_seed(1)
+        self.assertEqual(first, second)
+
+        generator = generate_schedule.ScheduleHandler(
+            self.stdout, self.meeting.number, name='seeded', verbosity=1, seeds=[1, 2, 3],
+        )
+        violations, cost = generator.run()
+        self.assertEqual(violations, self.fixed_violations)
+        self.assertEqual(cost, self.fixed_cost)
+
+        self.stdout.seek(0)
+        output = self.stdout.read()
+        self.assertIn('Seed 3: 2 violations', output)
+        self.assertIn('Using schedule from seed 1', output)
+        schedule = self.meeting.schedule_set.get(name='seeded')
+        self.assertCountEqual(
+            schedule.assignments.values_list('timeslot_id', 'session_id'),
+            first.assignments,
+        )
+
+    def test_cost_for_switch(self):
+        """Switch costs from the incremental calculation should match a full recalculation"""
+        self._create_basic_sessions()
+        base_schedule = self._create_base_schedule()
+        handler = generate_schedule.ScheduleHandler(
+            self.stdout,
+            self.meeting.number,
+            max_cycles=1,
+            verbosity=0,
+            base_id=generate_schedule.ScheduleId.from_schedule(base_schedule),
+        )
+        schedule = handler.schedule
+        schedule.fill_initial_schedule()
+        free_timeslots = list(schedule.free_timeslots)
+        for timeslot1 in free_timeslots:
+            for timeslot2 in free_timeslots:
+                proposed = schedule.schedule.copy()
+                session1 = proposed.get(timeslot1)
+                session2 = proposed.get(timeslot2)
+                if session1:
+                    proposed[timeslot2] = session1
+                elif session2:
+                    del proposed[timeslot2]
+                if session2:
+                    proposed[timeslot1] = session2
+                elif session1:
+                    del proposed[timeslot1]
+                if (session1 and not session1.fits_in_timeslot(timeslot2)) or (
+                        session2 and not session2.fits_in_timeslot(timeslot1)):
+                    expected = float('inf')
+                else:
+                    expected = schedule.calculate_dynamic_cost(proposed)[1]
+                self.assertEqual(schedule._cost_for_switch(timeslot1, timeslot2), expected)
+
+        # the stored state must follow changes to the schedule
+        timeslot1 = next(t for t, s in schedule.schedule.items() if s.attendees <= 10)
+        timeslot2 = next(t for t in free_timeslots if t != timeslot1 and t not in schedule.schedule)
+        cost = schedule._cost_for_switch(timeslot1, timeslot2)
+        schedule._switch_sessions(timeslot1, timeslot2)
+        self.assertIn(timeslot2, schedule.schedule)
+        self.assertEqual(schedule._current_cost_state().cost, cost)
+        self.assertEqual(schedule._current_cost_state().cost, schedule.calculate_dynamic_cost()[1])
+
     def test_base_schedule_dynamic_cost(self):
         """Conflicts with the base schedule should contribute to dynamic cost"""
         # create the base schedule
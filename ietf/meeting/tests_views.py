@@ -7,6 +7,7 @@ import os
 import random
 import re
 import shutil
+import tarfile
 import pytz
 import requests.exceptions
 import requests_mock
@@ -27,6 +28,8 @@ from django.urls import reverse as urlreverse
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
 from django.db.models import F, Max
 from django.http import QueryDict, FileResponse
 from django.template import Context, Template
@@ -45,7 +48,7 @@ from ietf.meeting.helpers import send_interim_meeting_cancellation_notice, send_
 from ietf.meeting.helpers import send_interim_minutes_reminder, populate_important_dates, update_important_dates
 from ietf.meeting.models import Session, TimeSlot, Meeting, SchedTimeSessAssignment, Schedule, SessionPresentation, SlideSubmission, SchedulingEvent, Room, Constraint, ConstraintName
 from ietf.meeting.test_data import make_meeting_test_data, make_interim_meeting, make_interim_test_data
-from ietf.meeting.utils import finalize, condition_slide_order
+from ietf.meeting.utils import finalize, condition_slide_order, agenda_version, pending_agenda_changes, new_agenda_version
 from ietf.meeting.utils import add_event_info_to_session_qs
 from ietf.meeting.views import session_draft_list, parse_agenda_filter_params, sessions_post_save, agenda_extract_schedule
 from ietf.name.models import SessionStatusName, ImportantDateName, RoleName, ProceedingsMaterialTypeName
@@ -172,8 +175,71 @@ class AgendaApiTests(TestCase):
         self.assertEqual(shown['room'], room.name)
         self.assertEqual(shown['location'], {'name': room.floorplan.name, 'short': room.floorplan.short})
 
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_agenda_data_etag(self):
+        meeting = MeetingFactory(type_id='ietf', number='120')
+        session = SessionFactory(meeting=meeting, agenda_note='First note')
+
+        for url in [
+            urlreverse('ietf.meeting.views.api_get_agenda_data', kwargs=dict(num=meeting.number)),
+            urlreverse('ietf.meeting.views.agenda_plain', kwargs=dict(num=meeting.number, ext='.txt')),
+            urlreverse('ietf.meeting.views.agenda_ical', kwargs=dict(num=meeting.number)),
+        ]:
+            r = self.client.get(url)
+            self.assertEqual(r.status_code, 200)
+            etag = r['ETag']
+            self.assertTrue(etag)
+            r = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(r.status_code, 304)
+
+            # changing the agenda changes the ETag
+            session.agenda_note = 'Note for %s' % url
+            session.save()
+            r = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(r.status_code, 200)
+            self.assertNotEqual(r['ETag'], etag)
+
+        r = self.client.get(urlreverse('ietf.meeting.views.api_get_agenda_data', kwargs=dict(num=meeting.number)))
+        self.assertIn(session.agenda_note, [s['note'] for s in r.json()['schedule']])
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+                       MEETING_AGENDA_PRERENDER=True)
+    def test_agenda_changes_per_transaction(self):
+        meeting = MeetingFactory(type_id='ietf', number='120')
+        sessions = SessionFactory.create_batch(3, meeting=meeting, add_to_schedule=False)
+        timeslots = TimeSlotFactory.create_batch(3, meeting=meeting)
+        schedule = meeting.schedule
+        version = agenda_version(meeting.pk)
+
+        # saving several assignments bumps the version once, without
+        # looking up the meeting of the schedule
+        with patch('ietf.meeting.utils.new_agenda_version', wraps=new_agenda_version) as bump:
+            with CaptureQueriesContext(connection) as queries:
+                for session, timeslot in zip(sessions, timeslots):
+                    SchedTimeSessAssignment.objects.create(schedule=schedule, session=session, timeslot=timeslot)
+            bump.assert_called_once_with(meeting.pk)
+        self.assertFalse([ q for q in queries if 'FROM "meeting_schedule"' in q['sql'] or 'FROM `meeting_schedule`' in q['sql'] ])
+        new_version = agenda_version(meeting.pk)
+        self.assertNotEqual(new_version, version)
+
+        # once it has been read, the next change bumps it again
+        session = sessions[0]
+        session.agenda_note = 'Changed'
+        session.save()
+        self.assertNotEqual(agenda_version(meeting.pk), new_version)
+
+        # the commit queues one rebuild per meeting
+        pending = pending_agenda_changes()
+        self.assertIn(meeting.pk, pending.meeting_ids)
+        with patch('ietf.meeting.tasks.rebuild_agenda_data_task.delay') as delay:
+            pending()
+            self.assertCountEqual([ c[0][0] for c in delay.call_args_list ], pending.meeting_ids)
+        self.assertIsNone(pending_agenda_changes())
+
 
 class MeetingTests(BaseMeetingTestCase):
+    settings_temp_path_overrides = TestCase.settings_temp_path_overrides + ['INTERNET_DRAFT_PDF_PATH', 'SESSION_DRAFT_PDF_CACHE_DIR']
+
     def test_meeting_agenda(self):
         meeting = make_meeting_test_data()
         session = Session.objects.filter(meeting=meeting, group__acronym="mars").first()
@@ -716,6 +782,10 @@ class MeetingTests(BaseMeetingTestCase):
         response = self.client.get(url)
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.get('Content-Type'), 'application/octet-stream')
+        tar = tarfile.open(fileobj=BytesIO(b''.join(response.streaming_content)), mode='r:gz')
+        self.assertIn('manifest.txt', tar.getnames())
+        manifest = tar.extractfile('manifest.txt').read().decode('utf-8')
+        self.assertEqual(len(manifest.splitlines()), 2)
         for filename in filenames:
             os.unlink(filename)
 
@@ -727,6 +797,13 @@ class MeetingTests(BaseMeetingTestCase):
         response = self.client.get(url)
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.get('Content-Type'), 'application/pdf')
+        content = b''.join(response.streaming_content)
+        # the merged PDF is cached, and served again for the same drafts
+        cached = os.listdir(settings.SESSION_DRAFT_PDF_CACHE_DIR)
+        self.assertEqual(len(cached), 1)
+        response = self.client.get(url)
+        self.assertEqual(b''.join(response.streaming_content), content)
+        self.assertEqual(os.listdir(settings.SESSION_DRAFT_PDF_CACHE_DIR), cached)
         for filename in filenames:
             os.unlink(filename)
 
@@ -1,10 +1,13 @@
 # Copyright The IETF Trust 2016-2020, All Rights Reserved
 # -*- coding: utf-8 -*-
 import datetime
+import hashlib
 import itertools
 import pytz
 import requests
 import subprocess
+import threading
+import uuid
 
 from collections import defaultdict
 from pathlib import Path
@@ -12,6 +15,8 @@ from urllib.error import HTTPError
 
 from django.conf import settings
 from django.contrib import messages
+from django.core.cache import cache
+from django.db import transaction
 from django.template.loader import render_to_string
 from django.utils import timezone
 from django.utils.encoding import smart_text
@@ -756,3 +761,85 @@ def write_doc_for_session(session, type_id, filename, contents):
     with open(path / filename, "wb") as file:
         file.write(contents.encode('utf-8'))
     return
+
+
+AGENDA_VERSION_KEY = "meeting:agenda-version:%s"
+AGENDA_REBUILD_PENDING_KEY = "meeting:agenda-rebuild-pending:%s"
+# Changes the signal handlers don't see, e.g. to group names, show up after
+# at most this long
+AGENDA_CACHE_TIMEOUT = 24 * 60 * 60
+
+def agenda_version(meeting_id):
+    """Return a token that changes whenever the sessions, timeslots,
+    assignments or materials of the meeting change, for use in cache keys
+    and ETags of the agenda outputs."""
+    pending = pending_agenda_changes()
+    if pending:
+        # what is read now can be cached under this version, so the next
+        # change in this transaction has to bump it again
+        pending.fresh.discard(meeting_id)
+    key = AGENDA_VERSION_KEY % meeting_id
+    version = cache.get(key)
+    if version is None:
+        version = uuid.uuid4().hex
+        if not cache.add(key, version, AGENDA_CACHE_TIMEOUT):
+            version = cache.get(key) or version
+    return version
+
+def agenda_etag(meeting, *parts):
+    """Return an ETag for an agenda output of the meeting, with parts
+    distinguishing the different outputs"""
+    text = ":".join(str(p) for p in (meeting.pk, agenda_version(meeting.pk)) + parts)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+def new_agenda_version(meeting_id):
+    cache.set(AGENDA_VERSION_KEY % meeting_id, uuid.uuid4().hex, AGENDA_CACHE_TIMEOUT)
+
+class AgendaChanges(object):
+    """The meetings whose agenda changed in the current transaction.  When
+    the transaction commits, their version is bumped again, in case a
+    concurrent request cached the data from before the commit under the new
+    version, and a rebuild of their agenda data is queued."""
+    def __init__(self, hooks):
+        self.meeting_ids = set()
+        # meetings whose version hasn't been read since it was bumped
+        self.fresh = set()
+        self.hooks = hooks
+
+    def __call__(self):
+        if getattr(_agenda_changes, "pending", None) is self:
+            _agenda_changes.pending = None
+        for meeting_id in self.meeting_ids:
+            new_agenda_version(meeting_id)
+            if settings.MEETING_AGENDA_PRERENDER and cache.add(AGENDA_REBUILD_PENDING_KEY % meeting_id, True, 60):
+                from ietf.meeting.tasks import rebuild_agenda_data_task
+                rebuild_agenda_data_task.delay(meeting_id)
+
+_agenda_changes = threading.local()
+
+def pending_agenda_changes():
+    """Return the AgendaChanges of the current transaction, if any"""
+    pending = getattr(_agenda_changes, "pending", None)
+    # a rollback replaces the list of commit hooks, dropping ours
+    if pending is not None and pending.hooks is transaction.get_connection().run_on_commit:
+        return pending
+    return None
+
+def agenda_changed(meeting_id):
+    """Invalidate the cached agenda outputs of the meeting, and queue a
+    rebuild of the agenda data once the current transaction commits.  The
+    version is only bumped again when it has been read since, and the
+    commit work is done once per meeting, however many of its objects the
+    transaction saves."""
+    pending = pending_agenda_changes()
+    if pending is not None and meeting_id in pending.fresh:
+        return
+    first = pending is None
+    if first:
+        pending = _agenda_changes.pending = AgendaChanges(transaction.get_connection().run_on_commit)
+    pending.meeting_ids.add(meeting_id)
+    pending.fresh.add(meeting_id)
+    new_agenda_version(meeting_id)
+    if first:
+        # outside a transaction, this runs it right away
+        transaction.on_commit(pending)
@@ -5,6 +5,7 @@
 import csv
 import datetime
 import glob
+import hashlib
 import io
 import itertools
 import json
@@ -18,18 +19,19 @@ import tempfile
 from calendar import timegm
 from collections import OrderedDict, Counter, deque, defaultdict, namedtuple
 from urllib.parse import unquote
-from tempfile import mkstemp
 from wsgiref.handlers import format_date_time
 
 from django import forms
 from django.shortcuts import render, redirect, get_object_or_404
 from django.http import (HttpResponse, HttpResponseRedirect, HttpResponseForbidden,
                          HttpResponseNotFound, Http404, HttpResponseBadRequest,
-                         JsonResponse, HttpResponseGone)
+                         JsonResponse, HttpResponseGone, FileResponse, StreamingHttpResponse)
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import URLValidator
 from django.urls import reverse,reverse_lazy
 from django.db.models import F, Max, Q
@@ -37,11 +39,13 @@ from django.forms.models import modelform_factory, inlineformset_factory
 from django.template import TemplateDoesNotExist
 from django.template.loader import render_to_string
 from django.utils import timezone
-from django.utils.encoding import force_str
+from django.utils.cache import get_conditional_response
 from django.utils.functional import curry
+from django.utils.http import quote_etag
 from django.utils.text import slugify
 from django.views.decorators.cache import cache_page
 from django.views.decorators.csrf import ensure_csrf_cookie, csrf_exempt
+from django.views.decorators.http import condition
 from django.views.generic import RedirectView
 
 import debug                            # pyflakes:ignore
@@ -60,9 +64,10 @@ from ietf.meeting.forms import ( CustomDurationField, SwapDaysForm, SwapTimeslot
 from ietf.meeting.helpers import get_person_by_email, get_schedule_by_name
 from ietf.meeting.helpers import get_meeting, get_ietf_meeting, get_current_ietf_meeting_num
 from ietf.meeting.helpers import get_schedule, schedule_permissions
-from ietf.meeting.helpers import preprocess_assignments_for_agenda, read_agenda_file
+from ietf.meeting.helpers import preprocess_assignments_for_agenda
 from ietf.meeting.helpers import AgendaFilterOrganizer, AgendaKeywordTagger
 from ietf.meeting.helpers import convert_draft_to_pdf, get_earliest_session_date
+from ietf.meeting.helpers import session_draft_list, draft_pdf_path, convert_missing_draft_pdfs, session_draft_merged_pdf
 from ietf.meeting.helpers import can_view_interim_request, can_approve_interim_request
 from ietf.meeting.helpers import can_edit_interim_request
 from ietf.meeting.helpers import can_request_interim_meeting, get_announcement_initial
@@ -82,6 +87,7 @@ from ietf.meeting.utils import diff_meeting_schedules, prefetch_schedule_diff_ob
 from ietf.meeting.utils import swap_meeting_schedule_timeslot_assignments, bulk_create_timeslots
 from ietf.meeting.utils import preprocess_meeting_important_dates
 from ietf.meeting.utils import new_doc_for_session, write_doc_for_session
+from ietf.meeting.utils import agenda_version, agenda_etag, AGENDA_CACHE_TIMEOUT
 from ietf.message.utils import infer_message
 from ietf.name.models import SlideSubmissionStatusName, ProceedingsMaterialTypeName, SessionPurposeName
 from ietf.secr.proceedings.proc_utils import (get_progress_stats, post_process, import_audio_files,
@@ -92,8 +98,6 @@ from ietf.utils.hedgedoc import Note, NoteError
 from ietf.utils.log import assertion
 from ietf.utils.mail import send_mail_message, send_mail_text
 from ietf.utils.mime import get_mime_type
-from ietf.utils.pipe import pipe
-from ietf.utils.pdf import pdf_pages
 from ietf.utils.response import permission_denied
 from ietf.utils.text import xslugify
 from ietf.utils.timezone import datetime_today, date_today
@@ -1512,6 +1516,13 @@ def get_assignments_for_agenda(schedule):
     )
 
 
+def agenda_plain_etag(request, num=None, name=None, base=None, ext=None, owner=None, utc=""):
+    meeting = get_ietf_meeting(num)
+    if meeting is None or int(meeting.number) <= 64:
+        return None
+    return agenda_etag(meeting, request.get_full_path())
+
+@condition(etag_func=agenda_plain_etag)
 @ensure_csrf_cookie
 def agenda_plain(request, num=None, name=None, base=None, ext=None, owner=None, utc=""):
     base = base if base else 'agenda'
@@ -1609,19 +1620,8 @@ def agenda(request, num=None, name=None, base=None, ext=None, owner=None, utc=""
         }
     })
 
-@cache_page(5 * 60)
-def api_get_agenda_data (request, num=None):
-    meeting = get_ietf_meeting(num)
-    if meeting is None:
-        raise Http404("No such full IETF meeting")
-    elif int(meeting.number) <= 64:
-        return Http404("Pre-IETF 64 meetings are not available through this API")
-    else:
-        pass
-
-    # Select the schedule to show
-    schedule = get_schedule(meeting, None)
-
+def build_agenda_data(meeting, schedule, is_current_meeting):
+    """Build the agenda data served by api_get_agenda_data"""
     updated = meeting.updated()
 
     # Select and prepare sessions that should be included
@@ -1633,14 +1633,12 @@ def api_get_agenda_data (request, num=None):
 
     filter_organizer = AgendaFilterOrganizer(assignments=filtered_assignments)
 
-    is_current_meeting = (num is None) or (num == get_current_ietf_meeting_num())
-
     # Get Floor Plans
     floors = FloorPlan.objects.filter(meeting=meeting).order_by('order')
 
     #debug.show('all([(item.acronym,item.session.order_number,item.session.order_in_meeting()) for item in filtered_assignments])')
 
-    return JsonResponse({
+    return {
         "meeting": {
             "number": schedule.meeting.number,
             "city": schedule.meeting.city,
@@ -1656,7 +1654,39 @@ def api_get_agenda_data (request, num=None):
         "useNotes": meeting.uses_notes(),
         "schedule": list(map(agenda_extract_schedule, filtered_assignments)),
         "floors": list(map(agenda_extract_floorplan, floors))
-    })
+    }
+
+def get_agenda_data(meeting, schedule):
+    """Return the ETag and JSON text of the agenda data.  This is cached
+    until the agenda changes, and rebuilt in the background then."""
+    is_current_meeting = meeting.number == get_current_ietf_meeting_num()
+    cache_key = "meeting:agenda-data:%s:%s:%s:%s" % (meeting.pk, schedule.pk, is_current_meeting, agenda_version(meeting.pk))
+    cached = cache.get(cache_key)
+    if cached is None:
+        content = json.dumps(build_agenda_data(meeting, schedule, is_current_meeting), cls=DjangoJSONEncoder)
+        cached = (hashlib.sha1(content.encode('utf-8')).hexdigest(), content)
+        cache.set(cache_key, cached, AGENDA_CACHE_TIMEOUT)
+    return cached
+
+def api_get_agenda_data (request, num=None):
+    meeting = get_ietf_meeting(num)
+    if meeting is None:
+        raise Http404("No such full IETF meeting")
+    elif int(meeting.number) <= 64:
+        return Http404("Pre-IETF 64 meetings are not available through this API")
+    else:
+        pass
+
+    # Select the schedule to show
+    schedule = get_schedule(meeting, None)
+
+    etag, content = get_agenda_data(meeting, schedule)
+    etag = quote_etag(etag)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(content, content_type='application/json')
+    response['ETag'] = etag
+    return response
 
 def api_get_session_materials (request, session_id=None):
     session = get_object_or_404(Session,pk=session_id)
@@ -1890,107 +1920,59 @@ def agenda_by_type_ics(request,num=None,type=None):
     updated = meeting.updated()
     return render(request,"meeting/agenda.ics",{"schedule":schedule,"updated":updated,"assignments":assignments},content_type="text/calendar")
 
-def session_draft_list(num, acronym):
-    try:
-        agendas = Document.objects.filter(type="agenda",
-                                         session__meeting__number=num,
-                                         session__group__acronym=acronym,
-                                         states=State.objects.get(type="agenda", slug="active")).distinct()
-    except Document.DoesNotExist:
-        raise Http404
-
-    drafts = set()
-    for agenda in agendas:
-        content, _ = read_agenda_file(num, agenda)
-        if content:
-            drafts.update(re.findall(b'(draft-[-a-z0-9]*)', content))
-
-    result = []
-    for draft in drafts:
-        draft = force_str(draft)
-        try:
-            if re.search('-[0-9]{2}$', draft):
-                doc_name = draft
-            else:
-                doc = Document.objects.get(name=draft)
-                doc_name = draft + "-" + doc.rev
+def session_draft_tarfile(request, num, acronym):
+    drafts = session_draft_list(num, acronym);
 
-            if doc_name not in result:
-                result.append(doc_name)
-        except Document.DoesNotExist:
-            pass
+    def tar_chunks():
+        # the stream mode tarfile only ever writes to the buffer, which is
+        # drained after each member so the response is sent as it is built
+        buffer = io.BytesIO()
+        tarstream = tarfile.open(mode='w|gz', fileobj=buffer)
+        manifest = io.StringIO()
 
-    for sp in SessionPresentation.objects.filter(session__meeting__number=num, session__group__acronym=acronym, document__type='draft'):
-        doc_name = sp.document.name + "-" + sp.document.rev
-        if doc_name not in result:
-            result.append(doc_name)
+        def drain():
+            data = buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            return data
 
-    return sorted(result)
+        for doc_name in drafts:
+            pdf_path = draft_pdf_path(doc_name)
 
-def session_draft_tarfile(request, num, acronym):
-    drafts = session_draft_list(num, acronym);
-
-    response = HttpResponse(content_type='application/octet-stream')
-    response['Content-Disposition'] = 'attachment; filename=%s-drafts.tgz'%(acronym)
-    tarstream = tarfile.open('','w:gz',response)
-    mfh, mfn = mkstemp()
-    os.close(mfh)
-    manifest = io.open(mfn, "w")
+            if not os.path.exists(pdf_path):
+                convert_draft_to_pdf(doc_name)
 
-    for doc_name in drafts:
-        pdf_path = os.path.join(settings.INTERNET_DRAFT_PDF_PATH, doc_name + ".pdf")
+            if os.path.exists(pdf_path):
+                try:
+                    tarstream.add(pdf_path, str(doc_name + ".pdf"))
+                    manifest.write("Included:  "+pdf_path+"\n")
+                except Exception as e:
+                    manifest.write(("Failed (%s): "%e)+pdf_path+"\n")
+            else:
+                manifest.write("Not found: "+pdf_path+"\n")
 
-        if not os.path.exists(pdf_path):
-            convert_draft_to_pdf(doc_name)
+            data = drain()
+            if data:
+                yield data
 
-        if os.path.exists(pdf_path):
-            try:
-                tarstream.add(pdf_path, str(doc_name + ".pdf"))
-                manifest.write("Included:  "+pdf_path+"\n")
-            except Exception as e:
-                manifest.write(("Failed (%s): "%e)+pdf_path+"\n")
-        else:
-            manifest.write("Not found: "+pdf_path+"\n")
+        manifest_content = manifest.getvalue().encode('utf-8')
+        info = tarfile.TarInfo("manifest.txt")
+        info.size = len(manifest_content)
+        info.mtime = int(timezone.now().timestamp())
+        tarstream.addfile(info, io.BytesIO(manifest_content))
+        tarstream.close()
+        yield drain()
 
-    manifest.close()
-    tarstream.add(mfn, "manifest.txt")
-    tarstream.close()
-    os.unlink(mfn)
+    response = StreamingHttpResponse(tar_chunks(), content_type='application/octet-stream')
+    response['Content-Disposition'] = 'attachment; filename=%s-drafts.tgz'%(acronym)
     return response
 
 def session_draft_pdf(request, num, acronym):
     drafts = session_draft_list(num, acronym);
-    curr_page = 1
-    pmh, pmn = mkstemp()
-    os.close(pmh)
-    pdfmarks = io.open(pmn, "w")
-    pdf_list = ""
-
-    for draft in drafts:
-        pdf_path = os.path.join(settings.INTERNET_DRAFT_PDF_PATH, draft + ".pdf")
-        if not os.path.exists(pdf_path):
-            convert_draft_to_pdf(draft)
-
-        if os.path.exists(pdf_path):
-            pages = pdf_pages(pdf_path)
-            pdfmarks.write("[/Page "+str(curr_page)+" /View [/XYZ 0 792 1.0] /Title (" + draft + ") /OUT pdfmark\n")
-            pdf_list = pdf_list + " " + pdf_path
-            curr_page = curr_page + pages
-
-    pdfmarks.close()
-    pdfh, pdfn = mkstemp()
-    os.close(pdfh)
-    gs = settings.GHOSTSCRIPT_COMMAND
-    code, out, err = pipe(gs + " -dBATCH -dNOPAUSE -q -sDEVICE=pdfwrite -sOutputFile=" + pdfn + " " + pdf_list + " " + pmn)
-    assertion('code == 0')
-
-    pdf = io.open(pdfn,"rb")
-    pdf_contents = pdf.read()
-    pdf.close()
-
-    os.unlink(pmn)
-    os.unlink(pdfn)
-    return HttpResponse(pdf_contents, content_type="application/pdf")
+    # the drafts are normally converted ahead of time by prepare_session_draft_pdfs_task
+    convert_missing_draft_pdfs(drafts)
+    pdf_path = session_draft_merged_pdf(num, acronym, drafts)
+    return FileResponse(io.open(pdf_path, "rb"), content_type="application/pdf")
 
 def ical_session_status(assignment):
     if assignment.session.current_status == 'canceled':
@@ -2031,6 +2013,10 @@ def should_include_assignment(filter_params, assignment):
     hidden = len(set(filter_params['hide']).intersection(assignment.filter_keywords)) > 0
     return shown and not hidden
 
+def agenda_ical_etag(request, num=None, name=None, acronym=None, session_id=None):
+    return agenda_etag(get_meeting(num, type_in=None), request.get_full_path())
+
+@condition(etag_func=agenda_ical_etag)
 def agenda_ical(request, num=None, name=None, acronym=None, session_id=None):
     """Agenda ical view
 
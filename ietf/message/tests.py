@@ -3,6 +3,9 @@
 
 
 import datetime
+import mock
+
+from smtplib import SMTPException
 
 from django.urls import reverse as urlreverse
 from django.utils import timezone
@@ -11,9 +14,9 @@ import debug                            # pyflakes:ignore
 
 from ietf.group.factories import GroupFactory
 from ietf.message.models import Message, SendQueue
-from ietf.message.utils import send_scheduled_message_from_send_queue
+from ietf.message.utils import send_scheduled_message_from_send_queue, send_scheduled_messages_from_send_queue
 from ietf.person.models import Person
-from ietf.utils.mail import outbox, send_mail_text, send_mail_message, get_payload_text
+from ietf.utils.mail import outbox, send_mail_text, send_mail_message, get_payload_text, smtp_connect
 from ietf.utils.test_utils import TestCase
 from ietf.utils.timezone import date_today
 
@@ -128,3 +131,55 @@ class SendScheduledAnnouncementsTests(TestCase):
         self.assertTrue("This is a test" in outbox[-1]["Subject"])
         self.assertTrue("--NextPart" in outbox[-1].as_string())
         self.assertTrue(SendQueue.objects.get(id=q.id).sent_at)
+
+    @mock.patch('ietf.utils.mail.smtp_connect', wraps=smtp_connect)
+    def test_send_scheduled_messages(self, mock_connect):
+        system = Person.objects.get(name="(System)")
+        queue = []
+        for i in range(5):
+            msg = Message.objects.create(
+                by=system,
+                subject="This is test %s" % i,
+                to="test@example.com",
+                frm="testmonkey@example.com",
+                body="Hello World!",
+                content_type="text/plain",
+                )
+            queue.append(SendQueue.objects.create(by=system, message=msg))
+
+        mailbox_before = len(outbox)
+
+        sent = send_scheduled_messages_from_send_queue(SendQueue.objects.filter(sent_at=None).select_related("message"))
+
+        self.assertEqual(len(sent), 5)
+        self.assertEqual(len(outbox), mailbox_before + 5)
+        self.assertEqual(mock_connect.call_count, 1)
+        self.assertFalse(SendQueue.objects.filter(pk__in=[q.pk for q in queue], sent_at=None).exists())
+        self.assertFalse(Message.objects.filter(sendqueue__in=queue, sent=None).exists())
+
+    @mock.patch('ietf.message.utils.send_error_email')
+    @mock.patch('ietf.message.utils.send_mail_text')
+    def test_send_scheduled_messages_marks_each_sent(self, mock_send, mock_error_email):
+        system = Person.objects.get(name="(System)")
+        queue = []
+        for i in range(3):
+            msg = Message.objects.create(
+                by=system,
+                subject="This is test %s" % i,
+                to="test@example.com",
+                frm="testmonkey@example.com",
+                body="Hello World!",
+                content_type="text/plain",
+                )
+            queue.append(SendQueue.objects.create(by=system, message=msg))
+
+        # the second message fails; the ones before and after it are still marked sent
+        mock_send.side_effect = [None, SMTPException("failed"), None]
+        sent = send_scheduled_messages_from_send_queue(SendQueue.objects.filter(pk__in=[q.pk for q in queue]).order_by("pk").select_related("message"))
+
+        self.assertEqual([q.pk for q in sent], [queue[0].pk, queue[2].pk])
+        self.assertTrue(mock_error_email.called)
+        self.assertTrue(SendQueue.objects.get(pk=queue[0].pk).sent_at)
+        self.assertIsNone(SendQueue.objects.get(pk=queue[1].pk).sent_at)
+        self.assertIsNone(Message.objects.get(pk=queue[1].message.pk).sent)
+        self.assertTrue(SendQueue.objects.get(pk=queue[2].pk).sent_at)
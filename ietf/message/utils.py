@@ -4,10 +4,12 @@
 
 import re, email
 
+from smtplib import SMTPException
+
 from django.utils import timezone
 from django.utils.encoding import force_str
 
-from ietf.utils.mail import send_mail_text, send_mail_mime
+from ietf.utils.mail import send_mail_text, send_mail_mime, smtp_session, log_smtp_exception, send_error_email
 from ietf.message.models import Message
 
 first_dot_on_line_re = re.compile(r'^\.', re.MULTILINE)
@@ -58,3 +60,20 @@ def send_scheduled_message_from_send_queue(queue_item):
 
     queue_item.message.sent = queue_item.sent_at
     queue_item.message.save()
+
+def send_scheduled_messages_from_send_queue(queue_items):
+    """Send the messages of the SendQueue entries over one SMTP connection,
+    marking each entry as sent as soon as its message has gone out, so an
+    interrupted run does not send it again. Returns the entries that were
+    sent; failures are logged and reported, and the entries left unsent."""
+    sent = []
+    with smtp_session():
+        for queue_item in queue_items:
+            try:
+                send_scheduled_message_from_send_queue(queue_item)
+            except SMTPException as e:
+                log_smtp_exception(e)
+                send_error_email(e)
+                continue
+            sent.append(queue_item)
+    return sent
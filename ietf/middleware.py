@@ -6,6 +6,7 @@ from django.db import connection
 from django.db.utils import OperationalError
 from django.shortcuts import render
 from django.http import HttpResponsePermanentRedirect
+from ietf.mailtrigger.utils import resolution_cache
 from ietf.utils.log import log, exc_parts
 from ietf.utils.mail import log_smtp_exception
 import re
@@ -70,4 +71,12 @@ def unicode_nfkc_normalization_middleware(get_response):
         response = get_response(request)
         return response
     return unicode_nfkc_normalization
-        
+
+def mailtrigger_resolution_cache_middleware(get_response):
+    def mailtrigger_resolution(request):
+        """Resolve each mailtrigger recipient only once per request for
+        the same objects, as actions like ballot and last call changes
+        send several mails about the same document."""
+        with resolution_cache():
+            return get_response(request)
+    return mailtrigger_resolution
@@ -31,7 +31,7 @@ from ietf.person.models import Email, Person
 from ietf.mailtrigger.utils import gather_address_lists
 from ietf.meeting.models import Meeting, Attended
 from ietf.utils.pipe import pipe
-from ietf.utils.mail import send_mail_text, send_mail, get_payload_text
+from ietf.utils.mail import send_mail_text, send_mail, get_payload_text, smtp_session
 from ietf.utils.log import log
 from ietf.person.name import unidecode_name
 from ietf.utils.timezone import date_today, datetime_from_date, DEADLINE_TZINFO
@@ -303,16 +303,17 @@ def send_questionnaire_reminder_to_nominee(nominee_position):
 
 def send_reminder_to_nominees(nominees,type):
     addrs = []
-    if type=='accept':
-        for nominee in nominees:
-            for nominee_position in nominee.nomineeposition_set.pending():
-                send_accept_reminder_to_nominee(nominee_position)
-                addrs.append(nominee_position.nominee.email.address)
-    elif type=='questionnaire':
-        for nominee in nominees:
-            for nominee_position in nominee.nomineeposition_set.accepted().without_questionnaire_response():
-                send_questionnaire_reminder_to_nominee(nominee_position)
-                addrs.append(nominee_position.nominee.email.address)
+    with smtp_session():
+        if type=='accept':
+            for nominee in nominees:
+                for nominee_position in nominee.nomineeposition_set.pending():
+                    send_accept_reminder_to_nominee(nominee_position)
+                    addrs.append(nominee_position.nominee.email.address)
+        elif type=='questionnaire':
+            for nominee in nominees:
+                for nominee_position in nominee.nomineeposition_set.accepted().without_questionnaire_response():
+                    send_questionnaire_reminder_to_nominee(nominee_position)
+                    addrs.append(nominee_position.nominee.email.address)
     return addrs
 
 
@@ -0,0 +1,38 @@
+# Copyright The IETF Trust 2023, All Rights Reserved
+# -*- coding: utf-8 -*-
+
+
+from tqdm import tqdm
+
+from django.core.management.base import BaseCommand
+
+import debug                            # pyflakes:ignore
+
+from ietf.person.models import Person
+from ietf.person.utils import update_person_search_tokens
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = ('Rebuild the autocompletion tokens of the names and email addresses of persons, '
+            'either for the given persons or for all persons.  The tokens are kept up to date '
+            'as names and addresses change, so this is only needed to fill them in initially, '
+            'or to catch changes made with bulk updates.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('ids', nargs='*', type=int, help="Rebuild the tokens only for the persons with these ids")
+
+    def handle(self, *args, **options):
+        verbosity = options.get("verbosity", 1)
+
+        persons = Person.objects.all()
+        if options["ids"]:
+            persons = persons.filter(pk__in=options["ids"])
+        person_ids = list(persons.order_by("pk").values_list("pk", flat=True))
+
+        for i in tqdm(range(0, len(person_ids), BATCH_SIZE), disable=(verbosity!=1)):
+            update_person_search_tokens(person_ids[i:i+BATCH_SIZE], batch_size=BATCH_SIZE)
+
+        if verbosity > 1:
+            self.stdout.write("Updated the search tokens for %d persons" % len(person_ids))
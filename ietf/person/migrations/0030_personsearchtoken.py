@@ -0,0 +1,52 @@
+# Generated by Django 2.2.28 on 2023-04-17 09:26
+
+from django.db import migrations, models
+import django.db.models.deletion
+import ietf.utils.models
+
+from ietf.utils.text import prefix_search_tokens
+
+
+def forward(apps, schema_editor):
+    # mirrors ietf.person.utils.update_person_search_tokens()
+    Person = apps.get_model('person', 'Person')
+    Alias = apps.get_model('person', 'Alias')
+    Email = apps.get_model('person', 'Email')
+    PersonSearchToken = apps.get_model('person', 'PersonSearchToken')
+
+    person_ids = list(Person.objects.order_by("pk").values_list("pk", flat=True))
+    batch_size = 1000
+    for i in range(0, len(person_ids), batch_size):
+        batch = person_ids[i:i+batch_size]
+        tokens = set()
+        for person_id, name, ascii in Person.objects.filter(pk__in=batch).values_list("pk", "name", "ascii"):
+            tokens.update((person_id, None, t) for t in prefix_search_tokens(name) | prefix_search_tokens(ascii))
+        for person_id, name in Alias.objects.filter(person__in=batch).values_list("person_id", "name"):
+            tokens.update((person_id, None, t) for t in prefix_search_tokens(name))
+        for person_id, address in Email.objects.filter(person__in=batch).values_list("person_id", "address"):
+            tokens.update((person_id, address, t) for t in prefix_search_tokens(address))
+        PersonSearchToken.objects.bulk_create([ PersonSearchToken(person_id=person_id, email_id=address, token=token) for person_id, address, token in tokens ], batch_size=batch_size)
+
+
+def reverse(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('person', '0029_use_timezone_now_for_person_models'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PersonSearchToken',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(db_index=True, max_length=255)),
+                ('email', ietf.utils.models.ForeignKey(blank=True, help_text="The address the token is from, if it isn't from a name", null=True, on_delete=django.db.models.deletion.CASCADE, to='person.Email')),
+                ('person', ietf.utils.models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='person.Person')),
+            ],
+        ),
+        migrations.RunPython(forward, reverse),
+    ]
@@ -14,7 +14,8 @@ from django.conf import settings
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
 from django.core.validators import validate_email
-from django.db import models
+from django.db import models, transaction
+from django.db.models import signals
 from django.template.loader import render_to_string
 from django.urls import reverse as urlreverse
 from django.utils import timezone
@@ -333,6 +334,18 @@ class Email(models.Model):
             log.assertion('self.origin')
         super(Email, self).save(*args, **kwargs)
 
+class PersonSearchToken(models.Model):
+    """Lower-cased tails of the name aliases and email addresses of a person
+    from the start of each of their words, so that autocompletion can find
+    words anywhere in them with an indexed prefix match.  This is kept up
+    to date by the signal handlers in ietf.person.models."""
+    person = ForeignKey(Person, related_name='search_tokens')
+    email = ForeignKey(Email, null=True, blank=True, help_text="The address the token is from, if it isn't from a name")
+    token = models.CharField(max_length=255, db_index=True)
+
+    def __str__(self):
+        return u"%s: %s" % (self.person_id, self.token)
+
 # "{key.id}{salt}{hash}
 KEY_STRUCT = "i12s32s"
 
@@ -422,3 +435,45 @@ class PersonEvent(models.Model):
 class PersonApiKeyEvent(PersonEvent):
     key = ForeignKey(PersonalApiKey)
 
+
+
+def update_search_tokens_on_person_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    from ietf.person.utils import update_person_search_tokens
+    update_person_search_tokens([instance.pk])
+
+signals.post_save.connect(update_search_tokens_on_person_save, sender=Person)
+
+
+def update_search_tokens_on_alias_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    from ietf.person.utils import update_person_search_tokens
+    update_person_search_tokens([instance.person_id])
+
+signals.post_save.connect(update_search_tokens_on_alias_save, sender=Alias)
+
+
+def update_search_tokens_on_alias_delete(sender, instance, **kwargs):
+    person_id = instance.person_id
+    def update():
+        # when the person itself is deleted, its tokens are gone already
+        from ietf.person.utils import update_person_search_tokens
+        update_person_search_tokens(Person.objects.filter(pk=person_id).values_list("pk", flat=True))
+    transaction.on_commit(update)
+
+signals.post_delete.connect(update_search_tokens_on_alias_delete, sender=Alias)
+
+
+def update_search_tokens_on_email_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    from ietf.person.utils import update_person_search_tokens
+    # the address may have moved from another person
+    person_ids = set(PersonSearchToken.objects.filter(email=instance).values_list("person_id", flat=True))
+    if instance.person_id:
+        person_ids.add(instance.person_id)
+    update_person_search_tokens(person_ids)
+
+signals.post_save.connect(update_search_tokens_on_email_save, sender=Email)
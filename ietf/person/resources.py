@@ -202,3 +202,22 @@ class PersonExtResourceResource(ModelResource):
             "name": ALL_WITH_RELATIONS,
         }
 api.person.register(PersonExtResourceResource())
+
+
+from ietf.person.models import PersonSearchToken
+class PersonSearchTokenResource(ModelResource):
+    person           = ToOneField(PersonResource, 'person')
+    email            = ToOneField(EmailResource, 'email', null=True)
+    class Meta:
+        queryset = PersonSearchToken.objects.all()
+        serializer = api.Serializer()
+        cache = SimpleCache()
+        #resource_name = 'personsearchtoken'
+        ordering = ['id', ]
+        filtering = { 
+            "id": ALL,
+            "token": ALL,
+            "person": ALL_WITH_RELATIONS,
+            "email": ALL_WITH_RELATIONS,
+        }
+api.person.register(PersonSearchTokenResource())
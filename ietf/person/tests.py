@@ -26,7 +26,7 @@ from ietf.nomcom.models import NomCom
 from ietf.nomcom.test_data import nomcom_test_data
 from ietf.nomcom.factories import NomComFactory, NomineeFactory, NominationFactory, FeedbackFactory, PositionFactory
 from ietf.person.factories import EmailFactory, PersonFactory, UserFactory
-from ietf.person.models import Person, Alias
+from ietf.person.models import Person, Alias, Email
 from ietf.person.utils import (merge_persons, determine_merge_order, send_merge_notification,
     handle_users, get_extra_primary, dedupe_aliases, move_related_objects, merge_nominees,
     handle_reviewer_settings, merge_users, get_dots)
@@ -51,6 +51,43 @@ class PersonTests(TestCase):
         data = r.json()
         self.assertEqual(data[0]["id"], person.email_address())
 
+    def test_ajax_search_word_prefixes(self):
+        url = urlreverse("ietf.person.views.ajax_select2_search", kwargs={ "model_name": "person"})
+        person = PersonFactory(name="Iñigo Sanç Ibáñez de la Peña")
+        other = PersonFactory(name="Peñafiel Smith")
+        EmailFactory(person=person, address="zorro@example.com")
+
+        # terms match the start of words, in any order and without accents
+        r = self.client.get(url, dict(q="pen inig"))
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual([ d["id"] for d in r.json() ], [person.pk])
+
+        # but not the middle of words
+        r = self.client.get(url, dict(q="afiel"))
+        self.assertEqual(r.json(), [])
+
+        # a whole name ranks first
+        Alias.objects.create(person=other, name="Peña")
+        r = self.client.get(url, dict(q="peña"))
+        self.assertEqual([ d["id"] for d in r.json() ], [other.pk, person.pk])
+
+        # addresses are only searched with an @
+        r = self.client.get(url, dict(q="zorro"))
+        self.assertEqual(r.json(), [])
+        r = self.client.get(url, dict(q="zorro@"))
+        self.assertEqual([ d["id"] for d in r.json() ], [person.pk])
+
+        # the tokens follow new names and moved addresses
+        Alias.objects.create(person=person, name="Iñaki Ibáñez")
+        r = self.client.get(url, dict(q="inak"))
+        self.assertEqual([ d["id"] for d in r.json() ], [person.pk])
+
+        email = Email.objects.get(address="zorro@example.com")
+        email.person = other
+        email.save()
+        r = self.client.get(url, dict(q="zorro@example"))
+        self.assertEqual([ d["id"] for d in r.json() ], [other.pk])
+
     def test_ajax_person_email_json(self):
         person = PersonFactory()
         EmailFactory.create_batch(5, person=person)
@@ -15,8 +15,9 @@ from django.db.models import Q
 
 import debug                            # pyflakes:ignore
 
-from ietf.person.models import Person
+from ietf.person.models import Person, Alias, Email, PersonSearchToken
 from ietf.utils.mail import send_mail
+from ietf.utils.text import prefix_search_tokens
 
 def merge_persons(request, source, target, file=sys.stdout, verbose=False):
     changes = []
@@ -239,3 +240,42 @@ def get_dots(person):
         if roles.filter(group__acronym__startswith='nomcom', name_id__in=('chair','member')).exists():
             dots.append('nomcom')
         return dots
+
+
+def update_person_search_tokens(person_ids, batch_size=1000):
+    """Bring the autocompletion tokens of the given persons up to date from
+    their names, name aliases and email addresses, only writing the tokens
+    that have changed"""
+    person_ids = list(set(person_ids))
+    for i in range(0, len(person_ids), batch_size):
+        batch = person_ids[i:i+batch_size]
+        wanted = set()
+        for person_id, name, ascii in Person.objects.filter(pk__in=batch).values_list("pk", "name", "ascii"):
+            wanted.update((person_id, None, t) for t in prefix_search_tokens(name) | prefix_search_tokens(ascii))
+        for person_id, name in Alias.objects.filter(person__in=batch).values_list("person_id", "name"):
+            wanted.update((person_id, None, t) for t in prefix_search_tokens(name))
+        for person_id, address in Email.objects.filter(person__in=batch).values_list("person_id", "address"):
+            wanted.update((person_id, address, t) for t in prefix_search_tokens(address))
+        existing = set()
+        stale = []
+        for pk, person_id, address, token in PersonSearchToken.objects.filter(person__in=batch).values_list("pk", "person_id", "email_id", "token"):
+            if (person_id, address, token) in wanted and (person_id, address, token) not in existing:
+                existing.add((person_id, address, token))
+            else:
+                stale.append(pk)
+        PersonSearchToken.objects.filter(pk__in=stale).delete()
+        PersonSearchToken.objects.bulk_create([ PersonSearchToken(person_id=person_id, email_id=address, token=token) for person_id, address, token in wanted - existing ])
+
+def person_tokens_matching(terms, emails=False):
+    """Return one queryset of PersonSearchToken per term, each selecting
+    the tokens with a word starting with the term.  Only name tokens are
+    included unless emails is True, or the term contains an @."""
+    matching = []
+    for t in terms:
+        # the tokens are lower-case already, but unlike startswith,
+        # istartswith can use the index on MySQL
+        tokens = PersonSearchToken.objects.filter(token__istartswith=t.lower())
+        if not (emails or "@" in t):
+            tokens = tokens.filter(email=None)
+        matching.append(tokens)
+    return matching
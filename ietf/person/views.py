@@ -6,7 +6,7 @@ from io import StringIO, BytesIO
 from PIL import Image
 
 from django.contrib import messages
-from django.db.models import Q
+from django.db.models import BooleanField, Exists, OuterRef, Q, Value
 from django.http import HttpResponse, Http404
 from django.shortcuts import render, get_object_or_404, redirect
 from django.utils import timezone
@@ -17,7 +17,7 @@ from ietf.ietfauth.utils import role_required
 from ietf.person.models import Email, Person, Alias
 from ietf.person.fields import select2_id_name_json
 from ietf.person.forms import MergeForm
-from ietf.person.utils import handle_users, merge_persons
+from ietf.person.utils import handle_users, merge_persons, person_tokens_matching
 
 
 def ajax_select2_search(request, model_name):
@@ -29,32 +29,36 @@ def ajax_select2_search(request, model_name):
     q = [w.strip() for w in request.GET.get('q', '').split() if w.strip()]
 
     if not q:
-        objs = model.objects.none()
+        objs = model.objects.none().annotate(exact=Value(False, output_field=BooleanField()))
     else:
-        query = Q()  # all objects returned if no other terms in the queryset
-        for t in q:
+        # each term has to match the start of a word in a name alias or, for
+        # email addresses and terms with an @, an address
+        objs = model.objects.all()
+        for tokens in person_tokens_matching(q, emails=(model == Email)):
             if model == Email:
-                query &= Q(person__alias__name__icontains=t) | Q(address__icontains=t)
+                objs = objs.filter(Q(address__in=tokens.exclude(email=None).values("email")) | Q(person__in=tokens.filter(email=None).values("person")))
             elif model == Person:
-                if "@" in t: # allow searching email address if there's a @ in the search term
-                    query &= Q(alias__name__icontains=t) | Q(email__address__icontains=t)
-                else:
-                    query &= Q(alias__name__icontains=t)
+                objs = objs.filter(pk__in=tokens.values("person"))
 
-        objs = model.objects.filter(query)
+        # rank the ones with a name matching the whole search first
+        exact = Alias.objects.filter(name__iexact=" ".join(q))
+        if model == Email:
+            objs = objs.annotate(exact=Exists(exact.filter(person=OuterRef("person"))))
+        elif model == Person:
+            objs = objs.annotate(exact=Exists(exact.filter(person=OuterRef("pk"))))
 
     # require an account at the Datatracker
     only_users = request.GET.get("user") == "1"
     all_emails = request.GET.get("a", "0") == "1"
 
     if model == Email:
-        objs = objs.exclude(person=None).order_by('person__name')
+        objs = objs.exclude(person=None).order_by('-exact', 'person__name')
         if not all_emails:
             objs = objs.filter(active=True)
         if only_users:
             objs = objs.exclude(person__user=None)
     elif model == Person:
-        objs = objs.order_by("name")
+        objs = objs.order_by("-exact", "name")
         if only_users:
             objs = objs.exclude(user=None)
 
@@ -5,6 +5,7 @@
 from simple_history.models import HistoricalRecords
 
 from django.db import models
+from django.db.models import signals
 from django.utils import timezone
 
 import debug                            # pyflakes:ignore
@@ -208,3 +209,16 @@ class ReviewTeamSettings(models.Model):
     class Meta:
         verbose_name = "Review team settings"
         verbose_name_plural = "Review team settings"
+
+
+def document_changed_on_review_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    from ietf.doc.utils import document_changed
+    if isinstance(instance, ReviewRequest):
+        document_changed([instance.doc_id])
+    else:
+        document_changed([instance.review_request.doc_id])
+
+signals.post_save.connect(document_changed_on_review_change, sender=ReviewRequest)
+signals.post_save.connect(document_changed_on_review_change, sender=ReviewAssignment)
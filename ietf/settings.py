@@ -407,6 +407,7 @@ MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
  #   'csp.middleware.CSPMiddleware',
     'ietf.middleware.unicode_nfkc_normalization_middleware',
+    'ietf.middleware.mailtrigger_resolution_cache_middleware',
 ]
 
 ROOT_URLCONF = 'ietf.urls'
@@ -658,6 +659,8 @@ URL_REGEXPS = {
 DOCUMENT_PATH_PATTERN = '/a/ietfdata/doc/{doc.type_id}/'
 INTERNET_DRAFT_PATH = '/a/ietfdata/doc/draft/repository'
 INTERNET_DRAFT_PDF_PATH = '/a/www/ietf-datatracker/pdf/'
+# Merged PDFs of the drafts of each meeting session
+SESSION_DRAFT_PDF_CACHE_DIR = '/a/cache/datatracker/session-draft-pdfs'
 RFC_PATH = '/a/www/ietf-ftp/rfc/'
 CHARTER_PATH = '/a/ietfdata/doc/charter/'
 BOFREQ_PATH = '/a/ietfdata/doc/bofreq/'
@@ -758,6 +761,8 @@ HTMLIZER_VERSION = 1
 HTMLIZER_URL_PREFIX = "/doc/html"
 HTMLIZER_CACHE_TIME = 60*60*24*14       # 14 days
 PDFIZER_CACHE_TIME = HTMLIZER_CACHE_TIME
+PDFIZER_VERSION = 1                     # bump to invalidate cached PDFs after renderer changes
+PDFIZER_RENDER_LOCK_TIME = 60           # seconds to wait for another process rendering the same PDF
 PDFIZER_URL_PREFIX = IDTRACKER_BASE_URL+"/doc/pdf"
 
 # Email settings
@@ -848,6 +853,13 @@ IDSUBMIT_CHECKER_CLASSES = (
 # Max time to allow for validation before a submission is subject to cancellation
 IDSUBMIT_MAX_VALIDATION_TIME = datetime.timedelta(minutes=20)
 
+# The submission checkers run in parallel, as do the per-model checks of the
+# yang checker.  Each checker, and each external command a checker runs, is
+# given up after the number of seconds below.
+IDSUBMIT_CHECKER_WORKERS = 4
+IDSUBMIT_CHECKER_TIMEOUT = 10 * 60
+IDSUBMIT_CHECKER_COMMAND_TIMEOUT = 5 * 60
+
 IDSUBMIT_MANUAL_STAGING_DIR = '/tmp/'
 
 IDSUBMIT_FILE_TYPES = (
@@ -1196,6 +1208,10 @@ CELERY_BEAT_SYNC_EVERY = 1  # update DB after every event
 #     'request_timeout': 3.01,  # python-requests doc recommend slightly > a multiple of 3 seconds
 # }
 
+# Rebuild the cached meeting agenda data in a celery task as soon as the
+# agenda changes, rather than on the first request after the change
+MEETING_AGENDA_PRERENDER = True
+
 
 # Put the production SECRET_KEY in settings_local.py, and also any other
 # sensitive or site-specific changes.  DO NOT commit settings_local.py to svn.
@@ -1265,6 +1281,8 @@ if SERVER_MODE != 'production':
         },
     }
     SESSION_ENGINE = "django.contrib.sessions.backends.db"
+    # there is no cache to rebuild the agenda data into
+    MEETING_AGENDA_PRERENDER = False
 
     if 'SECRET_KEY' not in locals():
         SECRET_KEY = 'PDwXboUq!=hPjnrtG2=ge#N$Dwy+wn@uivrugwpic8mxyPfHka'
@@ -1,6 +1,7 @@
 from django.contrib import admin
 
-from ietf.stats.models import AffiliationAlias, AffiliationIgnoredEnding, CountryAlias, MeetingRegistration
+from ietf.stats.models import ( AffiliationAlias, AffiliationIgnoredEnding, CountryAlias, MeetingRegistration,
+    DocumentStats, DocumentAuthorStats )
 
 
 class AffiliationAliasAdmin(admin.ModelAdmin):
@@ -26,3 +27,16 @@ class MeetingRegistrationAdmin(admin.ModelAdmin):
     search_fields = ['meeting__number', 'first_name', 'last_name', 'affiliation', 'country_code', 'email', ]
     raw_id_fields = ['person']
 admin.site.register(MeetingRegistration, MeetingRegistrationAdmin)
+
+class DocumentStatsAdmin(admin.ModelAdmin):
+    list_filter = ['is_rfc', ]
+    list_display = ['name', 'is_rfc', 'pages', 'words', 'author_count', 'citations', 'latest_event_time', ]
+    search_fields = ['name', ]
+    raw_id_fields = ['document']
+admin.site.register(DocumentStats, DocumentStatsAdmin)
+
+class DocumentAuthorStatsAdmin(admin.ModelAdmin):
+    list_display = ['name', 'document_stats', 'affiliation', 'country', ]
+    search_fields = ['name', 'affiliation', 'country', 'document_stats__name', ]
+    raw_id_fields = ['document_author', 'document_stats']
+admin.site.register(DocumentAuthorStats, DocumentAuthorStatsAdmin)
@@ -0,0 +1,41 @@
+# Copyright The IETF Trust 2023, All Rights Reserved
+# -*- coding: utf-8 -*-
+
+
+from tqdm import tqdm
+
+from django.core.management.base import BaseCommand
+
+import debug                            # pyflakes:ignore
+
+from ietf.doc.models import Document
+from ietf.stats.models import DocumentStats
+from ietf.stats.utils import update_document_stats
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = ('Rebuild the precomputed document and author statistics, either for the given '
+            'drafts or for all drafts.  Only rows that have changed are written, so this is '
+            'cheap to run nightly.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help="Rebuild the statistics only for these drafts")
+
+    def handle(self, *args, **options):
+        verbosity = options.get("verbosity", 1)
+
+        docs = Document.objects.filter(type="draft")
+        if options["names"]:
+            docs = docs.filter(name__in=options["names"])
+        else:
+            DocumentStats.objects.exclude(document__type="draft").delete()
+        doc_ids = list(docs.order_by("pk").values_list("pk", flat=True))
+
+        formats_on_disk = None
+        for i in tqdm(range(0, len(doc_ids), BATCH_SIZE), disable=(verbosity!=1)):
+            formats_on_disk = update_document_stats(doc_ids[i:i+BATCH_SIZE], batch_size=BATCH_SIZE, formats_on_disk=formats_on_disk)
+
+        if verbosity > 1:
+            self.stdout.write("Updated the statistics for %d drafts" % len(doc_ids))
@@ -0,0 +1,155 @@
+# Generated by Django 2.2.28 on 2023-04-03 09:41
+
+import itertools
+import os
+
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+import django.db.models.deletion
+import ietf.utils.models
+
+from ietf.utils.timezone import RPC_TZINFO
+
+
+def formats_on_disk():
+    # mirrors ietf.stats.utils.document_formats_on_disk()
+    formats = defaultdict(set)
+    for filename in itertools.chain(os.listdir(settings.INTERNET_ALL_DRAFTS_ARCHIVE_DIR), os.listdir(settings.RFC_PATH)):
+        t = filename.split(".", 1)
+        if len(t) == 2 and t[1].lower() in settings.DOCUMENT_FORMAT_ALLOWLIST:
+            formats[t[0]].add(t[1].upper())
+    return formats
+
+
+def forward(apps, schema_editor):
+    # mirrors ietf.stats.utils.update_document_stats(), for empty tables
+    Document = apps.get_model('doc', 'Document')
+    DocAlias = apps.get_model('doc', 'DocAlias')
+    DocumentAuthor = apps.get_model('doc', 'DocumentAuthor')
+    DocEvent = apps.get_model('doc', 'DocEvent')
+    RelatedDocument = apps.get_model('doc', 'RelatedDocument')
+    Submission = apps.get_model('submit', 'Submission')
+    DocumentStats = apps.get_model('stats', 'DocumentStats')
+    DocumentAuthorStats = apps.get_model('stats', 'DocumentAuthorStats')
+
+    disk_formats = None
+    doc_ids = list(Document.objects.filter(type="draft").order_by("pk").values_list("pk", flat=True))
+    batch_size = 1000
+    for i in range(0, len(doc_ids), batch_size):
+        batch = doc_ids[i:i+batch_size]
+
+        canonical_names = {}
+        for doc_id, name in DocAlias.objects.filter(docs__in=batch).values_list("docs", "name").order_by("docs", "name"):
+            chosen = canonical_names.get(doc_id)
+            if chosen is None or name.startswith("rfc") or (name.startswith("draft") and not chosen.startswith("rfc")):
+                canonical_names[doc_id] = name
+
+        rfc_doc_ids = set(Document.states.through.objects.filter(document__in=batch, state__type="draft", state__slug="rfc").values_list("document_id", flat=True))
+
+        authors = defaultdict(list)
+        for author_id, doc_id, name, affiliation, country in DocumentAuthor.objects.filter(document__in=batch).values_list("pk", "document_id", "person__name", "affiliation", "country"):
+            authors[doc_id].append((author_id, name, affiliation, country))
+
+        formal_languages = defaultdict(list)
+        for doc_id, name in Document.formal_languages.through.objects.filter(document__in=batch).values_list("document_id", "formallanguagename__name").order_by("formallanguagename__name"):
+            formal_languages[doc_id].append(name)
+
+        citations = dict(RelatedDocument.objects.filter(
+            relationship__in=['refnorm', 'refinfo', 'refunk', 'refold'],
+            target__docs__in=batch,
+        ).values_list("target__docs").annotate(Count("pk")))
+
+        years = defaultdict(set)
+        latest_event_time = {}
+        for doc_id, time in DocEvent.objects.filter(doc__in=batch, type__in=["published_rfc", "new_revision"]).values_list("doc_id", "time"):
+            years[doc_id].add(time.astimezone(RPC_TZINFO).year)
+            if doc_id not in latest_event_time or time > latest_event_time[doc_id]:
+                latest_event_time[doc_id] = time
+
+        submission_types = {}
+        for doc_id, file_types in Submission.objects.filter(draft__in=batch).values_list("draft", "file_types").order_by("submission_date", "id"):
+            if file_types:
+                submission_types[doc_id] = file_types
+
+        stats, author_stats = [], []
+        for doc_id, name, rev, pages, words in Document.objects.filter(pk__in=batch).values_list("pk", "name", "rev", "pages", "words"):
+            canonical_name = canonical_names.get(doc_id, name)
+            types = submission_types.get(doc_id)
+            if types:
+                formats = sorted(set(t.lstrip(".").upper() for t in types.split(",") if t))
+            else:
+                if disk_formats is None:
+                    disk_formats = formats_on_disk()
+                filename = canonical_name if canonical_name.startswith("rfc") else canonical_name + "-" + rev
+                formats = sorted(disk_formats.get(filename, []))
+
+            stats.append(DocumentStats(
+                document_id=doc_id,
+                name=canonical_name,
+                is_rfc=doc_id in rfc_doc_ids,
+                pages=pages,
+                words=words,
+                author_count=len(authors[doc_id]),
+                formats=",".join(formats),
+                formal_languages=",".join(formal_languages[doc_id]),
+                citations=citations.get(doc_id, 0),
+                years=",".join(str(y) for y in sorted(years[doc_id])),
+                latest_event_time=latest_event_time.get(doc_id),
+            ))
+            for author_id, author_name, affiliation, country in authors[doc_id]:
+                author_stats.append(DocumentAuthorStats(document_author_id=author_id, document_stats_id=doc_id, name=author_name, affiliation=affiliation, country=country))
+
+        DocumentStats.objects.bulk_create(stats)
+        DocumentAuthorStats.objects.bulk_create(author_stats)
+
+
+def reverse(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doc', '0048_documentsearchindex'),
+        ('stats', '0005_meetingregistration_checkedin'),
+        ('submit', '0012_use_date_today_helper'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentStats',
+            fields=[
+                ('document', ietf.utils.models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='doc.Document')),
+                ('name', models.CharField(help_text='Canonical name, the RFC name if the draft has been published', max_length=255)),
+                ('is_rfc', models.BooleanField(default=False)),
+                ('pages', models.IntegerField(blank=True, null=True)),
+                ('words', models.IntegerField(blank=True, null=True)),
+                ('author_count', models.IntegerField(default=0)),
+                ('formats', models.CharField(blank=True, help_text='Comma-separated upper-case file formats', max_length=255)),
+                ('formal_languages', models.TextField(blank=True, help_text='Comma-separated formal language names')),
+                ('citations', models.IntegerField(default=0, help_text='Number of normative and informative references to the document')),
+                ('years', models.TextField(blank=True, help_text='Comma-separated years with a new revision or RFC publication')),
+                ('latest_event_time', models.DateTimeField(blank=True, help_text='Time of the latest new revision or RFC publication', null=True)),
+            ],
+            options={
+                'verbose_name_plural': 'document stats',
+            },
+        ),
+        migrations.CreateModel(
+            name='DocumentAuthorStats',
+            fields=[
+                ('document_author', ietf.utils.models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='doc.DocumentAuthor')),
+                ('name', models.CharField(help_text="Name of the author's person record", max_length=255)),
+                ('affiliation', models.CharField(blank=True, max_length=100)),
+                ('country', models.CharField(blank=True, max_length=255)),
+                ('document_stats', ietf.utils.models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='authors', to='stats.DocumentStats')),
+            ],
+            options={
+                'verbose_name_plural': 'document author stats',
+            },
+        ),
+        migrations.RunPython(forward, reverse),
+    ]
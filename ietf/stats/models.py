@@ -6,10 +6,11 @@ from django.db import models
 
 import debug                            # pyflakes:ignore
 
+from ietf.doc.models import Document, DocumentAuthor
 from ietf.meeting.models import Meeting
 from ietf.name.models import CountryName
 from ietf.person.models import Person
-from ietf.utils.models import ForeignKey
+from ietf.utils.models import ForeignKey, OneToOneField
 
 
 class AffiliationAlias(models.Model):
@@ -66,3 +67,41 @@ class MeetingRegistration(models.Model):
 
     def __str__(self):
         return "{} {}".format(self.first_name, self.last_name)
+
+
+class DocumentStats(models.Model):
+    """Precomputed per-draft figures for the document statistics, so that
+    the charts can be built with simple filters.  This is rebuilt nightly by
+    the update_document_stats management command."""
+    document = OneToOneField(Document, primary_key=True, related_name='stats')
+    name = models.CharField(max_length=255, help_text="Canonical name, the RFC name if the draft has been published")
+    is_rfc = models.BooleanField(default=False)
+    pages = models.IntegerField(null=True, blank=True)
+    words = models.IntegerField(null=True, blank=True)
+    author_count = models.IntegerField(default=0)
+    formats = models.CharField(max_length=255, blank=True, help_text="Comma-separated upper-case file formats")
+    formal_languages = models.TextField(blank=True, help_text="Comma-separated formal language names")
+    citations = models.IntegerField(default=0, help_text="Number of normative and informative references to the document")
+    years = models.TextField(blank=True, help_text="Comma-separated years with a new revision or RFC publication")
+    latest_event_time = models.DateTimeField(null=True, blank=True, help_text="Time of the latest new revision or RFC publication")
+
+    def __str__(self):
+        return "Statistics for {}".format(self.name)
+
+    class Meta:
+        verbose_name_plural = "document stats"
+
+class DocumentAuthorStats(models.Model):
+    """Precomputed per-author figures for the author statistics, denormalized
+    from DocumentAuthor and Person."""
+    document_author = OneToOneField(DocumentAuthor, primary_key=True, related_name='stats')
+    document_stats = ForeignKey(DocumentStats, related_name='authors')
+    name = models.CharField(max_length=255, help_text="Name of the author's person record")
+    affiliation = models.CharField(max_length=100, blank=True)
+    country = models.CharField(max_length=255, blank=True)
+
+    def __str__(self):
+        return "Statistics for {} on {}".format(self.name, self.document_stats_id)
+
+    class Meta:
+        verbose_name_plural = "document author stats"
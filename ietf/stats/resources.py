@@ -11,7 +11,8 @@ from tastypie.cache import SimpleCache
 from ietf import api
 from ietf.api import ToOneField                         # pyflakes:ignore
 
-from ietf.stats.models import CountryAlias, AffiliationIgnoredEnding, AffiliationAlias, MeetingRegistration
+from ietf.stats.models import ( CountryAlias, AffiliationIgnoredEnding, AffiliationAlias, MeetingRegistration,
+    DocumentStats, DocumentAuthorStats )
 
 
 from ietf.name.resources import CountryNameResource
@@ -82,3 +83,46 @@ class MeetingRegistrationResource(ModelResource):
             "person": ALL_WITH_RELATIONS,
         }
 api.stats.register(MeetingRegistrationResource())
+
+
+from ietf.doc.resources import DocumentResource, DocumentAuthorResource
+class DocumentStatsResource(ModelResource):
+    document         = ToOneField(DocumentResource, 'document')
+    class Meta:
+        queryset = DocumentStats.objects.all()
+        serializer = api.Serializer()
+        cache = SimpleCache()
+        #resource_name = 'documentstats'
+        ordering = ['document', ]
+        filtering = { 
+            "name": ALL,
+            "is_rfc": ALL,
+            "pages": ALL,
+            "words": ALL,
+            "author_count": ALL,
+            "formats": ALL,
+            "formal_languages": ALL,
+            "citations": ALL,
+            "years": ALL,
+            "latest_event_time": ALL,
+            "document": ALL_WITH_RELATIONS,
+        }
+api.stats.register(DocumentStatsResource())
+
+class DocumentAuthorStatsResource(ModelResource):
+    document_author  = ToOneField(DocumentAuthorResource, 'document_author')
+    document_stats   = ToOneField(DocumentStatsResource, 'document_stats')
+    class Meta:
+        queryset = DocumentAuthorStats.objects.all()
+        serializer = api.Serializer()
+        cache = SimpleCache()
+        #resource_name = 'documentauthorstats'
+        ordering = ['document_author', ]
+        filtering = { 
+            "name": ALL,
+            "affiliation": ALL,
+            "country": ALL,
+            "document_author": ALL_WITH_RELATIONS,
+            "document_stats": ALL_WITH_RELATIONS,
+        }
+api.stats.register(DocumentAuthorStatsResource())
@@ -4,6 +4,7 @@
 
 import calendar
 import datetime
+import io
 import json
 
 from mock import patch
@@ -12,6 +13,8 @@ from requests import Response
 
 import debug    # pyflakes:ignore
 
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse as urlreverse
 from django.utils import timezone
 
@@ -27,9 +30,9 @@ from ietf.person.factories import PersonFactory
 from ietf.person.models import Person, Email
 from ietf.name.models import FormalLanguageName, DocRelationshipName, CountryName
 from ietf.review.factories import ReviewRequestFactory, ReviewerSettingsFactory, ReviewAssignmentFactory
-from ietf.stats.models import MeetingRegistration, CountryAlias
+from ietf.stats.models import MeetingRegistration, CountryAlias, DocumentStats, DocumentAuthorStats
 from ietf.stats.factories import MeetingRegistrationFactory
-from ietf.stats.utils import get_meeting_registration_data
+from ietf.stats.utils import get_meeting_registration_data, update_document_stats
 from ietf.utils.timezone import date_today
 
 
@@ -94,6 +97,24 @@ class StatisticsTests(TestCase):
             time=timezone.now() - datetime.timedelta(days=1000)
         )
 
+        update_document_stats(Document.objects.filter(type="draft").values_list("pk", flat=True))
+
+        stats = DocumentStats.objects.get(document=draft)
+        self.assertEqual(stats.name, draft.name)
+        self.assertFalse(stats.is_rfc)
+        self.assertEqual(stats.words, 4000)
+        self.assertEqual(stats.formats, "TXT")
+        self.assertEqual(stats.formal_languages, "XML")
+        self.assertEqual(stats.citations, 1)
+        self.assertEqual(stats.author_count, draft.documentauthor_set.count())
+        self.assertEqual(DocumentStats.objects.get(document=referencing_draft).citations, 0)
+        self.assertTrue(DocumentStats.objects.filter(is_rfc=True).exists())
+        self.assertEqual(DocumentAuthorStats.objects.get(document_stats=stats, affiliation="IETF").country, "Germany")
+
+        # rerunning the build picks up changes
+        Document.objects.filter(pk=draft.pk).update(pages=31)
+        update_document_stats([draft.pk, referencing_draft.pk])
+        self.assertEqual(DocumentStats.objects.get(document=draft).pages, 31)
 
         # check redirect
         url = urlreverse(ietf.stats.views.document_stats)
@@ -248,11 +269,11 @@ class StatisticsTests(TestCase):
         data2['RegType'] = 'hackathon'
         response_a = Response()
         response_a.status_code = 200
-        response_a._content = json.dumps([data, data2]).encode('utf8')
+        response_a.raw = io.BytesIO(json.dumps([data, data2]).encode('utf8'))
         # second response one less record, it's been deleted
         response_b = Response()
         response_b.status_code = 200
-        response_b._content = json.dumps([data]).encode('utf8')
+        response_b.raw = io.BytesIO(json.dumps([data]).encode('utf8'))
         # mock_get.return_value = response
         mock_get.side_effect = [response_a, response_b]
         meeting = MeetingFactory(type_id='ietf', date=datetime.date(2016, 7, 14), number="96")
@@ -273,3 +294,46 @@ class StatisticsTests(TestCase):
         self.assertEqual(query.count(), 1)
         self.assertEqual(query.filter(reg_type='onsite').count(), 1)
         self.assertEqual(query.filter(reg_type='hackathon').count(), 0)
+
+    @patch('requests.get')
+    def test_get_meeting_registration_data_bulk(self, mock_get):
+        '''Test that the number of queries doesn't grow with the number of registrations'''
+        def registrations(persons, reg_type='onsite'):
+            return [{
+                'LastName': p.last_name(),
+                'FirstName': p.first_name(),
+                'Company': 'ABC',
+                'Country': 'US',
+                'Email': p.email().address,
+                'RegType': reg_type,
+                'TicketType': 'week_pass',
+                'CheckedIn': 'False',
+            } for p in persons ]
+        def response(data):
+            r = Response()
+            r.status_code = 200
+            r.raw = io.BytesIO(json.dumps(data).encode('utf8'))
+            return r
+
+        persons = PersonFactory.create_batch(10)
+        few = registrations(persons[:2])
+        many = registrations(persons)
+        meeting = MeetingFactory(type_id='ietf', date=datetime.date(2016, 7, 14), number="96")
+        other_meeting = MeetingFactory(type_id='ietf', date=datetime.date(2016, 11, 14), number="97")
+
+        mock_get.side_effect = [response(few), response(many)]
+        with CaptureQueriesContext(connection) as few_queries:
+            self.assertEqual(get_meeting_registration_data(meeting)[:2], (2, 2))
+        with CaptureQueriesContext(connection) as many_queries:
+            self.assertEqual(get_meeting_registration_data(other_meeting)[:2], (10, 10))
+        self.assertEqual(len(few_queries), len(many_queries))
+        self.assertEqual(MeetingRegistration.objects.filter(meeting=other_meeting, person__in=persons).count(), 10)
+
+        # changes, additions and removals are reconciled
+        for r in many:
+            r['CheckedIn'] = 'True'
+        mock_get.side_effect = [response(many[1:] + registrations(persons[:1], 'hackathon'))]
+        self.assertEqual(get_meeting_registration_data(other_meeting)[:2], (1, 10))
+        self.assertEqual(MeetingRegistration.objects.filter(meeting=other_meeting, reg_type='onsite').count(), 9)
+        self.assertEqual(MeetingRegistration.objects.filter(meeting=other_meeting, reg_type='onsite', checkedin=True).count(), 9)
+        self.assertTrue(MeetingRegistration.objects.filter(meeting=other_meeting, reg_type='hackathon', person=persons[0]).exists())
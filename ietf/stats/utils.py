@@ -2,19 +2,27 @@
 # -*- coding: utf-8 -*-
 
 
+import codecs
+import itertools
+import json
+import os
 import re
 import requests
 from collections import defaultdict
 
 from django.conf import settings
-from django.db.models import Q
+from django.db.models import Count, Q
 
 import debug                            # pyflakes:ignore
 
-from ietf.stats.models import AffiliationAlias, AffiliationIgnoredEnding, CountryAlias, MeetingRegistration
+from ietf.doc.models import Document, DocAlias, DocumentAuthor, DocEvent, RelatedDocument, State
+from ietf.stats.models import ( AffiliationAlias, AffiliationIgnoredEnding, CountryAlias, MeetingRegistration,
+    DocumentStats, DocumentAuthorStats )
 from ietf.name.models import CountryName
 from ietf.person.models import Person, Email
+from ietf.submit.models import Submission
 from ietf.utils.log import log
+from ietf.utils.timezone import RPC_TZINFO
 
 import logging
 logger = logging.getLogger('django')
@@ -223,102 +231,285 @@ def compute_hirsch_index(citation_counts):
     return i
 
 
+CITATION_RELATIONSHIPS = ['refnorm', 'refinfo', 'refunk', 'refold']
+
+def document_formats_on_disk():
+    """Returns a dictionary from file name without extension to the set of
+    allowlisted upper-case formats found in the draft archive and RFC
+    directories."""
+    formats = defaultdict(set)
+    for filename in itertools.chain(os.listdir(settings.INTERNET_ALL_DRAFTS_ARCHIVE_DIR), os.listdir(settings.RFC_PATH)):
+        t = filename.split(".", 1)
+        if len(t) != 2:
+            continue
+
+        basename, ext = t
+        ext = ext.lower()
+        if ext in settings.DOCUMENT_FORMAT_ALLOWLIST:
+            formats[basename].add(ext.upper())
+    return formats
+
+def update_document_stats(doc_ids, batch_size=1000, formats_on_disk=None):
+    """Rebuild the DocumentStats and DocumentAuthorStats rows of the given
+    drafts, only writing the rows that have changed.  The formats found on
+    disk are only needed for drafts without a submission recording the file
+    types; pass in the result of document_formats_on_disk() to share it
+    between calls."""
+    doc_ids = list(doc_ids)
+    rfc_state = State.objects.get(type="draft", slug="rfc")
+
+    stats_fields = ["name", "is_rfc", "pages", "words", "author_count", "formats", "formal_languages", "citations", "years", "latest_event_time"]
+    author_fields = ["document_stats_id", "name", "affiliation", "country"]
+
+    for i in range(0, len(doc_ids), batch_size):
+        batch = doc_ids[i:i+batch_size]
+
+        # canonical name, preferring the RFC name, then the draft name
+        canonical_names = {}
+        for doc_id, name in DocAlias.objects.filter(docs__in=batch).values_list("docs", "name").order_by("docs", "name"):
+            chosen = canonical_names.get(doc_id)
+            if chosen is None or name.startswith("rfc") or (name.startswith("draft") and not chosen.startswith("rfc")):
+                canonical_names[doc_id] = name
+
+        rfc_doc_ids = set(Document.states.through.objects.filter(document__in=batch, state=rfc_state).values_list("document_id", flat=True))
+
+        authors = defaultdict(list)
+        for author_id, doc_id, name, affiliation, country in DocumentAuthor.objects.filter(document__in=batch).values_list("pk", "document_id", "person__name", "affiliation", "country"):
+            authors[doc_id].append((author_id, name, affiliation, country))
+
+        formal_languages = defaultdict(list)
+        for doc_id, name in Document.formal_languages.through.objects.filter(document__in=batch).values_list("document_id", "formallanguagename__name").order_by("formallanguagename__name"):
+            formal_languages[doc_id].append(name)
+
+        citations = dict(RelatedDocument.objects.filter(
+            relationship__in=CITATION_RELATIONSHIPS,
+            target__docs__in=batch,
+        ).values_list("target__docs").annotate(Count("pk")))
+
+        years = defaultdict(set)
+        latest_event_time = {}
+        for doc_id, time in DocEvent.objects.filter(doc__in=batch, type__in=["published_rfc", "new_revision"]).values_list("doc_id", "time"):
+            # RPC_TZINFO is used to match the timezone handling in Document.pub_date()
+            years[doc_id].add(time.astimezone(RPC_TZINFO).year)
+            if doc_id not in latest_event_time or time > latest_event_time[doc_id]:
+                latest_event_time[doc_id] = time
+
+        # on new documents, we should have a Submission row with the file types
+        submission_types = {}
+        for doc_id, file_types in Submission.objects.filter(draft__in=batch).values_list("draft", "file_types").order_by("submission_date", "id"):
+            if file_types:
+                submission_types[doc_id] = file_types
+
+        existing_stats = { t[0]: t[1:] for t in DocumentStats.objects.filter(document__in=batch).values_list("document_id", *stats_fields) }
+        existing_authors = { t[0]: t[1:] for t in DocumentAuthorStats.objects.filter(document_stats__in=batch).values_list("document_author_id", *author_fields) }
+
+        created, updated, found = [], [], set()
+        created_authors, updated_authors, found_authors = [], [], set()
+        for doc_id, name, rev, pages, words in Document.objects.filter(pk__in=batch, type="draft").values_list("pk", "name", "rev", "pages", "words"):
+            found.add(doc_id)
+            canonical_name = canonical_names.get(doc_id, name)
+
+            types = submission_types.get(doc_id)
+            if types:
+                formats = sorted(set(t.lstrip(".").upper() for t in types.split(",") if t))
+            else:
+                # look up older documents on disk
+                if formats_on_disk is None:
+                    formats_on_disk = document_formats_on_disk()
+                filename = canonical_name if canonical_name.startswith("rfc") else canonical_name + "-" + rev
+                formats = sorted(formats_on_disk.get(filename, []))
+
+            entry = DocumentStats(
+                document_id=doc_id,
+                name=canonical_name,
+                is_rfc=doc_id in rfc_doc_ids,
+                pages=pages,
+                words=words,
+                author_count=len(authors[doc_id]),
+                formats=",".join(formats),
+                formal_languages=",".join(formal_languages[doc_id]),
+                citations=citations.get(doc_id, 0),
+                years=",".join(str(y) for y in sorted(years[doc_id])),
+                latest_event_time=latest_event_time.get(doc_id),
+            )
+            values = tuple(getattr(entry, f) for f in stats_fields)
+            if doc_id not in existing_stats:
+                created.append(entry)
+            elif existing_stats[doc_id] != values:
+                updated.append(entry)
+
+            for author_id, author_name, affiliation, country in authors[doc_id]:
+                found_authors.add(author_id)
+                values = (doc_id, author_name, affiliation, country)
+                author_entry = DocumentAuthorStats(document_author_id=author_id, document_stats_id=doc_id, name=author_name, affiliation=affiliation, country=country)
+                if author_id not in existing_authors:
+                    created_authors.append(author_entry)
+                elif existing_authors[author_id] != values:
+                    updated_authors.append(author_entry)
+
+        DocumentStats.objects.bulk_create(created)
+        DocumentStats.objects.bulk_update(updated, stats_fields)
+        DocumentStats.objects.filter(document__in=set(batch) - found).delete()
+
+        DocumentAuthorStats.objects.bulk_create(created_authors)
+        DocumentAuthorStats.objects.bulk_update(updated_authors, ["document_stats", "name", "affiliation", "country"])
+        DocumentAuthorStats.objects.filter(document_author__in=set(existing_authors) - found_authors).delete()
+
+    return formats_on_disk
+
+
+def iter_json_array(chunks):
+    """Decode a JSON array from an iterable of text chunks, yielding the
+    items one at a time instead of holding the whole document in memory."""
+    decoder = json.JSONDecoder()
+    chunks = iter(chunks)
+    buf, pos, eof = "", 0, False
+    state = "start"
+    while True:
+        while pos < len(buf) and buf[pos].isspace():
+            pos += 1
+
+        item = end = None
+        if pos < len(buf) and state in ("first", "item") and buf[pos] != "]":
+            try:
+                item, end = decoder.raw_decode(buf, pos)
+            except ValueError:
+                pass
+
+        # read more when out of input, or when the item could not be decoded
+        # or ends at the end of the buffer, where it may be a truncated number
+        if pos == len(buf) or (state in ("first", "item") and buf[pos] != "]" and (end is None or end == len(buf)) and not eof):
+            chunk = next(chunks, None) if not eof else None
+            if chunk is None:
+                if eof:
+                    raise ValueError("Unexpected end of JSON array")
+                eof = True
+            else:
+                buf, pos = buf[pos:] + chunk, 0
+            continue
+
+        c = buf[pos]
+        if state == "start":
+            if c != "[":
+                raise ValueError("Expected a JSON array, found %r" % c)
+            pos += 1
+            state = "first"
+        elif c == "]" and state in ("first", "next"):
+            return
+        elif c == "," and state == "next":
+            pos += 1
+            state = "item"
+        elif state in ("first", "item") and end is not None:
+            pos = end
+            state = "next"
+            yield item
+        else:
+            raise ValueError("Unexpected %r in JSON array" % buf[pos:pos+64])
+
 def get_meeting_registration_data(meeting):
     """"Retrieve registration attendee data and summary statistics.  Returns number
     of Registration records created.
     
     MeetingRegistration records are created in realtime as people register for a 
     meeting. This function serves as an audit / reconciliation. Most records are
-    expected to already exist. The function has been optimized with this in mind.
+    expected to already exist. The function has been optimized with this in mind:
+    the response is decoded incrementally, and the database is updated with a
+    fixed number of bulk queries regardless of the number of registrations.
     """
-    num_created = 0
-    num_processed = 0
     try:
         response = requests.get(
             settings.STATS_REGISTRATION_ATTENDEES_JSON_URL.format(number=meeting.number),
             timeout=settings.DEFAULT_REQUESTS_TIMEOUT,
+            stream=True,
         )
     except requests.Timeout as exc:
         log(f'GET request timed out for [{settings.STATS_REGISTRATION_ATTENDEES_JSON_URL}]: {exc}')
         raise RuntimeError("Timeout retrieving data from registrations API") from exc
-    if response.status_code == 200:
-        decoded = []
-        try:
-            decoded = response.json()
-        except ValueError:
-            if response.content.strip() == 'Invalid meeting':
-                logger.info('Invalid meeting: {}'.format(meeting.number))
-                return (0,0,0)
-            else:
-                raise RuntimeError("Could not decode response from registrations API: '%s...'" % (response.content[:64], ))
-
-        records = MeetingRegistration.objects.filter(meeting_id=meeting.pk).select_related('person')
-        meeting_registrations = {(r.email, r.reg_type):r for r in records}
-        for registration in decoded:
-            person = None
-            # capture the stripped registration values for later use
-            first_name      = registration['FirstName'].strip()
-            last_name       = registration['LastName'].strip()
-            affiliation     = registration['Company'].strip()
-            country_code    = registration['Country'].strip()
+    if response.status_code != 200:
+        raise RuntimeError("Bad response from registrations API: %s, '%s'" % (response.status_code, response.content))
+
+    chunks = codecs.iterdecode(response.iter_content(chunk_size=64*1024), "utf-8")
+    first_chunk = next(chunks, "")
+    if not first_chunk.lstrip().startswith("["):
+        content = first_chunk + "".join(chunks)
+        if content.strip() == 'Invalid meeting':
+            logger.info('Invalid meeting: {}'.format(meeting.number))
+            return (0,0,0)
+        else:
+            raise RuntimeError("Could not decode response from registrations API: '%s...'" % (content[:64], ))
+
+    # capture the stripped registration values, keyed like the existing records
+    registrations = {}
+    num_processed = 0
+    try:
+        for registration in iter_json_array(itertools.chain([first_chunk], chunks)):
             address         = registration['Email'].strip()
             reg_type        = registration['RegType'].strip()
-            ticket_type     = registration['TicketType'].strip()
-            checkedin       = bool(registration['CheckedIn'].strip().lower() == 'true')
+            registrations[(address, reg_type)] = dict(
+                first_name      = registration['FirstName'].strip()[:200],
+                last_name       = registration['LastName'].strip()[:200],
+                affiliation     = registration['Company'].strip(),
+                country_code    = registration['Country'].strip(),
+                ticket_type     = registration['TicketType'].strip(),
+                checkedin       = bool(registration['CheckedIn'].strip().lower() == 'true'),
+            )
+            num_processed += 1
+    except ValueError as exc:
+        raise RuntimeError("Could not decode response from registrations API: %s" % exc) from exc
 
-            if (address, reg_type) in meeting_registrations:
-                object = meeting_registrations.pop((address, reg_type))
-                created = False
+    meeting_registrations = {
+        (r.email, r.reg_type): r
+        for r in MeetingRegistration.objects.filter(meeting_id=meeting.pk)
+    }
+
+    # Add a Person object to MeetingRegistration objects if a valid email is
+    # available; there can only be one Email object with a unique email address
+    # (primary key)
+    addresses = set()
+    for address, reg_type in registrations:
+        object = meeting_registrations.get((address, reg_type))
+        if address and (object is None or object.person_id is None):
+            addresses.add(address)
+    email_persons = {
+        address.lower(): person_id
+        for address, person_id in Email.objects.filter(address__in=addresses).values_list("address", "person_id")
+    }
+
+    fields = ["first_name", "last_name", "affiliation", "country_code", "ticket_type", "checkedin", "person"]
+    created, updated = [], []
+    for (address, reg_type), values in registrations.items():
+        object = meeting_registrations.pop((address, reg_type), None)
+        if object is None:
+            object = MeetingRegistration(meeting_id=meeting.pk, email=address, reg_type=reg_type, **values)
+            created.append(object)
+            changed = False
+        else:
+            changed = any(getattr(object, f) != v for f, v in values.items())
+            for f, v in values.items():
+                setattr(object, f, v)
+
+        if object.person_id is None and address:
+            person_id = email_persons.get(address.lower())
+            if person_id:
+                object.person_id = person_id
+                changed = True
             else:
-                object = MeetingRegistration.objects.create(
-                    meeting_id=meeting.pk,
-                    email=address,
-                    reg_type=reg_type)
-                created = True
-            
-            if (object.first_name != first_name[:200] or
-                object.last_name != last_name[:200] or
-                object.affiliation != affiliation or
-                object.country_code != country_code or
-                object.ticket_type != ticket_type or
-                object.checkedin != checkedin):
-                    object.first_name=first_name[:200]
-                    object.last_name=last_name[:200]
-                    object.affiliation=affiliation
-                    object.country_code=country_code
-                    object.ticket_type=ticket_type
-                    object.checkedin=checkedin
-                    object.save()
-
-            # Add a Person object to MeetingRegistration object
-            # if valid email is available
-            if object and not object.person and address:
-                # If the person already exists do not try to create a new one
-                emails = Email.objects.filter(address=address)
-                # there can only be on Email object with a unique email address (primary key)
-                if emails.exists():
-                    person = emails.first().person
-                # Create a new Person object
-                else:
-                    logger.error("No Person record for registration. email={}".format(address))
-                # update the person object to an actual value
-                object.person = person
-                object.save()
-            
-            if created:
-                num_created += 1
-            num_processed += 1
+                logger.error("No Person record for registration. email={}".format(address))
 
-        # any registrations left in meeting_registrations no longer exist in reg
-        # so must have been deleted
-        for r in meeting_registrations:
-            try:
-                MeetingRegistration.objects.get(meeting=meeting,email=r[0],reg_type=r[1]).delete()
-                logger.info('Removing deleted registration. email={}, reg_type={}'.format(r[0], r[1]))
-            except MeetingRegistration.DoesNotExist:
-                pass
-    else:
-        raise RuntimeError("Bad response from registrations API: %s, '%s'" % (response.status_code, response.content))
+        if changed and object.pk:
+            updated.append(object)
+
+    MeetingRegistration.objects.bulk_create(created, batch_size=1000)
+    MeetingRegistration.objects.bulk_update(updated, fields, batch_size=1000)
+
+    # any registrations left in meeting_registrations no longer exist in reg
+    # so must have been deleted
+    if meeting_registrations:
+        for email, reg_type in meeting_registrations:
+            logger.info('Removing deleted registration. email={}, reg_type={}'.format(email, reg_type))
+        MeetingRegistration.objects.filter(pk__in=[r.pk for r in meeting_registrations.values()]).delete()
+
+    num_created = len(created)
     num_total = MeetingRegistration.objects.filter(
         meeting_id=meeting.pk,
         reg_type__in=['onsite', 'remote']
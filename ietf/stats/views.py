@@ -2,7 +2,6 @@
 # -*- coding: utf-8 -*-
 
 
-import os
 import calendar
 import datetime
 import email.utils
@@ -14,7 +13,7 @@ from collections import defaultdict
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.core.cache import cache
-from django.db.models import Count, Q
+from django.db.models import Count, Q, Sum
 from django.http import HttpResponseRedirect
 from django.shortcuts import get_object_or_404, render
 from django.urls import reverse as urlreverse
@@ -29,18 +28,16 @@ from ietf.review.utils import (extract_review_assignment_data,
                                ReviewAssignmentData,
                                sum_period_review_assignment_stats,
                                sum_raw_review_assignment_aggregations)
-from ietf.submit.models import Submission
 from ietf.group.models import Role, Group
 from ietf.person.models import Person
-from ietf.name.models import ReviewResultName, CountryName, DocRelationshipName, ReviewAssignmentStateName
+from ietf.name.models import ReviewResultName, CountryName, ReviewAssignmentStateName
 from ietf.person.name import plain_name
-from ietf.doc.models import DocAlias, Document, State, DocEvent
 from ietf.meeting.models import Meeting
-from ietf.stats.models import MeetingRegistration, CountryAlias
+from ietf.stats.models import MeetingRegistration, CountryAlias, DocumentStats, DocumentAuthorStats
 from ietf.stats.utils import get_aliased_affiliations, get_aliased_countries, compute_hirsch_index
 from ietf.ietfauth.utils import has_role
 from ietf.utils.response import permission_denied
-from ietf.utils.timezone import date_today, DEADLINE_TZINFO, RPC_TZINFO
+from ietf.utils.timezone import date_today, DEADLINE_TZINFO
 
 
 def stats_index(request):
@@ -212,58 +209,34 @@ def document_stats(request, stats_type=None):
         eu_countries = None
 
 
-        if any(stats_type == t[0] for t in possible_document_stats_types):
-            # filter documents
-            docalias_filters = Q(docs__type="draft")
+        if document_type == "rfc":
+            doc_label = "RFC"
+        elif document_type == "draft":
+            doc_label = "draft"
+        else:
+            doc_label = "document"
 
-            rfc_state = State.objects.get(type="draft", slug="rfc")
-            if document_type == "rfc":
-                docalias_filters &= Q(docs__states=rfc_state)
-            elif document_type == "draft":
-                docalias_filters &= ~Q(docs__states=rfc_state)
+        # the figures are precomputed nightly by the update_document_stats
+        # management command
+        stats_qs = DocumentStats.objects.all()
+        if document_type == "rfc":
+            stats_qs = stats_qs.filter(is_rfc=True)
+        elif document_type == "draft":
+            stats_qs = stats_qs.filter(is_rfc=False)
 
+        if any(stats_type == t[0] for t in possible_document_stats_types):
             if from_time:
-                # this is actually faster than joining in the database,
-                # despite the round-trip back and forth
-                docs_within_time_constraint = list(Document.objects.filter(
-                    type="draft",
-                    docevent__time__gte=from_time,
-                    docevent__type__in=["published_rfc", "new_revision"],
-                ).values_list("pk"))
-
-                docalias_filters &= Q(docs__in=docs_within_time_constraint)
-
-            docalias_qs = DocAlias.objects.filter(docalias_filters)
-
-            if document_type == "rfc":
-                doc_label = "RFC"
-            elif document_type == "draft":
-                doc_label = "draft"
-            else:
-                doc_label = "document"
+                stats_qs = stats_qs.filter(latest_event_time__gte=from_time)
 
-            total_docs = docalias_qs.values_list("docs__name").distinct().count()
-
-            def generate_canonical_names(values):
-                for doc_id, ts in itertools.groupby(values.order_by("docs__name"), lambda a: a[0]):
-                    chosen = None
-                    for t in ts:
-                        if chosen is None:
-                            chosen = t
-                        else:
-                            if t[1].startswith("rfc"):
-                                chosen = t
-                            elif t[1].startswith("draft") and not chosen[1].startswith("rfc"):
-                                chosen = t
-                    yield chosen
+            total_docs = stats_qs.count()
 
             if stats_type == "authors":
                 stats_title = "Number of authors for each {}".format(doc_label)
 
                 bins = defaultdict(set)
 
-                for name, canonical_name, author_count in generate_canonical_names(docalias_qs.values_list("docs__name", "name").annotate(Count("docs__documentauthor"))):
-                    bins[author_count or 0].add(canonical_name)
+                for canonical_name, author_count in stats_qs.values_list("name", "author_count"):
+                    bins[author_count].add(canonical_name)
 
                 series_data = []
                 for author_count, names in sorted(bins.items(), key=lambda t: t[0]):
@@ -278,15 +251,14 @@ def document_stats(request, stats_type=None):
 
                 bins = defaultdict(set)
 
-                for name, canonical_name, pages in generate_canonical_names(docalias_qs.values_list("docs__name", "name", "docs__pages")):
+                for canonical_name, pages in stats_qs.values_list("name", "pages"):
                     bins[pages or 0].add(canonical_name)
 
                 series_data = []
                 for pages, names in sorted(bins.items(), key=lambda t: t[0]):
                     percentage = len(names) * 100.0 / (total_docs or 1)
-                    if pages is not None:
-                        series_data.append((pages, len(names)))
-                        table_data.append((pages, percentage, len(names), list(names)[:names_limit]))
+                    series_data.append((pages, len(names)))
+                    table_data.append((pages, percentage, len(names), list(names)[:names_limit]))
 
                 chart_data.append({ "data": series_data })
 
@@ -297,7 +269,7 @@ def document_stats(request, stats_type=None):
 
                 bins = defaultdict(set)
 
-                for name, canonical_name, words in generate_canonical_names(docalias_qs.values_list("docs__name", "name", "docs__words")):
+                for canonical_name, words in stats_qs.values_list("name", "words"):
                     bins[put_into_bin(words, bin_size)].add(canonical_name)
 
                 series_data = []
@@ -315,43 +287,10 @@ def document_stats(request, stats_type=None):
 
                 bins = defaultdict(set)
 
-                # on new documents, we should have a Submission row with the file types
-                submission_types = {}
-
-                for doc_name, file_types in Submission.objects.values_list("draft", "file_types").order_by("submission_date", "id"):
-                    submission_types[doc_name] = file_types
-
-                doc_names_with_missing_types = {}
-                for doc_name, canonical_name, rev in generate_canonical_names(docalias_qs.values_list("docs__name", "name", "docs__rev")):
-                    types = submission_types.get(doc_name)
-                    if types:
-                        for dot_ext in types.split(","):
-                            bins[dot_ext.lstrip(".").upper()].add(canonical_name)
-
-                    else:
-
-                        if canonical_name.startswith("rfc"):
-                            filename = canonical_name
-                        else:
-                            filename = canonical_name + "-" + rev
-
-                        doc_names_with_missing_types[filename] = canonical_name
-
-                # look up the remaining documents on disk
-                for filename in itertools.chain(os.listdir(settings.INTERNET_ALL_DRAFTS_ARCHIVE_DIR), os.listdir(settings.RFC_PATH)):
-                    t = filename.split(".", 1)
-                    if len(t) != 2:
-                        continue
-
-                    basename, ext = t
-                    ext = ext.lower()
-                    if not any(ext==allowlisted_ext for allowlisted_ext in settings.DOCUMENT_FORMAT_ALLOWLIST):
-                        continue
-
-                    canonical_name = doc_names_with_missing_types.get(basename)
-
-                    if canonical_name:
-                        bins[ext.upper()].add(canonical_name)
+                for canonical_name, formats in stats_qs.values_list("name", "formats"):
+                    for fmt in formats.split(","):
+                        if fmt:
+                            bins[fmt].add(canonical_name)
 
                 series_data = []
                 for fmt, names in sorted(bins.items(), key=lambda t: t[0]):
@@ -367,57 +306,30 @@ def document_stats(request, stats_type=None):
 
                 bins = defaultdict(set)
 
-                for name, canonical_name, formal_language_name in generate_canonical_names(docalias_qs.values_list("docs__name", "name", "docs__formal_languages__name")):
-                    bins[formal_language_name or ""].add(canonical_name)
+                for canonical_name, formal_languages in stats_qs.values_list("name", "formal_languages"):
+                    for formal_language in formal_languages.split(",") if formal_languages else [""]:
+                        bins[formal_language].add(canonical_name)
 
                 series_data = []
                 for formal_language, names in sorted(bins.items(), key=lambda t: t[0]):
                     percentage = len(names) * 100.0 / (total_docs or 1)
-                    if formal_language is not None:
-                        series_data.append((formal_language, len(names)))
-                        table_data.append((formal_language, percentage, len(names), list(names)[:names_limit]))
+                    series_data.append((formal_language, len(names)))
+                    table_data.append((formal_language, percentage, len(names), list(names)[:names_limit]))
 
                 chart_data.append({ "data": series_data })
 
         elif any(stats_type == t[0] for t in possible_author_stats_types):
-            person_filters = Q(documentauthor__document__type="draft")
-
-            # filter persons
-            rfc_state = State.objects.get(type="draft", slug="rfc")
-            if document_type == "rfc":
-                person_filters &= Q(documentauthor__document__states=rfc_state)
-            elif document_type == "draft":
-                person_filters &= ~Q(documentauthor__document__states=rfc_state)
-
+            author_qs = DocumentAuthorStats.objects.filter(document_stats__in=stats_qs)
             if from_time:
-                # this is actually faster than joining in the database,
-                # despite the round-trip back and forth
-                docs_within_time_constraint = set(Document.objects.filter(
-                    type="draft",
-                    docevent__time__gte=from_time,
-                    docevent__type__in=["published_rfc", "new_revision"],
-                ).values_list("pk"))
-
-                person_filters &= Q(documentauthor__document__in=docs_within_time_constraint)
-
-            person_qs = Person.objects.filter(person_filters)
-
-            if document_type == "rfc":
-                doc_label = "RFC"
-            elif document_type == "draft":
-                doc_label = "draft"
-            else:
-                doc_label = "document"
+                author_qs = author_qs.filter(document_stats__latest_event_time__gte=from_time)
 
             if stats_type == "author/documents":
                 stats_title = "Number of {}s per author".format(doc_label)
 
                 bins = defaultdict(set)
 
-                person_qs = Person.objects.filter(person_filters)
-
-                for name, document_count in person_qs.values_list("name").annotate(Count("documentauthor")):
-                    bins[document_count or 0].add(name)
+                for name, document_count in author_qs.values_list("name").annotate(Count("pk")).order_by():
+                    bins[document_count].add(name)
 
                 total_persons = count_bins(bins)
 
@@ -435,16 +347,11 @@ def document_stats(request, stats_type=None):
 
                 bins = defaultdict(set)
 
-                person_qs = Person.objects.filter(person_filters)
-
                 # Since people don't write the affiliation names in the
                 # same way, and we don't want to go back and edit them
                 # either, we transform them here.
 
-                name_affiliation_set = {
-                    (name, affiliation)
-                    for name, affiliation in person_qs.values_list("name", "documentauthor__affiliation")
-                }
+                name_affiliation_set = set(author_qs.values_list("name", "affiliation"))
 
                 aliases = get_aliased_affiliations(affiliation for _, affiliation in name_affiliation_set)
 
@@ -475,16 +382,11 @@ def document_stats(request, stats_type=None):
 
                 bins = defaultdict(set)
 
-                person_qs = Person.objects.filter(person_filters)
-
                 # Since people don't write the country names in the
                 # same way, and we don't want to go back and edit them
                 # either, we transform them here.
 
-                name_country_set = {
-                    (name, country)
-                    for name, country in person_qs.values_list("name", "documentauthor__country")
-                }
+                name_country_set = set(author_qs.values_list("name", "country"))
 
                 aliases = get_aliased_countries(country for _, country in name_country_set)
 
@@ -526,12 +428,7 @@ def document_stats(request, stats_type=None):
 
                 bins = defaultdict(set)
 
-                person_qs = Person.objects.filter(person_filters)
-
-                name_country_set = {
-                    (name, country)
-                    for name, country in person_qs.values_list("name", "documentauthor__country")
-                }
+                name_country_set = set(author_qs.values_list("name", "country"))
 
                 aliases = get_aliased_countries(country for _, country in name_country_set)
 
@@ -562,13 +459,8 @@ def document_stats(request, stats_type=None):
 
                 bins = defaultdict(set)
 
-                cite_relationships = list(DocRelationshipName.objects.filter(slug__in=['refnorm', 'refinfo', 'refunk', 'refold']))
-                person_filters &= Q(documentauthor__document__docalias__relateddocument__relationship__in=cite_relationships)
-
-                person_qs = Person.objects.filter(person_filters)
-
-                for name, citations in person_qs.values_list("name").annotate(Count("documentauthor__document__docalias__relateddocument")):
-                    bins[citations or 0].add(name)
+                for name, citations in author_qs.filter(document_stats__citations__gt=0).values_list("name").annotate(Sum("document_stats__citations")).order_by():
+                    bins[citations].add(name)
 
                 total_persons = count_bins(bins)
 
@@ -586,15 +478,12 @@ def document_stats(request, stats_type=None):
 
                 bins = defaultdict(set)
 
-                cite_relationships = list(DocRelationshipName.objects.filter(slug__in=['refnorm', 'refinfo', 'refunk', 'refold']))
-                person_filters &= Q(documentauthor__document__docalias__relateddocument__relationship__in=cite_relationships)
+                citation_counts = defaultdict(list)
+                for name, citations in author_qs.filter(document_stats__citations__gt=0).values_list("name", "document_stats__citations"):
+                    citation_counts[name].append(citations)
 
-                person_qs = Person.objects.filter(person_filters)
-
-                values = person_qs.values_list("name", "documentauthor__document").annotate(Count("documentauthor__document__docalias__relateddocument"))
-                for name, ts in itertools.groupby(values.order_by("name"), key=lambda t: t[0]):
-                    h_index = compute_hirsch_index([citations for _, document, citations in ts])
-                    bins[h_index or 0].add(name)
+                for name, counts in citation_counts.items():
+                    bins[compute_hirsch_index(counts)].add(name)
 
                 total_persons = count_bins(bins)
 
@@ -609,74 +498,38 @@ def document_stats(request, stats_type=None):
 
         elif any(stats_type == t[0] for t in possible_yearly_stats_types):
 
-            person_filters = Q(documentauthor__document__type="draft")
-
-            # filter persons
-            rfc_state = State.objects.get(type="draft", slug="rfc")
-            if document_type == "rfc":
-                person_filters &= Q(documentauthor__document__states=rfc_state)
-            elif document_type == "draft":
-                person_filters &= ~Q(documentauthor__document__states=rfc_state)
-
-            doc_years = defaultdict(set)
-
-            docevent_qs = DocEvent.objects.filter(
-                doc__type="draft",
-                type__in=["published_rfc", "new_revision"],
-            ).values_list("doc", "time").order_by("doc")
-
-            for doc_id, time in docevent_qs.iterator():
-                # RPC_TZINFO is used to match the timezone handling in Document.pub_date()
-                doc_years[doc_id].add(time.astimezone(RPC_TZINFO).year)
-
-            person_qs = Person.objects.filter(person_filters)
-
-            if document_type == "rfc":
-                doc_label = "RFC"
-            elif document_type == "draft":
-                doc_label = "draft"
-            else:
-                doc_label = "document"
+            author_qs = DocumentAuthorStats.objects.filter(document_stats__in=stats_qs)
 
             template_name = "yearly"
 
             years_from = from_time.year if from_time else 1
             years_to = timezone.now().year - 1
 
+            def doc_years(years):
+                return [ y for y in (int(t) for t in years.split(",") if t) if years_from <= y <= years_to ]
 
             if stats_type == "yearly/affiliation":
                 stats_title = "Number of {} authors per affiliation over the years".format(doc_label)
 
-                person_qs = Person.objects.filter(person_filters)
-
-                name_affiliation_doc_set = {
-                    (name, affiliation, doc)
-                    for name, affiliation, doc in person_qs.values_list("name", "documentauthor__affiliation", "documentauthor__document")
-                }
+                name_affiliation_years_set = set(author_qs.values_list("name", "affiliation", "document_stats__years"))
 
-                aliases = get_aliased_affiliations(affiliation for _, affiliation, _ in name_affiliation_doc_set)
+                aliases = get_aliased_affiliations(affiliation for _, affiliation, _ in name_affiliation_years_set)
 
                 bins = defaultdict(set)
-                for name, affiliation, doc in name_affiliation_doc_set:
+                for name, affiliation, years in name_affiliation_years_set:
                     a = aliases.get(affiliation, affiliation)
                     if a:
-                        for year in doc_years.get(doc):
-                            if years_from <= year <= years_to:
-                                bins[(year, a)].add(name)
+                        for year in doc_years(years):
+                            bins[(year, a)].add(name)
 
                 add_labeled_top_series_from_bins(chart_data, bins, limit=8)
 
             elif stats_type == "yearly/country":
                 stats_title = "Number of {} authors per country over the years".format(doc_label)
 
-                person_qs = Person.objects.filter(person_filters)
+                name_country_years_set = set(author_qs.values_list("name", "country", "document_stats__years"))
 
-                name_country_doc_set = {
-                    (name, country, doc)
-                    for name, country, doc in person_qs.values_list("name", "documentauthor__country", "documentauthor__document")
-                }
-
-                aliases = get_aliased_countries(country for _, country, _ in name_country_doc_set)
+                aliases = get_aliased_countries(country for _, country, _ in name_country_years_set)
 
                 countries = { c.name: c for c in CountryName.objects.all() }
                 eu_name = "EU"
@@ -684,18 +537,16 @@ def document_stats(request, stats_type=None):
 
                 bins = defaultdict(set)
 
-                for name, country, doc in name_country_doc_set:
+                for name, country, years in name_country_years_set:
                     country_name = aliases.get(country, country)
                     c = countries.get(country_name)
 
-                    years = doc_years.get(doc)
-                    if country_name and years:
-                        for year in years:
-                            if years_from <= year <= years_to:
-                                bins[(year, country_name)].add(name)
+                    if country_name:
+                        for year in doc_years(years):
+                            bins[(year, country_name)].add(name)
 
-                                if c and c.in_eu:
-                                    bins[(year, eu_name)].add(name)
+                            if c and c.in_eu:
+                                bins[(year, eu_name)].add(name)
 
                 add_labeled_top_series_from_bins(chart_data, bins, limit=8)
 
@@ -703,27 +554,21 @@ def document_stats(request, stats_type=None):
             elif stats_type == "yearly/continent":
                 stats_title = "Number of {} authors per continent".format(doc_label)
 
-                person_qs = Person.objects.filter(person_filters)
-
-                name_country_doc_set = {
-                    (name, country, doc)
-                    for name, country, doc in person_qs.values_list("name", "documentauthor__country", "documentauthor__document")
-                }
+                name_country_years_set = set(author_qs.values_list("name", "country", "document_stats__years"))
 
-                aliases = get_aliased_countries(country for _, country, _ in name_country_doc_set)
+                aliases = get_aliased_countries(country for _, country, _ in name_country_years_set)
 
                 country_to_continent = dict(CountryName.objects.values_list("name", "continent__name"))
 
                 bins = defaultdict(set)
 
-                for name, country, doc in name_country_doc_set:
+                for name, country, years in name_country_years_set:
                     country_name = aliases.get(country, country)
                     continent_name = country_to_continent.get(country_name, "")
 
                     if continent_name:
-                        for year in doc_years.get(doc):
-                            if years_from <= year <= years_to:
-                                bins[(year, continent_name)].add(name)
+                        for year in doc_years(years):
+                            bins[(year, continent_name)].add(name)
 
                 add_labeled_top_series_from_bins(chart_data, bins, limit=8)
 
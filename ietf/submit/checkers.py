@@ -8,7 +8,9 @@ import re
 import shutil
 import sys
 import tempfile
+import threading
 
+from concurrent.futures import ThreadPoolExecutor
 from xym import xym
 from django.conf import settings
 
@@ -19,6 +21,14 @@ from ietf.utils.models import VersionInfo
 from ietf.utils.pipe import pipe
 from ietf.utils.test_runner import set_coverage_checking
 
+def command_version(checker, command):
+    """Return the version of command, from the versions given to the checker
+    if any, so that checkers running in worker threads don't need the database"""
+    versions = getattr(checker, "command_versions", None)
+    if versions is not None and command in versions:
+        return versions[command]
+    return VersionInfo.objects.get(command=command).version
+
 class DraftSubmissionChecker(object):
     name = ""
 
@@ -80,7 +90,7 @@ class DraftIdnitsChecker(object):
         
 
         cmd = "%s %s %s" % (settings.IDSUBMIT_IDNITS_BINARY, self.options, path)
-        code, out, err = pipe(cmd)
+        code, out, err = pipe(cmd, timeout=settings.IDSUBMIT_CHECKER_COMMAND_TIMEOUT)
         out = out.decode('utf-8')
         err = err.decode('utf-8')
         if code != 0 or out == "":
@@ -122,48 +132,86 @@ class DraftYangChecker(object):
     name = "yang validation"
     symbol = '<i class="bi bi-yin-yang"></i>'
 
-    def check_file_txt(self, path):
+    def __init__(self):
+        self.cancelled = False
+        self._publish_lock = threading.Lock()
+        # models extracted by prepare(), by draft path
+        self.extracted = {}
+
+    def cancel(self):
+        """Keep the models of a check that is still running out of the
+        shared model directory, for when its result is no longer wanted.
+        Once this returns, the checker won't touch the directory."""
+        with self._publish_lock:
+            self.cancelled = True
+
+    def publish_models(self, workdir, model_list):
+        """Move the checked models from workdir to the draft model directory,
+        unless the check has been cancelled"""
+        with self._publish_lock:
+            if self.cancelled:
+                return
+            for model in model_list:
+                path = os.path.join(workdir, model)
+                if os.path.exists(path):
+                    shutil.move(path, os.path.join(settings.SUBMIT_YANG_DRAFT_MODEL_DIR, model))
+
+    def extract_models(self, path):
+        """Extract the yang models of the draft at path into a new work
+        directory with xym.  Returns the work directory, the model names and
+        xym's output and error output.  xym reports on sys.stdout and
+        sys.stderr, which are swapped for the duration, so this must not
+        run in a worker thread; see prepare()."""
         name = os.path.basename(path)
         workdir = tempfile.mkdtemp()
-        model_name_re = r'^[A-Za-z_][A-Za-z0-9_.-]*(@\d\d\d\d-\d\d-\d\d)?\.yang$'
-        errors = 0
-        warnings = 0
-        message = ""
-        results = []
-        passed = True                   # Used by the submission tool.  Yang checks always pass.
-        model_list = []
-        info = {'checker': self.name, 'items': [], 'code': {}}
-
         extractor = xym.YangModuleExtractor(path, workdir, strict=True, strict_examples=False, debug_level=1)
-        if not os.path.exists(path):
-            return None, "%s: No such file or directory: '%s'"%(name.capitalize(), path), errors, warnings, info
         with open(path) as file:
-            out = ""
-            err = ""
-            code = 0
+            saved_stdout = sys.stdout
+            saved_stderr = sys.stderr
             try:
                 # This places the yang models as files in workdir
-                saved_stdout = sys.stdout
-                saved_stderr = sys.stderr
                 sys.stdout = io.StringIO()
                 sys.stderr = io.StringIO()
                 extractor.extract_yang_model_text(file.read())
                 model_list = extractor.get_extracted_models(False, True)
                 out = sys.stdout.getvalue()
                 err = sys.stderr.getvalue()
-                # signature change in xym:
             except Exception as exc:
-                sys.stdout = saved_stdout
-                sys.stderr = saved_stderr
-                msg = "Exception when running xym on %s: %s" % (name, exc)
-                log(msg)
+                log("Exception when running xym on %s: %s" % (name, exc))
+                shutil.rmtree(workdir)
                 raise
-                return None, msg, 0, 0, info
             finally:
                 sys.stdout = saved_stdout
                 sys.stderr = saved_stderr
+        return workdir, model_list, out, err
+
+    def prepare(self, file_name):
+        """Extract the models in the calling thread, before the check is run
+        in a worker thread by apply_checkers()"""
+        path = file_name.get('txt')
+        if path and os.path.exists(path):
+            self.extracted[path] = self.extract_models(path)
+
+    def check_file_txt(self, path):
+        name = os.path.basename(path)
+        model_name_re = r'^[A-Za-z_][A-Za-z0-9_.-]*(@\d\d\d\d-\d\d-\d\d)?\.yang$'
+        errors = 0
+        warnings = 0
+        message = ""
+        results = []
+        passed = True                   # Used by the submission tool.  Yang checks always pass.
+        info = {'checker': self.name, 'items': [], 'code': {}}
+
+        if not os.path.exists(path):
+            return None, "%s: No such file or directory: '%s'"%(name.capitalize(), path), errors, warnings, info
+        if path in self.extracted:
+            workdir, model_list, out, err = self.extracted.pop(path)
+        else:
+            workdir, model_list, out, err = self.extract_models(path)
+        code = 0
         if not model_list:
             # Found no yang models, don't deliver any YangChecker result
+            shutil.rmtree(workdir)
             return None, "", 0, 0, info
 
         for m in model_list:
@@ -177,7 +225,7 @@ class DraftYangChecker(object):
         model_list = list(set(model_list))
 
         command = "xym"
-        cmd_version = VersionInfo.objects.get(command=command).version
+        cmd_version = command_version(self, command)
         message = "%s:\n%s\n\n" % (cmd_version, out.replace('\n\n','\n').strip() if code == 0 else err)
 
         results.append({
@@ -189,108 +237,119 @@ class DraftYangChecker(object):
             "items": [],
         })
 
-        for model in model_list:
-            path = os.path.join(workdir, model)
-            message = ""
-            passed = True
-            errors = 0
-            warnings = 0
-            items = []
-            modpath = ':'.join([
-                                workdir,
-                                settings.SUBMIT_YANG_RFC_MODEL_DIR,
-                                settings.SUBMIT_YANG_DRAFT_MODEL_DIR,
-                                settings.SUBMIT_YANG_IANA_MODEL_DIR,
-                                settings.SUBMIT_YANG_CATALOG_MODEL_DIR,
-                            ])
-            if os.path.exists(path):
-                with io.open(path) as file:
-                    text = file.readlines()
-                # pyang
-                cmd_template = settings.SUBMIT_PYANG_COMMAND
+        modpath = ':'.join([
+                            workdir,
+                            settings.SUBMIT_YANG_RFC_MODEL_DIR,
+                            settings.SUBMIT_YANG_DRAFT_MODEL_DIR,
+                            settings.SUBMIT_YANG_IANA_MODEL_DIR,
+                            settings.SUBMIT_YANG_CATALOG_MODEL_DIR,
+                        ])
+        # the commands may be installed in the virtual environment; the
+        # environment is built for the commands rather than changed for the
+        # whole process, as checkers run in threads
+        venv_path = os.environ.get('VIRTUAL_ENV') or os.path.join(os.getcwd(), 'env')
+        venv_bin = os.path.join(venv_path, 'bin')
+        env = dict(os.environ)
+        if not venv_bin in env.get('PATH', '').split(':'):
+            env['PATH'] = env.get('PATH', '') + ":" + venv_bin
+
+        # the models are checked in parallel, as most of the time is spent
+        # waiting for pyang and yanglint.  The worker threads shouldn't use
+        # the database, so look up the command versions here
+        if getattr(self, "command_versions", None) is None:
+            self.command_versions = dict(VersionInfo.objects.values_list("command", "version"))
+        with ThreadPoolExecutor(max_workers=settings.IDSUBMIT_CHECKER_WORKERS) as executor:
+            results.extend(executor.map(lambda model: self.check_model(model, workdir, modpath, env), model_list))
+
+        self.publish_models(workdir, model_list)
+        shutil.rmtree(workdir)
+
+        passed  = all( res["passed"] for res in results )
+        message = "\n".join([ "\n".join([res['name']+':', res["message"]]) for res in results ])
+        errors  = sum(res["errors"] for res in results )
+        warnings  = sum(res["warnings"] for res in results )
+        items  = [ e for res in results for e in res["items"] ]
+        info['items'] = items
+        info['code']['yang'] = model_list
+        return passed, message, errors, warnings, info
+
+    def check_model(self, model, workdir, modpath, env=None):
+        """Run pyang and yanglint on an extracted model, and return the summary result"""
+        path = os.path.join(workdir, model)
+        message = ""
+        passed = True
+        errors = 0
+        warnings = 0
+        items = []
+        if os.path.exists(path):
+            with io.open(path) as file:
+                text = file.readlines()
+            # pyang
+            cmd_template = settings.SUBMIT_PYANG_COMMAND
+            command = [ w for w in cmd_template.split() if not '=' in w ][0]
+            cmd_version = command_version(self, command)
+            cmd = cmd_template.format(libs=modpath, model=path)
+            code, out, err = pipe(cmd, timeout=settings.IDSUBMIT_CHECKER_COMMAND_TIMEOUT, env=env)
+            out = out.decode('utf-8')
+            err = err.decode('utf-8')
+            if code > 0 or len(err.strip()) > 0 :
+                error_lines = err.splitlines()
+                assertion('len(error_lines) > 0')
+                for line in error_lines:
+                    if line.strip():
+                        try:
+                            fn, lnum, msg = line.split(':', 2)
+                            lnum = int(lnum)
+                            if fn == model and (lnum-1) in range(len(text)):
+                                line = text[lnum-1].rstrip()
+                            else:
+                                line = None
+                            items.append((lnum, line, msg))
+                            if 'error: ' in msg:
+                                errors += 1
+                            if 'warning: ' in msg:
+                                warnings += 1
+                        except ValueError:
+                            pass
+            #passed = passed and code == 0 # For the submission tool.  Yang checks always pass
+            message += "%s: %s:\n%s\n" % (cmd_version, cmd_template, out+"No validation errors\n" if (code == 0 and len(err) == 0) else out+err)
+
+            # yanglint
+            set_coverage_checking(False) # we can't count the following as it may or may not be run, depending on setup
+            if settings.SUBMIT_YANGLINT_COMMAND and os.path.exists(settings.YANGLINT_BINARY):
+                cmd_template = settings.SUBMIT_YANGLINT_COMMAND
                 command = [ w for w in cmd_template.split() if not '=' in w ][0]
-                cmd_version = VersionInfo.objects.get(command=command).version
-                cmd = cmd_template.format(libs=modpath, model=path)
-                venv_path = os.environ.get('VIRTUAL_ENV') or os.path.join(os.getcwd(), 'env')
-                venv_bin = os.path.join(venv_path, 'bin')
-                if not venv_bin in os.environ.get('PATH', '').split(':'):
-                    os.environ['PATH'] = os.environ.get('PATH', '') + ":" + venv_bin
-                code, out, err = pipe(cmd)
+                cmd_version = command_version(self, command)
+                cmd = cmd_template.format(model=path, rfclib=settings.SUBMIT_YANG_RFC_MODEL_DIR, tmplib=workdir,
+                    draftlib=settings.SUBMIT_YANG_DRAFT_MODEL_DIR, ianalib=settings.SUBMIT_YANG_IANA_MODEL_DIR,
+                    cataloglib=settings.SUBMIT_YANG_CATALOG_MODEL_DIR, )
+                code, out, err = pipe(cmd, timeout=settings.IDSUBMIT_CHECKER_COMMAND_TIMEOUT, env=env)
                 out = out.decode('utf-8')
                 err = err.decode('utf-8')
-                if code > 0 or len(err.strip()) > 0 :
-                    error_lines = err.splitlines()
-                    assertion('len(error_lines) > 0')
-                    for line in error_lines:
+                if code > 0 or len(err.strip()) > 0:
+                    err_lines = err.splitlines()
+                    for line in err_lines:
                         if line.strip():
                             try:
-                                fn, lnum, msg = line.split(':', 2)
-                                lnum = int(lnum)
-                                if fn == model and (lnum-1) in range(len(text)):
-                                    line = text[lnum-1].rstrip()
-                                else:
-                                    line = None
-                                items.append((lnum, line, msg))
-                                if 'error: ' in msg:
+                                if 'err : ' in line:
                                     errors += 1
-                                if 'warning: ' in msg:
+                                if 'warn: ' in line:
                                     warnings += 1
                             except ValueError:
                                 pass
                 #passed = passed and code == 0 # For the submission tool.  Yang checks always pass
                 message += "%s: %s:\n%s\n" % (cmd_version, cmd_template, out+"No validation errors\n" if (code == 0 and len(err) == 0) else out+err)
+            set_coverage_checking(True)
+        else:
+            errors += 1
+            message += "No such file: %s\nPossible mismatch between extracted xym file name and returned module name?\n" % (path)
 
-                # yanglint
-                set_coverage_checking(False) # we can't count the following as it may or may not be run, depending on setup
-                if settings.SUBMIT_YANGLINT_COMMAND and os.path.exists(settings.YANGLINT_BINARY):
-                    cmd_template = settings.SUBMIT_YANGLINT_COMMAND
-                    command = [ w for w in cmd_template.split() if not '=' in w ][0]
-                    cmd_version = VersionInfo.objects.get(command=command).version
-                    cmd = cmd_template.format(model=path, rfclib=settings.SUBMIT_YANG_RFC_MODEL_DIR, tmplib=workdir,
-                        draftlib=settings.SUBMIT_YANG_DRAFT_MODEL_DIR, ianalib=settings.SUBMIT_YANG_IANA_MODEL_DIR,
-                        cataloglib=settings.SUBMIT_YANG_CATALOG_MODEL_DIR, )
-                    code, out, err = pipe(cmd)
-                    out = out.decode('utf-8')
-                    err = err.decode('utf-8')
-                    if code > 0 or len(err.strip()) > 0:
-                        err_lines = err.splitlines()
-                        for line in err_lines:
-                            if line.strip():
-                                try:
-                                    if 'err : ' in line:
-                                        errors += 1
-                                    if 'warn: ' in line:
-                                        warnings += 1
-                                except ValueError:
-                                    pass
-                    #passed = passed and code == 0 # For the submission tool.  Yang checks always pass
-                    message += "%s: %s:\n%s\n" % (cmd_version, cmd_template, out+"No validation errors\n" if (code == 0 and len(err) == 0) else out+err)
-                set_coverage_checking(True)
-            else:
-                errors += 1
-                message += "No such file: %s\nPossible mismatch between extracted xym file name and returned module name?\n" % (path)
-
-            dest = os.path.join(settings.SUBMIT_YANG_DRAFT_MODEL_DIR, model)
-            shutil.move(path, dest)
-
-            # summary result
-            results.append({
-                "name": model,
-                "passed":  passed,
-                "message": message,
-                "warnings": warnings,
-                "errors":  errors,
-                "items": items,
-            })
-
-
-        shutil.rmtree(workdir)
-
-        passed  = all( res["passed"] for res in results )
-        message = "\n".join([ "\n".join([res['name']+':', res["message"]]) for res in results ])
-        errors  = sum(res["errors"] for res in results )
-        warnings  = sum(res["warnings"] for res in results )
-        items  = [ e for res in results for e in res["items"] ]
-        info['items'] = items
-        info['code']['yang'] = model_list
-        return passed, message, errors, warnings, info
\ No newline at end of file
+        # summary result
+        return {
+            "name": model,
+            "passed":  passed,
+            "message": message,
+            "warnings": warnings,
+            "errors":  errors,
+            "items": items,
+        }
@@ -2,12 +2,16 @@
 # -*- coding: utf-8 -*-
 
 
+import concurrent.futures
 import datetime
 import email
 import io
 import os
 import re
+import shutil
 import sys
+import tempfile
+import threading
 import mock
 
 from io import StringIO
@@ -28,7 +32,7 @@ import debug                            # pyflakes:ignore
 
 from ietf.submit.utils import (expirable_submissions, expire_submission, find_submission_filenames,
                                post_submission, validate_submission_name, validate_submission_rev,
-                               process_uploaded_submission, SubmissionError, process_submission_text)
+                               process_uploaded_submission, SubmissionError, process_submission_text, apply_checkers)
 from ietf.doc.factories import (DocumentFactory, WgDraftFactory, IndividualDraftFactory, IndividualRfcFactory,
                                 ReviewFactory, WgRfcFactory)
 from ietf.doc.models import ( Document, DocAlias, DocEvent, State,
@@ -43,6 +47,7 @@ from ietf.message.models import Message
 from ietf.name.models import FormalLanguageName
 from ietf.person.models import Person
 from ietf.person.factories import UserFactory, PersonFactory, EmailFactory
+from ietf.submit.checkers import DraftYangChecker
 from ietf.submit.factories import SubmissionFactory, SubmissionExtResourceFactory
 from ietf.submit.forms import SubmissionBaseUploadForm, SubmissionAutoUploadForm
 from ietf.submit.models import Submission, Preapproval, SubmissionExtResource
@@ -3524,6 +3529,88 @@ class ApiSubmitTests(BaseSubmitTestCase):
         )
 
         
+class QuickTestChecker(object):
+    name = "quick check"
+    symbol = ""
+
+    def check_file_txt(self, path):
+        return True, "Quick check of %s" % os.path.basename(path), 0, 0, {'checker': self.name, 'items': [], 'code': {}}
+
+
+class SlowTestChecker(object):
+    """A checker that doesn't finish until the test releases it"""
+    name = "slow check"
+    symbol = ""
+    release = threading.Event()
+    cancelled = False
+
+    def check_file_txt(self, path):
+        SlowTestChecker.release.wait()
+        return True, "Slow check", 0, 0, {'checker': self.name, 'items': [], 'code': {}}
+
+    def cancel(self):
+        SlowTestChecker.cancelled = True
+
+
+def wait_for_first_checker(futures, timeout=None):
+    """Stand-in for concurrent.futures.wait() where the checkers that are
+    still running once the first one is done have timed out"""
+    return concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_COMPLETED)
+
+
+class ApplyCheckersTests(BaseSubmitTestCase):
+    @override_settings(IDSUBMIT_CHECKER_CLASSES=("ietf.submit.tests.SlowTestChecker", "ietf.submit.tests.QuickTestChecker"))
+    @mock.patch('ietf.submit.utils.wait', side_effect=wait_for_first_checker)
+    def test_apply_checkers(self, mock_wait):
+        submission = SubmissionFactory()
+        txt_path = os.path.join(self.staging_dir, "%s-%s.txt" % (submission.name, submission.rev))
+        Path(txt_path).touch()
+
+        SlowTestChecker.release.clear()
+        SlowTestChecker.cancelled = False
+        self.addCleanup(SlowTestChecker.release.set)
+        apply_checkers(submission, {"txt": txt_path})
+        self.assertTrue(SlowTestChecker.cancelled)
+
+        checks = list(submission.checks.order_by("pk"))
+        self.assertEqual([c.checker for c in checks], ["slow check", "quick check"])
+        slow, quick = checks
+        self.assertFalse(slow.passed)
+        self.assertIn("did not finish", slow.message)
+        self.assertTrue(quick.passed)
+        self.assertIn(os.path.basename(txt_path), quick.message)
+
+
+    def test_cancelled_yang_checker_keeps_models(self):
+        workdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, workdir)
+        for model in ("one.yang", "two.yang"):
+            Path(workdir, model).write_text("module %s { }" % model)
+
+        checker = DraftYangChecker()
+        checker.publish_models(workdir, ["one.yang"])
+        self.assertTrue(os.path.exists(os.path.join(settings.SUBMIT_YANG_DRAFT_MODEL_DIR, "one.yang")))
+
+        # a timed-out check doesn't publish its models any more
+        checker.cancel()
+        checker.publish_models(workdir, ["two.yang"])
+        self.assertFalse(os.path.exists(os.path.join(settings.SUBMIT_YANG_DRAFT_MODEL_DIR, "two.yang")))
+
+    @override_settings(IDSUBMIT_CHECKER_CLASSES=("ietf.submit.checkers.DraftYangChecker",))
+    def test_yang_models_extracted_in_calling_thread(self):
+        """xym swaps sys.stdout and sys.stderr, so it must not run in a checker thread"""
+        submission = SubmissionFactory()
+        txt_path = os.path.join(self.staging_dir, "%s-%s.txt" % (submission.name, submission.rev))
+        Path(txt_path).touch()
+
+        threads = []
+        def extract_models(checker, path):
+            threads.append(threading.current_thread())
+            return tempfile.mkdtemp(), [], "", ""
+        with mock.patch.object(DraftYangChecker, 'extract_models', autospec=True, side_effect=extract_models):
+            apply_checkers(submission, {"txt": txt_path})
+        self.assertEqual(threads, [threading.current_thread()])
+
 class RefsTests(BaseSubmitTestCase):
 
     def test_draft_refs_identification(self):
@@ -3589,6 +3676,18 @@ class PostSubmissionTests(BaseSubmitTestCase):
         args, kwargs = mock_rebuild_reference_relations.call_args
         self.assertEqual(args[1], mock_find_filenames.return_value)
 
+    @mock.patch.object(transaction, 'on_commit', lambda x: x())
+    @mock.patch('ietf.submit.utils.prerender_document_task')
+    @mock.patch('ietf.submit.utils.rebuild_reference_relations')
+    def test_post_submission_queues_prerender(self, mock_rebuild_reference_relations, mock_task):
+        """The post_submission method should queue pre-rendering of the new revision once committed"""
+        submission = SubmissionFactory()
+        request = RequestFactory()
+        request.user = PersonFactory().user
+        post_submission(request, submission, 'doc_desc', 'subm_desc')
+        self.assertEqual(mock_task.delay.call_count, 1)
+        self.assertEqual(mock_task.delay.call_args.args, (submission.name,))
+
 
 class ValidateSubmissionFilenameTests(BaseSubmitTestCase):
     def test_validate_submission_name(self):
@@ -11,6 +11,8 @@ import time
 import traceback
 import xml2rfc
 
+from concurrent.futures import ThreadPoolExecutor, wait
+
 from typing import Optional  # pyflakes:ignore
 from unidecode import unidecode
 
@@ -34,6 +36,7 @@ from ietf.doc.utils import (add_state_change_event, rebuild_reference_relations,
     can_edit_docextresources, update_documentauthors, update_action_holders,
     bibxml_for_draft )
 from ietf.doc.mails import send_review_possibly_replaces_request, send_external_resource_change_request
+from ietf.doc.tasks import prerender_document_task
 from ietf.group.models import Group
 from ietf.ietfauth.utils import has_role
 from ietf.name.models import StreamName, FormalLanguageName
@@ -47,6 +50,7 @@ from ietf.utils import log
 from ietf.utils.accesstoken import generate_random_key
 from ietf.utils.draft import PlaintextDraft
 from ietf.utils.mail import is_valid_email
+from ietf.utils.models import VersionInfo
 from ietf.utils.text import parse_unicode, normalize_text
 from ietf.utils.timezone import date_today
 from ietf.utils.xmldraft import XMLDraft
@@ -492,6 +496,10 @@ def post_submission(request, submission, approved_doc_desc, approved_subm_desc):
     with io.open(ref_rev_file_name, "w", encoding='utf-8') as f:
         f.write(ref_text)
 
+    # Fill the htmlized and pdfized caches before the first readers show up
+    draft_name = draft.name
+    transaction.on_commit(lambda: prerender_document_task.delay(draft_name))
+
     log.log(f"{submission.name}: done")
     
 
@@ -863,31 +871,73 @@ def fill_in_submission(form, submission, authors, abstract, file_size):
         submission.formal_languages.set(FormalLanguageName.objects.filter(slug__in=form.parsed_draft.get_formal_languages()))
     set_extresources_from_existing_draft(submission)
 
-def apply_checker(checker, submission, file_name):
-    def apply_check(submission, checker, method, fn):
-        func = getattr(checker, method)
-        passed, message, errors, warnings, info = func(fn)
-        check = SubmissionCheck(submission=submission, checker=checker.name, passed=passed,
-                                message=message, errors=errors, warnings=warnings, items=info,
-                                symbol=checker.symbol)
-        check.save()
+def run_checker(checker, file_name):
+    """Run checker on the first kind of file it can handle, and return the
+    result as an unsaved SubmissionCheck, or None if it can't handle any"""
     # ordered list of methods to try
     for method in ("check_fragment_xml", "check_file_xml", "check_fragment_txt", "check_file_txt", ):
         ext = method[-3:]
         if hasattr(checker, method) and ext in file_name:
-            apply_check(submission, checker, method, file_name[ext])
-            break
+            func = getattr(checker, method)
+            passed, message, errors, warnings, info = func(file_name[ext])
+            return SubmissionCheck(checker=checker.name, passed=passed,
+                                   message=message, errors=errors, warnings=warnings, items=info,
+                                   symbol=checker.symbol)
+    return None
 
 def apply_checkers(submission, file_name):
-    # run submission checkers
+    # run submission checkers.  They spend most of their time waiting for
+    # external commands, so they are run in parallel in threads, and the
+    # results are saved together at the end.  The threads shouldn't use the
+    # database, so the command versions the checkers need are looked up here.
     mark = time.time()
+    command_versions = dict(VersionInfo.objects.values_list("command", "version"))
+    checkers = []
     for checker_path in settings.IDSUBMIT_CHECKER_CLASSES:
-        lap = time.time()
         checker_class = import_string(checker_path)
         checker = checker_class()
-        apply_checker(checker, submission, file_name)
+        checker.command_versions = command_versions
+        checkers.append(checker)
+
+    def run(checker):
+        lap = time.time()
+        check = run_checker(checker, file_name)
         tau = time.time() - lap
         log.log(f"ran {checker.__class__.__name__} ({tau:.3}s) for {file_name}")
+        return check
+
+    # steps that can't run in a worker thread, like the yang model
+    # extraction, which captures the output of xym by swapping sys.stdout
+    for checker in checkers:
+        if hasattr(checker, "prepare"):
+            checker.prepare(file_name)
+
+    executor = ThreadPoolExecutor(max_workers=max(1, len(checkers)))
+    futures = [ (executor.submit(run, checker), checker) for checker in checkers ]
+    done, not_done = wait([ f for f, c in futures ], timeout=settings.IDSUBMIT_CHECKER_TIMEOUT)
+    # don't wait for checkers which have timed out, their external commands
+    # time out on their own.  Their results are dropped, so keep them from
+    # changing anything outside their own work directories.
+    for future, checker in futures:
+        if future not in done and hasattr(checker, "cancel"):
+            checker.cancel()
+    executor.shutdown(wait=False)
+
+    checks = []
+    for future, checker in futures:
+        if future in done:
+            check = future.result()
+        else:
+            log.log(f"{checker.__class__.__name__} timed out for {file_name}")
+            check = SubmissionCheck(checker=checker.name, passed=False,
+                                    message=f"The {checker.name} did not finish within {settings.IDSUBMIT_CHECKER_TIMEOUT} seconds.",
+                                    errors=1, warnings=0, items={'checker': checker.name, 'items': [], 'code': {}},
+                                    symbol=checker.symbol)
+        if check:
+            check.submission = submission
+            checks.append(check)
+    SubmissionCheck.objects.bulk_create(checks)
+
     tau = time.time() - mark
     log.log(f"ran submission checks ({tau:.3}s) for {file_name}")
 
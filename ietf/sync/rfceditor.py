@@ -4,13 +4,16 @@
 
 import base64
 import datetime
+import hashlib
+import json
 import re
 import requests
 
 from urllib.parse import urlencode
-from xml.dom import pulldom, Node
+from xml.etree import ElementTree
 
 from django.conf import settings
+from django.db import transaction
 from django.utils import timezone
 from django.utils.encoding import smart_bytes, force_str, force_text
 
@@ -19,6 +22,7 @@ import debug                            # pyflakes:ignore
 from ietf.doc.models import ( Document, DocAlias, State, StateType, DocEvent, DocRelationshipName,
     DocTagName, DocTypeName, RelatedDocument )
 from ietf.doc.expire import move_draft_files_to_archive
+from ietf.doc.tasks import prerender_document_task
 from ietf.doc.utils import add_state_change_event, prettify_std_name, update_action_holders
 from ietf.group.models import Group
 from ietf.name.models import StdLevelName, StreamName
@@ -37,25 +41,31 @@ MIN_QUEUE_RESULTS = 10
 
 def get_child_text(parent_node, tag_name):
     text = []
-    for node in parent_node.childNodes:
-        if node.nodeType == Node.ELEMENT_NODE and node.localName == tag_name:
-            text.append(node.firstChild.data)
+    for node in parent_node:
+        if node.tag == tag_name:
+            text.append(node.text or "")
     return '\n\n'.join(text)
 
 
+def iterparse_elements(response):
+    """Parse XML from a file-like object incrementally, yielding (event,
+    element) pairs with the namespace stripped from the tags. The caller
+    should clear() the elements it's done with to keep memory use flat."""
+    for event, elem in ElementTree.iterparse(response, events=("start", "end")):
+        elem.tag = elem.tag.rsplit("}", 1)[-1]
+        yield event, elem
+
+
 def parse_queue(response):
     """Parse RFC Editor queue XML into a bunch of tuples + warnings."""
 
-    events = pulldom.parse(response)
     drafts = []
     warnings = []
     stream = None
 
-    for event, node in events:
+    for event, node in iterparse_elements(response):
         try:
-            if event == pulldom.START_ELEMENT and node.tagName == "entry":
-                events.expandNode(node)
-                node.normalize()
+            if event == "end" and node.tag == "entry":
                 draft_name = get_child_text(node, "draft").strip()
                 draft_name = re.sub(r"(-\d\d)?(.txt){1,2}$", "", draft_name)
                 date_received = get_child_text(node, "date-received")
@@ -63,46 +73,43 @@ def parse_queue(response):
                 state = ""
                 tags = []
                 missref_generation = ""
-                for child in node.childNodes:
-                    if child.nodeType == Node.ELEMENT_NODE and child.localName == "state":
-                        state = child.firstChild.data
-                        # state has some extra annotations encoded, parse
-                        # them out
-                        if '*R' in state:
-                            tags.append("ref")
-                            state = state.replace("*R", "")
-                        if '*A' in state:
-                            tags.append("iana")
-                            state = state.replace("*A", "")
-                        m = re.search(r"\(([0-9]+)G\)", state)
-                        if m:
-                            missref_generation = m.group(1)
-                            state = state.replace("(%sG)" % missref_generation, "")
+                for child in node.findall("state"):
+                    state = child.text
+                    # state has some extra annotations encoded, parse
+                    # them out
+                    if '*R' in state:
+                        tags.append("ref")
+                        state = state.replace("*R", "")
+                    if '*A' in state:
+                        tags.append("iana")
+                        state = state.replace("*A", "")
+                    m = re.search(r"\(([0-9]+)G\)", state)
+                    if m:
+                        missref_generation = m.group(1)
+                        state = state.replace("(%sG)" % missref_generation, "")
 
                 # AUTH48 link
                 auth48 = ""
-                for child in node.childNodes:
-                    if child.nodeType == Node.ELEMENT_NODE and child.localName == "auth48-url":
-                        auth48 = child.firstChild.data
+                for child in node.findall("auth48-url"):
+                    auth48 = child.text
 
                 # cluster link (if it ever gets implemented)
                 cluster = ""
-                for child in node.childNodes:
-                    if child.nodeType == Node.ELEMENT_NODE and child.localName == "cluster-url":
-                        cluster = child.firstChild.data
+                for child in node.findall("cluster-url"):
+                    cluster = child.text
 
                 refs = []
-                for child in node.childNodes:
-                    if child.nodeType == Node.ELEMENT_NODE and child.localName == "normRef":
-                        ref_name = get_child_text(child, "ref-name")
-                        ref_state = get_child_text(child, "ref-state")
-                        in_queue = ref_state.startswith("IN-QUEUE")
-                        refs.append((ref_name, ref_state, in_queue))
+                for child in node.findall("normRef"):
+                    ref_name = get_child_text(child, "ref-name")
+                    ref_state = get_child_text(child, "ref-state")
+                    in_queue = ref_state.startswith("IN-QUEUE")
+                    refs.append((ref_name, ref_state, in_queue))
 
                 drafts.append((draft_name, date_received, state, tags, missref_generation, stream, auth48, cluster, refs))
+                node.clear()
 
-            elif event == pulldom.START_ELEMENT and node.tagName == "section":
-                name = node.getAttribute('name')
+            elif event == "start" and node.tag == "section":
+                name = node.get('name')
                 if name.startswith("IETF"):
                     stream = "ietf"
                 elif name.startswith("IAB"):
@@ -116,7 +123,7 @@ def parse_queue(response):
                     warnings.append("unrecognized section " + name)
         except Exception as e:
             log("Exception when processing an RFC queue entry: %s" % e)
-            log("node: %s" % node)
+            log("node: %s" % ElementTree.tostring(node, encoding="unicode"))
             raise
             
     return drafts, warnings
@@ -253,19 +260,18 @@ def parse_index(response):
 
     def extract_doc_list(parentNode, tagName):
         l = []
-        for u in parentNode.getElementsByTagName(tagName):
-            for d in u.getElementsByTagName("doc-id"):
-                l.append(normalize_std_name(d.firstChild.data))
+        for u in parentNode.iter(tagName):
+            for d in u.iter("doc-id"):
+                l.append(normalize_std_name(d.text))
         return l
 
     also_list = {}
     data = []
-    events = pulldom.parse(response)
-    for event, node in events:
+    for event, node in iterparse_elements(response):
+        if event != "end":
+            continue
         try:
-            if event == pulldom.START_ELEMENT and node.tagName in ["bcp-entry", "fyi-entry", "std-entry"]:
-                events.expandNode(node)
-                node.normalize()
+            if node.tag in ["bcp-entry", "fyi-entry", "std-entry"]:
                 bcpid = normalize_std_name(get_child_text(node, "doc-id"))
                 doclist = extract_doc_list(node, "is-also")
                 for docid in doclist:
@@ -274,17 +280,17 @@ def parse_index(response):
                     else:
                         also_list[docid] = [bcpid]
 
-            elif event == pulldom.START_ELEMENT and node.tagName == "rfc-entry":
-                events.expandNode(node)
-                node.normalize()
+                node.clear()
+
+            elif node.tag == "rfc-entry":
                 rfc_number = int(get_child_text(node, "doc-id")[3:])
                 title = get_child_text(node, "title")
 
                 authors = []
-                for author in node.getElementsByTagName("author"):
+                for author in node.iter("author"):
                     authors.append(get_child_text(author, "name"))
 
-                d = node.getElementsByTagName("date")[0]
+                d = node.find("date")
                 year = int(get_child_text(d, "year"))
                 month = get_child_text(d, "month")
                 month = ["January","February","March","April","May","June","July","August","September","October","November","December"].index(month)+1
@@ -303,27 +309,28 @@ def parse_index(response):
                     wg = None
 
                 l = []
-                for fmt in node.getElementsByTagName("format"):
+                for fmt in node.iter("format"):
                     l.append(get_child_text(fmt, "file-format"))
                 file_formats = (",".join(l)).lower()
 
                 abstract = ""
-                for abstract in node.getElementsByTagName("abstract"):
+                for abstract in node.iter("abstract"):
                     abstract = get_child_text(abstract, "p")
 
                 draft = get_child_text(node, "draft")
                 if draft and re.search(r"-\d\d$", draft):
                     draft = draft[0:-3]
 
-                if len(node.getElementsByTagName("errata-url")) > 0:
+                if node.find("errata-url") is not None:
                     has_errata = 1
                 else:
                     has_errata = 0
 
                 data.append((rfc_number,title,authors,rfc_published_date,current_status,updates,updated_by,obsoletes,obsoleted_by,[],draft,has_errata,stream,wg,file_formats,pages,abstract))
+                node.clear()
         except Exception as e:
             log("Exception when processing an RFC index entry: %s" % e)
-            log("node: %s" % node)
+            log("node: %s" % ElementTree.tostring(node, encoding="unicode"))
             raise
     for d in data:
         k = "RFC%04d" % d[0]
@@ -332,6 +339,156 @@ def parse_index(response):
     return data
 
 
+def rfc_index_entry_hash(entry, doc_errata):
+    """Hash of an RFC index entry and the status of its errata, so that
+    a sync can tell which entries have changed since it last ran."""
+    codes = sorted(er['errata_status_code'] for er in doc_errata)
+    return hashlib.sha1(json.dumps([entry, codes], default=str).encode()).hexdigest()
+
+def unseen_rfc_index_entries(index_data, errata_data, seen):
+    """Return the index entries whose hash isn't in the seen dictionary
+    (from RFC number to hash), and the hashes of all the entries."""
+    errata = {}
+    for item in errata_data:
+        errata.setdefault(item['doc-id'], []).append(item)
+
+    entries = []
+    hashes = {}
+    for entry in index_data:
+        key = str(entry[0])
+        hashes[key] = rfc_index_entry_hash(entry, errata.get('RFC%04d' % entry[0], []))
+        if seen.get(key) != hashes[key]:
+            entries.append(entry)
+    return entries, hashes
+
+
+RFC_INDEX_STATE_TYPES = ("draft-iesg", "draft-stream-iab", "draft-stream-irtf", "draft-stream-ise")
+
+def _chunks(l, size=500):
+    l = list(l)
+    for i in range(0, len(l), size):
+        yield l[i:i + size]
+
+def _relation_alias_names(l):
+    """The alias names parse_relation_list in update_docs_from_rfc_index
+    looks up directly, and the ones it translates to RFCs."""
+    direct, translated = set(), set()
+    for x in l:
+        (translated if x[:3] in ("NIC", "IEN", "STD", "RTR") else direct).add(x.lower())
+    return direct, translated
+
+
+class RfcIndexSnapshot(object):
+    """What the database currently says about the documents in a parsed
+    RFC Editor index, loaded with a handful of bulk queries, so that the
+    index entries which wouldn't change anything can be skipped without
+    touching the database."""
+
+    def __init__(self, entries):
+        rfc_names = set("rfc%s" % e[0] for e in entries)
+        direct, translated = set(), set()
+        for rfc_number, title, authors, rfc_published_date, current_status, updates, updated_by, obsoletes, obsoleted_by, also, draft, has_errata, stream, wg, file_formats, pages, abstract in entries:
+            for l in (obsoletes, updates):
+                d, t = _relation_alias_names(l)
+                direct |= d
+                translated |= t
+            direct |= set(a.lower() for a in also)
+
+        AliasDocs = DocAlias.docs.through
+        self.alias_ids = {}
+        for chunk in _chunks(rfc_names | direct | translated):
+            self.alias_ids.update(DocAlias.objects.filter(name__in=chunk).values_list("name", "pk"))
+
+        alias_docs = {}
+        for chunk in _chunks(rfc_names | translated):
+            for name, doc_id in AliasDocs.objects.filter(docalias__name__in=chunk).values_list("docalias__name", "document_id"):
+                alias_docs.setdefault(name, []).append(doc_id)
+        # DocAlias.document is docs.first(), i.e. the lowest pk
+        self.rfc_docs = { name: min(alias_docs[name]) for name in rfc_names if name in alias_docs }
+
+        # the RFC aliases that the NIC/IEN/STD/RTR names translate to
+        translated_doc_ids = set(doc_id for name in translated for doc_id in alias_docs.get(name, []))
+        rfc_aliases_of_doc = {}
+        for chunk in _chunks(translated_doc_ids):
+            for doc_id, alias_id in AliasDocs.objects.filter(document_id__in=chunk, docalias__name__startswith="rfc").values_list("document_id", "docalias_id"):
+                rfc_aliases_of_doc.setdefault(doc_id, set()).add(alias_id)
+        self.translated_alias_ids = {
+            name: set(alias_id for doc_id in alias_docs.get(name, []) for alias_id in rfc_aliases_of_doc.get(doc_id, []))
+            for name in translated
+        }
+
+        doc_ids = set(self.rfc_docs.values())
+        self.docs = {}
+        self.states = {}
+        self.tags = {}
+        self.relations = set()
+        self.published = set()
+        for chunk in _chunks(doc_ids):
+            for row in Document.objects.filter(pk__in=chunk).values_list("pk", "type_id", "title", "abstract", "pages", "std_level_id", "stream_id", "group_id"):
+                self.docs[row[0]] = row[1:]
+            for doc_id, type_id, slug in Document.states.through.objects.filter(document_id__in=chunk).values_list("document_id", "state__type_id", "state__slug"):
+                self.states[(doc_id, type_id)] = slug
+            for doc_id, tag in Document.tags.through.objects.filter(document_id__in=chunk, doctagname__in=["errata", "verified-errata"]).values_list("document_id", "doctagname_id"):
+                self.tags.setdefault(doc_id, set()).add(tag)
+            self.relations.update(RelatedDocument.objects.filter(source__in=chunk, relationship__in=["obs", "updates"]).values_list("source_id", "target_id", "relationship_id"))
+            self.published.update(DocEvent.objects.filter(doc__in=chunk, type="published_rfc").values_list("doc_id", flat=True))
+
+    def relation_target_ids(self, l):
+        direct, translated = _relation_alias_names(l)
+        ids = set(self.alias_ids[name] for name in direct if name in self.alias_ids)
+        for name in translated:
+            ids |= self.translated_alias_ids.get(name, set())
+        return ids
+
+    def needs_update(self, entry, errata, std_level_mapping, stream_mapping):
+        """Return True unless update_docs_from_rfc_index is known not to
+        write anything for this entry."""
+        rfc_number, title, authors, rfc_published_date, current_status, updates, updated_by, obsoletes, obsoleted_by, also, draft, has_errata, stream, wg, file_formats, pages, abstract = entry
+
+        doc_id = self.rfc_docs.get("rfc%s" % rfc_number)
+        if doc_id is None:
+            return True
+        type_id, doc_title, doc_abstract, doc_pages, std_level_id, stream_id, group_id = self.docs[doc_id]
+
+        if (title != doc_title
+            or (abstract and abstract != doc_abstract)
+            or (pages and int(pages) != doc_pages)
+            or std_level_mapping[current_status].pk != std_level_id
+            or self.states.get((doc_id, type_id)) != "rfc"
+            or stream_mapping[stream].pk != stream_id
+            or (not group_id and wg)
+            or doc_id not in self.published):
+            return True
+
+        for t in RFC_INDEX_STATE_TYPES:
+            slug = self.states.get((doc_id, t))
+            if slug is None and t == "draft-iesg":
+                return True
+            if slug is not None and slug not in ("pub", "idexists"):
+                return True
+
+        for l, relationship in ((obsoletes, "obs"), (updates, "updates")):
+            for target_id in self.relation_target_ids(l):
+                if (doc_id, target_id, relationship) not in self.relations:
+                    return True
+
+        if any(a.lower() not in self.alias_ids for a in also):
+            return True
+
+        tags = self.tags.get(doc_id, set())
+        doc_errata = errata.get('RFC%04d'%rfc_number, [])
+        all_rejected = doc_errata and all( er['errata_status_code']=='Rejected' for er in doc_errata )
+        if has_errata and not all_rejected:
+            if "errata" not in tags:
+                return True
+            if any(er['errata_status_code']=='Verified' for er in doc_errata) and "verified-errata" not in tags:
+                return True
+        elif tags:
+            return True
+
+        return False
+
+
 def update_docs_from_rfc_index(index_data, errata_data, skip_older_than_date=None):
     """Given parsed data from the RFC Editor index, update the documents in the database
 
@@ -374,12 +531,20 @@ def update_docs_from_rfc_index(index_data, errata_data, skip_older_than_date=Non
 
     system = Person.objects.get(name="(System)")
 
-    for rfc_number, title, authors, rfc_published_date, current_status, updates, updated_by, obsoletes, obsoleted_by, also, draft, has_errata, stream, wg, file_formats, pages, abstract in index_data:
+    if skip_older_than_date:
+        # speed up the process by skipping old entries
+        index_data = [ entry for entry in index_data if entry[3] >= skip_older_than_date ]
 
-        if skip_older_than_date and rfc_published_date < skip_older_than_date:
-            # speed up the process by skipping old entries
+    # most entries don't change anything, find those without asking the
+    # database about each of them
+    snapshot = RfcIndexSnapshot(index_data)
+
+    for entry in index_data:
+        if not snapshot.needs_update(entry, errata, std_level_mapping, stream_mapping):
             continue
 
+        rfc_number, title, authors, rfc_published_date, current_status, updates, updated_by, obsoletes, obsoleted_by, also, draft, has_errata, stream, wg, file_formats, pages, abstract = entry
+
         # we assume two things can happen: we get a new RFC, or an
         # attribute has been updated at the RFC Editor (RFC Editor
         # attributes take precedence over our local attributes)
@@ -472,7 +637,7 @@ def update_docs_from_rfc_index(index_data, errata_data, skip_older_than_date=Non
             changes.append("added RFC published event at %s" % e.time.strftime("%Y-%m-%d"))
             rfc_published = True
 
-        for t in ("draft-iesg", "draft-stream-iab", "draft-stream-irtf", "draft-stream-ise"):
+        for t in RFC_INDEX_STATE_TYPES:
             prev_state = doc.get_state(t)
             if prev_state is not None:
                 if prev_state.slug not in ("pub", "idexists"):
@@ -550,6 +715,9 @@ def update_docs_from_rfc_index(index_data, errata_data, skip_older_than_date=Non
             doc.save_with_history(events)
 
         if changes:
+            if rfc_published:
+                # Fill the htmlized and pdfized caches before the first readers show up
+                transaction.on_commit(lambda name=doc.name: prerender_document_task.delay(name))
             yield changes, doc, rfc_published
 
 
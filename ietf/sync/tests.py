@@ -6,9 +6,12 @@ import os
 import io
 import json
 import datetime
+import mock
 import quopri
 
 from django.conf import settings
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse as urlreverse
 from django.utils import timezone
 
@@ -345,8 +348,13 @@ class RFCSyncTests(TestCase):
         self.write_draft_file(draft_filename, 5000)
 
         changes = []
-        for cs, d, rfc_published in rfceditor.update_docs_from_rfc_index(data, errata, today - datetime.timedelta(days=30)):
-            changes.append(cs)
+        # the on_commit callbacks would not run within the test transaction
+        with mock.patch.object(transaction, 'on_commit', lambda x: x()), \
+             mock.patch('ietf.sync.rfceditor.prerender_document_task') as mock_task:
+            for cs, d, rfc_published in rfceditor.update_docs_from_rfc_index(data, errata, today - datetime.timedelta(days=30)):
+                changes.append(cs)
+        # the newly published RFC gets pre-rendered
+        self.assertIn((doc.name,), [c.args for c in mock_task.delay.call_args_list])
 
         doc = Document.objects.get(name=doc.name)
 
@@ -376,6 +384,22 @@ class RFCSyncTests(TestCase):
         changed = list(rfceditor.update_docs_from_rfc_index(data, errata, today - datetime.timedelta(days=30)))
         self.assertEqual(len(changed), 0)
 
+        # and that finding that out doesn't take queries per index entry
+        with CaptureQueriesContext(connection) as one:
+            list(rfceditor.update_docs_from_rfc_index(data, errata, today - datetime.timedelta(days=30)))
+        with CaptureQueriesContext(connection) as many:
+            changed = list(rfceditor.update_docs_from_rfc_index(data * 10, errata, today - datetime.timedelta(days=30)))
+        self.assertEqual(len(changed), 0)
+        self.assertEqual(len(many.captured_queries), len(one.captured_queries))
+
+        # entries are skipped by hash until they or their errata change
+        entries, hashes = rfceditor.unseen_rfc_index_entries(data, errata, {})
+        self.assertEqual(entries, data)
+        entries, __ = rfceditor.unseen_rfc_index_entries(data, errata, hashes)
+        self.assertEqual(entries, [])
+        entries, __ = rfceditor.unseen_rfc_index_entries(data, errata + [dict(errata[0], **{"doc-id": "RFC1234"})], hashes)
+        self.assertEqual(entries, data)
+
     def _generate_rfc_queue_xml(self, draft, state, auth48_url=None):
         """Generate an RFC queue xml string for a draft"""
         t = '''<rfc-editor-queue xmlns="http://www.rfc-editor.org/rfc-editor-queue">
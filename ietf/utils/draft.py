@@ -236,6 +236,7 @@ class PlaintextDraft(Draft):
         self._status = None
         self._creation_date = None
         self._title = None
+        self._refs = None
 
     @classmethod
     def from_file(cls, source, *args, **kwargs):
@@ -1112,6 +1113,11 @@ class PlaintextDraft(Draft):
 
     # ------------------------------------------------------------------
     def get_refs(self):
+        if self._refs is None:
+            self._refs = self._parse_refs()
+        return self._refs
+
+    def _parse_refs(self):
         # Bill's horrible "references section" regexps, built up over lots of years
         # of fine tuning for different formats.
         # Examples:
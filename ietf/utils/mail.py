@@ -8,9 +8,11 @@ import re
 import smtplib
 import sys
 import textwrap
+import threading
 import time
 import traceback
 
+from contextlib import contextmanager
 from email.utils import make_msgid, formatdate, formataddr as simple_formataddr, parseaddr as simple_parseaddr, getaddresses
 from email.message import Message       # pyflakes:ignore
 from email.mime.text import MIMEText
@@ -80,6 +82,73 @@ class SMTPSomeRefusedRecipients(smtplib.SMTPException):
     def summary_refusals(self):
         return ", ".join(["%s (%s)"%(x,self.refusals[x][0]) for x in self.refusals])
 
+def smtp_connect():
+    """Open an SMTP connection to the configured server, logging in if
+    a user and password are configured."""
+    server = smtplib.SMTP()
+    #log("SMTP server: %s" % repr(server))
+    #if settings.DEBUG:
+    #    server.set_debuglevel(1)
+    conn_code, conn_msg = server.connect(SMTP_ADDR['ip4'], SMTP_ADDR['port'])
+    #log("SMTP connect: code: %s; msg: %s" % (conn_code, conn_msg))
+    if settings.EMAIL_HOST_USER and settings.EMAIL_HOST_PASSWORD:
+        server.ehlo()
+        if 'starttls' not in server.esmtp_features:
+            raise ImproperlyConfigured('password configured but starttls not supported')
+        (retval, retmsg) = server.starttls()
+        if retval != 220:
+            raise ImproperlyConfigured('password configured but tls failed: %d %s' % ( retval, retmsg ))
+        # Send a new EHLO, since without TLS the server might not
+        # advertise the AUTH capability.
+        server.ehlo()
+        server.login(settings.EMAIL_HOST_USER, settings.EMAIL_HOST_PASSWORD)
+    return server
+
+def smtp_quit(server):
+    try:
+        server.quit()
+    except (smtplib.SMTPServerDisconnected, OSError):
+        server.close()
+
+_smtp_session = threading.local()
+
+SMTP_SESSION_RETRIES = 3
+SMTP_SESSION_RETRY_DELAY = 1            # seconds, doubled for each retry
+
+@contextmanager
+def smtp_session():
+    """Send all the mail sent by send_smtp() within the block over one SMTP
+    connection, reconnecting and retrying with backoff when the server
+    disconnects or answers with a temporary (4xx) error. Meant for jobs
+    that send many messages in a row."""
+    if getattr(_smtp_session, "state", None) is not None:
+        yield
+        return
+    _smtp_session.state = { "server": None }
+    try:
+        yield
+    finally:
+        server = _smtp_session.state["server"]
+        _smtp_session.state = None
+        if server is not None:
+            smtp_quit(server)
+
+def _session_sendmail(state, frm, to, data):
+    for attempt in range(SMTP_SESSION_RETRIES + 1):
+        try:
+            if state["server"] is None:
+                state["server"] = smtp_connect()
+            return state["server"].sendmail(frm, to, data)
+        except (smtplib.SMTPServerDisconnected, smtplib.SMTPResponseException, OSError) as e:
+            temporary = not isinstance(e, smtplib.SMTPResponseException) or 400 <= e.smtp_code < 500
+            if state["server"] is not None:
+                smtp_quit(state["server"])
+                state["server"] = None
+            if not temporary or attempt == SMTP_SESSION_RETRIES:
+                raise
+            log("Temporary SMTP failure, retrying: %s" % e)
+            time.sleep(SMTP_SESSION_RETRY_DELAY * 2 ** attempt)
+
 def send_smtp(msg, bcc=None):
     '''
     Send a Message via SMTP, based on the django email server settings.
@@ -87,6 +156,9 @@ def send_smtp(msg, bcc=None):
     Message.  The From address will be used if present or will default
     to the django setting DEFAULT_FROM_EMAIL
 
+    Within an smtp_session() block the session's connection is used
+    rather than a new one.
+
     If someone has set test_mode=True, then append the msg to
     the outbox.
     '''
@@ -103,25 +175,13 @@ def send_smtp(msg, bcc=None):
         if test_mode:
             outbox.append(msg)
         server = None
+        session = getattr(_smtp_session, "state", None)
         try:
-            server = smtplib.SMTP()
-            #log("SMTP server: %s" % repr(server))
-            #if settings.DEBUG:
-            #    server.set_debuglevel(1)
-            conn_code, conn_msg = server.connect(SMTP_ADDR['ip4'], SMTP_ADDR['port'])
-            #log("SMTP connect: code: %s; msg: %s" % (conn_code, conn_msg))
-            if settings.EMAIL_HOST_USER and settings.EMAIL_HOST_PASSWORD:
-                server.ehlo()
-                if 'starttls' not in server.esmtp_features:
-                    raise ImproperlyConfigured('password configured but starttls not supported')
-                (retval, retmsg) = server.starttls()
-                if retval != 220:
-                    raise ImproperlyConfigured('password configured but tls failed: %d %s' % ( retval, retmsg ))
-                # Send a new EHLO, since without TLS the server might not
-                # advertise the AUTH capability.
-                server.ehlo()
-                server.login(settings.EMAIL_HOST_USER, settings.EMAIL_HOST_PASSWORD)
-            unhandled = server.sendmail(frm, to, force_bytes(msg.as_string()))
+            if session is not None:
+                unhandled = _session_sendmail(session, frm, to, force_bytes(msg.as_string()))
+            else:
+                server = smtp_connect()
+                unhandled = server.sendmail(frm, to, force_bytes(msg.as_string()))
             if unhandled != {}:
                 raise SMTPSomeRefusedRecipients(message="%d addresses were refused"%len(unhandled),original_msg=msg,refusals=unhandled)
         except Exception as e:
@@ -133,10 +193,11 @@ def send_smtp(msg, bcc=None):
             else:
                 raise smtplib.SMTPException({'really': sys.exc_info()[0], 'value': sys.exc_info()[1], 'tb': traceback.format_tb(sys.exc_info()[2])})
         finally:
-            try:
-                server.quit()
-            except smtplib.SMTPServerDisconnected:
-                pass
+            if server is not None:
+                try:
+                    server.quit()
+                except smtplib.SMTPServerDisconnected:
+                    pass
         subj = force_text(msg.get('Subject', '[no subject]'))
         tau = time.time() - mark
         log("sent email (%.3fs) from '%s' to %s id %s subject '%s'" % (tau, frm, to, msg.get('Message-ID', ''), subj))
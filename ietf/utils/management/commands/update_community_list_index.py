@@ -7,12 +7,13 @@ from django.core.management.base import BaseCommand
 
 import debug                            # pyflakes:ignore
 
-from ietf.community.models import SearchRule
-from ietf.community.utils import reset_name_contains_index_for_rule
+from ietf.community.models import CommunityList, SearchRule
+from ietf.community.utils import reset_name_contains_indexes, reset_community_list_index
 
 class Command(BaseCommand):
     help = ("""
-        Update the index tables for stored regex-based document search rules.
+        Update the index tables for stored regex-based document search rules,
+        and the index of documents tracked by each community list.
         """)
 
     def add_arguments(self, parser):
@@ -22,12 +23,10 @@ class Command(BaseCommand):
 
     def handle(self, *args, **options):
         verbosity = options.get('verbosity', 1)
-        for rule in tqdm(SearchRule.objects.filter(rule_type='name_contains'), disable=(verbosity!=1)):
-            count1 = rule.name_contains_index.count()
-            if not options['dry_run']:
-                reset_name_contains_index_for_rule(rule)
-            count2 = rule.name_contains_index.count()
-            if int(options['verbosity']) > 1:
+        counts = reset_name_contains_indexes(dry_run=options['dry_run'])
+        if int(options['verbosity']) > 1:
+            for rule in SearchRule.objects.filter(pk__in=counts).select_related("group", "person", "community_list__group", "community_list__user"):
+                count1, count2 = counts[rule.pk]
                 group = rule.group or rule.community_list.group
                 person  = rule.person
                 if not person and not group:
@@ -37,4 +36,8 @@ class Command(BaseCommand):
                         pass
                 name = ((group and group.acronym) or (person and person.email_address())) or '?'
                 self.stdout.write("%-24s %-24s  %3d -->%3d\n" % (name[:24], rule.text[:24], count1, count2 ))
-            
+
+        for clist in tqdm(CommunityList.objects.all(), disable=(verbosity!=1)):
+            added, removed = reset_community_list_index(clist, dry_run=options['dry_run'])
+            if int(options['verbosity']) > 1 and (added or removed):
+                self.stdout.write("%-49s  +%d -%d\n" % (clist.long_name()[:49], len(added), len(removed)))
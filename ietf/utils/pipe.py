@@ -4,7 +4,12 @@
 
 # Simplified interface to os.popen3()
 
-def pipe(cmd, str=None):
+def pipe(cmd, str=None, timeout=None, env=None):
+    """Run cmd in a shell, feeding it str on stdin, and return a tuple of
+    the exit code, stdout and stderr.  If timeout is given, the command and
+    any processes it started are killed after that many seconds, and the
+    exit code is -SIGKILL.  If env is given, it is the environment of the
+    command instead of that of this process."""
     from subprocess import Popen, PIPE
     bufsize = 4096
     MAX = 65536*16
@@ -12,7 +17,10 @@ def pipe(cmd, str=None):
     if str and len(str) > 4096:                 # XXX: Hardcoded Linux 2.4, 2.6 pipe buffer size
         bufsize = len(str)
 
-    pipe = Popen(cmd, stdin=PIPE, stdout=PIPE, stderr=PIPE, bufsize=bufsize, shell=True)
+    if timeout is not None:
+        return _pipe_with_timeout(cmd, str, timeout, bufsize, MAX, env)
+
+    pipe = Popen(cmd, stdin=PIPE, stdout=PIPE, stderr=PIPE, bufsize=bufsize, shell=True, env=env)
     if not str is None:
         pipe.stdin.write(str)
         pipe.stdin.close()
@@ -32,3 +40,29 @@ def pipe(cmd, str=None):
             break
 
     return (code, out, err)
+
+def _pipe_with_timeout(cmd, str, timeout, bufsize, MAX, env):
+    import os
+    import signal
+    from subprocess import Popen, PIPE, TimeoutExpired
+
+    # run the command in its own process group, so that everything it
+    # started can be killed on timeout
+    pipe = Popen(cmd, stdin=PIPE, stdout=PIPE, stderr=PIPE, bufsize=bufsize, shell=True, start_new_session=True, env=env)
+    try:
+        out, err = pipe.communicate(input=str, timeout=timeout)
+        code = pipe.returncode
+    except TimeoutExpired:
+        try:
+            os.killpg(pipe.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        out, err = pipe.communicate()
+        code = -signal.SIGKILL
+        err += b"\nCommand timed out after %d seconds" % timeout
+
+    if len(out) >= MAX:
+        out = out[:MAX]
+        err += b"\nOutput exceeds %d bytes and has been truncated" % MAX
+
+    return (code, out, err)
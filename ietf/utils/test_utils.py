@@ -277,6 +277,11 @@ class TestCase(django.test.TestCase):
         self.requests_mock = requests_mock.Mocker()
         self.requests_mock.start()
 
+        # The mailtrigger definitions kept by this process follow changes
+        # through signals, which the rollback after each test doesn't send
+        from ietf.mailtrigger.utils import invalidate_mailtrigger_definitions
+        invalidate_mailtrigger_definitions()
+
         # Replace settings paths with temporary directories.
         self._ietf_temp_dirs = {}  # trashed during tearDown, DO NOT put paths you care about in this
         for setting in self.settings_temp_path_overrides:
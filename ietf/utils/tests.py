@@ -41,7 +41,7 @@ from ietf.utils.log import unreachable, assertion
 from ietf.utils.mail import send_mail_preformatted, send_mail_text, send_mail_mime, outbox, get_payload_text
 from ietf.utils.test_runner import get_template_paths, set_coverage_checking
 from ietf.utils.test_utils import TestCase, unicontent
-from ietf.utils.text import parse_unicode
+from ietf.utils.text import parse_unicode, prefix_search_tokens
 from ietf.utils.timezone import timezone_not_near_midnight
 from ietf.utils.xmldraft import XMLDraft
 
@@ -473,6 +473,13 @@ class TestRFC2047Strings(TestCase):
         for encoded_str, unicode in names: 
             self.assertEqual(unicode, parse_unicode(encoded_str))
 
+class PrefixSearchTokenTests(TestCase):
+    def test_prefix_search_tokens(self):
+        self.assertEqual(prefix_search_tokens('Iñigo  Peña'), {'iñigo peña', 'peña', 'inigo pena', 'pena'})
+        self.assertEqual(prefix_search_tokens('draft-ietf-quic-http'), {'draft-ietf-quic-http', 'ietf-quic-http', 'quic-http', 'http'})
+        self.assertEqual(prefix_search_tokens('RFC9114'), {'rfc9114', '9114'})
+        self.assertEqual(prefix_search_tokens(''), set())
+
 class TestAndroidSiteManifest(TestCase):
     def test_manifest(self):
         r = self.client.get(urlreverse('site.webmanifest'))
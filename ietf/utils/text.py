@@ -10,6 +10,8 @@ import textwrap
 import tlds
 import unicodedata
 
+from unidecode import unidecode
+
 from django.core.validators import URLValidator
 from django.core.exceptions import ValidationError
 from django.utils.functional import keep_lazy
@@ -263,3 +265,18 @@ def parse_unicode(text):
     else:
         text = decoded_string
     return text
+
+SEARCH_TOKEN_MAX_LENGTH = 255
+# the start of a word, or of a number following letters, as in rfc9114
+_word_start_re = re.compile(r'(?<![^\W_])[^\W_]|(?<=[^\W\d_])\d')
+
+def prefix_search_tokens(text):
+    """Return the lower-cased tails of text from the start of each of its
+    words, in the text's own form and in ascii, so that a prefix match on
+    the tokens finds words anywhere in the text."""
+    text = normalize_text(text).lower()
+    tokens = set()
+    for form in (text, unidecode(text)):
+        for m in _word_start_re.finditer(form):
+            tokens.add(form[m.start():m.start() + SEARCH_TOKEN_MAX_LENGTH])
+    return tokens